@@ -0,0 +1,66 @@
+"""
+Compare splitting the documents in S3 into chunks by words and by tokens of the dense
+embedding model, reporting the number of chunks and the embedding time for each.
+
+Example of usage:
+> python chunking_report.py --token-split-length 256 --no-embed
+"""
+
+import argparse
+
+from haystack import Document
+
+from scripts.config import get_config
+from scripts.read_data_functions import read_docs
+from scripts.services import SERVICES
+from search_backend.evaluation import chunking_report
+
+parser = argparse.ArgumentParser(prog="Chunking report")
+parser.add_argument("--word-split-length", type=int, default=64)
+parser.add_argument("--word-split-overlap", type=int, default=8)
+parser.add_argument(
+    "--token-split-length",
+    type=int,
+    default=256,
+    help="Chunk length in tokens, e.g. the model's maximum sequence length",
+)
+parser.add_argument("--token-split-overlap", type=int, default=32)
+parser.add_argument(
+    "--embed",
+    action=argparse.BooleanOptionalAction,
+    default=True,
+    help="Use --no-embed to skip timing the embedder",
+)
+args = parser.parse_args()
+
+cfg = get_config()
+s3client = SERVICES["s3clientfactory"]()
+objs, _ = s3client.list()
+docs = [
+    Document(**content)
+    for content in read_docs(s3client, [obj["Key"] for obj in objs])
+]
+
+word, token = chunking_report(
+    docs,
+    cfg["dense_embedding_model"],
+    word_split_length=args.word_split_length,
+    word_split_overlap=args.word_split_overlap,
+    token_split_length=args.token_split_length,
+    token_split_overlap=args.token_split_overlap,
+    embed=args.embed,
+)
+
+for row in [word, token]:
+    line = (
+        f"{row['split_by']:>5}: {row['chunks']} chunks, "
+        f"{row['mean_tokens']:.0f} tokens per chunk on average, "
+        f"{row['truncated']} truncated by the model"
+    )
+    if args.embed:
+        line += f", embedded in {row['embedding_s']:.1f}s"
+    print(line)
+
+print(f"Token splitting gives {token['chunk_reduction']:.0%} fewer chunks")
+if args.embed:
+    print(f"Embedding time saved: {token['embedding_s_saved']:.1f}s")
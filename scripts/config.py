@@ -28,6 +28,18 @@ defaults = {
     "embedding_dim": 384,
     # Language model used to rank search results better than the embedding retrieval can
     "rerank_model": "cross-encoder/ms-marco-MiniLM-L-2-v2",
+    # kNN engine and HNSW parameters for new indexes ("lucene", "faiss" or "nmslib");
+    # the engine's defaults are used if not set. See scripts/hnsw_report.py for tuning
+    "knn_engine": None,
+    "hnsw_m": None,
+    "hnsw_ef_construction": None,
+    "hnsw_ef_search": None,
+    # Timeout in seconds of the OpenSearch requests made by searches, so a stuck request
+    # gives up rather than holding a search thread
+    "opensearch_query_timeout": 5,
+    # Directory for caching text parsed from documents, so unchanged documents aren't
+    # parsed again when reprocessing the data (no caching if not set)
+    "PARSED_TEXT_CACHE_DIR": None,
 }
 
 
@@ -0,0 +1,132 @@
+"""
+Compare recall@k and the cost of HNSW index parameters, using embeddings already
+written to the document store, and recommend the cheapest settings meeting a target
+recall. The graphs are built in memory with LocalHNSWIndex, so recall matches what the
+OpenSearch engines would give, but speeds are not: settings are compared by the number
+of embeddings each query visits.
+
+The queries are read from a file (one per line) and embedded with the dense embedding
+model. Without a file, a sample of chunks is held out of the graphs and their
+embeddings used as queries, so no query finds itself.
+
+Example of usage:
+> python hnsw_report.py --k 10 --queries queries.txt --target-recall 0.95
+"""
+
+import argparse
+import os
+import random
+
+from haystack_integrations.components.embedders.fastembed import (
+    FastembedTextEmbedder,
+)
+
+from scripts.config import get_config
+from scripts.services import SERVICES
+from search_backend.evaluation import hnsw_report, recommend_hnsw_params
+from search_backend.snapshot import iter_documents
+
+parser = argparse.ArgumentParser(prog="HNSW report")
+parser.add_argument(
+    "--k", type=int, default=10, help="Number of results to compare"
+)
+parser.add_argument(
+    "--queries", help="File of sample queries, one per line (optional)"
+)
+parser.add_argument(
+    "--n-queries",
+    type=int,
+    default=100,
+    help="Number of chunks held out as queries, without a queries file",
+)
+parser.add_argument(
+    "--max-docs",
+    type=int,
+    default=None,
+    help="Build the graphs from a random sample of this many chunks",
+)
+parser.add_argument(
+    "--target-recall", type=float, default=0.95, help="Minimum recall@k"
+)
+parser.add_argument(
+    "--m", type=int, nargs="+", default=[8, 16, 32], help="Values of m"
+)
+parser.add_argument(
+    "--ef-construction",
+    type=int,
+    nargs="+",
+    default=[64, 128, 256],
+    help="Values of ef_construction",
+)
+parser.add_argument(
+    "--ef-search",
+    type=int,
+    nargs="+",
+    default=[16, 32, 64, 128, 256],
+    help="Values of ef_search",
+)
+args = parser.parse_args()
+
+cfg = get_config()
+document_store = SERVICES["querydocumentstore"]
+
+# Stream every chunk out of the store (filter_documents stops at 10,000), keeping a
+# uniform sample of max_docs of them if set
+random.seed(0)
+docs = []
+n_seen = 0
+for batch in iter_documents(document_store):
+    for doc in batch:
+        if doc.embedding is None:
+            continue
+        n_seen += 1
+        if args.max_docs is None or len(docs) < args.max_docs:
+            docs.append(doc)
+        else:
+            position = random.randrange(n_seen)
+            if position < args.max_docs:
+                docs[position] = doc
+
+if args.queries is not None:
+    with open(args.queries) as f:
+        texts = [line.strip() for line in f if line.strip()]
+    embedder = FastembedTextEmbedder(
+        model=cfg["dense_embedding_model"],
+        cache_dir=os.getcwd() + "/embedding_cache",
+    )
+    embedder.warm_up()
+    queries = [embedder.run(text=text)["embedding"] for text in texts]
+else:
+    random.shuffle(docs)
+    n_queries = min(args.n_queries, len(docs) // 2)
+    queries = [doc.embedding for doc in docs[:n_queries]]
+    docs = docs[n_queries:]
+
+report = hnsw_report(
+    docs,
+    queries,
+    k=args.k,
+    m_values=args.m,
+    ef_construction_values=args.ef_construction,
+    ef_search_values=args.ef_search,
+)
+
+print(f"{len(docs)} of {n_seen} chunks, {len(queries)} queries")
+for row in report:
+    print(
+        f"m={row['m']:<3} ef_construction={row['ef_construction']:<4} "
+        f"ef_search={row['ef_search']:<4}: "
+        f"recall@{args.k} {row[f'recall@{args.k}']:.3f}, "
+        f"{row['visited']:.0f} embeddings visited/query, "
+        f"build {row['build_s']:.1f} s"
+    )
+
+best = recommend_hnsw_params(report, args.target_recall, k=args.k)
+if best is None:
+    print(f"No settings reach recall@{args.k} of {args.target_recall}")
+else:
+    print(
+        f"Recommended: m={best['m']}, "
+        f"ef_construction={best['ef_construction']}, "
+        f"ef_search={best['ef_search']}"
+    )
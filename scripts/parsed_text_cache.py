@@ -0,0 +1,133 @@
+"""
+A local cache of the page dictionaries parsed from documents, so documents that haven't
+changed aren't parsed again when the data is reprocessed.
+"""
+
+import gzip
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import BinaryIO, Optional
+
+# File extension of cache entries (one gzipped JSON lines file per document)
+ENTRY_SUFFIX = ".jsonl.gz"
+
+
+def content_hash(f: BinaryIO, chunk_size: int = 1024 * 1024) -> str:
+    """
+    SHA-256 of the contents of a seekable binary file, read in chunks. The file is
+    returned to the start afterwards.
+    """
+
+    digest = hashlib.sha256()
+    f.seek(0)
+    for chunk in iter(lambda: f.read(chunk_size), b""):
+        digest.update(chunk)
+    f.seek(0)
+
+    return digest.hexdigest()
+
+
+class ParsedTextCache:
+    """
+    Content-addressed cache of parsed documents. Entries are keyed by a hash of the
+    document contents (or its S3 ETag) together with the reader settings, so the same
+    file is parsed once however many times it is reindexed, and a change to the readers
+    invalidates the old entries.
+
+    Each entry is a gzipped JSON lines file with one page dictionary per line. When the
+    cache grows beyond `max_bytes`, the least recently used entries are removed.
+    """
+
+    def __init__(self, path: str, max_bytes: int = 1024**3):
+        """
+        :param path: Directory to store the cache in, created if it doesn't exist.
+        :param max_bytes: Maximum total size of the cache entries on disk.
+        """
+
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.path.mkdir(parents=True, exist_ok=True)
+
+        self.total_bytes = sum(
+            entry.stat().st_size for entry in self._entries()
+        )
+
+    def key(self, content_id: str, **reader_settings) -> str:
+        """
+        Build the cache key for a document.
+
+        :param content_id: Content hash or S3 ETag of the document.
+        :param reader_settings: Anything else affecting the parsed text, e.g. the reader
+            version and PDF backend.
+        """
+
+        key = json.dumps([content_id, reader_settings], sort_keys=True)
+
+        return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[list[dict]]:
+        """
+        Get the page dictionaries cached for a key, or None if it isn't cached.
+        """
+
+        entry = self._entry_path(key)
+        try:
+            with gzip.open(entry, "rt", encoding="utf-8") as f:
+                pages = [json.loads(line) for line in f]
+        except (EOFError, OSError, ValueError):
+            # Missing or corrupt entry
+            return None
+
+        # Mark as recently used
+        os.utime(entry)
+
+        return pages
+
+    def put(self, key: str, pages: list[dict]):
+        """
+        Cache the page dictionaries for a key, removing least recently used entries if
+        the cache is over its size limit.
+        """
+
+        entry = self._entry_path(key)
+        entry.parent.mkdir(exist_ok=True)
+        if entry.exists():
+            self.total_bytes -= entry.stat().st_size
+
+        # Write to a temporary file first, so a partly written entry is never read
+        tmp = entry.with_name(f"{entry.name}.{os.getpid()}.tmp")
+        with gzip.open(tmp, "wt", encoding="utf-8") as f:
+            for page in pages:
+                f.write(json.dumps(page, ensure_ascii=False))
+                f.write("\n")
+        os.replace(tmp, entry)
+
+        self.total_bytes += entry.stat().st_size
+        self._evict()
+
+    def _entry_path(self, key: str) -> Path:
+        return self.path / key[:2] / f"{key}{ENTRY_SUFFIX}"
+
+    def _entries(self) -> list[Path]:
+        return list(self.path.glob(f"*/*{ENTRY_SUFFIX}"))
+
+    def _evict(self):
+        """
+        Remove the least recently used entries until the cache fits in max_bytes.
+        """
+
+        if self.total_bytes <= self.max_bytes:
+            return
+
+        entries = sorted(
+            ((entry, entry.stat()) for entry in self._entries()),
+            key=lambda item: item[1].st_mtime,
+        )
+
+        for entry, stat in entries:
+            if self.total_bytes <= self.max_bytes:
+                break
+            entry.unlink(missing_ok=True)
+            self.total_bytes -= stat.st_size
@@ -6,6 +6,7 @@ from haystack import Document
 
 from scripts.config import get_config
 from search_backend.indexing_pipeline import IndexingPipeline
+from scripts.parsed_text_cache import ParsedTextCache
 from scripts.read_data_functions import read_docs
 from scripts.services import SERVICES
 
@@ -18,8 +19,11 @@ document_store = SERVICES["documentstorefactory"](cfg, create_index=True)
 objs, _ = s3client.list()
 file_list = [obj["Key"] for obj in objs]
 
-# Parse the data
-dataset = read_docs(s3client, file_list)
+# Parse the data, reusing previously parsed text for unchanged documents
+cache = None
+if cfg["PARSED_TEXT_CACHE_DIR"]:
+    cache = ParsedTextCache(cfg["PARSED_TEXT_CACHE_DIR"])
+dataset = read_docs(s3client, file_list, cache=cache)
 
 # Create the document store containing the embeddings
 indexer = IndexingPipeline(
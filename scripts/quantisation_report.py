@@ -0,0 +1,85 @@
+"""
+Compare recall@k, memory and latency of the quantised embedding index modes, using
+embeddings already written to the document store.
+
+The queries are read from a file (one per line) and embedded with the dense embedding
+model. Without a file, a sample of chunks is held out of the index and their embeddings
+used as queries, so no query finds itself.
+
+Example of usage:
+> python quantisation_report.py --k 10 --queries queries.txt
+"""
+
+import argparse
+import os
+import random
+
+from haystack_integrations.components.embedders.fastembed import (
+    FastembedTextEmbedder,
+)
+
+from scripts.config import get_config
+from scripts.services import SERVICES
+from search_backend.evaluation import quantisation_report
+from search_backend.snapshot import iter_documents
+
+parser = argparse.ArgumentParser(prog="Quantisation report")
+parser.add_argument(
+    "--k", type=int, default=10, help="Number of results to compare"
+)
+parser.add_argument(
+    "--queries", help="File of sample queries, one per line (optional)"
+)
+parser.add_argument(
+    "--n-queries",
+    type=int,
+    default=100,
+    help="Number of chunks held out as queries, without a queries file",
+)
+parser.add_argument(
+    "--rescore-multiplier",
+    type=int,
+    default=4,
+    help="Candidates rescored with full precision per result",
+)
+args = parser.parse_args()
+
+cfg = get_config()
+document_store = SERVICES["querydocumentstore"]
+
+# Stream every chunk out of the store, as filter_documents stops at 10,000
+docs = [
+    doc
+    for batch in iter_documents(document_store)
+    for doc in batch
+    if doc.embedding is not None
+]
+
+if args.queries is not None:
+    with open(args.queries) as f:
+        texts = [line.strip() for line in f if line.strip()]
+    embedder = FastembedTextEmbedder(
+        model=cfg["dense_embedding_model"],
+        cache_dir=os.getcwd() + "/embedding_cache",
+    )
+    embedder.warm_up()
+    queries = [embedder.run(text=text)["embedding"] for text in texts]
+else:
+    random.seed(0)
+    random.shuffle(docs)
+    n_queries = min(args.n_queries, len(docs) // 2)
+    queries = [doc.embedding for doc in docs[:n_queries]]
+    docs = docs[n_queries:]
+
+report = quantisation_report(
+    docs, queries, k=args.k, rescore_multiplier=args.rescore_multiplier
+)
+
+print(f"{len(docs)} chunks, {len(queries)} queries")
+for row in report:
+    print(
+        f"{row['quantisation']:>8}: {row['search_nbytes'] / 1e6:.1f} MB "
+        f"({row['compression']:.0f}x smaller), "
+        f"recall@{args.k} {row[f'recall@{args.k}']:.3f}, "
+        f"{row['latency_ms']:.2f} ms/query"
+    )
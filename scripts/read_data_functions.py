@@ -3,88 +3,355 @@ A collection of functions to help read data from PDFs, Word docs, and Powerpoint
 """
 
 import re
-from io import BytesIO
+from collections import Counter
+from functools import cached_property, partial
+from io import StringIO
+from typing import Optional
 
 from docx import Document
 from pdfminer.converter import TextConverter
 from pdfminer.layout import LAParams
+from pdfminer.pdfdevice import PDFDevice
+from pdfminer.pdfdocument import PDFDocument
+from pdfminer.pdffont import PDFUnicodeNotDefined
 from pdfminer.pdfinterp import PDFResourceManager, PDFPageInterpreter
 from pdfminer.pdfpage import PDFPage
+from pdfminer.pdfparser import PDFParser
 from pptx import Presentation
 
+from scripts.parsed_text_cache import ParsedTextCache, content_hash
 from scripts.s3client import S3Client
 
+# Increment when a change to the readers changes their output, so documents in the
+# parsed text cache are parsed again
+READER_VERSION = 2
+
+# This dictionary specifies strings that need replacing in text extracted from PDFs.
+# This is because the PDF reader can't interpret certain punctuation marks.
+PDF_REPLACEMENTS = {
+    "\x0c": "",
+    # '\n': ' ',
+    "\xe2\x80\x93": "-",
+    "\xc2\xa3": "£",
+    "\uf0b7": "•",
+    "\uf020": "",
+}
+PDF_REPLACE_PATTERN = re.compile(
+    "|".join(
+        re.escape(match)
+        for match in sorted(PDF_REPLACEMENTS, key=len, reverse=True)
+    )
+)
+WHITESPACE_PATTERN = re.compile(r"\s+")
+
+
+def _clean_pdf_text(body):
+    """
+    Replace weird sets of characters that get introduced by the pdf reader when it
+    can't interpret a punctuation mark, and replace multiple spaces with single spaces.
+    """
+
+    body = PDF_REPLACE_PATTERN.sub(
+        lambda match: PDF_REPLACEMENTS[match.group()], body
+    )
+
+    return WHITESPACE_PATTERN.sub(" ", body.strip())
+
 
-def _read_pdf_gen(f, title, fname):
+def _iter_pdf_pages(f, page_numbers=None):
     """
-    Generator to read pages from PDF
+    Generator over the pages of a PDF, yielding (page index, PDFPage) tuples.
+
+    Arguments:
+     - f: seekable binary file object containing the PDF
+     - page_numbers: optional set of page indexes (starting at 0) to yield
     """
 
-    # Define generator from which pages can be read
-    page_gen = PDFPage.get_pages(f)
+    doc = PDFDocument(PDFParser(f))
 
-    # This dictionary specifies strings that need replacing in the extracted text.
-    # This is because the PDF reader can't interpret certain punctuation marks.
-    replace_dict = {
-        "\x0c": "",
-        # '\n': ' ',
-        "\xe2\x80\x93": "-",
-        "\xc2\xa3": "£",
-        "\uf0b7": "•",
-        "": "",
-    }
+    for page_number, page in enumerate(PDFPage.create_pages(doc)):
+        if page_numbers is not None and page_number not in page_numbers:
+            continue
+        yield page_number, page
 
-    # Iterate over the pdf pages
-    for pageNumber, page in enumerate(page_gen):
 
-        # Define some objects required by the pdf reader
-        laparams = LAParams()
-        rsrcmgr = PDFResourceManager()
-        retstr = BytesIO()
-        device = TextConverter(
-            rsrcmgr, retstr, codec="utf-8", laparams=laparams
-        )
-        interpreter = PDFPageInterpreter(rsrcmgr, device)
+class _LayoutExtractor:
+    """
+    Extracts the text of PDF pages with pdfminer's layout analysis, which gives the best
+    reading order.
 
-        # Extract the text
-        interpreter.process_page(page)
-        data = retstr.getvalue()
-        body = data.decode("utf-8")
+    One converter and interpreter are set up per document and reused for every page, so
+    fonts and other resources shared between pages are only parsed once.
+    """
 
-        # Replace weird sets of characters that get introduced by the pdf reader
-        # when it can't interpret a punctuation mark
-        for match, repl in replace_dict.items():
-            body = body.replace(match, repl)
+    def __init__(self, rsrcmgr):
+        self.retstr = StringIO()
+        self.device = TextConverter(rsrcmgr, self.retstr, laparams=LAParams())
+        self.interpreter = PDFPageInterpreter(rsrcmgr, self.device)
 
-        # Replace multiple spaces with single space
-        body = re.sub(r"\s+", " ", body.strip())
+    def __call__(self, page):
+        self.interpreter.process_page(page)
+        text = self.retstr.getvalue()
+        self.retstr.seek(0)
+        self.retstr.truncate(0)
 
-        if body == "":
-            # Skip pages with no text
-            continue
-        if body is None:
-            continue
-        elif bool(re.search("^contents", body.lower())) & (pageNumber <= 5):
-            # Skip contents pages
-            continue
-        elif (pageNumber == 0) & (len(body.split(" ")) <= 8):
-            # Skip what is likely to be a title page
-            continue
+        return text
+
+    def close(self):
+        self.device.close()
+        self.retstr.close()
+
+
+class _PlainTextDevice(PDFDevice):
+    """
+    pdfminer device that collects the decoded text of each text-showing operator,
+    without working out the position of every character or running layout analysis.
+    """
+
+    # Gap in a TJ array (in thousandths of a text space unit) treated as a word space
+    word_gap = 200
+
+    def __init__(self, rsrcmgr):
+        PDFDevice.__init__(self, rsrcmgr)
+        self.chunks = []
+
+    def render_string(self, textstate, seq, ncs, graphicstate):
+        font = textstate.font
+        if font is None:
+            return
+
+        text = []
+        for obj in seq:
+            if isinstance(obj, (int, float)):
+                if -obj >= self.word_gap:
+                    text.append(" ")
+                continue
+            if isinstance(obj, str):
+                obj = obj.encode("latin-1")
+            for cid in font.decode(obj):
+                try:
+                    text.append(font.to_unichr(cid))
+                except PDFUnicodeNotDefined:
+                    pass
+
+        self.chunks.append("".join(text))
+
+
+class _FastExtractor:
+    """
+    Extracts the text of PDF pages without layout analysis, which is several times
+    quicker. Text is returned in content stream order, with a space between the strings
+    drawn by each text operator.
+    """
+
+    def __init__(self, rsrcmgr):
+        self.device = _PlainTextDevice(rsrcmgr)
+        self.interpreter = PDFPageInterpreter(rsrcmgr, self.device)
+
+    def __call__(self, page):
+        self.device.chunks = []
+        self.interpreter.process_page(page)
+
+        return " ".join(self.device.chunks)
+
+    def close(self):
+        self.device.close()
+
+
+# Backends for extracting the text from PDF pages. Each is set up once per document
+# with a pdfminer resource manager, called with each PDFPage to get its raw text, and
+# closed at the end of the document.
+#  - layout: pdfminer with layout analysis, which gives the best reading order
+#  - fast: pdfminer without layout analysis, which is several times quicker, but can
+#    give a different reading order for multi-column pages, and splits words drawn
+#    with one text operator per character
+PDF_BACKENDS = {
+    "layout": _LayoutExtractor,
+    "fast": _FastExtractor,
+}
+
+
+class PageInfo:
+    """
+    A page (or slide) being read, as seen by the page filters. Text is only extracted
+    the first time it is used, so filters that can decide from the page index or a quick
+    preview of the text save the cost of fully extracting pages that are skipped.
+
+    Attributes:
+     - index: page index, starting at 0
+     - quick_text: text from a cheap extraction pass, with the same cleaning as the full
+       text. For PDFs read with the layout backend this comes from the fast backend, so
+       words drawn one character at a time can be split, and the reading order can
+       differ on multi-column pages.
+     - text: fully extracted text of the page
+    """
+
+    def __init__(self, index, get_text, get_quick_text=None):
+        self.index = index
+        self._get_text = get_text
+        self._get_quick_text = get_quick_text
+
+    @cached_property
+    def text(self):
+        return self._get_text()
+
+    @cached_property
+    def quick_text(self):
+        if self._get_quick_text is None or "text" in self.__dict__:
+            return self.text
+        return self._get_quick_text()
+
+
+def starts_with(*prefixes, max_index=None, quick=False):
+    """
+    Page filter skipping pages whose text starts with one of the prefixes (case
+    insensitive), e.g. to drop appendices:
+
+        ("appendix", starts_with("appendix", "annex"))
+
+    Arguments:
+     - prefixes: strings to look for at the start of the page
+     - max_index: only skip pages with an index up to this
+     - quick: decide from the page's quick text, so skipped pages aren't fully
+       extracted. With the layout backend this can decide differently to the full
+       text, e.g. for words drawn one character at a time.
+    """
+
+    prefixes = tuple(prefix.lower() for prefix in prefixes)
+
+    def page_filter(page):
+        if max_index is not None and page.index > max_index:
+            return False
+        text = page.quick_text if quick else page.text
+        return text[:100].lower().startswith(prefixes)
+
+    return page_filter
+
+
+def title_page(quick=False):
+    """
+    Page filter skipping a likely title page: the first page, with 8 words or fewer.
+
+    Arguments:
+     - quick: decide from the page's quick text (see starts_with)
+    """
+
+    def page_filter(page):
+        if page.index != 0:
+            return False
+        text = page.quick_text if quick else page.text
+        return text != "" and len(text.split(" ")) <= 8
+
+    return page_filter
+
+
+def _is_empty_page(page):
+    return page.text == ""
+
+
+# Filters deciding which PDF pages to skip, as (name, function) pairs. Each function
+# takes a PageInfo and returns True to skip the page. Filters are checked in order and
+# stop at the first that skips the page, so put the cheapest first: those using the
+# page index, then the quick text, then the full text. The names identify the filters
+# in parsed text cache keys.
+PDF_PAGE_FILTERS = [
+    ("contents", starts_with("contents", max_index=5)),
+    ("title", title_page()),
+    ("empty", _is_empty_page),
+]
+
+# The same filters deciding contents and title pages from the quick text, so with the
+# layout backend those pages aren't fully extracted. The quick text can split words
+# drawn one character at a time, or reorder multi-column pages, so these can skip
+# different pages to PDF_PAGE_FILTERS.
+QUICK_PDF_PAGE_FILTERS = [
+    ("quick_contents", starts_with("contents", max_index=5, quick=True)),
+    ("quick_title", title_page(quick=True)),
+    ("empty", _is_empty_page),
+]
+
+
+def _filter_pages(pages, page_filters, stats=None):
+    """
+    Generator over the pages that pass all of the filters.
+
+    Arguments:
+     - pages: iterable of PageInfo
+     - page_filters: list of (name, function) pairs, see PDF_PAGE_FILTERS
+     - stats: optional Counter, updated with the number of pages read ("pages"), kept
+       ("kept"), and skipped by each filter (by filter name)
+    """
+
+    if stats is None:
+        stats = Counter()
+
+    for page in pages:
+        stats["pages"] += 1
+        for name, page_filter in page_filters:
+            if page_filter(page):
+                stats[name] += 1
+                break
         else:
-            # Add page info to a dataframe
-            page_dict = {
+            stats["kept"] += 1
+            yield page
+
+
+def _read_pdf_gen(
+    f,
+    title,
+    fname,
+    backend="layout",
+    page_numbers=None,
+    page_filters=None,
+    stats=None,
+):
+    """
+    Generator to read pages from PDF
+
+    Arguments:
+     - backend: name of the text extraction backend in PDF_BACKENDS
+     - page_numbers: optional set of page indexes (starting at 0) to read
+     - page_filters: list of (name, function) pairs deciding which pages to skip,
+       defaults to PDF_PAGE_FILTERS
+     - stats: optional Counter to update with the number of pages skipped by each filter
+    """
+
+    if page_filters is None:
+        page_filters = PDF_PAGE_FILTERS
+
+    rsrcmgr = PDFResourceManager(caching=True)
+    extract = PDF_BACKENDS[backend](rsrcmgr)
+    # The fast backend is cheap enough to be its own preview
+    quick_extract = None if backend == "fast" else _FastExtractor(rsrcmgr)
+
+    def get_text(pdf_page, extract):
+        if extract is None:
+            return None
+        return lambda: _clean_pdf_text(extract(pdf_page))
+
+    pages = (
+        PageInfo(
+            page_number,
+            get_text(pdf_page, extract),
+            get_text(pdf_page, quick_extract),
+        )
+        for page_number, pdf_page in _iter_pdf_pages(f, page_numbers)
+    )
+
+    try:
+        for page in _filter_pages(pages, page_filters, stats):
+            yield {
                 "meta": {
                     "title": title,
                     "path": fname,
-                    "page": pageNumber + 1,
+                    "page": page.index + 1,
                 },
-                "content": body,
+                "content": page.text,
             }
-
-        retstr.close()
-        device.close()
-
-        yield page_dict
+    finally:
+        extract.close()
+        if quick_extract is not None:
+            quick_extract.close()
 
 
 def _read_word(f, title, fname):
@@ -138,68 +405,172 @@ def _read_word(f, title, fname):
     return word_dict
 
 
-def _read_ppt_gen(f, title, fname):
+def _slide_text(slide):
+    """
+    Combine the text from the text frames and tables on a slide.
+    """
+
+    slide_text = []
+
+    # Add all text from the slide to a list
+    for shape in slide.shapes:
+
+        if shape.has_text_frame:
+            for jj, para in enumerate(shape.text_frame.paragraphs):
+                para_text = " ".join([run.text for run in para.runs])
+                para_text = re.sub(r"\s+", " ", para_text).strip()
+                para_text = para_text.replace("\xa0", "")
+                if para_text != "":
+                    # Make sure the paragraph contains text
+                    slide_text.append(para_text)
+
+        # Check for a table, as text formatted via a table won't be captured by the above
+        if shape.has_table:
+            for row in shape.table.rows:
+                table_text = " ".join(
+                    [cell.text for cell in row.cells if cell.text != ""]
+                )
+                if table_text != "":
+                    slide_text.append(table_text)
+
+    return "\n".join(slide_text)
+
+
+# Filters deciding which Powerpoint slides to skip, in the same format as
+# PDF_PAGE_FILTERS
+PPT_PAGE_FILTERS = [
+    # The first slide is just a title slide
+    ("first_slide", lambda page: page.index == 0),
+    ("empty", _is_empty_page),
+    (
+        "contents",
+        lambda page: bool(
+            re.search("^contents|\ncontents$", page.text.lower())
+        ),
+    ),
+    # Likely to be a title slide
+    ("title", lambda page: len(page.text.split(" ")) <= 8),
+]
+
+
+def _read_ppt_gen(f, title, fname, page_filters=None, stats=None):
     """
     Generator to read paragraphs from Powerpoint doc
+
+    Arguments:
+     - page_filters: list of (name, function) pairs deciding which slides to skip,
+       defaults to PPT_PAGE_FILTERS
+     - stats: optional Counter to update with the number of slides skipped by each
+       filter
     """
 
+    if page_filters is None:
+        page_filters = PPT_PAGE_FILTERS
+
     ppt = Presentation(f)
 
-    for ii, slide in enumerate(ppt.slides):
+    pages = (
+        PageInfo(ii, partial(_slide_text, slide))
+        for ii, slide in enumerate(ppt.slides)
+    )
 
-        # Skip the first slide, since it's just a title slide
-        if ii == 0:
-            continue
+    for page in _filter_pages(pages, page_filters, stats):
+        yield {
+            "meta": {
+                "title": title,
+                "path": fname,
+                "page": page.index + 1,
+            },
+            "content": page.text,
+        }
 
-        slide_text = []
-
-        # Add all text from the slide to a list
-        for shape in slide.shapes:
-
-            if shape.has_text_frame:
-                for jj, para in enumerate(shape.text_frame.paragraphs):
-                    para_text = " ".join([run.text for run in para.runs])
-                    para_text = re.sub(r"\s+", " ", para_text).strip()
-                    para_text = para_text.replace("\xa0", "")
-                    if para_text != "":
-                        # Make sure the paragraph contains text
-                        slide_text.append(para_text)
-
-            # Check for a table, as text formatted via a table won't be captured by the above
-            if shape.has_table:
-                for row in shape.table.rows:
-                    table_text = " ".join(
-                        [cell.text for cell in row.cells if cell.text != ""]
-                    )
-                    if table_text != "":
-                        slide_text.append(table_text)
-
-        # Combine slide text and yield if it meets requirements
-        slide_text = "\n".join(slide_text)
-        if slide_text == "":
-            # Skip slides with no text
-            continue
-        elif re.search("^contents|\ncontents$", slide_text.lower()):
-            # Skip contents page slides
-            continue
-        elif len(slide_text.split(" ")) <= 8:
-            # Skip what is likely to be a title slide
-            continue
-        else:
-            # Add page info to a dataframe
-            slide_dict = {
-                "meta": {
-                    "title": title,
-                    "path": fname,
-                    "page": ii + 1,
-                },
-                "content": slide_text,
-            }
 
-            yield slide_dict
+def _format_stats(stats):
+    """
+    Summarise page skip statistics for a document, e.g.
+    "kept 40 of 52 pages (skipped contents: 2, empty: 10)"
+    """
+
+    skipped = ", ".join(
+        f"{name}: {count}"
+        for name, count in stats.items()
+        if name not in ["pages", "kept"]
+    )
+    summary = f"kept {stats['kept']} of {stats['pages']} pages"
 
+    return f"{summary} (skipped {skipped})" if skipped else summary
 
-def read_docs(s3client: S3Client, fnames: list[str]):
+
+def _read_doc(
+    f, title, fname, pdf_backend, pdf_page_filters, ppt_page_filters
+):
+    """
+    Read the pages of a document with the reader for its file type.
+
+    Returns:
+    A tuple of (list of page dictionaries, Counter of skipped pages), or (None, None)
+    if the file type isn't supported.
+    """
+
+    stats = Counter()
+    if re.search(".pdf$", fname):
+        doc_list = [
+            page
+            for page in _read_pdf_gen(
+                f,
+                title,
+                fname,
+                backend=pdf_backend,
+                page_filters=pdf_page_filters,
+                stats=stats,
+            )
+        ]
+    elif re.search(".doc$|.docx$", fname):
+        doc_list = [_read_word(f, title, fname)]
+    elif re.search(".ppt$|.pptx$", fname):
+        doc_list = [
+            para
+            for para in _read_ppt_gen(
+                f,
+                title,
+                fname,
+                page_filters=ppt_page_filters,
+                stats=stats,
+            )
+        ]
+    else:
+        return None, None
+
+    return doc_list, stats
+
+
+def _reader_settings(pdf_backend, pdf_page_filters, ppt_page_filters):
+    """
+    Settings affecting the parsed text of a document, used in parsed text cache keys.
+    Page filters are identified by name.
+    """
+
+    return {
+        "reader_version": READER_VERSION,
+        "pdf_backend": pdf_backend,
+        "pdf_page_filters": [
+            name for name, _ in pdf_page_filters or PDF_PAGE_FILTERS
+        ],
+        "ppt_page_filters": [
+            name for name, _ in ppt_page_filters or PPT_PAGE_FILTERS
+        ],
+    }
+
+
+def read_docs(
+    s3client: S3Client,
+    fnames: list[str],
+    pdf_backend="layout",
+    pdf_page_filters=None,
+    ppt_page_filters=None,
+    skip_stats=None,
+    cache: Optional[ParsedTextCache] = None,
+):
     """
     Iterates through a list of docs and calls the appropriate function
     to extract the text from each page (if applicable) of each doc.
@@ -207,6 +578,15 @@ def read_docs(s3client: S3Client, fnames: list[str]):
     Arguments:
      - s3client: S3 client set up with authentication
      - fnames: a list of keys in the bucket
+     - pdf_backend: name of the PDF text extraction backend in PDF_BACKENDS
+     - pdf_page_filters: filters deciding which PDF pages to skip, defaults to
+       PDF_PAGE_FILTERS
+     - ppt_page_filters: filters deciding which slides to skip, defaults to
+       PPT_PAGE_FILTERS
+     - skip_stats: optional dictionary, filled with a Counter of pages read, kept and
+       skipped by each filter for each PDF or Powerpoint (keyed by fname)
+     - cache: optional ParsedTextCache. Documents are looked up by S3 ETag (or content
+       hash, if the ETag isn't available), and only downloaded and parsed on a miss.
 
     Returns:
     A list of dictionaries containing document text and metadata.
@@ -214,26 +594,59 @@ def read_docs(s3client: S3Client, fnames: list[str]):
 
     print("Reading documents...")
 
+    settings = _reader_settings(
+        pdf_backend, pdf_page_filters, ppt_page_filters
+    )
     data = []
 
     for fname in fnames:
         # Get the title from the filename
         title = fname.split("/")[-1]
 
-        # Read in the pdf
-        obj, _ = s3client.get_object(fname, prepend_prefix=False)
+        key = None
+        if cache is not None:
+            etag, _ = s3client.get_etag(fname, prepend_prefix=False)
+            if etag is not None:
+                key = cache.key(etag, **settings)
+                doc_list = cache.get(key)
+                if doc_list is not None:
+                    data.append(_set_source(doc_list, title, fname))
+                    continue
+
+        # Stream the file from S3, spooling large files to disk
+        f, error = s3client.download_fileobj(fname, prepend_prefix=False)
+        if error is not None:
+            print(f"Unable to read {fname}: {error}")
+            continue
+
+        with f:
+            if cache is not None and key is None:
+                key = cache.key(content_hash(f), **settings)
+                doc_list = cache.get(key)
+                if doc_list is not None:
+                    data.append(_set_source(doc_list, title, fname))
+                    continue
+
+            doc_list, stats = _read_doc(
+                f,
+                title,
+                fname,
+                pdf_backend,
+                pdf_page_filters,
+                ppt_page_filters,
+            )
+
+        if doc_list is None:
+            print(f"File format not accepted for {fname}")
+            continue
 
-        fs = obj["Body"].read()
+        if stats:
+            print(f"{fname}: {_format_stats(stats)}")
+            if skip_stats is not None:
+                skip_stats[fname] = stats
 
-        with BytesIO(fs) as f:
-            if re.search(".pdf$", fname):
-                doc_list = [page for page in _read_pdf_gen(f, title, fname)]
-            elif re.search(".doc$|.docx$", fname):
-                doc_list = [_read_word(f, title, fname)]
-            elif re.search(".ppt$|.pptx$", fname):
-                doc_list = [para for para in _read_ppt_gen(f, title, fname)]
-            else:
-                print(f"File format not accepted for {fname}")
+        if key is not None:
+            cache.put(key, doc_list)
 
         data.append(doc_list)
 
@@ -241,3 +654,16 @@ def read_docs(s3client: S3Client, fnames: list[str]):
     data = [page for doc in data for page in doc]
 
     return data
+
+
+def _set_source(doc_list, title, fname):
+    """
+    Set the title and path of cached pages, since the same contents may have been
+    cached under a different file name.
+    """
+
+    for page in doc_list:
+        page["meta"]["title"] = title
+        page["meta"]["path"] = fname
+
+    return doc_list
@@ -1,11 +1,24 @@
 import logging
 import os
 from io import BytesIO
-from typing import Optional
+from tempfile import SpooledTemporaryFile
+from typing import BinaryIO, Optional
 
 import boto3
+from boto3.s3.transfer import TransferConfig
 from botocore.exceptions import ClientError, EndpointConnectionError
 
+# Objects smaller than this are held in memory when downloaded, larger ones are spooled
+# to a temporary file on disk
+SPOOL_MAX_SIZE = 16 * 1024 * 1024
+
+# Transfers are split into parts of this size, so only a few parts are held in memory
+TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=8 * 1024 * 1024,
+    multipart_chunksize=8 * 1024 * 1024,
+    max_concurrency=4,
+)
+
 
 def _get_error_message(ex: Exception) -> str:
     if isinstance(ex, ClientError):
@@ -25,11 +38,22 @@ class S3Client:
 
     # returns None (no error), or error message
     def upload(self, bytes_to_upload: bytes, filename: str) -> Optional[str]:
+        return self.upload_fileobj(BytesIO(bytes_to_upload), filename)
+
+    # Stream a file object to S3, using a multipart upload for large files, so the
+    # whole file is never held in memory.
+    #
+    # fileobj: readable binary file object, e.g. a member opened from a zip file
+    # returns None (no error), or error message
+    def upload_fileobj(
+        self, fileobj: BinaryIO, filename: str
+    ) -> Optional[str]:
         try:
             self.client.upload_fileobj(
-                BytesIO(bytes_to_upload),
+                fileobj,
                 self.bucket,
                 f"{self.prefix}/{os.path.basename(filename)}",
+                Config=TRANSFER_CONFIG,
             )
 
             return None
@@ -49,6 +73,48 @@ class S3Client:
         except Exception as ex:
             return None, _get_error_message(ex)
 
+    # Get the ETag of an object without downloading it. The ETag changes whenever the
+    # object's contents change.
+    #
+    # key: key for the object, excluding the prefix
+    # prepend_prefix: if True, prefix is prepended to the key before doing the head
+    # returns (etag, error); etag is None if error occurred
+    def get_etag(self, key: str, prepend_prefix=True) -> tuple:
+        if prepend_prefix:
+            key = f"{self.prefix}/{key}"
+
+        try:
+            data = self.client.head_object(Bucket=self.bucket, Key=key)
+            return data["ETag"], None
+        except Exception as ex:
+            return None, _get_error_message(ex)
+
+    # Download an object into a seekable temporary file, which stays in memory for
+    # small objects and is spooled to disk above spool_max_size bytes. The body is
+    # streamed in parts rather than read into one bytes object. The caller should
+    # close the file.
+    #
+    # key: key for the object, excluding the prefix
+    # prepend_prefix: if True, prefix is prepended to the key before doing the get
+    # returns (file, error); file is None if error occurred, and is positioned at the
+    # start otherwise
+    def download_fileobj(
+        self, key: str, prepend_prefix=True, spool_max_size=SPOOL_MAX_SIZE
+    ) -> tuple:
+        if prepend_prefix:
+            key = f"{self.prefix}/{key}"
+
+        f = SpooledTemporaryFile(max_size=spool_max_size)
+        try:
+            self.client.download_fileobj(
+                self.bucket, key, f, Config=TRANSFER_CONFIG
+            )
+            f.seek(0)
+            return f, None
+        except Exception as ex:
+            f.close()
+            return None, _get_error_message(ex)
+
     # Get a list of objects in the bucket with given prefix.
     #
     # returns (objects: list, error: str); if an error occurred, error is not None
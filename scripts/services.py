@@ -11,6 +11,8 @@ from opensearchpy import (
 
 from scripts.config import get_config
 from search_backend.aws import get_aws_session
+from search_backend.hnsw import hnsw_index_options
+from search_backend.resilient_transport import ResilientTransport
 from scripts.s3client import S3Client
 
 
@@ -41,7 +43,9 @@ def opensearch_client_factory():
     )
 
 
-def document_store_factory(cfg, create_index=False):
+def document_store_factory(
+    cfg, create_index=False, index="document", resilient=False, timeout=None
+):
     aws_session = get_aws_session(cfg, cfg["AWS_REGION"])
     credentials = aws_session.get_credentials()
     auth = Urllib3AWSV4SignerAuth(credentials, cfg["AWS_REGION"], "es")
@@ -57,21 +61,47 @@ def document_store_factory(cfg, create_index=False):
         "use_ssl": use_ssl,
         "verify_certs": False,
         "connection_class": Urllib3HttpConnection,
-        "index": "document",
+        "index": index,
         "embedding_dim": embedding_dim,
         "batch_size": batch_size,
     }
 
+    # HNSW parameters, used when the index is created
+    if cfg.get("knn_engine") is not None:
+        method, settings = hnsw_index_options(
+            engine=cfg["knn_engine"],
+            m=_optional_int(cfg.get("hnsw_m")),
+            ef_construction=_optional_int(cfg.get("hnsw_ef_construction")),
+            ef_search=_optional_int(cfg.get("hnsw_ef_search")),
+        )
+        opensearch_docstore_options["method"] = method
+        opensearch_docstore_options["settings"] = settings
+
+    # Client-side timeout of each request in seconds, in place of the client's default
+    # of 10, so a stuck request doesn't hold up the thread waiting on it
+    if timeout is not None:
+        opensearch_docstore_options["timeout"] = timeout
+
+    # Hedge slow searches and fail fast while the cluster is unhealthy
+    if resilient:
+        opensearch_docstore_options["transport_class"] = ResilientTransport
+
     return OpenSearchDocumentStore(
         create_index=create_index, **opensearch_docstore_options
     )
 
 
+def _optional_int(value):
+    return None if value is None else int(value)
+
+
 SERVICES = {
     "s3clientfactory": s3client_factory,
     "opensearchclientfactory": opensearch_client_factory,
     "documentstorefactory": document_store_factory,
     "querydocumentstore": document_store_factory(
-        get_config(), create_index=False
+        get_config(),
+        create_index=False,
+        timeout=float(get_config()["opensearch_query_timeout"]),
     ),
 }
@@ -1,22 +1,22 @@
 """
 Upload a set of documents from a zip file to the local S3 bucket.
 
+Files are streamed straight from the zip file to S3 (using multipart uploads for large
+files), without extracting the zip to disk.
+
 Example of usage:
-> python upload_zip_to_s3.py 'test_zip.zip' 'unzip_folder' --bucket mojap-rd --prefix test_upload/docs --no-local
+> python upload_zip_to_s3.py 'test_zip.zip' --bucket mojap-rd --prefix test_upload/docs --no-local
 """
 
 import argparse
 import os
 import zipfile
 
-from glob import glob
-from pathlib import Path
-
 import boto3
+from boto3.s3.transfer import TransferConfig
 
 parser = argparse.ArgumentParser(prog="Document uploader")
 parser.add_argument("zipfile", help="Path to zip file")
-parser.add_argument("destdir", help="Destination directory to unzip to")
 parser.add_argument(
     "--bucket", help="S3 bucket to upload files to", default="mojap-rd"
 )
@@ -35,17 +35,6 @@ parser.add_argument(
 
 args = parser.parse_args()
 
-destdir_path = Path(args.destdir)
-
-os.makedirs(destdir_path, exist_ok=True)
-
-# unzip
-with zipfile.ZipFile(args.zipfile, "r") as zip_file:
-    zip_file.extractall(destdir_path)
-
-# get list of files
-files_to_upload = glob(f"{destdir_path / '**'}")
-
 # upload files to s3 bucket; NB in localstack, we can just use
 # "localstack" for auth
 if args.local:
@@ -58,11 +47,20 @@ if args.local:
 else:
     s3 = boto3.client("s3")
 
+# Large files are uploaded in 8MB parts, so only a few parts are held in memory
+transfer_config = TransferConfig(
+    multipart_threshold=8 * 1024 * 1024,
+    multipart_chunksize=8 * 1024 * 1024,
+)
+
 prefix = args.prefix.strip("/")
-for f in files_to_upload:
-    if not os.path.isfile(f):
-        continue
+with zipfile.ZipFile(args.zipfile, "r") as zip_file:
+    for member in zip_file.infolist():
+        # Only upload files at the top level of the zip
+        if member.is_dir() or "/" in member.filename.rstrip("/"):
+            continue
 
-    key = f"{prefix}/{os.path.basename(f)}"
-    print(f"Uploading {key}")
-    s3.upload_file(f, args.bucket, key)
+        key = f"{prefix}/{os.path.basename(member.filename)}"
+        print(f"Uploading {key}")
+        with zip_file.open(member) as f:
+            s3.upload_fileobj(f, args.bucket, key, Config=transfer_config)
@@ -0,0 +1,251 @@
+"""
+Embed chunks in a pool of worker processes, each with its own copy of the embedding
+model, so indexing can use all the cores of a machine.
+"""
+
+import os
+from dataclasses import replace
+from multiprocessing import get_context
+from multiprocessing.shared_memory import SharedMemory
+from typing import Callable, List, Optional
+
+import numpy as np
+from haystack import Document, component
+
+# Model loaded by each worker process
+_worker_model = None
+
+
+def fastembed_model(model: str, threads: int):
+    """
+    Load a fastembed text embedding model, using `threads` threads for inference.
+    """
+
+    from fastembed import TextEmbedding
+
+    return TextEmbedding(model_name=model, threads=threads)
+
+
+def _init_worker(load_model: Callable, model: str, threads: int):
+    """
+    Load the model once when a worker process starts, limiting the threads it uses so
+    workers don't compete for cores.
+    """
+
+    global _worker_model
+
+    for variable in ["OMP_NUM_THREADS", "MKL_NUM_THREADS"]:
+        os.environ[variable] = str(threads)
+    _worker_model = load_model(model, threads)
+
+
+def _embedding_dim(_=None) -> int:
+    return len(next(iter(_worker_model.embed(["dimension"]))))
+
+
+def _embed_batch(task: tuple) -> int:
+    """
+    Embed a batch of texts and write the embeddings into their rows of the shared
+    output array.
+    """
+
+    shm_name, shape, start, texts = task
+    embeddings = np.asarray(
+        list(_worker_model.embed(texts, batch_size=len(texts))),
+        dtype=np.float32,
+    )
+
+    shm = SharedMemory(name=shm_name)
+    try:
+        output = np.ndarray(shape, dtype=np.float32, buffer=shm.buf)
+        output[start : start + len(texts)] = embeddings
+        del output
+    finally:
+        shm.close()
+
+    return len(texts)
+
+
+class EmbeddingPool:
+    """
+    A pool of worker processes, each of which loads the embedding model once when the
+    pool starts. Texts are sent to the workers in batches, and the workers write the
+    embeddings straight into a shared memory array at each batch's row offset, so the
+    output is in the same order as the input however the batches are scheduled.
+    """
+
+    def __init__(
+        self,
+        model: str,
+        workers: Optional[int] = None,
+        threads_per_worker: int = 1,
+        batch_size: int = 64,
+        load_model: Callable = fastembed_model,
+    ):
+        """
+        :param model: Name of the embedding model.
+        :param workers: Number of worker processes. Defaults to the number of cores
+            divided by threads_per_worker.
+        :param threads_per_worker: Number of threads each worker uses for inference.
+        :param batch_size: Number of texts sent to a worker at a time.
+        :param load_model: Top-level function taking (model, threads) and returning an
+            object with an `embed(texts, batch_size)` method yielding an embedding for
+            each text, like fastembed's TextEmbedding.
+        """
+
+        self.model = model
+        self.threads_per_worker = threads_per_worker
+        self.workers = workers or max(
+            (os.cpu_count() or 1) // threads_per_worker, 1
+        )
+        self.batch_size = batch_size
+        self.load_model = load_model
+
+        self.dim = None
+        self._pool = None
+
+    def start(self):
+        """
+        Start the worker processes and load the model in each, if not already started.
+        """
+
+        if self._pool is not None:
+            return
+
+        # Workers are spawned rather than forked, as inference libraries aren't safe to
+        # use after a fork
+        self._pool = get_context("spawn").Pool(
+            self.workers,
+            initializer=_init_worker,
+            initargs=(self.load_model, self.model, self.threads_per_worker),
+        )
+        self.dim = self._pool.apply(_embedding_dim)
+
+    def close(self):
+        """
+        Stop the worker processes.
+        """
+
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """
+        Embed texts, returning a float32 array with a row for each text.
+        """
+
+        self.start()
+
+        shape = (len(texts), self.dim)
+        if not texts:
+            return np.empty(shape, dtype=np.float32)
+
+        shm = SharedMemory(create=True, size=4 * shape[0] * shape[1])
+        try:
+            tasks = (
+                (
+                    shm.name,
+                    shape,
+                    start,
+                    texts[start : start + self.batch_size],
+                )
+                for start in range(0, len(texts), self.batch_size)
+            )
+            for _ in self._pool.imap_unordered(_embed_batch, tasks):
+                pass
+
+            return np.ndarray(shape, dtype=np.float32, buffer=shm.buf).copy()
+        finally:
+            shm.close()
+            shm.unlink()
+
+
+@component
+class ParallelDocumentEmbedder:
+    """
+    A Haystack component to embed documents with an `EmbeddingPool`. Texts are prepared
+    in the same way as FastembedDocumentEmbedder, so the embeddings are the same.
+    """
+
+    def __init__(
+        self,
+        model: str,
+        workers: Optional[int] = None,
+        threads_per_worker: int = 1,
+        batch_size: int = 64,
+        prefix: str = "",
+        suffix: str = "",
+        meta_fields_to_embed: Optional[List[str]] = None,
+        embedding_separator: str = "\n",
+    ):
+        """
+        :param model: Name of the fastembed embedding model.
+        :param workers: Number of worker processes (see `EmbeddingPool`).
+        :param threads_per_worker: Number of threads each worker uses for inference.
+        :param batch_size: Number of documents sent to a worker at a time.
+        :param prefix: A string to add to the beginning of each text.
+        :param suffix: A string to add to the end of each text.
+        :param meta_fields_to_embed: Meta fields to embed along with the content.
+        :param embedding_separator: Separator between the meta fields and the content.
+        """
+
+        self.model = model
+        self.workers = workers
+        self.threads_per_worker = threads_per_worker
+        self.batch_size = batch_size
+        self.prefix = prefix
+        self.suffix = suffix
+        self.meta_fields_to_embed = meta_fields_to_embed or []
+        self.embedding_separator = embedding_separator
+
+        self.pool = EmbeddingPool(
+            model,
+            workers=workers,
+            threads_per_worker=threads_per_worker,
+            batch_size=batch_size,
+        )
+
+    def warm_up(self):
+        """
+        Start the worker processes and load the model.
+        """
+
+        self.pool.start()
+
+    def _prepare_texts_to_embed(self, documents: List[Document]) -> List[str]:
+        texts = []
+        for doc in documents:
+            meta_values = [
+                str(doc.meta[key])
+                for key in self.meta_fields_to_embed
+                if doc.meta.get(key) is not None
+            ]
+            texts.append(
+                self.prefix
+                + self.embedding_separator.join(
+                    [*meta_values, doc.content or ""]
+                )
+                + self.suffix
+            )
+
+        return texts
+
+    @component.output_types(documents=List[Document])
+    def run(self, documents: List[Document]):
+        if not isinstance(documents, list) or (
+            documents and not isinstance(documents[0], Document)
+        ):
+            raise TypeError(
+                "ParallelDocumentEmbedder expects a list of Documents as input."
+            )
+
+        embeddings = self.pool.embed(self._prepare_texts_to_embed(documents))
+
+        return {
+            "documents": [
+                replace(doc, embedding=embedding.tolist())
+                for doc, embedding in zip(documents, embeddings)
+            ]
+        }
@@ -0,0 +1,281 @@
+"""
+Functions to measure retrieval quality and speed, e.g. to compare index settings.
+"""
+
+import itertools
+import time
+from typing import Callable, Iterable, List, Optional, Sequence
+
+import numpy as np
+from haystack import Document
+from haystack_integrations.components.embedders.fastembed import (
+    FastembedDocumentEmbedder,
+)
+
+from search_backend.hnsw import LocalHNSWIndex
+from search_backend.local_embedding_retriever import LocalEmbeddingIndex
+from search_backend.token_splitter import TokenSplitter
+from search_backend.word_splitter import WordSplitter
+
+
+def recall_at_k(retrieved_ids: Sequence, relevant_ids: Sequence, k: int):
+    """
+    Fraction of the relevant ids found in the first k retrieved ids.
+
+    >>> recall_at_k(["a", "b", "c"], ["a", "c", "d"], k=2)
+    0.5
+    """
+
+    relevant = set(relevant_ids[:k])
+    if not relevant:
+        return 1.0
+
+    return len(relevant.intersection(retrieved_ids[:k])) / len(relevant)
+
+
+def quantisation_report(
+    documents: Iterable[Document],
+    query_embeddings: List[List[float]],
+    k: int = 10,
+    modes: Sequence[Optional[str]] = (None, "int8", "binary"),
+    rescore_multiplier: int = 4,
+) -> List[dict]:
+    """
+    Compare the memory use, recall@k and latency of the LocalEmbeddingIndex
+    quantisation modes. Recall is measured against exact kNN over the float32
+    embeddings.
+
+    :param documents: Haystack Document objects with embeddings.
+    :param query_embeddings: Embeddings of a sample of queries.
+    :param k: Number of results to compare for each query.
+    :param modes: Quantisation modes to compare (None for no quantisation).
+    :param rescore_multiplier: Candidates rescored per result for quantised modes.
+
+    :return: One dictionary per mode, with the size of the scanned matrix, the
+        compression relative to float32, the mean recall@k and the mean query latency
+        in milliseconds.
+    """
+
+    documents = list(documents)
+    exact = LocalEmbeddingIndex.from_documents(documents)
+    expected = [
+        [doc.id for doc in exact.search(query, top_k=k)]
+        for query in query_embeddings
+    ]
+
+    report = []
+    for mode in modes:
+        index = LocalEmbeddingIndex(
+            exact.documents,
+            exact.embeddings,
+            exact.similarity,
+            quantisation=mode,
+            rescore_multiplier=rescore_multiplier,
+        )
+
+        recalls = []
+        start = time.perf_counter()
+        for query, relevant in zip(query_embeddings, expected):
+            retrieved = [doc.id for doc in index.search(query, top_k=k)]
+            recalls.append(recall_at_k(retrieved, relevant, k))
+        elapsed = time.perf_counter() - start
+
+        report.append(
+            {
+                "quantisation": mode or "float32",
+                "search_nbytes": index.search_nbytes,
+                "compression": exact.search_nbytes
+                / max(index.search_nbytes, 1),
+                f"recall@{k}": float(np.mean(recalls)) if recalls else 1.0,
+                "latency_ms": 1000 * elapsed / max(len(query_embeddings), 1),
+            }
+        )
+
+    return report
+
+
+def hnsw_report(
+    documents: Iterable[Document],
+    query_embeddings: List[List[float]],
+    k: int = 10,
+    m_values: Sequence[int] = (8, 16, 32),
+    ef_construction_values: Sequence[int] = (64, 128, 256),
+    ef_search_values: Sequence[int] = (16, 32, 64, 128, 256),
+    index_factory: Callable = LocalHNSWIndex.from_documents,
+) -> List[dict]:
+    """
+    Measure recall@k and latency of HNSW indexes over a grid of parameters. Recall is
+    measured against exact kNN over the same embeddings.
+
+    :param documents: Haystack Document objects with embeddings.
+    :param query_embeddings: Embeddings of a sample of queries. These shouldn't be
+        embeddings of the documents, which every index finds, making recall look
+        higher than it is.
+    :param k: Number of results to compare for each query.
+    :param m_values: Numbers of neighbours linked to each node to try.
+    :param ef_construction_values: Candidate list sizes for building the graph to try.
+    :param ef_search_values: Candidate list sizes for searching to try. Each graph
+        is built once and searched with each of these.
+    :param index_factory: Called with the documents, `m` and `ef_construction` to
+        build an index, whose `search(query_embedding, top_k, ef_search)` method
+        returns documents. Defaults to a LocalHNSWIndex.
+
+    :return: One dictionary per combination of parameters, with the parameters, the
+        time taken to build the index in seconds, the mean recall@k and the mean query
+        latency in milliseconds. For indexes that count them, the mean number of
+        embeddings each query visited is reported too.
+    """
+
+    documents = list(documents)
+    exact = LocalEmbeddingIndex.from_documents(documents)
+    expected = [
+        [doc.id for doc in exact.search(query, top_k=k)]
+        for query in query_embeddings
+    ]
+    n_queries = max(len(query_embeddings), 1)
+
+    report = []
+    for m, ef_construction in itertools.product(
+        m_values, ef_construction_values
+    ):
+        start = time.perf_counter()
+        index = index_factory(documents, m=m, ef_construction=ef_construction)
+        build_s = time.perf_counter() - start
+
+        for ef_search in ef_search_values:
+            visited = getattr(index, "visited", None)
+            recalls = []
+            start = time.perf_counter()
+            for query, relevant in zip(query_embeddings, expected):
+                retrieved = [
+                    doc.id
+                    for doc in index.search(
+                        query, top_k=k, ef_search=ef_search
+                    )
+                ]
+                recalls.append(recall_at_k(retrieved, relevant, k))
+            elapsed = time.perf_counter() - start
+
+            row = {
+                "m": m,
+                "ef_construction": ef_construction,
+                "ef_search": ef_search,
+                "build_s": build_s,
+                f"recall@{k}": float(np.mean(recalls)) if recalls else 1.0,
+                "latency_ms": 1000 * elapsed / n_queries,
+            }
+            if visited is not None:
+                row["visited"] = (index.visited - visited) / n_queries
+            report.append(row)
+
+    return report
+
+
+def recommend_hnsw_params(
+    report: List[dict],
+    target_recall: float = 0.95,
+    k: int = 10,
+    cost: str = "visited",
+) -> Optional[dict]:
+    """
+    Pick the cheapest settings from an hnsw_report that meet a target recall. Ties are
+    broken by the smaller graph (m), then the quicker build (ef_construction).
+
+    :param report: Output of hnsw_report.
+    :param target_recall: Minimum mean recall@k.
+    :param k: The k the report was made with.
+    :param cost: Column to minimise. The number of embeddings visited per query
+        tracks the work the OpenSearch engines would do, where the latencies of a
+        LocalHNSWIndex don't. Use "latency_ms" for indexes that don't count visits.
+
+    :return: The row of the report with the chosen settings, or None if no settings
+        meet the target.
+    """
+
+    meeting = [row for row in report if row[f"recall@{k}"] >= target_recall]
+    if not meeting:
+        return None
+
+    return min(
+        meeting,
+        key=lambda row: (
+            row[cost],
+            row["m"],
+            row["ef_construction"],
+            row["ef_search"],
+        ),
+    )
+
+
+def chunking_report(
+    documents: List[Document],
+    dense_embedding_model: str,
+    word_split_length: int = 64,
+    word_split_overlap: int = 8,
+    token_split_length: int = 256,
+    token_split_overlap: int = 32,
+    embed: bool = True,
+) -> List[dict]:
+    """
+    Compare splitting a corpus by words with splitting it by tokens of the embedding
+    model: the number of chunks, their length in tokens, how many are too long for the
+    model, and how long embedding them takes.
+
+    :param documents: Haystack Document objects to split.
+    :param dense_embedding_model: Name of the dense embedding model.
+    :param word_split_length: Chunk length in words for word splitting.
+    :param word_split_overlap: Overlap in words for word splitting.
+    :param token_split_length: Chunk length in tokens for token splitting, taken to be
+        the model's maximum sequence length when counting truncated chunks.
+    :param token_split_overlap: Overlap in tokens for token splitting.
+    :param embed: Whether to embed the chunks to time the embedder.
+
+    :return: One dictionary for each of word and token splitting. The token splitting
+        row also has the fraction fewer chunks than word splitting, and the embedding
+        time saved in seconds if the chunks were embedded.
+    """
+
+    token_splitter = TokenSplitter(
+        dense_embedding_model,
+        split_length=token_split_length,
+        split_overlap=token_split_overlap,
+    )
+    splitters = {
+        "word": WordSplitter(
+            split_length=word_split_length, split_overlap=word_split_overlap
+        ),
+        "token": token_splitter,
+    }
+
+    embedder = None
+    if embed:
+        embedder = FastembedDocumentEmbedder(model=dense_embedding_model)
+        embedder.warm_up()
+
+    report = []
+    for split_by, splitter in splitters.items():
+        chunks = splitter.run(documents)["documents"]
+        tokens = np.array(
+            token_splitter.count_tokens([chunk.content for chunk in chunks])
+        )
+
+        row = {
+            "split_by": split_by,
+            "chunks": len(chunks),
+            "mean_tokens": float(tokens.mean()) if len(tokens) else 0.0,
+            "truncated": int((tokens > token_split_length).sum()),
+        }
+
+        if embedder is not None:
+            start = time.perf_counter()
+            embedder.run(chunks)
+            row["embedding_s"] = time.perf_counter() - start
+
+        report.append(row)
+
+    word, token = report
+    token["chunk_reduction"] = 1 - token["chunks"] / max(word["chunks"], 1)
+    if embedder is not None:
+        token["embedding_s_saved"] = word["embedding_s"] - token["embedding_s"]
+
+    return report
@@ -0,0 +1,342 @@
+"""
+Search several indexes at once, such as one for each business area, and merge the results.
+"""
+
+import logging
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError
+from dataclasses import replace
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+from haystack import Document, Pipeline
+
+from search_backend.fusion_joiner import min_max, z_score
+from search_backend.query_cost_guard import CostDecision, QueryCostGuard
+from search_backend.search import Search, SearchUnavailableError
+
+logger = logging.getLogger(__name__)
+
+# Ways of normalising the scores of each index before the results are merged
+SCORE_NORMALISATIONS = {"min_max": min_max, "z_score": z_score}
+
+
+class FederatedSearch:
+    """
+    Run BM25, semantic or hybrid searches across several indexes, each with its own
+    pipeline set up with RetrievalPipeline() (all of the same type, and with the same
+    embedding model).
+
+    The query is checked and embedded once, then the retrieval (and reranking) runs for
+    every index in parallel in a thread pool, so a search takes about as long as the
+    slowest index rather than all of them. Indexes that don't answer within their
+    timeout, or fail, are left out of the results and logged. A retrieval can't be
+    stopped once it is running, so each index runs on at most its share of the threads,
+    and is skipped straight away while they are all busy (e.g. with calls to an index
+    that has stopped answering). If no index answers, SearchUnavailableError is raised
+    with the names of the indexes in `degraded`. Each index's scores are
+    normalised before the results are merged, as scores from different indexes aren't
+    comparable, and each result records the index it came from in `meta["index"]`.
+    """
+
+    def __init__(
+        self,
+        pipelines: Dict[str, Pipeline],
+        timeout: float = 2.0,
+        timeouts: Optional[Dict[str, float]] = None,
+        normalisation: Optional[str] = "min_max",
+        normalise_query: bool = True,
+        cost_guard: QueryCostGuard = None,
+        max_workers: Optional[int] = None,
+    ):
+        """
+        :param pipelines: The pipeline of each index, by a name for the index.
+        :param timeout: Time in seconds to wait for each index, from the start of the
+            retrieval.
+        :param timeouts: Timeouts of particular indexes, by name, in place of `timeout`.
+        :param normalisation: How to normalise each index's scores before merging,
+            "min_max" or "z_score", or None to merge the raw scores. With "min_max", the
+            scores of an index with a single result, or equal scores, are kept as they
+            are (clipped to between 0 and 1).
+        :param normalise_query: See Search.
+        :param cost_guard: See Search.
+        :param max_workers: Number of threads running the retrievals, shared equally
+            between the indexes. Defaults to four for each index, so several federated
+            searches can run at once.
+        """
+
+        if not pipelines:
+            raise ValueError("FederatedSearch needs at least one pipeline")
+        if (
+            normalisation is not None
+            and normalisation not in SCORE_NORMALISATIONS
+        ):
+            raise ValueError(
+                f"normalisation must be one of {sorted(SCORE_NORMALISATIONS)} or None, "
+                f"but got {normalisation}"
+            )
+
+        # The query is checked, and embedded with the first pipeline's embedder, by
+        # this search
+        self.search = Search(
+            next(iter(pipelines.values())),
+            normalise_query=normalise_query,
+            cost_guard=cost_guard,
+        )
+
+        self.searches = {
+            name: Search(pipeline, normalise_query=False)
+            for name, pipeline in pipelines.items()
+        }
+        self.timeout = timeout
+        self.timeouts = timeouts or {}
+        self.normalisation = normalisation
+        max_workers = max_workers or 4 * len(pipelines)
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="federated-search"
+        )
+        self._index_slots = {
+            name: threading.BoundedSemaphore(
+                max(max_workers // len(pipelines), 1)
+            )
+            for name in pipelines
+        }
+
+    def _decide(
+        self,
+        search_query: str,
+        mode: str,
+        top_k: int = 0,
+        bm25_top_k: int = None,
+    ) -> Optional[CostDecision]:
+        """
+        Prepare and check the query, as the searches of Search do.
+
+        :return: The cost guard's decision, or None if the query is rejected.
+        """
+
+        if self.search._fast_reject(search_query):
+            return None
+
+        search_query = self.search._prepare_query(search_query)
+        if self.search._basic_query_verification(search_query):
+            return None
+
+        decision = self.search._check_cost(
+            search_query, mode, top_k, bm25_top_k
+        )
+        if decision.rejected:
+            return None
+
+        return decision
+
+    def _fan_out(
+        self, run: Callable[[Search], List[Document]], top_k: Optional[int]
+    ) -> List[Document]:
+        """
+        Run `run(search)` for the Search of every index in parallel, and merge the
+        results of the indexes that answer in time.
+
+        :raises SearchUnavailableError: If no index answers.
+        """
+
+        start = time.monotonic()
+        futures = {}
+        for name, search in self.searches.items():
+            future = self._submit(name, run, search)
+            if future is None:
+                logger.warning(
+                    "Search skipped index %s, which has no free workers", name
+                )
+            else:
+                futures[name] = future
+
+        results = {}
+        errors = []
+        # Wait for the indexes in order of their deadlines, so the total wait is the
+        # longest timeout
+        for name in sorted(futures, key=self._timeout):
+            remaining = start + self._timeout(name) - time.monotonic()
+            try:
+                results[name] = futures[name].result(timeout=max(remaining, 0))
+            except TimeoutError:
+                futures[name].cancel()
+                logger.warning(
+                    "Search of index %s timed out after %ss",
+                    name,
+                    self._timeout(name),
+                )
+            except Exception as error:
+                logger.exception("Search of index %s failed", name)
+                errors.append(error)
+
+        if not results:
+            if errors and len(errors) == len(self.searches):
+                raise errors[0]
+            raise SearchUnavailableError(list(self.searches))
+
+        return self._merge(results, top_k)
+
+    def _submit(
+        self,
+        name: str,
+        run: Callable[[Search], List[Document]],
+        search: Search,
+    ) -> Optional[Future]:
+        """
+        Start the retrieval of an index in the thread pool, unless every thread the index
+        can use is busy.
+
+        :return: The retrieval's future, or None if it can't be started.
+        """
+
+        slots = self._index_slots[name]
+        if not slots.acquire(blocking=False):
+            return None
+
+        def run_index():
+            try:
+                return run(search)
+            finally:
+                slots.release()
+
+        return self._executor.submit(run_index)
+
+    def _timeout(self, name: str) -> float:
+        return self.timeouts.get(name, self.timeout)
+
+    def _merge(
+        self, results: Dict[str, List[Document]], top_k: Optional[int]
+    ) -> List[Document]:
+        """
+        Normalise the scores of each index's results, and merge them best first.
+        """
+
+        merged = []
+        for name, documents in results.items():
+            if not documents:
+                continue
+
+            scores = np.array(
+                [
+                    doc.score if doc.score is not None else 0.0
+                    for doc in documents
+                ]
+            )
+            if self.normalisation == "min_max" and np.ptp(scores) == 0:
+                # A single result (or equal scores) has no range to scale, and would
+                # score 1 whether it is a good match or not. Keep the raw scores, which
+                # are between 0 and 1 for the reranker and the scaled BM25 retriever.
+                scores = np.clip(scores, 0.0, 1.0)
+            elif self.normalisation is not None:
+                scores = SCORE_NORMALISATIONS[self.normalisation](scores)
+
+            merged.extend(
+                replace(
+                    doc, score=float(score), meta={**doc.meta, "index": name}
+                )
+                for doc, score in zip(documents, scores)
+            )
+
+        merged.sort(key=lambda doc: doc.score, reverse=True)
+
+        return merged[:top_k]
+
+    def hybrid_search(
+        self,
+        search_query: str,
+        filters: dict = None,
+        bm25_top_k: int = 10,
+        semantic_top_k: int = 10,
+        top_k: int = None,
+        threshold: float = 0.0,
+        join_mode: str = None,
+        weights: dict = None,
+    ) -> list:
+        """
+        Run a hybrid search of every index. The arguments are as for
+        `Search.hybrid_search`, and apply to each index; `top_k` also limits the merged
+        results.
+        """
+
+        decision = self._decide(
+            search_query, "hybrid", semantic_top_k, bm25_top_k
+        )
+        if decision is None:
+            return []
+        query = decision.query
+
+        if decision.mode == "bm25":
+            return self._fan_out(
+                lambda search: search._run_bm25_retriever(
+                    query, filters, decision.bm25_top_k
+                ),
+                top_k,
+            )
+
+        fusion = {"join_mode": join_mode, "weights": weights, "top_k": top_k}
+        fusion = {key: value for key, value in fusion.items() if value}
+        embedding = self.search._embed_query(query)
+
+        return self._fan_out(
+            lambda search: search._run_hybrid_retrieval(
+                query,
+                filters,
+                decision.bm25_top_k,
+                semantic_top_k,
+                threshold,
+                fusion,
+                embedding,
+            ),
+            top_k,
+        )
+
+    def semantic_search(
+        self,
+        search_query: str,
+        filters: dict = None,
+        top_k: int = 10,
+        threshold: float = 0.0,
+    ) -> list:
+        """
+        Run a semantic search of every index. The arguments are as for
+        `Search.semantic_search`, and apply to each index; `top_k` also limits the merged
+        results.
+        """
+
+        decision = self._decide(search_query, "semantic", top_k)
+        if decision is None:
+            return []
+        query = decision.query
+        embedding = self.search._embed_query(query)
+
+        if decision.rerank:
+            run = Search._run_reranked_retrieval
+        else:
+            run = Search._run_embedding_retriever
+
+        return self._fan_out(
+            lambda search: run(
+                search, query, filters, top_k, threshold, embedding
+            ),
+            top_k,
+        )
+
+    def bm25_search(
+        self, search_query: str, filters: dict = None, top_k: int = 10
+    ) -> list:
+        """
+        Run a BM25 search of every index. The arguments are as for `Search.bm25_search`.
+        """
+
+        decision = self._decide(search_query, "bm25", bm25_top_k=top_k)
+        if decision is None:
+            return []
+
+        return self._fan_out(
+            lambda search: search._run_bm25_retriever(
+                decision.query, filters, decision.bm25_top_k
+            ),
+            top_k,
+        )
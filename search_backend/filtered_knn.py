@@ -0,0 +1,324 @@
+"""
+Dense embedding retrieval from OpenSearch with metadata filters, choosing how to apply the
+filters from how many documents they match, so restrictive filters don't starve the kNN
+search of results.
+"""
+
+import json
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import replace
+from typing import Any, Dict, List, Optional
+
+from haystack import Document, component
+from haystack_integrations.document_stores.opensearch import (
+    OpenSearchDocumentStore,
+)
+from haystack_integrations.document_stores.opensearch.filters import (
+    normalize_filters,
+)
+
+from search_backend.hnsw import knn_clause
+
+logger = logging.getLogger(__name__)
+
+# Ways the filters can be applied, as reported by FilteredEmbeddingRetriever
+FILTER_STRATEGIES = ("unfiltered", "exact", "efficient", "post_filter")
+
+# Number of filters whose document counts are remembered
+COUNT_CACHE_SIZE = 1024
+
+
+@component
+class FilteredEmbeddingRetriever:
+    """
+    A Haystack component to retrieve documents from an OpenSearch index by kNN, like
+    OpenSearchEmbeddingRetriever, picking a strategy for each query from the number of
+    documents its filters match:
+
+     - "unfiltered": there are no filters, so the approximate kNN search is run as is.
+     - "exact": the filters match at most `exact_threshold` documents, so they are all
+       scored exactly with a script score query.
+     - "post_filter": the filters match at least `post_filter_selectivity` of the
+       documents, or the kNN engine can't filter during the search. The approximate
+       search asks for enough neighbours that about top_k are expected to pass the
+       filters, doubling k (up to `max_k`) until they do.
+     - "efficient": otherwise, the filters are applied while the HNSW graph is
+       traversed, which needs the "lucene" or "faiss" engine.
+
+    The strategy used is returned with the documents, and logged. Exact scores are
+    mapped onto the scale of the engine's approximate scores, so a score (or threshold)
+    means the same whichever strategy was used.
+    """
+
+    def __init__(
+        self,
+        document_store: OpenSearchDocumentStore,
+        top_k: int = 10,
+        efficient_filtering: bool = True,
+        exact_threshold: int = 10_000,
+        post_filter_selectivity: float = 0.9,
+        max_k: int = 10_000,
+        oversample: float = 1.2,
+        space_type: Optional[str] = None,
+        count_ttl: float = 60.0,
+        ef_search: Optional[int] = None,
+        engine: Optional[str] = None,
+    ):
+        """
+        :param document_store: The OpenSearch document store to search.
+        :param top_k: Default maximum number of documents to return.
+        :param efficient_filtering: Whether the index's kNN engine can filter during the
+            search ("lucene" or "faiss", not "nmslib").
+        :param exact_threshold: Largest number of matching documents to score exactly.
+        :param post_filter_selectivity: Fraction of the documents the filters must match
+            for them to be applied after the kNN search.
+        :param max_k: Largest number of neighbours asked for when post-filtering.
+        :param oversample: How many more neighbours than expected to be needed to ask
+            for when post-filtering.
+        :param space_type: The index's kNN space type, used for exact scoring. Defaults to
+            that of the document store's `method`, or "cosinesimil".
+        :param count_ttl: Time in seconds to remember how many documents the index and
+            each filter match.
+        :param ef_search: Size of the HNSW candidate list for approximate searches, in
+            place of the index default. Larger values give better recall but slower
+            searches. Needs OpenSearch 2.16 or later.
+        :param engine: The index's kNN engine, whose scale exact scores are mapped onto.
+            Defaults to that of the document store's `method`, or "nmslib", which
+            OpenSearch uses for indexes created without one.
+        """
+
+        self.document_store = document_store
+        self.top_k = top_k
+        self.efficient_filtering = efficient_filtering
+        self.exact_threshold = exact_threshold
+        self.post_filter_selectivity = post_filter_selectivity
+        self.max_k = max_k
+        self.oversample = oversample
+        method = getattr(document_store, "_method", None) or {}
+        self.space_type = space_type or method.get("space_type", "cosinesimil")
+        self.engine = engine or method.get("engine", "nmslib")
+        self.count_ttl = count_ttl
+        self.ef_search = ef_search
+
+        self._counts = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _count(self, filters: Optional[Dict[str, Any]]) -> int:
+        """
+        Number of documents matching filters (or in the index, if there are none),
+        remembered for count_ttl seconds.
+        """
+
+        key = json.dumps(filters, sort_keys=True, default=str)
+        with self._lock:
+            cached = self._counts.get(key)
+        if (
+            cached is not None
+            and time.monotonic() - cached[0] < self.count_ttl
+        ):
+            return cached[1]
+
+        body = None
+        if filters:
+            body = {"query": {"bool": {"filter": normalize_filters(filters)}}}
+        count = self.document_store.client.count(
+            index=self.document_store._index, body=body
+        )["count"]
+
+        with self._lock:
+            self._counts[key] = (time.monotonic(), count)
+            self._counts.move_to_end(key)
+            while len(self._counts) > COUNT_CACHE_SIZE:
+                self._counts.popitem(last=False)
+
+        return count
+
+    def _search(self, body: dict) -> List[Document]:
+        if not self.document_store._return_embedding:
+            body["_source"] = {"excludes": ["embedding"]}
+
+        return self.document_store._search_documents(**body)
+
+    def _knn(
+        self,
+        query_embedding: List[float],
+        k: int,
+        top_k: int,
+        ef_search: Optional[int],
+        filters: Optional[Dict[str, Any]] = None,
+        efficient: bool = False,
+    ) -> List[Document]:
+        """
+        Approximate kNN search for k neighbours, applying the filters during the search
+        if efficient, or else to the neighbours found.
+        """
+
+        body = {
+            "query": {
+                "bool": {
+                    "must": [
+                        knn_clause(
+                            query_embedding,
+                            k,
+                            normalize_filters(filters) if efficient else None,
+                            ef_search,
+                        )
+                    ]
+                }
+            },
+            "size": top_k,
+        }
+        if filters and not efficient:
+            body["query"]["bool"]["filter"] = normalize_filters(filters)
+
+        return self._search(body)
+
+    def _exact(
+        self,
+        query_embedding: List[float],
+        filters: Dict[str, Any],
+        top_k: int,
+    ) -> List[Document]:
+        """
+        Score every document matching the filters exactly.
+        """
+
+        documents = self._search(
+            {
+                "query": {
+                    "script_score": {
+                        "query": {
+                            "bool": {"filter": normalize_filters(filters)}
+                        },
+                        "script": {
+                            "source": "knn_score",
+                            "lang": "knn",
+                            "params": {
+                                "field": "embedding",
+                                "query_value": query_embedding,
+                                "space_type": self.space_type,
+                            },
+                        },
+                    }
+                },
+                "size": top_k,
+            }
+        )
+
+        if self.space_type == "cosinesimil":
+            documents = [
+                replace(doc, score=self._cosine_score(doc.score - 1))
+                for doc in documents
+            ]
+
+        return documents
+
+    def _cosine_score(self, cosine: float) -> float:
+        """
+        Score the engine gives an approximate result with a cosine similarity to the
+        query (the script of an exact search scores 1 + cosine similarity). The other
+        space types are scored the same way by the script and the engines.
+        """
+
+        if self.engine == "lucene":
+            return (1 + cosine) / 2
+        return 1 / (2 - cosine)
+
+    def _post_filter(
+        self,
+        query_embedding: List[float],
+        filters: Dict[str, Any],
+        top_k: int,
+        selectivity: float,
+        total: int,
+        ef_search: Optional[int],
+    ) -> List[Document]:
+        """
+        Filter the approximate kNN results, asking for more neighbours until there are
+        top_k results after filtering.
+        """
+
+        k = min(
+            max(math.ceil(top_k * self.oversample / selectivity), top_k),
+            self.max_k,
+        )
+        while True:
+            documents = self._knn(
+                query_embedding, k, top_k, ef_search, filters
+            )
+            if len(documents) >= top_k or k >= min(self.max_k, total):
+                return documents
+            k = min(2 * k, self.max_k)
+
+    @component.output_types(documents=List[Document], strategy=str)
+    def run(
+        self,
+        query_embedding: List[float],
+        filters: Optional[Dict[str, Any]] = None,
+        top_k: Optional[int] = None,
+        ef_search: Optional[int] = None,
+    ):
+        """
+        Retrieve the documents nearest to the query embedding that match the filters.
+
+        :param query_embedding: Embedding of the query.
+        :param filters: Haystack metadata filters.
+        :param top_k: Maximum number of documents to return.
+        :param ef_search: Size of the HNSW candidate list for this query, in place of
+            the retriever's default.
+        :return: The documents, nearest first, and the strategy used to filter them.
+        """
+
+        top_k = top_k or self.top_k
+        ef_search = ef_search or self.ef_search
+
+        if not filters:
+            strategy = "unfiltered"
+            documents = self._knn(query_embedding, top_k, top_k, ef_search)
+        else:
+            total = self._count(None)
+            matching = self._count(filters)
+            selectivity = matching / total if total else 0.0
+
+            if matching == 0:
+                strategy = "exact"
+                documents = []
+            elif matching <= self.exact_threshold:
+                strategy = "exact"
+                documents = self._exact(query_embedding, filters, top_k)
+            elif (
+                selectivity >= self.post_filter_selectivity
+                or not self.efficient_filtering
+            ):
+                strategy = "post_filter"
+                documents = self._post_filter(
+                    query_embedding,
+                    filters,
+                    top_k,
+                    selectivity,
+                    total,
+                    ef_search,
+                )
+            else:
+                strategy = "efficient"
+                documents = self._knn(
+                    query_embedding,
+                    top_k,
+                    top_k,
+                    ef_search,
+                    filters,
+                    efficient=True,
+                )
+
+            logger.info(
+                "Filtered kNN: %s strategy for %d of %d documents",
+                strategy,
+                matching,
+                total,
+            )
+
+        return {"documents": documents, "strategy": strategy}
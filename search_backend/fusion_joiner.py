@@ -0,0 +1,233 @@
+"""
+Fuse the BM25 and semantic results of a hybrid search, working on arrays of ids and scores
+rather than one Document at a time.
+"""
+
+from dataclasses import replace
+from typing import Dict, List, Optional
+
+import numpy as np
+from haystack import Document, component
+
+# Ways of fusing the results
+JOIN_MODES = {
+    "reciprocal_rank_fusion",
+    "convex_combination",
+    "distribution_based_rank_fusion",
+}
+
+# Ways of normalising the scores of each branch for a convex combination
+NORMALISATIONS = {"min_max", "z_score"}
+
+# Names of the branches, as used for the weights
+BRANCHES = ("bm25", "semantic")
+
+
+def min_max(scores: np.ndarray) -> np.ndarray:
+    """
+    Scale scores to the range 0 to 1. If all the scores are the same they are set to 1.
+
+    >>> min_max(np.array([2.0, 4.0, 3.0]))
+    array([0. , 1. , 0.5])
+    """
+
+    low = scores.min()
+    spread = scores.max() - low
+    if spread == 0:
+        return np.ones_like(scores)
+
+    return (scores - low) / spread
+
+
+def z_score(scores: np.ndarray) -> np.ndarray:
+    """
+    Scale scores to have a mean of 0 and a standard deviation of 1. If all the scores
+    are the same they are set to 0.
+    """
+
+    std = scores.std()
+    if std == 0:
+        return np.zeros_like(scores)
+
+    return (scores - scores.mean()) / std
+
+
+def distribution_scale(scores: np.ndarray) -> np.ndarray:
+    """
+    Scale scores so that the mean minus and plus three standard deviations map to 0 and
+    1, as in distribution-based score fusion. If all the scores are the same they are
+    set to 0.
+    """
+
+    std = scores.std()
+    if std == 0:
+        return np.zeros_like(scores)
+
+    return (scores - (scores.mean() - 3 * std)) / (6 * std)
+
+
+@component
+class FusionJoiner:
+    """
+    A Haystack component to fuse the results of the BM25 and semantic branches of a
+    hybrid search. The documents are collected into an array of ids, and each branch's
+    contribution is worked out for the whole array at once. Supports:
+
+     - "reciprocal_rank_fusion": each branch scores a document weight * k / (k + rank),
+       with the rank counting from 0. With equal weights and k = 61 this gives the same
+       scores as Haystack's DocumentJoiner.
+     - "convex_combination": the weighted sum of each branch's scores, after normalising
+       them with "min_max" or "z_score".
+     - "distribution_based_rank_fusion": the weighted sum of each branch's scores, after
+       scaling them so the mean -/+ three standard deviations map to 0 and 1.
+
+    Documents missing from a branch get nothing from it. Where a document is in both
+    branches, the semantic copy is returned.
+    """
+
+    def __init__(
+        self,
+        join_mode: str = "reciprocal_rank_fusion",
+        rrf_k: int = 61,
+        normalisation: str = "min_max",
+        weights: Optional[Dict[str, float]] = None,
+        top_k: Optional[int] = None,
+    ):
+        """
+        :param join_mode: How to fuse the results (see above).
+        :param rrf_k: Constant of the reciprocal rank fusion. Larger values give more
+            weight to documents further down each branch's results.
+        :param normalisation: How to normalise the scores for a convex combination,
+            "min_max" or "z_score".
+        :param weights: Default weights of the branches, like
+            {"bm25": 0.3, "semantic": 0.7}. The branches are weighted equally by default.
+        :param top_k: Default maximum number of documents to return.
+        """
+
+        self.join_mode = _check_option("join_mode", join_mode, JOIN_MODES)
+        self.normalisation = _check_option(
+            "normalisation", normalisation, NORMALISATIONS
+        )
+        self.rrf_k = rrf_k
+        self.weights = _check_weights(weights)
+        self.top_k = top_k
+
+    @component.output_types(documents=List[Document])
+    def run(
+        self,
+        bm25_documents: Optional[List[Document]] = None,
+        semantic_documents: Optional[List[Document]] = None,
+        join_mode: Optional[str] = None,
+        weights: Optional[Dict[str, float]] = None,
+        top_k: Optional[int] = None,
+    ):
+        """
+        Fuse the results of the two branches.
+
+        :param bm25_documents: Results of the BM25 branch, best first.
+        :param semantic_documents: Results of the semantic branch, best first.
+        :param join_mode: Overrides the join mode for this call.
+        :param weights: Overrides the weights of the branches for this call.
+        :param top_k: Overrides the maximum number of documents to return.
+        :return: The fused documents, best first, with their fused scores.
+        """
+
+        join_mode = _check_option(
+            "join_mode", join_mode or self.join_mode, JOIN_MODES
+        )
+        weights = _check_weights(weights) if weights else self.weights
+        top_k = top_k or self.top_k
+
+        branches = [bm25_documents or [], semantic_documents or []]
+        documents = [doc for branch in branches for doc in branch]
+        if not documents:
+            return {"documents": []}
+
+        # Index of each document's id among the unique ids
+        ids, positions = np.unique(
+            [doc.id for doc in documents], return_inverse=True
+        )
+
+        fused = np.zeros(len(ids))
+        # Last copy of each document, so semantic copies replace BM25 ones
+        copies = np.empty(len(ids), dtype=np.int64)
+        start = 0
+        for name, branch in zip(BRANCHES, branches):
+            branch_positions = positions[start : start + len(branch)]
+            copies[branch_positions] = np.arange(start, start + len(branch))
+            start += len(branch)
+            if not branch:
+                continue
+
+            # A document listed twice in a branch counts once, at its best
+            branch_scores = np.full(len(ids), -np.inf)
+            np.maximum.at(
+                branch_scores,
+                branch_positions,
+                self._branch_scores(join_mode, branch),
+            )
+            seen = np.isfinite(branch_scores)
+            fused[seen] += weights[name] * branch_scores[seen]
+
+        order = np.argsort(-fused, kind="stable")[:top_k]
+
+        return {
+            "documents": [
+                replace(documents[copies[ii]], score=float(fused[ii]))
+                for ii in order
+            ]
+        }
+
+    def _branch_scores(
+        self, join_mode: str, branch: List[Document]
+    ) -> np.ndarray:
+        """
+        Contribution of each document in a branch to its fused score, before weighting.
+        """
+
+        if join_mode == "reciprocal_rank_fusion":
+            # Scaled so the top document scores 1, and as the weights sum to 1 so
+            # does a document at the top of both branches
+            return self.rrf_k / (self.rrf_k + np.arange(len(branch)))
+
+        scores = np.array(
+            [doc.score if doc.score is not None else 0.0 for doc in branch],
+            dtype=np.float64,
+        )
+        if join_mode == "distribution_based_rank_fusion":
+            return distribution_scale(scores)
+        if self.normalisation == "z_score":
+            return z_score(scores)
+        return min_max(scores)
+
+
+def _check_option(name: str, value: str, options: set) -> str:
+    if value not in options:
+        raise ValueError(
+            f"{name} must be one of {sorted(options)}, but got {value}"
+        )
+
+    return value
+
+
+def _check_weights(weights: Optional[Dict[str, float]]) -> Dict[str, float]:
+    """
+    Weights of each branch, normalised to sum to 1.
+    """
+
+    if weights is None:
+        return {name: 1 / len(BRANCHES) for name in BRANCHES}
+
+    unknown = set(weights) - set(BRANCHES)
+    if unknown:
+        raise ValueError(
+            f"weights can only be given for {list(BRANCHES)}, but got {sorted(unknown)}"
+        )
+    weights = {name: float(weights.get(name, 0.0)) for name in BRANCHES}
+    total = sum(weights.values())
+    if total <= 0 or any(weight < 0 for weight in weights.values()):
+        raise ValueError(
+            f"weights must be at least 0 and not all 0, but got {weights}"
+        )
+
+    return {name: weight / total for name, weight in weights.items()}
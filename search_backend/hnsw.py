@@ -0,0 +1,269 @@
+"""
+HNSW index parameters: building the OpenSearch kNN method and settings for an index,
+the kNN query clause with a per-query ef_search, and an in-process HNSW graph used to
+measure how the parameters trade recall against latency.
+"""
+
+import heapq
+import math
+from dataclasses import replace
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from haystack import Document
+
+from search_backend.local_embedding_retriever import (
+    LocalEmbeddingIndex,
+    _normalise,
+)
+
+HNSW_ENGINES = ["lucene", "faiss", "nmslib"]
+
+
+def hnsw_index_options(
+    engine: str = "lucene",
+    space_type: str = "cosinesimil",
+    m: Optional[int] = None,
+    ef_construction: Optional[int] = None,
+    ef_search: Optional[int] = None,
+) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """
+    The `method` and `settings` arguments of OpenSearchDocumentStore for an HNSW index.
+    Parameters left as None take the engine's defaults.
+
+    >>> method, settings = hnsw_index_options("nmslib", m=32, ef_search=200)
+    >>> method["parameters"], settings
+    ({'m': 32}, {'index.knn': True, 'index.knn.algo_param.ef_search': 200})
+
+    :param engine: "lucene", "faiss" or "nmslib".
+    :param space_type: The kNN space type, e.g. "cosinesimil" or "innerproduct".
+    :param m: Number of neighbours linked to each node of the graph.
+    :param ef_construction: Size of the candidate list when building the graph.
+    :param ef_search: Default size of the candidate list when searching. The lucene
+        engine has no index default, and uses k unless ef_search is set per query.
+    """
+
+    if engine not in HNSW_ENGINES:
+        raise ValueError(
+            f"engine must be one of {HNSW_ENGINES}, but got {engine}"
+        )
+
+    parameters = {"m": m, "ef_construction": ef_construction}
+    settings = {"index.knn": True}
+    if engine == "faiss":
+        parameters["ef_search"] = ef_search
+    elif engine == "nmslib" and ef_search is not None:
+        settings["index.knn.algo_param.ef_search"] = ef_search
+
+    method = {
+        "name": "hnsw",
+        "engine": engine,
+        "space_type": space_type,
+        "parameters": {
+            key: value
+            for key, value in parameters.items()
+            if value is not None
+        },
+    }
+
+    return method, settings
+
+
+def knn_clause(
+    query_embedding: List[float],
+    k: int,
+    filters: Optional[Dict[str, Any]] = None,
+    ef_search: Optional[int] = None,
+) -> Dict[str, Any]:
+    """
+    The knn clause of an OpenSearch query on the "embedding" field.
+
+    :param query_embedding: Embedding of the query.
+    :param k: Number of neighbours to find.
+    :param filters: Filters in OpenSearch query syntax to apply during the search.
+    :param ef_search: Size of the candidate list for this query, in place of the index
+        default (needs OpenSearch 2.16 or later).
+    """
+
+    knn = {"vector": query_embedding, "k": k}
+    if filters is not None:
+        knn["filter"] = filters
+    if ef_search is not None:
+        knn["method_parameters"] = {"ef_search": ef_search}
+
+    return {"knn": {"embedding": knn}}
+
+
+class LocalHNSWIndex:
+    """
+    An HNSW graph over embeddings held in memory, as a stand-in for the OpenSearch kNN
+    engines when tuning the index parameters. It follows the algorithm of Malkov and
+    Yashunin, choosing neighbours by distance alone, so recall is comparable with the
+    engines' but speeds are not: compare settings by the number of embeddings each
+    query visits, or by latency relative to other settings.
+
+    Only cosine similarity is supported.
+    """
+
+    def __init__(
+        self,
+        documents: List[Document],
+        embeddings: np.ndarray,
+        m: int = 16,
+        ef_construction: int = 100,
+        seed: int = 0,
+    ):
+        """
+        :param documents: Documents in the same order as the rows of `embeddings`.
+        :param embeddings: A 2D array of embeddings normalised to unit length, one row
+            per document.
+        :param m: Number of neighbours linked to each node above the bottom layer (the
+            bottom layer links twice as many).
+        :param ef_construction: Size of the candidate list when inserting a node.
+        :param seed: Seed for drawing the layer of each node.
+        """
+
+        self.documents = documents
+        self.embeddings = embeddings
+        self.m = m
+        self.ef_construction = ef_construction
+        self.visited = 0
+
+        self._layers: List[Dict[int, List[int]]] = []
+        self._entry_point = None
+        rng = np.random.default_rng(seed)
+        level_mult = 1 / math.log(max(m, 2))
+        for node in range(len(documents)):
+            level = int(-math.log(1 - rng.random()) * level_mult)
+            self._insert(node, level)
+
+    @classmethod
+    def from_documents(
+        cls, documents: Iterable[Document], **kwargs
+    ) -> "LocalHNSWIndex":
+        """
+        Build the graph from embedded documents, skipping documents without an
+        embedding.
+
+        :param documents: Haystack Document objects with embeddings.
+        :param kwargs: Graph parameters passed on to the constructor.
+        """
+
+        exact = LocalEmbeddingIndex.from_documents(documents)
+
+        return cls(exact.documents, exact.embeddings, **kwargs)
+
+    def __len__(self):
+        return len(self.documents)
+
+    def _similarities(self, query: np.ndarray, nodes: List[int]) -> np.ndarray:
+        self.visited += len(nodes)
+
+        return self.embeddings[nodes] @ query
+
+    def _search_layer(
+        self,
+        query: np.ndarray,
+        entry_points: List[Tuple[float, int]],
+        ef: int,
+        layer: int,
+    ) -> List[Tuple[float, int]]:
+        """
+        Greedy beam search of one layer, returning up to ef (similarity, node) pairs,
+        most similar first.
+        """
+
+        graph = self._layers[layer]
+        seen = {node for _, node in entry_points}
+        candidates = [(-sim, node) for sim, node in entry_points]
+        heapq.heapify(candidates)
+        best = list(entry_points)
+        heapq.heapify(best)
+
+        while candidates:
+            neg_sim, node = heapq.heappop(candidates)
+            if -neg_sim < best[0][0] and len(best) >= ef:
+                break
+
+            neighbours = [nb for nb in graph[node] if nb not in seen]
+            if not neighbours:
+                continue
+            seen.update(neighbours)
+            for sim, nb in zip(
+                self._similarities(query, neighbours).tolist(), neighbours
+            ):
+                if len(best) < ef or sim > best[0][0]:
+                    heapq.heappush(candidates, (-sim, nb))
+                    heapq.heappush(best, (sim, nb))
+                    if len(best) > ef:
+                        heapq.heappop(best)
+
+        return sorted(best, reverse=True)
+
+    def _link(self, node: int, neighbours: List[int], layer: int):
+        graph = self._layers[layer]
+        max_links = 2 * self.m if layer == 0 else self.m
+        graph[node] = neighbours
+        for nb in neighbours:
+            links = graph[nb]
+            links.append(node)
+            if len(links) > max_links:
+                sims = self.embeddings[links] @ self.embeddings[nb]
+                graph[nb] = [links[ii] for ii in np.argsort(-sims)[:max_links]]
+
+    def _insert(self, node: int, level: int):
+        query = self.embeddings[node]
+        while len(self._layers) <= level:
+            self._layers.append({})
+
+        if self._entry_point is None:
+            for layer in range(level + 1):
+                self._layers[layer][node] = []
+            self._entry_point = (node, level)
+            return
+
+        entry, top = self._entry_point
+        nearest = [(float(self._similarities(query, [entry])[0]), entry)]
+        for layer in range(top, level, -1):
+            nearest = self._search_layer(query, nearest, 1, layer)
+        for layer in range(min(top, level), -1, -1):
+            nearest = self._search_layer(
+                query, nearest, self.ef_construction, layer
+            )
+            self._link(node, [nb for _, nb in nearest[: self.m]], layer)
+        for layer in range(top + 1, level + 1):
+            self._layers[layer][node] = []
+
+        if level > top:
+            self._entry_point = (node, level)
+
+    def search(
+        self,
+        query_embedding: List[float],
+        top_k: int = 10,
+        ef_search: int = 100,
+    ) -> List[Document]:
+        """
+        Find the documents most similar to a query embedding.
+
+        :param query_embedding: Embedding of the query.
+        :param top_k: Maximum number of documents to return.
+        :param ef_search: Size of the candidate list, at least top_k.
+
+        :return: Documents sorted by descending similarity, with the score set.
+        """
+
+        if top_k <= 0 or self._entry_point is None:
+            return []
+
+        query = _normalise(np.asarray(query_embedding, dtype=np.float32))
+        entry, top = self._entry_point
+        nearest = [(float(self._similarities(query, [entry])[0]), entry)]
+        for layer in range(top, 0, -1):
+            nearest = self._search_layer(query, nearest, 1, layer)
+        nearest = self._search_layer(query, nearest, max(ef_search, top_k), 0)
+
+        return [
+            replace(self.documents[node], score=sim)
+            for sim, node in nearest[:top_k]
+        ]
@@ -1,7 +1,7 @@
-from typing import Iterable, Any
+import time
+from typing import Iterable, Any, Optional, Union
 
 from haystack import Pipeline, Document
-from haystack.components.preprocessors import DocumentSplitter
 from haystack.components.writers import DocumentWriter
 from haystack.document_stores.types import DuplicatePolicy
 from haystack_integrations.components.embedders.fastembed import (
@@ -10,6 +10,28 @@ from haystack_integrations.components.embedders.fastembed import (
 from haystack_integrations.document_stores.opensearch import (
     OpenSearchDocumentStore,
 )
+from haystack_integrations.document_stores.opensearch.filters import (
+    normalize_filters,
+)
+
+from search_backend.embedding_pool import ParallelDocumentEmbedder
+from search_backend.near_duplicate_filter import NearDuplicateFilter
+from search_backend.snapshot import (
+    SNAPSHOT_BATCH_SIZE,
+    iter_documents,
+    load_documents,
+    read_snapshot,
+    write_snapshot,
+)
+from search_backend.token_splitter import TokenSplitter
+from search_backend.word_splitter import WordSplitter
+
+# Number of document ids matched by each delete request, below OpenSearch's default limit
+# of 65536 terms in a query
+DELETE_BATCH_SIZE = 10000
+
+# Time in seconds between checks on the progress of a delete by query task
+DELETE_POLL_INTERVAL = 1.0
 
 
 class IndexingPipeline:
@@ -26,6 +48,14 @@ class IndexingPipeline:
         split_length: int = 64,
         split_overlap: int = 8,
         split_threshold: int = 0,
+        respect_sentence_boundary: bool = False,
+        split_by: str = "word",
+        dedup_threshold: Optional[float] = None,
+        merge_duplicates: bool = False,
+        cross_source_dedup: bool = False,
+        embedding_workers: Optional[int] = None,
+        threads_per_worker: int = 1,
+        query_cache=None,
     ):
         """
         :param document_store: DocumentStore object that has been set up elsewhere
@@ -33,21 +63,72 @@ class IndexingPipeline:
         :param semantic: set this to True to enable semantic/hybrid search. Otherwise uses a BM25 search. If True,
         the chunks of text are embedded and written to a vector store.
         :param indexing: pipeline to do the indexing, which will be configured in this constructor
+        :param split_length: maximum number of words (or tokens) in each chunk
+        :param split_overlap: number of words (or tokens) shared between neighbouring chunks
+        :param split_threshold: chunks at the end of a document with fewer words (or tokens) than this are added to
+        the previous chunk
+        :param respect_sentence_boundary: end chunks at the last sentence end within split_length words
+        :param split_by: "word" to count split_length etc. in words, or "token" to count them in tokens of the
+        dense embedding model's tokenizer. With "token", set split_length to the model's maximum sequence length
+        (e.g. 256) so chunks fill the model's context without being truncated.
+        :param dedup_threshold: if set, chunks whose word shingles have a Jaccard similarity of at least this with an
+        earlier chunk are dropped before embedding (see NearDuplicateFilter)
+        :param merge_duplicates: record the ids and source documents of dropped duplicates on the chunk that is kept
+        :param cross_source_dedup: also drop chunks that duplicate a chunk of another source document. Deleting that
+        document with `delete_docs` then removes the text from the documents in the kept chunk's
+        `duplicate_source_ids`, so they need indexing again. By default only chunks of the same document are compared.
+        :param embedding_workers: if set, embed chunks in this many worker processes, each loading the model once
+        (see ParallelDocumentEmbedder). Otherwise chunks are embedded in the calling process.
+        :param threads_per_worker: number of threads each embedding worker uses for inference
+        :param query_cache: a SemanticQueryCache of search results to invalidate whenever documents are indexed or
+        deleted
         """
 
         if indexing is None:
             indexing = Pipeline()
 
         self.document_store = document_store
+        self.dense_embedding_model = dense_embedding_model
+        self.query_cache = query_cache
 
-        document_splitter = DocumentSplitter(
-            split_by="word",
-            split_length=split_length,
-            split_overlap=split_overlap,
-            split_threshold=split_threshold,
-        )
+        if split_by == "word":
+            document_splitter = WordSplitter(
+                split_length=split_length,
+                split_overlap=split_overlap,
+                split_threshold=split_threshold,
+                respect_sentence_boundary=respect_sentence_boundary,
+            )
+        elif split_by == "token":
+            if dense_embedding_model is None:
+                raise ValueError(
+                    'split_by="token" needs a dense_embedding_model, whose tokenizer '
+                    "counts the tokens"
+                )
+            document_splitter = TokenSplitter(
+                dense_embedding_model,
+                split_length=split_length,
+                split_overlap=split_overlap,
+                split_threshold=split_threshold,
+            )
+        else:
+            raise ValueError(
+                f'split_by must be "word" or "token", but got {split_by}'
+            )
 
         indexing.add_component("document_splitter", document_splitter)
+        chunks_output = "document_splitter"
+
+        if dedup_threshold is not None:
+            indexing.add_component(
+                "near_duplicate_filter",
+                NearDuplicateFilter(
+                    threshold=dedup_threshold,
+                    merge=merge_duplicates,
+                    cross_source=cross_source_dedup,
+                ),
+            )
+            indexing.connect("document_splitter", "near_duplicate_filter")
+            chunks_output = "near_duplicate_filter.documents"
 
         indexing.add_component(
             "document_writer",
@@ -58,15 +139,22 @@ class IndexingPipeline:
         )
 
         if semantic:
-            indexing.add_component(
-                "dense_doc_embedder",
-                FastembedDocumentEmbedder(model=dense_embedding_model),
-            )
+            if embedding_workers is None:
+                dense_doc_embedder = FastembedDocumentEmbedder(
+                    model=dense_embedding_model
+                )
+            else:
+                dense_doc_embedder = ParallelDocumentEmbedder(
+                    model=dense_embedding_model,
+                    workers=embedding_workers,
+                    threads_per_worker=threads_per_worker,
+                )
+            indexing.add_component("dense_doc_embedder", dense_doc_embedder)
 
-            indexing.connect("document_splitter", "dense_doc_embedder")
+            indexing.connect(chunks_output, "dense_doc_embedder")
             indexing.connect("dense_doc_embedder", "document_writer")
         else:
-            indexing.connect("document_splitter", "document_writer")
+            indexing.connect(chunks_output, "document_writer")
 
         self.indexing = indexing
 
@@ -76,26 +164,158 @@ class IndexingPipeline:
 
         :param docs: Haystack Document objects to be indexed.
         """
-        return self.indexing.run({"document_splitter": {"documents": docs}})
+        result = self.indexing.run({"document_splitter": {"documents": docs}})
+        self._invalidate_query_cache()
+
+        return result
 
-    def delete_docs(self, document_ids: list[Any], id_metafield: str):
+    def delete_docs(
+        self,
+        document_ids: list[Any],
+        id_metafield: str,
+        batch_size: int = DELETE_BATCH_SIZE,
+        slices: Union[int, str] = "auto",
+        requests_per_second: Optional[float] = None,
+    ) -> int:
         """
         Remove documents from the OpenSearch index.
 
+        Documents are deleted on the server with OpenSearch's delete by query API, so they aren't fetched into
+        Python first. Each delete runs as a background task on the server, which is polled until it finishes, so
+        a large or throttled delete isn't cut short by the client's request timeout. Other document stores fall
+        back to filtering the documents and deleting them by id.
+
         :param document_ids: List of document ids to delete. These are values of the id_metafield field of
         documents in the document store which are to be deleted.
         :param id_metafield: The name of the field in the docstore metadata containing identifiers to use
             to select docs for deletion.
+        :param batch_size: Number of document_ids matched by each delete by query request.
+        :param slices: Number of slices OpenSearch splits each delete into to run in parallel, or "auto".
+        :param requests_per_second: Throttle for the delete, in documents per second (unthrottled if None).
+        :return: The number of chunks deleted.
+        :raises RuntimeError: If a delete by query task fails.
+        """
+
+        deleted = 0
+        for start in range(0, len(document_ids), batch_size):
+            # Match up a list of values in a particular field to IDs recognised by the docstore
+            filters = {
+                "field": f"meta.{id_metafield}",
+                "operator": "in",
+                "value": document_ids[start : start + batch_size],
+            }
+
+            if isinstance(self.document_store, OpenSearchDocumentStore):
+                deleted += self._delete_by_query(
+                    filters, slices, requests_per_second
+                )
+            else:
+                results = self.document_store.filter_documents(filters=filters)
+                doc_ids = {result.id for result in results}
+
+                self.document_store.delete_documents(list(doc_ids))
+                deleted += len(doc_ids)
+
+        self._invalidate_query_cache()
+
+        return deleted
+
+    def export_snapshot(
+        self, path: str, batch_size: int = SNAPSHOT_BATCH_SIZE
+    ) -> int:
         """
+        Write every chunk in the document store, with its metadata and embedding, to a Parquet snapshot. Chunks
+        are streamed out of the store in batches, so the index doesn't have to fit in memory.
 
-        # Match up a list of values in a particular field to IDs recognised by the docstore
-        filters = {
-            "field": f"meta.{id_metafield}",
-            "operator": "in",
-            "value": document_ids,
+        :param path: Path of the Parquet file to write.
+        :param batch_size: Number of chunks read from the store, and written as a row group, at a time.
+        :return: The number of chunks exported.
+        """
+
+        return write_snapshot(
+            iter_documents(self.document_store, batch_size),
+            path,
+            embedding_model=self.dense_embedding_model,
+        )
+
+    def import_snapshot(
+        self,
+        path: str,
+        batch_size: int = SNAPSHOT_BATCH_SIZE,
+        policy: DuplicatePolicy = DuplicatePolicy.OVERWRITE,
+    ) -> int:
+        """
+        Load a snapshot written by `export_snapshot()` into the document store, without splitting or embedding
+        the chunks again. OpenSearch indexes are bulk loaded with refreshes turned off until the end.
+
+        :param path: Path of the Parquet snapshot.
+        :param batch_size: Number of chunks written to the store at a time.
+        :param policy: What to do with chunks that are already in the store.
+        :return: The number of chunks imported.
+        :raises ValueError: If the snapshot's embeddings are from a different model to dense_embedding_model, or
+            of a different size to the OpenSearch index's.
+        """
+
+        written = load_documents(
+            self.document_store,
+            read_snapshot(
+                path,
+                batch_size,
+                embedding_model=self.dense_embedding_model,
+                embedding_dim=getattr(
+                    self.document_store, "_embedding_dim", None
+                ),
+            ),
+            policy=policy,
+        )
+        self._invalidate_query_cache()
+
+        return written
+
+    def _invalidate_query_cache(self):
+        """
+        Drop cached search results, which may no longer match the index.
+        """
+
+        if self.query_cache is not None:
+            self.query_cache.invalidate()
+
+    def _delete_by_query(
+        self,
+        filters: dict,
+        slices: Union[int, str],
+        requests_per_second: Optional[float],
+    ) -> int:
+        """
+        Delete the documents matching Haystack filters on the OpenSearch server, in a
+        task that is polled every DELETE_POLL_INTERVAL seconds until it is complete.
+        """
+
+        params = {
+            "slices": slices,
+            "conflicts": "proceed",
+            "refresh": True,
+            "wait_for_completion": False,
         }
+        if requests_per_second is not None:
+            params["requests_per_second"] = requests_per_second
 
-        results = self.document_store.filter_documents(filters=filters)
-        doc_ids = {result.id for result in results}
+        client = self.document_store.client
+        task_id = client.delete_by_query(
+            index=self.document_store._index,
+            body={"query": {"bool": {"filter": normalize_filters(filters)}}},
+            **params,
+        )["task"]
+
+        task = client.tasks.get(task_id=task_id)
+        while not task["completed"]:
+            time.sleep(DELETE_POLL_INTERVAL)
+            task = client.tasks.get(task_id=task_id)
+
+        if task.get("error") or task["response"].get("failures"):
+            raise RuntimeError(
+                f"Delete by query task {task_id} failed: "
+                f"{task.get('error') or task['response']['failures']}"
+            )
 
-        self.document_store.delete_documents(list(doc_ids))
+        return task["response"]["deleted"]
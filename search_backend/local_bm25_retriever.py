@@ -0,0 +1,463 @@
+"""
+In-process BM25 retrieval, as an alternative to running a match query against
+OpenSearch for every lexical search.
+"""
+
+import json
+import os
+import re
+from collections import Counter
+from dataclasses import replace
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional, Union
+
+import numpy as np
+from haystack import Document, component
+from haystack.document_stores.types import DocumentStore
+
+from search_backend.local_index import (
+    FilterMaskCache,
+    read_documents,
+    top_k_indices,
+    write_documents,
+)
+
+# Arrays making up the inverted index, each saved to its own .npy file so they can
+# be memory-mapped
+ARRAY_FILES = ["offsets", "postings", "impacts", "max_impacts", "doc_lengths"]
+VOCAB_FILE = "vocab.json"
+DOCUMENTS_FILE = "documents.jsonl"
+
+# Same scaling as the OpenSearch document store uses for BM25 scores
+BM25_SCALING_FACTOR = 8
+
+# Same limit as the OpenSearch match query on the number of terms a fuzzy term expands to
+MAX_EXPANSIONS = 50
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+
+def tokenise(text: str) -> List[str]:
+    """
+    Split text into lower case word tokens, roughly as the OpenSearch standard analyser
+    does.
+    """
+
+    return TOKEN_PATTERN.findall(text.casefold())
+
+
+def auto_fuzziness(term: str) -> int:
+    """
+    The maximum edit distance allowed for a term by `fuzziness="AUTO"` in OpenSearch.
+    """
+
+    if len(term) <= 2:
+        return 0
+    elif len(term) <= 5:
+        return 1
+    return 2
+
+
+class LocalBM25Index:
+    """
+    A compact inverted index for BM25 retrieval in memory.
+
+    Postings are stored in flat arrays: for the term with id `t`, the ids of documents
+    containing the term are `postings[offsets[t]:offsets[t + 1]]` (sorted), and
+    `impacts` holds the matching precomputed BM25 score contributions. Precomputing the
+    impacts means IDF and document length normalisation cost nothing at query time.
+
+    Queries are answered term-at-a-time with MaxScore pruning: once the terms still to
+    be processed can't lift an unseen document into the top k, only documents already
+    in contention are scored for the remaining terms.
+    """
+
+    def __init__(
+        self,
+        documents: List[Document],
+        vocab: List[str],
+        offsets: np.ndarray,
+        postings: np.ndarray,
+        impacts: np.ndarray,
+        max_impacts: np.ndarray,
+        doc_lengths: np.ndarray,
+    ):
+        """
+        Use `from_documents()`, `from_document_store()` or `load()` rather than calling
+        this directly.
+        """
+
+        self.documents = documents
+        self.vocab = vocab
+        self.term_ids = {term: ii for ii, term in enumerate(vocab)}
+        self.offsets = offsets
+        self.postings = postings
+        self.impacts = impacts
+        self.max_impacts = max_impacts
+        self.doc_lengths = doc_lengths
+        self.filter_masks = FilterMaskCache(documents)
+        self._terms_by_length = None
+        self._expand = lru_cache(maxsize=4096)(self._expand_term)
+
+    @classmethod
+    def from_documents(
+        cls, documents: Iterable[Document], k1: float = 1.2, b: float = 0.75
+    ) -> "LocalBM25Index":
+        """
+        Build the index from documents, e.g. chunks produced by IndexingPipeline.
+
+        :param documents: Haystack Document objects with text content.
+        :param k1: BM25 term frequency saturation parameter (OpenSearch default 1.2).
+        :param b: BM25 length normalisation parameter (OpenSearch default 0.75).
+        """
+
+        documents = [
+            replace(doc, embedding=None, score=None) for doc in documents
+        ]
+
+        term_postings = {}
+        doc_lengths = np.zeros(len(documents), dtype=np.float32)
+        for doc_id, doc in enumerate(documents):
+            tokens = tokenise(doc.content or "")
+            doc_lengths[doc_id] = len(tokens)
+            for term, tf in Counter(tokens).items():
+                term_postings.setdefault(term, []).append((doc_id, tf))
+
+        vocab = sorted(term_postings)
+        n_docs = len(documents)
+        avg_length = doc_lengths.mean() if n_docs else 0.0
+
+        offsets = np.zeros(len(vocab) + 1, dtype=np.int64)
+        for ii, term in enumerate(vocab):
+            offsets[ii + 1] = offsets[ii] + len(term_postings[term])
+
+        postings = np.empty(offsets[-1], dtype=np.int32)
+        tfs = np.empty(offsets[-1], dtype=np.float32)
+        idf = np.empty(offsets[-1], dtype=np.float32)
+        for ii, term in enumerate(vocab):
+            start, end = offsets[ii], offsets[ii + 1]
+            postings[start:end], tfs[start:end] = zip(*term_postings[term])
+            df = end - start
+            idf[start:end] = np.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+
+        # Term frequency component of BM25, with document length normalisation
+        norm = k1 * (1 - b + b * doc_lengths[postings] / max(avg_length, 1))
+        impacts = (idf * tfs * (k1 + 1) / (tfs + norm)).astype(np.float32)
+
+        max_impacts = np.zeros(len(vocab), dtype=np.float32)
+        if impacts.size:
+            max_impacts = np.maximum.reduceat(impacts, offsets[:-1])
+
+        return cls(
+            documents,
+            vocab,
+            offsets,
+            postings,
+            impacts,
+            max_impacts,
+            doc_lengths,
+        )
+
+    @classmethod
+    def from_document_store(
+        cls,
+        document_store: DocumentStore,
+        filters: Optional[Dict[str, Any]] = None,
+        **kwargs,
+    ) -> "LocalBM25Index":
+        """
+        Build the index from documents already written to a document store.
+
+        :param document_store: DocumentStore object that has been set up elsewhere.
+        :param filters: Optional filters to select a subset of documents from the store.
+        :param kwargs: BM25 parameters passed on to `from_documents()`.
+        """
+
+        return cls.from_documents(
+            document_store.filter_documents(filters=filters), **kwargs
+        )
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True) -> "LocalBM25Index":
+        """
+        Load an index previously written with `save()`.
+
+        :param path: Directory the index was saved to.
+        :param mmap: If True, the index arrays are memory-mapped read-only rather than
+            read into memory, so worker processes share one copy.
+        """
+
+        with open(os.path.join(path, VOCAB_FILE), "r") as f:
+            vocab = json.load(f)
+
+        arrays = {
+            name: np.load(
+                os.path.join(path, f"{name}.npy"),
+                mmap_mode="r" if mmap else None,
+            )
+            for name in ARRAY_FILES
+        }
+
+        return cls(
+            read_documents(os.path.join(path, DOCUMENTS_FILE)), vocab, **arrays
+        )
+
+    def save(self, path: str):
+        """
+        Write the index to a directory, so it can be reloaded with `load()`.
+
+        :param path: Directory to write the index to. Created if it doesn't exist.
+        """
+
+        os.makedirs(path, exist_ok=True)
+
+        for name in ARRAY_FILES:
+            np.save(os.path.join(path, f"{name}.npy"), getattr(self, name))
+
+        with open(os.path.join(path, VOCAB_FILE), "w") as f:
+            json.dump(self.vocab, f)
+
+        write_documents(os.path.join(path, DOCUMENTS_FILE), self.documents)
+
+    def __len__(self):
+        return len(self.documents)
+
+    def query_terms(
+        self, query: str, fuzziness: Union[str, int] = 0
+    ) -> Dict[int, float]:
+        """
+        Map a query to the ids of the index terms it matches, with a weight for each.
+
+        With fuzziness, each query term also matches index terms within the allowed edit
+        distance, weighted down by how far they are from the query term (as Lucene does
+        for fuzzy queries).
+
+        :param query: The search query.
+        :param fuzziness: "AUTO", or the maximum edit distance (0, 1 or 2).
+        """
+
+        weights = {}
+        for token in tokenise(query):
+            if fuzziness == "AUTO":
+                max_dist = auto_fuzziness(token)
+            else:
+                max_dist = int(fuzziness)
+
+            for term_id, weight in self._expand(token, max_dist):
+                weights[term_id] = weights.get(term_id, 0.0) + weight
+
+        return weights
+
+    def _expand_term(self, token: str, max_dist: int) -> tuple:
+        matches = []
+        if token in self.term_ids:
+            matches.append((self.term_ids[token], 1.0))
+
+        if max_dist > 0:
+            if self._terms_by_length is None:
+                self._terms_by_length = {}
+                for term in self.vocab:
+                    self._terms_by_length.setdefault(len(term), []).append(
+                        term
+                    )
+
+            fuzzy_matches = []
+            for length in range(
+                len(token) - max_dist, len(token) + max_dist + 1
+            ):
+                for term in self._terms_by_length.get(length, []):
+                    if term == token:
+                        continue
+                    dist = _edit_distance(token, term, max_dist)
+                    if dist <= max_dist:
+                        fuzzy_matches.append((dist, term))
+
+            for dist, term in sorted(fuzzy_matches)[:MAX_EXPANSIONS]:
+                weight = 1 - dist / min(len(token), len(term))
+                if weight > 0:
+                    matches.append((self.term_ids[term], weight))
+
+        return tuple(matches)
+
+    def search(
+        self,
+        query: str,
+        top_k: int = 10,
+        filters: Optional[Dict[str, Any]] = None,
+        fuzziness: Union[str, int] = "AUTO",
+        scale_score: bool = False,
+    ) -> List[Document]:
+        """
+        Find the documents with the highest BM25 scores for a query.
+
+        :param query: The search query.
+        :param top_k: Maximum number of documents to return.
+        :param filters: Metadata filters, in the same format as used by Search.
+        :param fuzziness: "AUTO", or the maximum edit distance (0, 1 or 2).
+        :param scale_score: If True, scale the BM25 scores to the range 0 to 1.
+
+        :return: Matching documents sorted by descending score, with the score set.
+        """
+
+        if top_k <= 0 or len(self.documents) == 0:
+            return []
+
+        mask = self.filter_masks.mask(filters)
+        terms = self.query_terms(query, fuzziness)
+
+        term_ids = np.fromiter(terms.keys(), dtype=np.int64, count=len(terms))
+        weights = np.fromiter(
+            terms.values(), dtype=np.float32, count=len(terms)
+        )
+
+        # Process the terms with the biggest possible contributions first
+        upper_bounds = weights * self.max_impacts[term_ids]
+        order = np.argsort(-upper_bounds, kind="stable")
+        remaining = np.cumsum(upper_bounds[order][::-1])[::-1]
+
+        scores = np.zeros(len(self.documents), dtype=np.float32)
+        candidates = None
+        for ii, idx in enumerate(order):
+            start = self.offsets[term_ids[idx]]
+            end = self.offsets[term_ids[idx] + 1]
+            postings = self.postings[start:end]
+            impacts = weights[idx] * self.impacts[start:end]
+
+            if candidates is None:
+                # Postings are unique within a term, so this doesn't need np.add.at
+                scores[postings] += impacts
+            else:
+                pos = np.searchsorted(postings, candidates)
+                pos[pos == postings.size] = 0
+                hits = postings[pos] == candidates
+                scores[candidates[hits]] += impacts[pos[hits]]
+
+            if candidates is None and ii + 1 < len(order):
+                candidates = self._prune(
+                    scores, mask, top_k, remaining[ii + 1]
+                )
+
+        if mask is not None:
+            scores[~mask] = 0
+
+        matches = np.flatnonzero(scores)
+        if matches.size == 0:
+            return []
+
+        matches, top_scores = top_k_indices(matches, scores[matches], top_k)
+        if scale_score:
+            top_scores = 1 / (1 + np.exp(-top_scores / BM25_SCALING_FACTOR))
+
+        return [
+            replace(self.documents[idx], score=float(score))
+            for idx, score in zip(matches, top_scores)
+        ]
+
+    def _prune(
+        self,
+        scores: np.ndarray,
+        mask: Optional[np.ndarray],
+        top_k: int,
+        remaining: float,
+    ) -> Optional[np.ndarray]:
+        """
+        Check whether the terms still to be processed could lift a document that hasn't
+        been seen yet into the top k. If not, return the (sorted) ids of the documents
+        that could still make it, otherwise None.
+        """
+
+        live = scores if mask is None else np.where(mask, scores, 0)
+        seen = np.flatnonzero(live)
+        if seen.size < top_k:
+            return None
+
+        threshold = np.partition(live[seen], seen.size - top_k)[
+            seen.size - top_k
+        ]
+        if remaining >= threshold:
+            return None
+
+        return seen[live[seen] + remaining >= threshold]
+
+
+@component
+class LocalBM25Retriever:
+    """
+    A Haystack component to retrieve documents from a LocalBM25Index. Accepts the same
+    inputs as OpenSearchBM25Retriever, so it can be used in its place in
+    RetrievalPipeline.
+    """
+
+    def __init__(
+        self,
+        index: LocalBM25Index,
+        top_k: int = 10,
+        fuzziness: Union[str, int] = "AUTO",
+        scale_score: bool = True,
+    ):
+        """
+        :param index: The LocalBM25Index to search.
+        :param top_k: Default number of documents to return.
+        :param fuzziness: "AUTO", or the maximum edit distance (0, 1 or 2).
+        :param scale_score: If True, scale the BM25 scores to the range 0 to 1.
+        """
+
+        self.index = index
+        self.top_k = top_k
+        self.fuzziness = fuzziness
+        self.scale_score = scale_score
+
+    @component.output_types(documents=List[Document])
+    def run(
+        self,
+        query: str,
+        filters: Optional[Dict[str, Any]] = None,
+        top_k: Optional[int] = None,
+        fuzziness: Optional[Union[str, int]] = None,
+        scale_score: Optional[bool] = None,
+    ):
+
+        return {
+            "documents": self.index.search(
+                query,
+                top_k=self.top_k if top_k is None else top_k,
+                filters=filters,
+                fuzziness=self.fuzziness if fuzziness is None else fuzziness,
+                scale_score=(
+                    self.scale_score if scale_score is None else scale_score
+                ),
+            )
+        }
+
+
+def _edit_distance(a: str, b: str, max_dist: int) -> int:
+    """
+    Damerau-Levenshtein (optimal string alignment) distance between two strings,
+    giving up early and returning max_dist + 1 once the distance must exceed max_dist.
+    """
+
+    if abs(len(a) - len(b)) > max_dist:
+        return max_dist + 1
+
+    two_back = None
+    previous = None
+    current = list(range(len(b) + 1))
+    for ii in range(1, len(a) + 1):
+        two_back, previous, current = previous, current, [ii] + [0] * len(b)
+        for jj in range(1, len(b) + 1):
+            current[jj] = min(
+                previous[jj] + 1,
+                current[jj - 1] + 1,
+                previous[jj - 1] + (a[ii - 1] != b[jj - 1]),
+            )
+            if (
+                ii > 1
+                and jj > 1
+                and a[ii - 1] == b[jj - 2]
+                and a[ii - 2] == b[jj - 1]
+            ):
+                current[jj] = min(current[jj], two_back[jj - 2] + 1)
+        if min(current) > max_dist:
+            return max_dist + 1
+
+    return current[-1]
@@ -0,0 +1,401 @@
+"""
+In-process dense embedding retrieval, as an alternative to running a kNN query
+against OpenSearch for every semantic search.
+"""
+
+import json
+import os
+from dataclasses import replace
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+from haystack import Document, component
+from haystack.document_stores.types import DocumentStore
+
+from search_backend.local_index import (
+    FilterMaskCache,
+    read_documents,
+    top_k_indices,
+    write_documents,
+)
+
+EMBEDDINGS_FILE = "embeddings.npy"
+CODES_FILE = "codes.npy"
+DOCUMENTS_FILE = "documents.jsonl"
+CONFIG_FILE = "config.json"
+
+SIMILARITY_FUNCTIONS = ["cosine", "dot_product"]
+QUANTISATION_MODES = ["int8", "binary"]
+
+# Number of rows scored at a time when scanning quantised codes, to bound the size of
+# the temporary float32 copy
+SCAN_BLOCK_SIZE = 65536
+
+# Number of set bits in each possible byte value, for Hamming distances between
+# binary codes
+POPCOUNT = np.array([bin(ii).count("1") for ii in range(256)], dtype=np.uint8)
+
+
+class LocalEmbeddingIndex:
+    """
+    Hold chunk embeddings in a single contiguous float32 matrix and answer kNN queries
+    with a vectorised dot product. Intended for small and medium corpora, where a brute
+    force scan in memory is quicker than a network round trip to the cluster.
+
+    The index can be saved to disk and loaded back as a memory-mapped array, so several
+    worker processes can share one copy of the embeddings.
+
+    Optionally, the embeddings can be quantised to int8 (4x smaller) or binary (32x
+    smaller) codes. The codes are scanned to pick `top_k * rescore_multiplier`
+    candidates, which are then rescored with the full precision embeddings. When a
+    quantised index is loaded, the full precision embeddings are always memory-mapped,
+    so only the rows needed for rescoring are read from disk.
+    """
+
+    def __init__(
+        self,
+        documents: List[Document],
+        embeddings: np.ndarray,
+        similarity: str = "cosine",
+        quantisation: Optional[str] = None,
+        rescore_multiplier: int = 4,
+        codes: Optional[np.ndarray] = None,
+    ):
+        """
+        :param documents: Documents in the same order as the rows of `embeddings`. The
+            embedding field of these documents is not used.
+        :param embeddings: A 2D array of embeddings, one row per document. When the
+            similarity is "cosine" the rows should already be normalised to unit length
+            (the from_* constructors take care of this).
+        :param similarity: Either "cosine" or "dot_product".
+        :param quantisation: None to search the float32 embeddings directly, or "int8"
+            or "binary" to search quantised codes and rescore the best candidates.
+        :param rescore_multiplier: With quantisation, how many candidates to rescore
+            per result requested.
+        :param codes: Quantised codes previously computed for these embeddings. If None
+            and quantisation is set, they are computed here.
+        """
+
+        if similarity not in SIMILARITY_FUNCTIONS:
+            raise ValueError(
+                f"similarity must be one of {SIMILARITY_FUNCTIONS}, but got {similarity}"
+            )
+        if quantisation is not None and quantisation not in QUANTISATION_MODES:
+            raise ValueError(
+                f"quantisation must be None or one of {QUANTISATION_MODES}, but got {quantisation}"
+            )
+        if embeddings.ndim != 2 or embeddings.shape[0] != len(documents):
+            raise ValueError(
+                f"Expected an embedding matrix with {len(documents)} rows, but got shape {embeddings.shape}"
+            )
+
+        self.documents = documents
+        self.embeddings = embeddings
+        self.similarity = similarity
+        self.quantisation = quantisation
+        self.rescore_multiplier = rescore_multiplier
+        if quantisation is not None and codes is None:
+            codes = quantise(embeddings, quantisation)
+        self.codes = codes
+        self.filter_masks = FilterMaskCache(documents)
+
+    @classmethod
+    def from_documents(
+        cls,
+        documents: Iterable[Document],
+        similarity: str = "cosine",
+        **kwargs,
+    ) -> "LocalEmbeddingIndex":
+        """
+        Build the index from embedded documents, e.g. the output of the
+        "dense_doc_embedder" component of IndexingPipeline. Documents without an
+        embedding are skipped.
+
+        :param documents: Haystack Document objects with embeddings.
+        :param similarity: Either "cosine" or "dot_product".
+        :param kwargs: Quantisation options passed on to the constructor.
+        """
+
+        documents = [doc for doc in documents if doc.embedding is not None]
+        embeddings = np.array(
+            [doc.embedding for doc in documents], dtype=np.float32
+        )
+        if not documents:
+            embeddings = embeddings.reshape(0, 0)
+        if similarity == "cosine":
+            embeddings = _normalise(embeddings)
+
+        documents = [
+            replace(doc, embedding=None, score=None) for doc in documents
+        ]
+
+        return cls(
+            documents, np.ascontiguousarray(embeddings), similarity, **kwargs
+        )
+
+    @classmethod
+    def from_document_store(
+        cls,
+        document_store: DocumentStore,
+        filters: Optional[Dict[str, Any]] = None,
+        similarity: str = "cosine",
+        **kwargs,
+    ) -> "LocalEmbeddingIndex":
+        """
+        Build the index from documents already written to a document store.
+
+        :param document_store: DocumentStore object that has been set up elsewhere.
+        :param filters: Optional filters to select a subset of documents from the store.
+        :param similarity: Either "cosine" or "dot_product".
+        :param kwargs: Quantisation options passed on to the constructor.
+        """
+
+        return cls.from_documents(
+            document_store.filter_documents(filters=filters),
+            similarity,
+            **kwargs,
+        )
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True) -> "LocalEmbeddingIndex":
+        """
+        Load an index previously written with `save()`.
+
+        :param path: Directory the index was saved to.
+        :param mmap: If True, the embedding matrix (or the quantised codes) are
+            memory-mapped read-only rather than read into memory.
+        """
+
+        with open(os.path.join(path, CONFIG_FILE), "r") as f:
+            config = json.load(f)
+
+        documents = read_documents(os.path.join(path, DOCUMENTS_FILE))
+
+        quantisation = config.get("quantisation")
+
+        embeddings = np.load(
+            os.path.join(path, EMBEDDINGS_FILE),
+            mmap_mode="r" if mmap or quantisation is not None else None,
+        )
+
+        codes = None
+        if quantisation is not None:
+            codes = np.load(
+                os.path.join(path, CODES_FILE),
+                mmap_mode="r" if mmap else None,
+            )
+
+        return cls(
+            documents,
+            embeddings,
+            config["similarity"],
+            quantisation=quantisation,
+            rescore_multiplier=config.get("rescore_multiplier", 4),
+            codes=codes,
+        )
+
+    def save(self, path: str):
+        """
+        Write the index to a directory, so it can be reloaded with `load()`.
+
+        :param path: Directory to write the index to. Created if it doesn't exist.
+        """
+
+        os.makedirs(path, exist_ok=True)
+
+        np.save(os.path.join(path, EMBEDDINGS_FILE), self.embeddings)
+        if self.codes is not None:
+            np.save(os.path.join(path, CODES_FILE), self.codes)
+
+        write_documents(os.path.join(path, DOCUMENTS_FILE), self.documents)
+
+        with open(os.path.join(path, CONFIG_FILE), "w") as f:
+            json.dump(
+                {
+                    "similarity": self.similarity,
+                    "quantisation": self.quantisation,
+                    "rescore_multiplier": self.rescore_multiplier,
+                },
+                f,
+            )
+
+    def __len__(self):
+        return len(self.documents)
+
+    @property
+    def search_nbytes(self) -> int:
+        """
+        Size in bytes of the matrix scanned for every query: the quantised codes if
+        quantisation is enabled, otherwise the float32 embeddings.
+        """
+
+        if self.codes is not None:
+            return self.codes.nbytes
+        return self.embeddings.nbytes
+
+    def _prepare_query(self, query_embedding: List[float]) -> np.ndarray:
+        query = np.asarray(query_embedding, dtype=np.float32)
+        if self.similarity == "cosine":
+            query = _normalise(query)
+
+        return query
+
+    def query_scores(self, query_embedding: List[float]) -> np.ndarray:
+        """
+        Score every document in the index against a query embedding. With quantisation
+        these are approximate scores from the codes, only suitable for ranking.
+        """
+
+        query = self._prepare_query(query_embedding)
+
+        if self.quantisation is None:
+            return self.embeddings @ query
+
+        scores = np.empty(len(self.documents), dtype=np.float32)
+        if self.quantisation == "binary":
+            query_code = np.packbits(query > 0)
+
+        for start in range(0, len(self.documents), SCAN_BLOCK_SIZE):
+            block = self.codes[start : start + SCAN_BLOCK_SIZE]
+            if self.quantisation == "int8":
+                scores[start : start + len(block)] = (
+                    block.astype(np.float32) @ query
+                )
+            else:
+                # Negative Hamming distance, so that higher is more similar
+                scores[start : start + len(block)] = -POPCOUNT[
+                    np.bitwise_xor(block, query_code)
+                ].sum(axis=1, dtype=np.int32)
+
+        return scores
+
+    def search(
+        self,
+        query_embedding: List[float],
+        top_k: int = 10,
+        filters: Optional[Dict[str, Any]] = None,
+        scale_score: bool = False,
+    ) -> List[Document]:
+        """
+        Find the documents most similar to a query embedding.
+
+        :param query_embedding: Embedding of the query.
+        :param top_k: Maximum number of documents to return.
+        :param filters: Metadata filters, in the same format as used by Search.
+        :param scale_score: If True, scale the similarity scores to the range 0 to 1.
+
+        :return: Documents sorted by descending similarity, with the score set.
+        """
+
+        if top_k <= 0 or len(self.documents) == 0:
+            return []
+
+        scores = self.query_scores(query_embedding)
+        candidates = np.arange(len(self.documents))
+
+        mask = self.filter_masks.mask(filters)
+        if mask is not None:
+            candidates = candidates[mask]
+            scores = scores[mask]
+            if candidates.size == 0:
+                return []
+
+        if self.quantisation is not None:
+            # Rescore the best candidates with the full precision embeddings, reading
+            # the rows in order as they may be memory-mapped
+            candidates, _ = top_k_indices(
+                candidates, scores, top_k * self.rescore_multiplier
+            )
+            candidates = np.sort(candidates)
+            scores = self.embeddings[candidates] @ self._prepare_query(
+                query_embedding
+            )
+
+        top_idx, top_scores = top_k_indices(candidates, scores, top_k)
+
+        if scale_score:
+            top_scores = self._scale(top_scores)
+
+        return [
+            replace(self.documents[idx], score=float(score))
+            for idx, score in zip(top_idx, top_scores)
+        ]
+
+    def _scale(self, scores: np.ndarray) -> np.ndarray:
+        if self.similarity == "cosine":
+            return (scores + 1) / 2
+        return 1 / (1 + np.exp(-scores / 100))
+
+
+@component
+class LocalEmbeddingRetriever:
+    """
+    A Haystack component to retrieve documents from a LocalEmbeddingIndex. Accepts the
+    same inputs as OpenSearchEmbeddingRetriever, so it can be used in its place in
+    RetrievalPipeline.
+    """
+
+    def __init__(
+        self,
+        index: LocalEmbeddingIndex,
+        top_k: int = 10,
+        scale_score: bool = False,
+    ):
+        """
+        :param index: The LocalEmbeddingIndex to search.
+        :param top_k: Default number of documents to return.
+        :param scale_score: If True, scale the similarity scores to the range 0 to 1.
+        """
+
+        self.index = index
+        self.top_k = top_k
+        self.scale_score = scale_score
+
+    @component.output_types(documents=List[Document])
+    def run(
+        self,
+        query_embedding: List[float],
+        filters: Optional[Dict[str, Any]] = None,
+        top_k: Optional[int] = None,
+    ):
+
+        if top_k is None:
+            top_k = self.top_k
+
+        return {
+            "documents": self.index.search(
+                query_embedding,
+                top_k=top_k,
+                filters=filters,
+                scale_score=self.scale_score,
+            )
+        }
+
+
+def _normalise(embeddings: np.ndarray) -> np.ndarray:
+    """
+    Scale vectors (or rows of a matrix) to unit length, leaving zero vectors alone.
+    """
+
+    norms = np.linalg.norm(embeddings, axis=-1, keepdims=True)
+    norms[norms == 0] = 1
+
+    return (embeddings / norms).astype(np.float32)
+
+
+def quantise(embeddings: np.ndarray, quantisation: str) -> np.ndarray:
+    """
+    Quantise a matrix of embeddings.
+
+    :param embeddings: A 2D float array, one row per document.
+    :param quantisation: "int8" to scale all values by the same factor into the range
+        -127 to 127, or "binary" to keep only the sign of each value (packed 8 per byte).
+    """
+
+    if quantisation == "binary":
+        return np.packbits(embeddings > 0, axis=-1)
+
+    max_abs = np.abs(embeddings).max() if embeddings.size else 0
+    scale = 127 / max_abs if max_abs > 0 else 1
+
+    return np.round(embeddings * scale).astype(np.int8)
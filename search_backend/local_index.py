@@ -0,0 +1,99 @@
+"""
+Helpers shared by the in-process indexes: metadata filtering and reading/writing the
+indexed documents.
+"""
+
+import json
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from haystack import Document
+from haystack.utils.filters import document_matches_filter
+
+
+class FilterMaskCache:
+    """
+    Evaluate Haystack metadata filters against a fixed list of documents, returning a
+    boolean array marking the documents that match. Masks are cached, as the same
+    filters tend to be used for many queries.
+    """
+
+    def __init__(self, documents: List[Document], max_size: int = 128):
+        """
+        :param documents: The documents filters are evaluated against, in index order.
+        :param max_size: Maximum number of masks to keep. The least recently used mask
+            is evicted first.
+        """
+
+        self.documents = documents
+        self.max_size = max_size
+        self._masks = OrderedDict()
+
+    def mask(self, filters: Optional[Dict[str, Any]]) -> Optional[np.ndarray]:
+        """
+        :param filters: Metadata filters, in the same format as used by Search.
+
+        :return: A boolean array with one entry per document, or None if there are no
+            filters (i.e. every document matches).
+        """
+
+        if not filters:
+            return None
+
+        key = json.dumps(filters, sort_keys=True, default=str)
+        if key in self._masks:
+            self._masks.move_to_end(key)
+            return self._masks[key]
+
+        mask = np.fromiter(
+            (document_matches_filter(filters, doc) for doc in self.documents),
+            dtype=bool,
+            count=len(self.documents),
+        )
+
+        self._masks[key] = mask
+        if len(self._masks) > self.max_size:
+            self._masks.popitem(last=False)
+
+        return mask
+
+
+def write_documents(path: str, documents: List[Document]):
+    """
+    Write documents to a JSON lines file, one document per line.
+    """
+
+    with open(path, "w") as f:
+        for doc in documents:
+            f.write(json.dumps(doc.to_dict(flatten=False)) + "\n")
+
+
+def read_documents(path: str) -> List[Document]:
+    """
+    Read documents written with `write_documents()`.
+    """
+
+    with open(path, "r") as f:
+        return [Document.from_dict(json.loads(line)) for line in f]
+
+
+def top_k_indices(ids: np.ndarray, scores: np.ndarray, top_k: int) -> tuple:
+    """
+    Select the top_k highest scores without sorting the whole array.
+
+    :param ids: Identifiers for each score, e.g. row numbers in the index.
+    :param scores: Scores to select from.
+    :param top_k: Number of entries to select.
+
+    :return: The ids and scores of the selected entries, sorted by descending score.
+    """
+
+    if top_k < scores.size:
+        part = np.argpartition(-scores, top_k - 1)[:top_k]
+    else:
+        part = np.arange(scores.size)
+
+    order = part[np.argsort(-scores[part], kind="stable")]
+
+    return ids[order], scores[order]
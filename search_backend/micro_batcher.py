@@ -0,0 +1,385 @@
+"""
+Batch the query embedding and reranking of concurrent searches, so that several queries
+share each forward pass of the models.
+"""
+
+import math
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import replace
+from queue import Empty, SimpleQueue
+from typing import Any, Callable, List, Optional
+
+from haystack import Document, component
+from haystack.components.rankers import TransformersSimilarityRanker
+from haystack_integrations.components.embedders.fastembed import (
+    FastembedTextEmbedder,
+)
+from search_backend.rerank_cache import rerank_key
+
+
+class MicroBatcher:
+    """
+    Collect items submitted by concurrent callers into batches, process each batch with
+    one call to `process_batch` in a background thread, and return each caller its own
+    result.
+
+    A batch is started by the first item to arrive, and runs once it has `max_batch`
+    items, `max_wait` seconds have passed, or every caller waiting on a result has an
+    item in it. So a caller on its own doesn't wait at all, and callers only queue for
+    up to max_wait when there are others to share a batch with.
+    """
+
+    def __init__(
+        self,
+        process_batch: Callable[[list], list],
+        max_batch: int = 32,
+        max_wait: float = 0.005,
+    ):
+        """
+        :param process_batch: Function taking a list of items and returning a list of
+            results in the same order.
+        :param max_batch: Maximum number of items in a batch.
+        :param max_wait: Maximum time in seconds to wait for a batch to fill.
+        """
+
+        if max_batch < 1:
+            raise ValueError(
+                f"max_batch must be at least 1, but got {max_batch}"
+            )
+
+        self.process_batch = process_batch
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+
+        self._queue = SimpleQueue()
+        self._lock = threading.Lock()
+        self._waiting = 0
+        self._thread = None
+
+    def submit(self, item, timeout: Optional[float] = None) -> Any:
+        """
+        Add an item to the next batch and wait for its result. Exceptions raised while
+        processing the batch are raised here.
+
+        :param timeout: Maximum time in seconds to wait for the result, after which
+            concurrent.futures.TimeoutError is raised (the item is still processed).
+        """
+
+        future = Future()
+        with self._lock:
+            self._waiting += 1
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._process_batches, daemon=True
+                )
+                self._thread.start()
+
+        self._queue.put((item, future))
+
+        return future.result(timeout=timeout)
+
+    def _collect_batch(self) -> list:
+        """
+        Wait for the first item of a batch, then add items until the batch is full.
+        """
+
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+
+        while len(batch) < self.max_batch:
+            with self._lock:
+                waiting = self._waiting
+            if len(batch) >= waiting:
+                break
+
+            timeout = deadline - time.monotonic()
+            try:
+                if timeout > 0:
+                    batch.append(self._queue.get(timeout=timeout))
+                else:
+                    # Out of time, but take anything already queued
+                    batch.append(self._queue.get_nowait())
+            except Empty:
+                break
+
+        return batch
+
+    def _process_batches(self):
+        while True:
+            batch = self._collect_batch()
+            items = [item for item, _ in batch]
+
+            try:
+                results = self.process_batch(items)
+            except Exception as error:
+                for _, future in batch:
+                    future.set_exception(error)
+            else:
+                for (_, future), result in zip(batch, results):
+                    future.set_result(result)
+
+            with self._lock:
+                self._waiting -= len(batch)
+
+
+@component
+class BatchedTextEmbedder:
+    """
+    A Haystack component to embed query texts with a fastembed model, like
+    FastembedTextEmbedder, but embedding the texts of concurrent calls together.
+    """
+
+    def __init__(
+        self,
+        model: str,
+        cache_dir: Optional[str] = None,
+        prefix: str = "",
+        suffix: str = "",
+        max_batch: int = 32,
+        max_wait: float = 0.005,
+    ):
+        """
+        :param model: Name of the fastembed embedding model.
+        :param cache_dir: Directory to cache the model in.
+        :param prefix: A string to add to the beginning of each text.
+        :param suffix: A string to add to the end of each text.
+        :param max_batch: Maximum number of texts embedded together.
+        :param max_wait: Maximum time in seconds a text waits for others to embed with.
+        """
+
+        self.embedder = FastembedTextEmbedder(
+            model=model,
+            cache_dir=cache_dir,
+            prefix=prefix,
+            suffix=suffix,
+            progress_bar=False,
+        )
+        self.batcher = MicroBatcher(self._embed, max_batch, max_wait)
+
+    def warm_up(self):
+        self.embedder.warm_up()
+
+    def _embed(self, texts: List[str]) -> List[List[float]]:
+        return self.embedder.embedding_backend.embed(
+            [
+                self.embedder.prefix + text + self.embedder.suffix
+                for text in texts
+            ],
+            progress_bar=False,
+            batch_size=len(texts),
+        )
+
+    @component.output_types(embedding=List[float])
+    def run(self, text: str):
+        if not isinstance(text, str):
+            raise TypeError("BatchedTextEmbedder expects a string as input.")
+
+        self.warm_up()
+
+        return {"embedding": self.batcher.submit(text)}
+
+
+@component
+class BatchedRanker:
+    """
+    A Haystack component to rerank documents with a cross-encoder, like
+    TransformersSimilarityRanker, but scoring the query-document pairs of concurrent
+    calls in one forward pass.
+
+    With a `score_cache`, only pairs that haven't been scored before are passed to the
+    model. Set max_batch=1 to use the cache without batching calls together.
+    """
+
+    def __init__(
+        self,
+        model: str,
+        top_k: int = 10,
+        max_batch: int = 8,
+        max_wait: float = 0.005,
+        score_cache=None,
+        timeout: Optional[float] = None,
+        **ranker_kwargs,
+    ):
+        """
+        :param model: Name of the cross-encoder model.
+        :param top_k: Default maximum number of documents to return.
+        :param max_batch: Maximum number of calls scored together.
+        :param max_wait: Maximum time in seconds a call waits for others to score with.
+        :param score_cache: Optional RerankScoreCache or SharedRerankScoreCache of the
+            raw scores of (query, chunk) pairs.
+        :param timeout: Optional maximum time in seconds a call waits for its documents
+            to be scored, after which concurrent.futures.TimeoutError is raised, so a
+            stuck model doesn't hold up the callers' threads.
+        :param ranker_kwargs: Other arguments of TransformersSimilarityRanker, such as
+            `meta_fields_to_embed` or `calibration_factor`.
+        """
+
+        self.ranker = TransformersSimilarityRanker(
+            model=model, top_k=top_k, **ranker_kwargs
+        )
+        self.score_cache = score_cache
+        self.timeout = timeout
+        self.batcher = MicroBatcher(self._rank, max_batch, max_wait)
+
+    def warm_up(self):
+        self.ranker.warm_up()
+
+    def _pair(self, query: str, doc: Document) -> List[str]:
+        meta_values = [
+            str(doc.meta[key])
+            for key in self.ranker.meta_fields_to_embed
+            if doc.meta.get(key) is not None
+        ]
+        text = self.ranker.embedding_separator.join(
+            [*meta_values, doc.content or ""]
+        )
+
+        return [
+            self.ranker.query_prefix + query,
+            self.ranker.document_prefix + text,
+        ]
+
+    def _score(self, pairs: List[List[str]]) -> List[float]:
+        """
+        Raw cross-encoder scores of query-document pairs, in one forward pass.
+        """
+
+        import torch
+
+        features = self.ranker.tokenizer(
+            pairs, padding=True, truncation=True, return_tensors="pt"
+        ).to(self.ranker.device.first_device.to_torch())
+        with torch.inference_mode():
+            logits = self.ranker.model(**features).logits.squeeze(dim=1)
+
+        return logits.cpu().tolist()
+
+    def _cached_scores(
+        self, requests: List[dict], pairs: List[List[str]]
+    ) -> List[float]:
+        """
+        Scores of the pairs, looking them up in the score cache and only running the
+        model on the pairs that aren't in it.
+        """
+
+        doc_ids = [
+            doc.id for request in requests for doc in request["documents"]
+        ]
+        keys = [
+            rerank_key(
+                str(self.ranker.model_name_or_path), query, doc_id, text
+            )
+            for (query, text), doc_id in zip(pairs, doc_ids)
+        ]
+        scores = self.score_cache.get_many(keys)
+
+        # Score each missing pair once, even if it's in more than one call
+        missing = {}
+        for ii, (key, score) in enumerate(zip(keys, scores)):
+            if score is None:
+                missing.setdefault(key, ii)
+        if missing:
+            new_scores = self._score([pairs[ii] for ii in missing.values()])
+            self.score_cache.put_many(list(missing), new_scores)
+            new_scores = dict(zip(missing, new_scores))
+            scores = [
+                new_scores[key] if score is None else score
+                for key, score in zip(keys, scores)
+            ]
+
+        return scores
+
+    def _rank(self, requests: List[dict]) -> List[List[Document]]:
+        """
+        Score the documents of several calls together, then rank each call's documents.
+        """
+
+        pairs = [
+            self._pair(request["query"], doc)
+            for request in requests
+            for doc in request["documents"]
+        ]
+        if self.score_cache is None:
+            scores = iter(self._score(pairs) if pairs else [])
+        else:
+            scores = iter(self._cached_scores(requests, pairs))
+
+        results = []
+        for request in requests:
+            ranked = []
+            for doc in request["documents"]:
+                score = next(scores)
+                if request["scale_score"]:
+                    score = _sigmoid(score * request["calibration_factor"])
+                ranked.append(replace(doc, score=score))
+
+            ranked.sort(key=lambda doc: doc.score, reverse=True)
+            if request["score_threshold"] is not None:
+                ranked = [
+                    doc
+                    for doc in ranked
+                    if doc.score >= request["score_threshold"]
+                ]
+            results.append(ranked[: request["top_k"]])
+
+        return results
+
+    @component.output_types(documents=List[Document])
+    def run(
+        self,
+        query: str,
+        documents: List[Document],
+        top_k: Optional[int] = None,
+        scale_score: Optional[bool] = None,
+        calibration_factor: Optional[float] = None,
+        score_threshold: Optional[float] = None,
+    ):
+        if not documents:
+            return {"documents": []}
+
+        request = {
+            "query": query,
+            "documents": _deduplicate(documents),
+            "top_k": top_k or self.ranker.top_k,
+            "scale_score": scale_score or self.ranker.scale_score,
+            "calibration_factor": calibration_factor
+            or self.ranker.calibration_factor,
+            "score_threshold": score_threshold or self.ranker.score_threshold,
+        }
+
+        if request["top_k"] <= 0:
+            raise ValueError(f"top_k must be > 0, but got {request['top_k']}")
+        if request["scale_score"] and request["calibration_factor"] is None:
+            raise ValueError(
+                "scale_score is True so calibration_factor must be provided"
+            )
+
+        self.warm_up()
+
+        return {
+            "documents": self.batcher.submit(request, timeout=self.timeout)
+        }
+
+
+def _sigmoid(x: float) -> float:
+    if x >= 0:
+        return 1 / (1 + math.exp(-x))
+    return math.exp(x) / (1 + math.exp(x))
+
+
+def _deduplicate(documents: List[Document]) -> List[Document]:
+    """
+    Keep the highest scoring document with each id, in order of first appearance.
+    """
+
+    def score(doc):
+        return doc.score if doc.score is not None else -math.inf
+
+    best = {}
+    for doc in documents:
+        if doc.id not in best or score(doc) > score(best[doc.id]):
+            best[doc.id] = doc
+
+    return list(best.values())
@@ -0,0 +1,219 @@
+"""
+Find near-duplicate chunks with MinHash signatures and locality-sensitive hashing (LSH),
+so repeated boilerplate and near-identical copies of pages are only embedded and stored
+once.
+"""
+
+import logging
+import zlib
+from collections import defaultdict
+from typing import List
+
+import numpy as np
+from haystack import Document, component
+
+logger = logging.getLogger(__name__)
+
+# Multiplier and increment of the multiply-shift hash functions are drawn from a fixed
+# seed, so signatures are the same between runs
+MINHASH_SEED = 1
+
+
+def shingles(text: str, shingle_size: int = 3) -> np.ndarray:
+    """
+    Unique 32-bit hashes of the overlapping word n-grams of a text, ignoring case and
+    whitespace. Texts shorter than shingle_size words give a single shingle.
+    """
+
+    words = text.casefold().split()
+    if not words:
+        return np.empty(0, dtype=np.uint64)
+
+    n_shingles = max(len(words) - shingle_size + 1, 1)
+    hashes = {
+        zlib.crc32(" ".join(words[ii : ii + shingle_size]).encode("utf-8"))
+        for ii in range(n_shingles)
+    }
+
+    return np.fromiter(hashes, dtype=np.uint64, count=len(hashes))
+
+
+def lsh_bands(num_perm: int, threshold: float, recall: float = 0.95) -> tuple:
+    """
+    Choose the number of bands and rows per band for LSH. Pairs with a Jaccard
+    similarity at the threshold share a bucket with probability 1 - (1 - s^rows)^bands,
+    which needs to be at least `recall`. Of the options that meet this, the one with the
+    most rows is used, as it gives the fewest candidates below the threshold to check.
+
+    >>> lsh_bands(128, 0.9)
+    (16, 8)
+    >>> lsh_bands(128, 0.5)
+    (64, 2)
+    """
+
+    options = [
+        (num_perm // rows, rows)
+        for rows in range(1, num_perm + 1)
+        if num_perm % rows == 0
+    ]
+    options = [
+        (bands, rows)
+        for bands, rows in options
+        if 1 - (1 - threshold**rows) ** bands >= recall
+    ]
+
+    return max(options, key=lambda option: option[1], default=(num_perm, 1))
+
+
+@component
+class NearDuplicateFilter:
+    """
+    A Haystack component to remove near-duplicate chunks before they are embedded.
+
+    Each chunk gets a MinHash signature of its word shingles. Signatures are split into
+    bands, and chunks sharing a band are candidate duplicates, which are confirmed by
+    the Jaccard similarity of their shingles. The first chunk of each group of
+    near-duplicates is kept as the canonical chunk.
+
+    By default only chunks of the same source document (by `source_id` metadata) are
+    compared, so every document keeps its own copy of its text and deleting a document
+    can't remove text that others still contain.
+    """
+
+    def __init__(
+        self,
+        threshold: float = 0.9,
+        num_perm: int = 128,
+        shingle_size: int = 3,
+        merge: bool = False,
+        cross_source: bool = False,
+    ):
+        """
+        :param threshold: Jaccard similarity of the word shingles above which chunks
+            count as duplicates.
+        :param num_perm: Number of hash functions in the MinHash signatures.
+        :param shingle_size: Number of words in each shingle.
+        :param merge: If True, canonical chunks record the ids and source documents of
+            their duplicates in `duplicate_ids` and `duplicate_source_ids` metadata.
+        :param cross_source: If True, chunks of different source documents are
+            compared too, so boilerplate shared between documents is stored once.
+            Deleting the document of a canonical chunk then removes the text from
+            the documents in its `duplicate_source_ids`, so they need indexing again.
+        """
+
+        if not 0 < threshold <= 1:
+            raise ValueError(
+                f"threshold must be a float greater than 0 and at most 1, but got {threshold}"
+            )
+
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self.merge = merge
+        self.cross_source = cross_source
+
+        self.bands, self.rows = lsh_bands(num_perm, threshold)
+        rng = np.random.default_rng(MINHASH_SEED)
+        self._a = rng.integers(1, 2**63, num_perm, dtype=np.uint64) | 1
+        self._b = rng.integers(0, 2**63, num_perm, dtype=np.uint64)
+
+    def signature(self, hashes: np.ndarray) -> np.ndarray:
+        """
+        MinHash signature of a set of shingle hashes, using multiply-shift hash
+        functions.
+        """
+
+        with np.errstate(over="ignore"):
+            permuted = (hashes[:, None] * self._a + self._b) >> np.uint64(32)
+
+        return permuted.min(axis=0)
+
+    @component.output_types(
+        documents=List[Document], duplicates=List[Document]
+    )
+    def run(self, documents: List[Document]):
+        """
+        Remove near-duplicate chunks.
+
+        :param documents: Chunks to deduplicate.
+        :return: `documents`, the canonical chunks in their original order, and
+            `duplicates`, the chunks removed, each with the id of its canonical chunk
+            in `canonical_id` metadata.
+        """
+
+        buckets = [defaultdict(list) for _ in range(self.bands)]
+        kept = []
+        kept_shingles = []
+        duplicates = []
+
+        for doc in documents:
+            hashes = shingles(doc.content or "", self.shingle_size)
+            if len(hashes) == 0:
+                kept.append(doc)
+                kept_shingles.append(hashes)
+                continue
+
+            band_keys = self.signature(hashes).reshape(self.bands, self.rows)
+            band_keys = [band.tobytes() for band in band_keys]
+            if not self.cross_source:
+                # Only chunks of the same document share buckets
+                source_id = doc.meta.get("source_id")
+                band_keys = [(source_id, key) for key in band_keys]
+
+            canonical = self._find_duplicate(
+                hashes, band_keys, buckets, kept_shingles
+            )
+            if canonical is None:
+                for bucket, key in zip(buckets, band_keys):
+                    bucket[key].append(len(kept))
+                kept.append(doc)
+                kept_shingles.append(hashes)
+            else:
+                duplicates.append(self._record(kept[canonical], doc))
+
+        if duplicates:
+            logger.info(
+                "Removed %d near-duplicate chunks out of %d",
+                len(duplicates),
+                len(documents),
+            )
+
+        return {"documents": kept, "duplicates": duplicates}
+
+    def _find_duplicate(self, hashes, band_keys, buckets, kept_shingles):
+        """
+        Index of the first kept chunk sharing a band with this one whose Jaccard
+        similarity is over the threshold, or None.
+        """
+
+        candidates = set()
+        for bucket, key in zip(buckets, band_keys):
+            candidates.update(bucket.get(key, []))
+
+        for candidate in sorted(candidates):
+            other = kept_shingles[candidate]
+            intersection = len(
+                np.intersect1d(hashes, other, assume_unique=True)
+            )
+            union = len(hashes) + len(other) - intersection
+            if intersection / union >= self.threshold:
+                return candidate
+
+        return None
+
+    def _record(self, canonical: Document, duplicate: Document) -> Document:
+        """
+        Point a duplicate at its canonical chunk, and if merging, record the duplicate
+        on the canonical chunk.
+        """
+
+        duplicate.meta["canonical_id"] = canonical.id
+
+        if self.merge:
+            canonical.meta.setdefault("duplicate_ids", []).append(duplicate.id)
+            source_id = duplicate.meta.get("source_id")
+            source_ids = canonical.meta.setdefault("duplicate_source_ids", [])
+            if source_id is not None and source_id not in source_ids:
+                source_ids.append(source_id)
+
+        return duplicate
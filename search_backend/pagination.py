@@ -0,0 +1,395 @@
+"""
+Page through search results with continuation tokens, so getting every match for a query
+doesn't mean retrieving and holding them all at once.
+"""
+
+import base64
+import binascii
+import hashlib
+import json
+from dataclasses import replace
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+from haystack import Document
+from haystack_integrations.components.retrievers.opensearch import (
+    OpenSearchBM25Retriever,
+)
+from haystack_integrations.document_stores.opensearch.document_store import (
+    BM25_SCALING_FACTOR,
+)
+from haystack_integrations.document_stores.opensearch.filters import (
+    normalize_filters,
+)
+
+from search_backend.local_embedding_retriever import LocalEmbeddingRetriever
+from search_backend.resilient_transport import FallbackRetriever
+
+# Largest number of results a page can have
+MAX_PAGE_SIZE = 100
+
+# How long OpenSearch keeps a point in time open between pages
+PIT_KEEP_ALIVE = "5m"
+
+# Constant of the reciprocal rank fusion, as in Haystack's DocumentJoiner
+RRF_K = 61
+
+
+class SearchPage(NamedTuple):
+    """
+    A page of search results.
+    """
+
+    # Results on this page
+    documents: List[Document]
+    # Token to pass back to get the next page, or None if this is the last page
+    continuation: Optional[str]
+
+
+def encode_token(state: dict) -> str:
+    """
+    Opaque continuation token holding the state of a paged search.
+    """
+
+    data = json.dumps(state, separators=(",", ":")).encode("utf-8")
+
+    return base64.urlsafe_b64encode(data).decode("ascii")
+
+
+def decode_token(token: str) -> dict:
+    """
+    State of a paged search from a continuation token.
+    """
+
+    try:
+        state = json.loads(base64.urlsafe_b64decode(token.encode("ascii")))
+    except (binascii.Error, UnicodeError, ValueError):
+        raise ValueError("Invalid continuation token")
+    if not isinstance(state, dict) or not _valid_state(state):
+        raise ValueError("Invalid continuation token")
+
+    return state
+
+
+def _is_rank(value: Any) -> bool:
+    return type(value) is int and value >= 0
+
+
+def _valid_cursor(cursor: Any) -> bool:
+    if cursor is None:
+        return True
+    if not isinstance(cursor, dict):
+        return False
+    if "offset" in cursor:
+        return _is_rank(cursor["offset"])
+
+    return isinstance(cursor.get("pit"), str) and (
+        cursor.get("after") is None or isinstance(cursor["after"], list)
+    )
+
+
+def _valid_state(state: dict) -> bool:
+    """
+    Whether decoded state has the fields of a paged search with the right types, so a
+    tampered token is rejected rather than failing part way through a search.
+    """
+
+    window = state.get("semantic", [])
+
+    return (
+        isinstance(state.get("key"), str)
+        and _valid_cursor(state.get("bm25_cursor"))
+        and _is_rank(state.get("bm25_rank"))
+        and _is_rank(state.get("semantic_rank"))
+        and isinstance(state.get("emitted"), list)
+        and all(isinstance(doc_id, str) for doc_id in state["emitted"])
+        and isinstance(state.get("bm25_done", False), bool)
+        and isinstance(window, list)
+        and all(
+            isinstance(item, list)
+            and len(item) == 2
+            and isinstance(item[0], str)
+            and (item[1] is None or isinstance(item[1], (int, float)))
+            for item in window
+        )
+    )
+
+
+def search_key(mode: str, query: str, filters: Optional[dict]) -> str:
+    """
+    Identify a search, so a continuation token can't be used with a different one.
+    """
+
+    key = json.dumps([mode, query, filters], sort_keys=True, default=str)
+
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:16]
+
+
+def rrf_score(ranks: List[int], n_lists: int = 2) -> float:
+    """
+    Reciprocal rank fusion score of a document from its ranks (counting from 0) in the
+    lists it appears in, scaled as in Haystack's DocumentJoiner so a document at the top
+    of every list scores 1.
+
+    >>> rrf_score([0, 0])
+    1.0
+    >>> rrf_score([0])
+    0.5
+    """
+
+    return sum(RRF_K / (n_lists * (RRF_K + rank)) for rank in ranks)
+
+
+class OpenSearchBM25Pager:
+    """
+    Page through the BM25 results of an OpenSearch index with `search_after`, in a point
+    in time (PIT) so that the results don't shift between pages as documents are
+    indexed. Each page only scores and returns the next `size` results.
+    """
+
+    def __init__(self, retriever: OpenSearchBM25Retriever):
+        """
+        :param retriever: The BM25 retriever of the pipeline, giving the document store
+            and the fuzziness and score scaling to use.
+        """
+
+        self.document_store = retriever._document_store
+        self.fuzziness = retriever._fuzziness
+        self.scale_score = retriever._scale_score
+
+    def _query(self, query: str, filters: Optional[dict]) -> dict:
+        """
+        The query OpenSearchBM25Retriever runs.
+        """
+
+        body = {
+            "bool": {
+                "must": [
+                    {
+                        "multi_match": {
+                            "query": query,
+                            "fuzziness": self.fuzziness,
+                            "type": "most_fields",
+                            "operator": "OR",
+                        }
+                    }
+                ]
+            }
+        }
+        if filters:
+            body["bool"]["filter"] = normalize_filters(filters)
+
+        return body
+
+    def start(self) -> dict:
+        """
+        Open a point in time for a new search, returning the cursor before the first
+        result. Points in time that aren't closed expire after PIT_KEEP_ALIVE.
+        """
+
+        pit = self.document_store.client.create_pit(
+            index=self.document_store._index, keep_alive=PIT_KEEP_ALIVE
+        )
+
+        return {"pit": pit["pit_id"], "after": None}
+
+    def fetch(
+        self,
+        query: str,
+        filters: Optional[dict],
+        size: int,
+        cursor: dict,
+    ) -> Tuple[List[Tuple[Document, dict]], bool]:
+        """
+        Get the next results after a cursor.
+
+        :param cursor: Cursor from `start()`, or of the last result already seen.
+        :return: A list of (document, cursor after the document) tuples, and whether
+            there are no more results after these.
+        """
+
+        body = {
+            "query": self._query(query, filters),
+            "size": size,
+            "pit": {"id": cursor["pit"], "keep_alive": PIT_KEEP_ALIVE},
+            # Ties are broken by id, so the order of results is fixed
+            "sort": [{"_score": "desc"}, {"_id": "asc"}],
+            "track_total_hits": False,
+        }
+        if cursor["after"] is not None:
+            body["search_after"] = cursor["after"]
+        if not self.document_store._return_embedding:
+            body["_source"] = {"excludes": ["embedding"]}
+
+        response = self.document_store.client.search(body=body)
+        pit = response.get("pit_id", cursor["pit"])
+
+        results = []
+        for hit in response["hits"]["hits"]:
+            doc = self.document_store._deserialize_document(hit)
+            if self.scale_score:
+                score = 1 / (1 + np.exp(-doc.score / BM25_SCALING_FACTOR))
+                doc = replace(doc, score=float(score))
+            results.append((doc, {"pit": pit, "after": hit["sort"]}))
+
+        return results, len(results) < size
+
+    def close(self, cursor: dict):
+        """
+        Release the point in time of a finished search.
+        """
+
+        self.document_store.client.delete_pit(body={"pit_id": [cursor["pit"]]})
+
+
+class OffsetBM25Pager:
+    """
+    Page through the results of any BM25 retriever, such as a LocalBM25Retriever, by
+    asking for the top `offset + size` results and keeping the last `size`.
+    """
+
+    def __init__(self, retriever):
+        self.retriever = retriever
+
+    def fetch(
+        self,
+        query: str,
+        filters: Optional[dict],
+        size: int,
+        cursor: dict,
+    ) -> Tuple[List[Tuple[Document, dict]], bool]:
+        offset = cursor["offset"]
+        documents = self.retriever.run(
+            query=query, filters=filters, top_k=offset + size
+        )["documents"][offset:]
+
+        results = [
+            (doc, {"offset": offset + ii + 1})
+            for ii, doc in enumerate(documents)
+        ]
+
+        return results, len(results) < size
+
+    def start(self) -> dict:
+        return {"offset": 0}
+
+    def close(self, cursor: dict):
+        pass
+
+
+def bm25_pager(retriever):
+    """
+    Pager for the BM25 retriever of a pipeline.
+    """
+
+    if isinstance(retriever, OpenSearchBM25Retriever):
+        return OpenSearchBM25Pager(retriever)
+    return OffsetBM25Pager(retriever)
+
+
+def documents_by_id(retriever, ids: List[str]) -> Dict[str, Document]:
+    """
+    Look up documents by id through the embedding retriever of a pipeline, to rebuild
+    the semantic results of a paged hybrid search from the ids in its continuation
+    token.
+
+    :return: The documents found, by id. Documents deleted since are missing.
+    """
+
+    if isinstance(retriever, FallbackRetriever):
+        retriever = retriever.retriever
+    if isinstance(retriever, LocalEmbeddingRetriever):
+        wanted = set(ids)
+        return {
+            doc.id: doc
+            for doc in retriever.index.documents
+            if doc.id in wanted
+        }
+
+    document_store = getattr(retriever, "document_store", None)
+    if document_store is None:
+        document_store = retriever._document_store
+    documents = document_store.filter_documents(
+        {"field": "id", "operator": "in", "value": ids}
+    )
+
+    return {doc.id: doc for doc in documents}
+
+
+def fuse_page(
+    bm25_results: List[Tuple[Document, dict]],
+    bm25_exhausted: bool,
+    semantic_documents: List[Document],
+    state: Dict[str, Any],
+    page_size: int,
+) -> List[Document]:
+    """
+    Take the next page of a hybrid search, fusing the BM25 results with the (reranked)
+    semantic results by reciprocal rank fusion.
+
+    Results are taken from the two lists in order of rank, so each page covers the next
+    window of ranks from both lists, and the documents on the page are ordered by their
+    fused score. A document in both lists counts both ranks if it is on the same page,
+    or is reached by its BM25 rank first. It is only returned once.
+
+    :param bm25_results: (document, cursor) tuples of the next BM25 results.
+    :param bm25_exhausted: Whether there are no BM25 results after bm25_results.
+    :param semantic_documents: All the semantic results, which are a bounded set.
+    :param state: Position of the search, updated in place: `bm25_rank` and
+        `bm25_cursor` of the last BM25 result taken, `semantic_rank`, and `emitted`, the
+        ids of semantic results already returned by their BM25 rank.
+    :param page_size: Number of results on the page.
+    """
+
+    semantic_ranks = {
+        doc.id: rank for rank, doc in enumerate(semantic_documents)
+    }
+    emitted = set(state["emitted"])
+
+    page = []
+    bm25_position = 0
+    while len(page) < page_size:
+        semantic_rank = state["semantic_rank"]
+        while (
+            semantic_rank < len(semantic_documents)
+            and semantic_documents[semantic_rank].id in emitted
+        ):
+            emitted.discard(semantic_documents[semantic_rank].id)
+            semantic_rank += 1
+        state["semantic_rank"] = semantic_rank
+
+        has_bm25 = bm25_position < len(bm25_results)
+        has_semantic = semantic_rank < len(semantic_documents)
+        if not has_bm25 and not has_semantic:
+            break
+
+        if has_bm25 and (
+            not has_semantic or state["bm25_rank"] <= semantic_rank
+        ):
+            doc, cursor = bm25_results[bm25_position]
+            bm25_position += 1
+            ranks = [state["bm25_rank"]]
+            state["bm25_rank"] += 1
+            state["bm25_cursor"] = cursor
+
+            other_rank = semantic_ranks.get(doc.id)
+            if other_rank is not None:
+                if other_rank < semantic_rank:
+                    # Already returned by its semantic rank
+                    continue
+                ranks.append(other_rank)
+                emitted.add(doc.id)
+            page.append((doc, ranks))
+        elif has_bm25 or bm25_exhausted or semantic_rank < state["bm25_rank"]:
+            state["semantic_rank"] += 1
+            page.append((semantic_documents[semantic_rank], [semantic_rank]))
+        else:
+            # Need more BM25 results to know which comes next
+            break
+
+    state["emitted"] = sorted(emitted)
+    state["bm25_done"] = bm25_exhausted and bm25_position == len(bm25_results)
+
+    page = [replace(doc, score=rrf_score(ranks)) for doc, ranks in page]
+
+    return sorted(page, key=lambda doc: doc.score, reverse=True)
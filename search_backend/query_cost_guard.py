@@ -0,0 +1,228 @@
+"""
+Estimate how expensive a query will be to run and decide whether to run it as
+requested, run a cheaper version of it, or reject it.
+"""
+
+import logging
+import re
+from typing import List, NamedTuple, Optional
+
+logger = logging.getLogger(__name__)
+
+# A query starting with four single letters, each followed by a space or punctuation,
+# e.g. "i g n o r e" or "I-g-n-o-r-e"
+SPACED_OUT_PATTERN = re.compile(r"(?:[A-Za-z][\s\-\.\?\'\,]){4}")
+
+
+class QueryCost(NamedTuple):
+    """
+    Estimated cost of running a query.
+    """
+
+    # Number of whitespace separated tokens in the query
+    tokens: int
+    # Number of tokens long enough to be expanded by fuzzy matching (fuzziness="AUTO")
+    fuzzy_terms: int
+    # Query/chunk pairs scored by the cross-encoder, weighted by sequence length
+    # (top_k * (tokens + chunk_tokens)). Zero if the search doesn't rerank.
+    rerank_cost: int
+
+
+class CostDecision(NamedTuple):
+    """
+    What the cost guard has decided to do with a query.
+    """
+
+    # The query to run, which may have been truncated
+    query: str
+    # Search mode to run: "hybrid", "semantic" or "bm25"
+    mode: str
+    # Whether to run the cross-encoder reranker
+    rerank: bool
+    # Number of results to request from the BM25 retriever
+    bm25_top_k: Optional[int]
+    # True if the query shouldn't be run at all
+    rejected: bool
+    # Why the query was changed or rejected (empty if it runs as requested)
+    reasons: List[str]
+
+
+class QueryCostGuard:
+    """
+    Check queries against configurable budgets before they reach the retrievers, so a
+    very long or pathological query can't tie up the embedding and reranking workers.
+
+    Budgets are applied in order of how cheap they are to check:
+     - queries longer than `max_chars` characters, or with unusual spacing, are
+       rejected outright (checked on the raw query, with `too_long` and
+       `unusual_spacing`)
+     - queries with more than `max_tokens` tokens, or more than `max_fuzzy_terms`
+       tokens that would be fuzzy matched, are truncated
+     - requests for more than `max_bm25_top_k` BM25 results are capped
+     - if reranking would cost more than `max_rerank_cost`, the search is downgraded to
+       skip the reranker: hybrid searches become BM25 searches, semantic searches
+       return results in embedding order
+    """
+
+    def __init__(
+        self,
+        max_chars: int = 500,
+        max_tokens: int = 64,
+        max_fuzzy_terms: int = 32,
+        max_bm25_top_k: int = 1000,
+        max_rerank_cost: int = 20000,
+        chunk_tokens: int = 64,
+        reject_unusual_spacing: bool = True,
+    ):
+        """
+        :param max_chars: Reject queries longer than this (before normalisation).
+        :param max_tokens: Truncate queries to this many tokens.
+        :param max_fuzzy_terms: Truncate queries so no more than this many tokens get
+            fuzzy matched by the BM25 retriever.
+        :param max_bm25_top_k: Cap on the number of BM25 results requested.
+        :param max_rerank_cost: Budget for reranking, in units of top_k * (query tokens +
+            chunk_tokens). Searches over budget skip the reranker.
+        :param chunk_tokens: Typical length of an indexed chunk, in tokens (words).
+        :param reject_unusual_spacing: Reject queries starting with a run of single
+            letters separated by spaces or punctuation, e.g. "i g n o r e  a l l".
+        """
+
+        self.max_chars = max_chars
+        self.max_tokens = max_tokens
+        self.max_fuzzy_terms = max_fuzzy_terms
+        self.max_bm25_top_k = max_bm25_top_k
+        self.max_rerank_cost = max_rerank_cost
+        self.chunk_tokens = chunk_tokens
+        self.reject_unusual_spacing = reject_unusual_spacing
+
+    def too_long(self, query: str) -> bool:
+        """
+        Cheap check on the raw query, so very long queries can be rejected before any
+        other processing.
+        """
+
+        return len(query) > self.max_chars
+
+    def unusual_spacing(self, query: str) -> bool:
+        """
+        Check on the raw query for letters spaced out to get around filtering. This has
+        to be done before normalisation, which turns punctuation such as "A/B/C/D" into
+        spaces.
+        """
+
+        return self.reject_unusual_spacing and bool(
+            SPACED_OUT_PATTERN.match(query)
+        )
+
+    def estimate(
+        self, query: str, mode: str, top_k: int = 0, rerank: bool = True
+    ) -> QueryCost:
+        """
+        Estimate the cost of running a query.
+
+        :param query: The (normalised) search query.
+        :param mode: Search mode: "hybrid", "semantic" or "bm25".
+        :param top_k: Number of results to rerank.
+        :param rerank: Whether the search reranks the results.
+        """
+
+        tokens = query.split()
+
+        fuzzy_terms = 0
+        if mode in ["hybrid", "bm25"]:
+            fuzzy_terms = sum(len(token) > 2 for token in tokens)
+
+        rerank_cost = 0
+        if rerank and mode in ["hybrid", "semantic"]:
+            rerank_cost = top_k * (len(tokens) + self.chunk_tokens)
+
+        return QueryCost(len(tokens), fuzzy_terms, rerank_cost)
+
+    def check(
+        self,
+        query: str,
+        mode: str,
+        top_k: int = 0,
+        bm25_top_k: Optional[int] = None,
+    ) -> CostDecision:
+        """
+        Decide how to run a query. Unusual spacing isn't checked here, as the query has
+        been normalised: check the raw query with `unusual_spacing` first.
+
+        :param query: The (normalised) search query.
+        :param mode: Search mode requested: "hybrid", "semantic" or "bm25".
+        :param top_k: Number of results to rerank (semantic_top_k for hybrid search).
+        :param bm25_top_k: Number of results requested from the BM25 retriever.
+        """
+
+        reasons = []
+
+        if self.too_long(query):
+            return self._log(
+                CostDecision(
+                    query,
+                    mode,
+                    False,
+                    bm25_top_k,
+                    True,
+                    [f"query longer than {self.max_chars} characters"],
+                )
+            )
+
+        cost = self.estimate(query, mode, top_k)
+
+        tokens = query.split()
+        if cost.tokens > self.max_tokens:
+            tokens = tokens[: self.max_tokens]
+            reasons.append(f"truncated to {self.max_tokens} tokens")
+        if cost.fuzzy_terms > self.max_fuzzy_terms:
+            tokens = _truncate_fuzzy_terms(tokens, self.max_fuzzy_terms)
+            reasons.append(f"truncated to {self.max_fuzzy_terms} fuzzy terms")
+        query = " ".join(tokens)
+
+        if bm25_top_k is not None and bm25_top_k > self.max_bm25_top_k:
+            bm25_top_k = self.max_bm25_top_k
+            reasons.append(f"bm25_top_k capped at {self.max_bm25_top_k}")
+
+        rerank = mode in ["hybrid", "semantic"]
+        if (
+            self.estimate(query, mode, top_k).rerank_cost
+            > self.max_rerank_cost
+        ):
+            rerank = False
+            if mode == "hybrid":
+                mode = "bm25"
+                reasons.append("rerank over budget, downgraded to BM25")
+            else:
+                reasons.append("rerank over budget, skipped reranker")
+
+        return self._log(
+            CostDecision(query, mode, rerank, bm25_top_k, False, reasons)
+        )
+
+    def _log(self, decision: CostDecision) -> CostDecision:
+        if decision.rejected:
+            logger.warning("Query rejected: %s", ", ".join(decision.reasons))
+        elif decision.reasons:
+            logger.info("Query modified: %s", ", ".join(decision.reasons))
+
+        return decision
+
+
+def _truncate_fuzzy_terms(
+    tokens: List[str], max_fuzzy_terms: int
+) -> List[str]:
+    """
+    Keep tokens from the start of the query until the fuzzy term budget is used up.
+    """
+
+    kept = []
+    fuzzy_terms = 0
+    for token in tokens:
+        if len(token) > 2:
+            if fuzzy_terms == max_fuzzy_terms:
+                break
+            fuzzy_terms += 1
+        kept.append(token)
+
+    return kept
@@ -0,0 +1,111 @@
+"""
+Query normalisation, to turn equivalent queries into the same canonical form before
+they are passed to the retrievers or used as a cache key.
+"""
+
+import json
+import re
+import unicodedata
+from functools import lru_cache
+from typing import Any, Dict, Optional
+
+from haystack import component
+
+# Punctuation kept when it sits inside a word, e.g. "gdd's", "e-mail", "3.5"
+WORD_PUNCTUATION = "'-.,"
+
+# Characters that map to something other than themselves or a space
+REPLACEMENTS = {
+    "&": " and ",
+    "‘": "'",
+    "’": "'",
+    "‐": "-",
+    "‑": "-",
+    "–": "-",
+    "—": "-",
+}
+
+# Word punctuation that isn't between two word characters, e.g. trailing full stops
+# or runs like "..." and "--"
+LOOSE_PUNCTUATION = re.compile(r"(?<!\w)['.,-]+|['.,-]+(?!\w)")
+
+
+class _TranslationTable(dict):
+    """
+    Translation table for str.translate covering every character. Letters, digits and
+    word punctuation map to themselves, a few characters have explicit replacements,
+    and everything else (whitespace, other punctuation, symbols) maps to a space. The
+    mapping for each character is worked out the first time it is seen.
+    """
+
+    def __missing__(self, codepoint: int):
+        char = chr(codepoint)
+        if char in REPLACEMENTS:
+            value = REPLACEMENTS[char]
+        elif char.isalnum() or char in WORD_PUNCTUATION:
+            value = codepoint
+        elif unicodedata.category(char) == "Mn":
+            # Keep combining marks (accents) attached to their letters
+            value = codepoint
+        else:
+            value = " "
+
+        self[codepoint] = value
+        return value
+
+
+TRANSLATION_TABLE = _TranslationTable()
+
+
+def normalise_query(query: str) -> str:
+    """
+    Produce the canonical form of a query: case folded, with symbols and stray
+    punctuation removed and whitespace collapsed to single spaces.
+
+    >>> normalise_query("  When does my GDD allowance EXPIRE??  ")
+    'when does my gdd allowance expire'
+    >>> normalise_query("R&D spend... (2023/24), section 3.5")
+    'r and d spend 2023 24 section 3.5'
+    """
+
+    query = query.casefold().translate(TRANSLATION_TABLE)
+    query = LOOSE_PUNCTUATION.sub(" ", query)
+
+    return " ".join(query.split())
+
+
+def query_cache_key(
+    canonical_query: str, filters: Optional[Dict[str, Any]] = None, **params
+) -> str:
+    """
+    Build a key for caching results of a query. Queries with the same canonical form,
+    filters and search parameters get the same key.
+
+    :param canonical_query: The query after normalisation.
+    :param filters: Metadata filters used for the search.
+    :param params: Any other parameters affecting the results, e.g. top_k.
+    """
+
+    return json.dumps(
+        [canonical_query, filters, params], sort_keys=True, default=str
+    )
+
+
+@component
+class QueryNormaliser:
+    """
+    A Haystack component to normalise queries (see `normalise_query()`). Results for
+    recently seen queries are memoised.
+    """
+
+    def __init__(self, cache_size: int = 4096):
+        """
+        :param cache_size: Number of recent queries to memoise.
+        """
+
+        self.normalise = lru_cache(maxsize=cache_size)(normalise_query)
+
+    @component.output_types(query=str)
+    def run(self, query: str):
+
+        return {"query": self.normalise(query)}
@@ -0,0 +1,216 @@
+"""
+Caches of cross-encoder scores for (query, chunk) pairs, so the reranker only runs the
+model on pairs it hasn't scored before.
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+from typing import List, Optional
+
+import numpy as np
+
+from search_backend.query_normaliser import query_cache_key
+
+# Entries of the shared cache: a 128-bit key, the raw score, and when it was last used
+SHARED_ENTRY = np.dtype(
+    [("key", "<u8", (2,)), ("score", "<f4"), ("used", "<u8")]
+)
+
+# Entries in each set of the shared cache. A key can only be stored in one set, and
+# the least recently used entry of the set is replaced when it is full.
+SHARED_WAYS = 8
+
+
+def rerank_key(model: str, query: str, doc_id: str, text: str) -> bytes:
+    """
+    16-byte cache key of a (query, chunk) pair.
+
+    :param model: Name of the cross-encoder.
+    :param query: The canonical query, as passed to the reranker.
+    :param doc_id: Id of the chunk.
+    :param text: The text of the chunk that is scored (including any metadata and
+        prefixes), so the key changes if the chunk's content does.
+    """
+
+    digest = hashlib.blake2b(digest_size=16)
+    for part in [model, query_cache_key(query), doc_id, text]:
+        data = part.encode("utf-8")
+        digest.update(len(data).to_bytes(8, "little"))
+        digest.update(data)
+
+    return digest.digest()
+
+
+class RerankScoreCache:
+    """
+    In-process LRU cache of raw cross-encoder scores. Safe to use from several
+    threads.
+    """
+
+    def __init__(self, max_size: int = 100_000):
+        """
+        :param max_size: Maximum number of scores to keep. The least recently used
+            scores are evicted first.
+        """
+
+        self.max_size = max_size
+        self._scores = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._scores)
+
+    def get_many(self, keys: List[bytes]) -> List[Optional[float]]:
+        """
+        Cached scores of keys, with None for keys that aren't cached.
+        """
+
+        scores = []
+        with self._lock:
+            for key in keys:
+                score = self._scores.get(key)
+                if score is not None:
+                    self._scores.move_to_end(key)
+                scores.append(score)
+
+        return scores
+
+    def put_many(self, keys: List[bytes], scores: List[float]):
+        with self._lock:
+            for key, score in zip(keys, scores):
+                self._scores[key] = score
+                self._scores.move_to_end(key)
+            while len(self._scores) > self.max_size:
+                self._scores.popitem(last=False)
+
+
+class SharedRerankScoreCache:
+    """
+    Cache of raw cross-encoder scores in shared memory, so the worker processes of a
+    server share their scores. It is a fixed-size, set-associative table: each key maps
+    to one set of SHARED_WAYS entries, and when the set is full its least recently used
+    entry is replaced.
+
+    Processes don't lock the table. Entries are invalidated while they are written and
+    checked again after being read, so a clash between processes can lose a score,
+    which is then recomputed, but can't return the wrong one.
+
+    The process that creates the cache should call `unlink()` when it is no longer
+    needed. Other processes attach to it by name.
+    """
+
+    def __init__(
+        self,
+        name: Optional[str] = None,
+        max_size: int = 2**20,
+        create: bool = True,
+    ):
+        """
+        :param name: Name of the shared memory block. Generated if creating the cache
+            and not given.
+        :param max_size: Number of entries, rounded down to a multiple of SHARED_WAYS.
+            Each entry takes 28 bytes. Ignored when attaching to an existing cache.
+        :param create: Create the cache, rather than attach to an existing one.
+        """
+
+        if create:
+            n_sets = max(max_size // SHARED_WAYS, 1)
+            size = n_sets * SHARED_WAYS * SHARED_ENTRY.itemsize
+            self.shm = SharedMemory(name=name, create=True, size=size)
+            self.shm.buf[:size] = bytes(size)
+        else:
+            self.shm = SharedMemory(name=name)
+            n_sets = self.shm.size // (SHARED_WAYS * SHARED_ENTRY.itemsize)
+        # The creating process removes the block with unlink(), not when whichever
+        # process happens to exit first stops tracking it
+        resource_tracker.unregister(self.shm._name, "shared_memory")
+
+        self.name = self.shm.name
+        self.n_sets = n_sets
+        self.table = np.ndarray(
+            (n_sets, SHARED_WAYS), dtype=SHARED_ENTRY, buffer=self.shm.buf
+        )
+
+    def __len__(self):
+        return int(np.count_nonzero(self.table["used"]))
+
+    def _locate(self, keys: List[bytes]) -> tuple:
+        """
+        The two halves of each key as integers, and the set each key belongs in.
+        """
+
+        halves = np.frombuffer(b"".join(keys), dtype="<u8").reshape(-1, 2)
+
+        return halves, halves[:, 0] % self.n_sets
+
+    def get_many(self, keys: List[bytes]) -> List[Optional[float]]:
+        """
+        Cached scores of keys, with None for keys that aren't cached.
+        """
+
+        if not keys:
+            return []
+
+        halves, sets = self._locate(keys)
+        entries = self.table[sets]
+        matches = (entries["key"] == halves[:, None, :]).all(axis=2)
+        hit_rows, hit_ways = np.nonzero(matches)
+        hit_sets = sets[hit_rows]
+        scores = entries["score"][hit_rows, hit_ways]
+
+        # Drop scores whose entry was replaced while being read
+        still_there = (
+            self.table["key"][hit_sets, hit_ways] == halves[hit_rows]
+        ).all(axis=1)
+        self.table["used"][
+            hit_sets[still_there], hit_ways[still_there]
+        ] = time.monotonic_ns()
+
+        results = [None] * len(keys)
+        for row, score, valid in zip(hit_rows, scores, still_there):
+            if valid:
+                results[row] = float(score)
+
+        return results
+
+    def put_many(self, keys: List[bytes], scores: List[float]):
+        if not keys:
+            return
+
+        halves, sets = self._locate(keys)
+        for half, set_index, score in zip(halves, sets, scores):
+            entries = self.table[set_index]
+            matches = np.nonzero((entries["key"] == half).all(axis=1))[0]
+            if len(matches):
+                way = matches[0]
+            else:
+                way = np.argmin(entries["used"])
+
+            entry = self.table[set_index, way : way + 1]
+            # Invalidate the entry while it is written
+            entry["key"] = 0
+            entry["score"] = score
+            entry["used"] = time.monotonic_ns()
+            entry["key"] = half
+
+    def close(self):
+        """
+        Detach from the shared memory.
+        """
+
+        del self.table
+        self.shm.close()
+
+    def unlink(self):
+        """
+        Remove the shared memory, once no process needs the cache.
+        """
+
+        # SharedMemory.unlink stops the resource tracker tracking the block, so it has
+        # to be tracked again first
+        resource_tracker.register(self.shm._name, "shared_memory")
+        self.shm.unlink()
@@ -0,0 +1,499 @@
+"""
+An OpenSearch transport that hedges slow read requests and stops sending requests to an
+unhealthy cluster, and a retriever wrapper that falls back to in-process retrieval when
+the cluster can't be reached.
+"""
+
+import inspect
+import logging
+import random
+import threading
+import time
+from collections import deque
+from functools import partial
+from typing import Any, List
+
+import numpy as np
+from haystack import Document, component
+from opensearchpy import Transport
+from opensearchpy.exceptions import (
+    ConnectionError as OpenSearchConnectionError,
+)
+from opensearchpy.exceptions import ConnectionTimeout, TransportError
+
+logger = logging.getLogger(__name__)
+
+# Read-only endpoints requested with POST, which are safe to send twice
+HEDGED_ENDPOINTS = {"_search", "_count", "_msearch", "_mget"}
+
+# Response statuses that mean the cluster is struggling, rather than the request being
+# wrong
+UNHEALTHY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class CircuitOpenError(OpenSearchConnectionError):
+    """
+    Raised without sending a request while the circuit breaker is open.
+    """
+
+
+def is_unhealthy(error: Exception) -> bool:
+    """
+    Whether an error from the OpenSearch client means the cluster is unhealthy (it can't
+    be reached, timed out or is overloaded).
+    """
+
+    if isinstance(error, OpenSearchConnectionError):
+        return True
+
+    return (
+        isinstance(error, TransportError)
+        and error.status_code in UNHEALTHY_STATUSES
+    )
+
+
+class CircuitBreaker:
+    """
+    Count consecutive failures, and once there are `failure_threshold` of them, "open"
+    to refuse requests for `reset_timeout` seconds. After that a single trial request is
+    let through ("half open"): if it succeeds the breaker closes, and if it fails the
+    breaker opens again.
+    """
+
+    def __init__(
+        self, failure_threshold: int = 5, reset_timeout: float = 30.0
+    ):
+        """
+        :param failure_threshold: Number of consecutive failures that open the breaker.
+        :param reset_timeout: Time in seconds the breaker stays open before a trial
+            request.
+        """
+
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+
+        self._failures = 0
+        self._opened_at = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def failures(self) -> int:
+        """
+        Number of consecutive failures, since the last success.
+        """
+
+        with self._lock:
+            return self._failures
+
+    @property
+    def state(self) -> str:
+        """
+        "closed", "open" or "half_open".
+        """
+
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            if self._trial:
+                return "half_open"
+            return "open"
+
+    def allow(self) -> bool:
+        """
+        Whether a request can be sent now.
+        """
+
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if self._trial:
+                return False
+            if time.monotonic() - self._opened_at < self.reset_timeout:
+                return False
+            self._trial = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            if self._opened_at is not None:
+                logger.info("Circuit breaker closed")
+            self._failures = 0
+            self._opened_at = None
+            self._trial = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._trial or (
+                self._opened_at is None
+                and self._failures >= self.failure_threshold
+            ):
+                logger.warning(
+                    "Circuit breaker opened after %d failures", self._failures
+                )
+                self._opened_at = time.monotonic()
+                self._trial = False
+
+
+class ResilientTransport(Transport):
+    """
+    An opensearchpy Transport that:
+
+     - hedges read requests: if a search hasn't been answered after the
+       `hedge_quantile` of recent request latencies, the same request is sent again to
+       another node in the connection pool (so another copy of the shards). The client
+       blocks the calling thread while it waits for an answer, so the two attempts
+       aren't raced: the first is sent from the calling thread with the hedging delay
+       as its read timeout, and is given up on (though the node may still finish it)
+       when the hedge is sent. No other threads are used. At most `hedge_budget` of
+       recent requests are hedged, and none while the circuit breaker has recent
+       failures, so hedging can't double the load on a struggling cluster.
+     - fails fast with CircuitOpenError while a CircuitBreaker is open, after repeated
+       connection errors, timeouts or overloaded responses.
+
+    Hedging needs several hosts: with a single endpoint (as `document_store_factory`
+    sets up for AWS), requests are never hedged, as the hedge would go to the same
+    place as the first attempt.
+
+    Use it with a document store by passing it as the client's transport class:
+    `OpenSearchDocumentStore(hosts=[...], transport_class=ResilientTransport)`. Options
+    passed to the store are passed on to the transport.
+    """
+
+    def __init__(
+        self,
+        hosts: Any,
+        *args,
+        hedge_quantile: float = 0.95,
+        hedge_window: int = 1000,
+        min_hedge_samples: int = 20,
+        initial_hedge_delay: float = 0.1,
+        min_hedge_delay: float = 0.01,
+        hedge_budget: float = 0.05,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+        **kwargs,
+    ):
+        """
+        :param hosts: Hosts of the cluster, as for Transport.
+        :param hedge_quantile: Quantile of recent request latencies after which a
+            request is hedged, or None to never hedge.
+        :param hedge_window: Number of recent request latencies kept.
+        :param min_hedge_samples: Number of latencies needed before the quantile is
+            used. Until then, requests are hedged after `initial_hedge_delay` seconds.
+        :param initial_hedge_delay: Hedging delay in seconds before there are enough
+            latencies.
+        :param min_hedge_delay: Shortest hedging delay in seconds, so that a cluster
+            that is usually very quick doesn't get every request twice.
+        :param hedge_budget: Largest fraction of the last `hedge_window` read requests
+            that can be hedged.
+        :param failure_threshold: Number of consecutive failures that open the circuit
+            breaker.
+        :param reset_timeout: Time in seconds the circuit breaker stays open before a
+            trial request.
+        :param kwargs: Other Transport options.
+        """
+
+        super().__init__(hosts, *args, **kwargs)
+
+        self.hedge_quantile = hedge_quantile
+        self.min_hedge_samples = min_hedge_samples
+        self.initial_hedge_delay = initial_hedge_delay
+        self.min_hedge_delay = min_hedge_delay
+        self.hedge_budget = hedge_budget
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+
+        self._latencies = deque(maxlen=hedge_window)
+        # Whether each recent read request was hedged
+        self._hedges = deque(maxlen=hedge_window)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    @property
+    def hedge_delay(self) -> float:
+        """
+        Time in seconds after which a read request is sent again.
+        """
+
+        with self._lock:
+            if len(self._latencies) < self.min_hedge_samples:
+                return self.initial_hedge_delay
+            latencies = np.array(self._latencies)
+
+        return max(
+            float(np.quantile(latencies, self.hedge_quantile)),
+            self.min_hedge_delay,
+        )
+
+    def _hedgeable(self, method: str, url: str) -> bool:
+        if self.hedge_quantile is None:
+            return False
+        if method in ("GET", "HEAD"):
+            return True
+
+        return (
+            method == "POST"
+            and url.rstrip("/").rsplit("/", 1)[-1] in HEDGED_ENDPOINTS
+        )
+
+    def get_connection(self):
+        """
+        Get a connection from the pool, avoiding the connection of the request being
+        hedged if there are others, and recording the connection used.
+        """
+
+        connection = super().get_connection()
+        attempt = getattr(self._local, "attempt", None)
+        if attempt is None:
+            return connection
+
+        if connection is attempt.get("avoid"):
+            others = [
+                other
+                for other in self.connection_pool.connections
+                if other is not connection
+            ]
+            if others:
+                connection = random.choice(others)
+        attempt["connection"] = connection
+
+        return connection
+
+    def _may_hedge(self) -> bool:
+        """
+        Whether a request can be hedged now: there is another node to send it to, the
+        breaker has had no failures since its last success, and fewer than
+        `hedge_budget` of the last `hedge_window` requests have been hedged.
+        """
+
+        if (
+            len(self.connection_pool.connections) < 2
+            or self.breaker.failures > 0
+        ):
+            return False
+
+        with self._lock:
+            return sum(self._hedges) < self.hedge_budget * self._hedges.maxlen
+
+    def _send(self, send, attempt: dict, timeout=None):
+        """
+        Send a request, recording its latency.
+
+        :param attempt: Where the connection used is recorded, and the connection to
+            avoid (under "avoid").
+        :param timeout: Read timeout of the request in seconds, if not the client's.
+        """
+
+        self._local.attempt = attempt
+        start = time.monotonic()
+        try:
+            return send(timeout=timeout)
+        finally:
+            self._local.attempt = None
+            with self._lock:
+                self._latencies.append(time.monotonic() - start)
+
+    def _send_once(
+        self,
+        method: str,
+        url: str,
+        params=None,
+        body=None,
+        timeout=None,
+        ignore=(),
+        headers=None,
+    ):
+        """
+        Send a request to one node, as one attempt of Transport.perform_request but
+        without its retries, so the node isn't marked dead when the attempt times out.
+        """
+
+        method, params, body, ignore, timeout = self._resolve_request_args(
+            method, params, body, ignore, timeout
+        )
+
+        connection = self.get_connection()
+        try:
+            status, headers_response, data = connection.perform_request(
+                method,
+                url,
+                params,
+                body,
+                headers=headers,
+                ignore=ignore,
+                timeout=timeout,
+            )
+        except TransportError as error:
+            if method == "HEAD" and error.status_code == 404:
+                return False
+            raise
+        self.connection_pool.mark_live(connection)
+
+        if method == "HEAD":
+            return 200 <= status < 300
+        if data:
+            headers_response = {
+                header.lower(): value
+                for header, value in headers_response.items()
+            }
+            data = self.deserializer.loads(
+                data, headers_response.get("content-type")
+            )
+
+        return data
+
+    def _retryable(self, error: TransportError) -> bool:
+        """
+        Whether Transport would send a request again after an error other than a
+        timeout.
+        """
+
+        return self.max_retries > 0 and (
+            isinstance(error, OpenSearchConnectionError)
+            or error.status_code in self.retry_on_status
+        )
+
+    def _hedged(self, send, send_once, timeout=None):
+        """
+        Send a request, and again to another node if there is no answer after the
+        hedging delay (and the request may be hedged).
+
+        The first attempt is sent without the transport's retries, as its timeout is
+        the hedging delay: with `retry_on_timeout`, a slow query would otherwise be
+        retried on (and mark dead) node after node before the hedge is sent. Other
+        errors are retried as Transport would.
+
+        :param send: Sends the request, with the transport's retries.
+        :param send_once: Sends the request to one node.
+        :param timeout: Read timeout of the request in seconds, if not the client's.
+        """
+
+        delay = self.hedge_delay
+        if (timeout and timeout <= delay) or not self._may_hedge():
+            with self._lock:
+                self._hedges.append(False)
+            return self._send(send, {}, timeout)
+
+        attempt = {}
+        hedged = False
+        try:
+            result = self._send(send_once, attempt, delay)
+        except ConnectionTimeout:
+            hedged = True
+        except TransportError as error:
+            if not self._retryable(error):
+                raise
+            try:
+                self.mark_dead(attempt["connection"])
+            except TransportError:
+                pass
+        else:
+            with self._lock:
+                self._hedges.append(False)
+            return result
+
+        with self._lock:
+            self._hedges.append(hedged)
+        if hedged:
+            logger.debug("Hedging a request after %.3f seconds", delay)
+
+        return self._send(send, {"avoid": attempt.get("connection")}, timeout)
+
+    def perform_request(
+        self,
+        method: str,
+        url: str,
+        params=None,
+        body=None,
+        timeout=None,
+        ignore=(),
+        headers=None,
+    ):
+        if not self.breaker.allow():
+            raise CircuitOpenError("N/A", "The circuit breaker is open", None)
+
+        # Resolved as Transport does, as the first attempt of a hedged request is sent
+        # with a timeout of its own
+        if params and not timeout:
+            params = dict(params)
+            timeout = params.pop("request_timeout", None) or params.pop(
+                "timeout", None
+            )
+
+        request = {
+            "params": params,
+            "body": body,
+            "ignore": ignore,
+            "headers": headers,
+        }
+        send = partial(super().perform_request, method, url, **request)
+        try:
+            if self._hedgeable(method, url):
+                send_once = partial(self._send_once, method, url, **request)
+                result = self._hedged(send, send_once, timeout)
+            else:
+                result = send(timeout=timeout)
+        except Exception as error:
+            if is_unhealthy(error):
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
+            raise
+
+        self.breaker.record_success()
+
+        return result
+
+
+@component
+class FallbackRetriever:
+    """
+    A Haystack component running a retriever backed by OpenSearch, and if the cluster
+    is unhealthy (e.g. the circuit breaker of a ResilientTransport is open), a fallback
+    retriever such as a LocalBM25Retriever or LocalEmbeddingRetriever. It has the same
+    inputs as the retriever, and passes the fallback those it accepts.
+    """
+
+    def __init__(self, retriever, fallback=None):
+        """
+        :param retriever: The retriever to run.
+        :param fallback: The retriever to run if the cluster is unhealthy. If None, the
+            error is raised.
+        """
+
+        self.retriever = retriever
+        self.fallback = fallback
+
+        for name, param in inspect.signature(retriever.run).parameters.items():
+            if param.kind in (param.VAR_POSITIONAL, param.VAR_KEYWORD):
+                continue
+            default = param.default
+            if default is param.empty:
+                component.set_input_type(self, name, param.annotation)
+            else:
+                component.set_input_type(self, name, param.annotation, default)
+
+        self._fallback_inputs = None
+        if fallback is not None:
+            self._fallback_inputs = set(
+                inspect.signature(fallback.run).parameters
+            )
+
+    @component.output_types(documents=List[Document])
+    def run(self, **kwargs):
+        try:
+            documents = self.retriever.run(**kwargs)["documents"]
+        except TransportError as error:
+            if self.fallback is None or not is_unhealthy(error):
+                raise
+            logger.warning("Retrieving from the fallback retriever: %s", error)
+            documents = self.fallback.run(
+                **{
+                    name: value
+                    for name, value in kwargs.items()
+                    if name in self._fallback_inputs
+                }
+            )["documents"]
+
+        return {"documents": documents}
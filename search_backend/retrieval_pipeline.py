@@ -4,7 +4,6 @@ Haystack pipeline functions and retrieval, using Opensearch as the document stor
 
 import os
 from haystack import Pipeline
-from haystack.components.joiners import DocumentJoiner
 from haystack.components.rankers import TransformersSimilarityRanker
 from haystack_integrations.components.embedders.fastembed import (
     FastembedTextEmbedder,
@@ -16,6 +15,10 @@ from haystack_integrations.components.retrievers.opensearch import (
 from haystack_integrations.document_stores.opensearch import (
     OpenSearchDocumentStore,
 )
+from search_backend.filtered_knn import FilteredEmbeddingRetriever
+from search_backend.fusion_joiner import FusionJoiner
+from search_backend.micro_batcher import BatchedRanker, BatchedTextEmbedder
+from search_backend.resilient_transport import FallbackRetriever
 from search_backend.threshold_score import ThresholdScore
 
 
@@ -33,6 +36,18 @@ class RetrievalPipeline:
         dense_embedding_model: str = None,
         rerank_model: str = None,
         retrieval: Pipeline = None,
+        embedding_retriever=None,
+        bm25_retriever=None,
+        document_joiner=None,
+        micro_batching: bool = False,
+        max_batch: int = 8,
+        max_wait: float = 0.005,
+        rerank_cache=None,
+        rerank_timeout: float = None,
+        adaptive_filtering: bool = False,
+        ef_search: int = None,
+        fallback_bm25_retriever=None,
+        fallback_embedding_retriever=None,
     ):
         """
         :param document_store: An Haystack/OpenSearch document store object, set up elsewhere.
@@ -41,6 +56,33 @@ class RetrievalPipeline:
         :param rerank_model: Name of the reranker/cross-encoder model to use (assumes model is available from HuggingFace)
             for a semantic/hybrid search
         :param retrieval: pipeline to do the retrieval, which will be configured in this constructor
+        :param embedding_retriever: Component to use for the dense embedding retrieval in place of an
+            OpenSearchEmbeddingRetriever, e.g. a LocalEmbeddingRetriever to search embeddings in memory.
+        :param bm25_retriever: Component to use for the BM25 retrieval in place of an OpenSearchBM25Retriever,
+            e.g. a LocalBM25Retriever to search an inverted index in memory.
+        :param document_joiner: Component to fuse the BM25 and semantic results of the hybrid pipeline in place of
+            the default FusionJoiner (reciprocal rank fusion), e.g. a FusionJoiner with a different join mode.
+        :param micro_batching: If True, the query embeddings and reranking of searches running concurrently
+            (e.g. in different threads of a web server) are batched together, so they share the forward passes
+            of the models.
+        :param max_batch: Maximum number of searches batched together.
+        :param max_wait: Maximum time in seconds a search waits for others to be batched with. Searches don't
+            wait when no others are running.
+        :param rerank_cache: Optional RerankScoreCache, or SharedRerankScoreCache to share scores between worker
+            processes, so the reranker only runs the model on (query, chunk) pairs it hasn't scored before.
+        :param rerank_timeout: Optional maximum time in seconds a search waits for the reranker, after which
+            concurrent.futures.TimeoutError is raised. Use with a Search deadline, so a stuck model can't hold
+            the threads running the rerank stage.
+        :param adaptive_filtering: If True, the default embedding retriever is a FilteredEmbeddingRetriever, which
+            picks how to apply each query's metadata filters from how many documents they match, rather than
+            filtering the top_k kNN results.
+        :param ef_search: Size of the HNSW candidate list for the kNN searches, in place of the index default
+            (see hnsw_report to choose it). It is set per query by the FilteredEmbeddingRetriever, so this also turns
+            on adaptive filtering.
+        :param fallback_bm25_retriever: Optional retriever, e.g. a LocalBM25Retriever, to run in place of the BM25
+            retriever when the cluster is unhealthy (see ResilientTransport, whose circuit breaker makes this quick).
+        :param fallback_embedding_retriever: Optional retriever, e.g. a LocalEmbeddingRetriever, to run in place of
+            the embedding retriever when the cluster is unhealthy.
         """
 
         if retrieval is None:
@@ -49,16 +91,55 @@ class RetrievalPipeline:
         self.retrieval = retrieval
         self.document_store = document_store
 
-        self.bm25_retriever = OpenSearchBM25Retriever(
-            document_store=self.document_store,
-            scale_score=True,
-            fuzziness="AUTO",
-        )
-        self.embedding_retriever = OpenSearchEmbeddingRetriever(
-            document_store=self.document_store
-        )
+        if bm25_retriever is not None:
+            self.bm25_retriever = bm25_retriever
+        else:
+            self.bm25_retriever = OpenSearchBM25Retriever(
+                document_store=self.document_store,
+                scale_score=True,
+                fuzziness="AUTO",
+            )
+        if embedding_retriever is not None:
+            self.embedding_retriever = embedding_retriever
+        elif adaptive_filtering or ef_search is not None:
+            self.embedding_retriever = FilteredEmbeddingRetriever(
+                document_store=self.document_store, ef_search=ef_search
+            )
+        else:
+            self.embedding_retriever = OpenSearchEmbeddingRetriever(
+                document_store=self.document_store
+            )
+
+        if fallback_bm25_retriever is not None:
+            self.bm25_retriever = FallbackRetriever(
+                self.bm25_retriever, fallback_bm25_retriever
+            )
+        if fallback_embedding_retriever is not None:
+            self.embedding_retriever = FallbackRetriever(
+                self.embedding_retriever, fallback_embedding_retriever
+            )
+
+        if document_joiner is not None:
+            self.document_joiner = document_joiner
+        else:
+            self.document_joiner = FusionJoiner(
+                join_mode="reciprocal_rank_fusion"
+            )
+
+        self.micro_batching = micro_batching
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.rerank_cache = rerank_cache
+        self.rerank_timeout = rerank_timeout
 
-        if dense_embedding_model is not None:
+        if dense_embedding_model is not None and micro_batching:
+            self.dense_text_embedder = BatchedTextEmbedder(
+                model=dense_embedding_model,
+                cache_dir=os.getcwd() + "/embedding_cache",
+                max_batch=max_batch,
+                max_wait=max_wait,
+            )
+        elif dense_embedding_model is not None:
             self.dense_text_embedder = FastembedTextEmbedder(
                 model=dense_embedding_model,
                 cache_dir=os.getcwd() + "/embedding_cache",
@@ -71,6 +152,25 @@ class RetrievalPipeline:
         else:
             self.rerank_model = None
 
+    def _ranker(self):
+        """
+        Reranker component for the semantic and hybrid pipelines.
+        """
+
+        if (
+            self.micro_batching
+            or self.rerank_cache is not None
+            or self.rerank_timeout is not None
+        ):
+            return BatchedRanker(
+                model=self.rerank_model,
+                max_batch=self.max_batch if self.micro_batching else 1,
+                max_wait=self.max_wait,
+                score_cache=self.rerank_cache,
+                timeout=self.rerank_timeout,
+            )
+        return TransformersSimilarityRanker(model=self.rerank_model)
+
     def setup_hybrid_pipeline(self) -> Pipeline:
         """
         This function sets up the hybrid retrieval pipeline based on an existing document
@@ -82,7 +182,8 @@ class RetrievalPipeline:
            pipeline is set up to allow all matches to be returned from the BM25 retrieval,
            and if there are many matches it would cause the reranking stage to be very slow.
          - Results from the BM25 and embedding retrieval are joined using reciprocal rank
-           fusion
+           fusion by default (see FusionJoiner for the other options, which can also be
+           chosen per search)
 
         :return: Returns the pipeline object which can then be used to search the data for
             matches to a particular query.
@@ -95,23 +196,22 @@ class RetrievalPipeline:
         self.retrieval.add_component(
             "embedding_retriever", self.embedding_retriever
         )
-        self.retrieval.add_component(
-            "ranker", TransformersSimilarityRanker(model=self.rerank_model)
-        )
+        self.retrieval.add_component("ranker", self._ranker())
         self.retrieval.add_component("semantic_threshold", ThresholdScore())
-        self.retrieval.add_component(
-            "document_joiner",
-            DocumentJoiner(join_mode="reciprocal_rank_fusion"),
-        )
+        self.retrieval.add_component("document_joiner", self.document_joiner)
 
         self.retrieval.connect(
             "dense_text_embedder.embedding",
             "embedding_retriever.query_embedding",
         )
-        self.retrieval.connect("bm25_retriever", "document_joiner")
+        self.retrieval.connect(
+            "bm25_retriever", "document_joiner.bm25_documents"
+        )
         self.retrieval.connect("embedding_retriever", "ranker")
         self.retrieval.connect("ranker", "semantic_threshold.documents")
-        self.retrieval.connect("semantic_threshold", "document_joiner")
+        self.retrieval.connect(
+            "semantic_threshold", "document_joiner.semantic_documents"
+        )
 
         return self.retrieval
 
@@ -128,9 +228,7 @@ class RetrievalPipeline:
         self.retrieval.add_component(
             "embedding_retriever", self.embedding_retriever
         )
-        self.retrieval.add_component(
-            "ranker", TransformersSimilarityRanker(model=self.rerank_model)
-        )
+        self.retrieval.add_component("ranker", self._ranker())
         self.retrieval.add_component("threshold", ThresholdScore())
 
         self.retrieval.connect(
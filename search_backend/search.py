@@ -2,7 +2,51 @@
 Functions to run searches based on Haystack pipelines and print the results.
 """
 
-from haystack import Pipeline
+import logging
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError
+from dataclasses import replace
+
+from haystack import Document, Pipeline
+
+from search_backend.pagination import (
+    MAX_PAGE_SIZE,
+    SearchPage,
+    bm25_pager,
+    decode_token,
+    documents_by_id,
+    encode_token,
+    fuse_page,
+    search_key,
+)
+from search_backend.query_cost_guard import CostDecision, QueryCostGuard
+from search_backend.query_normaliser import QueryNormaliser
+from search_backend.semantic_query_cache import (
+    SemanticQueryCache,
+    search_settings_key,
+)
+from search_backend.threshold_score import ThresholdScore
+
+logger = logging.getLogger(__name__)
+
+# Stages of a hybrid search with a deadline
+DEADLINE_STAGES = ["bm25", "knn", "rerank"]
+
+
+class SearchUnavailableError(RuntimeError):
+    """
+    Raised when every retrieval of a search was skipped, so there are no results because
+    nothing could be searched rather than because nothing matched.
+    """
+
+    def __init__(self, degraded: list):
+        """
+        :param degraded: The retrievals skipped.
+        """
+
+        super().__init__(f"Search skipped {', '.join(degraded)}")
+        self.degraded = degraded
 
 
 class Search:
@@ -17,12 +61,440 @@ class Search:
      - setup_bm25_pipeline -> bm25_search
     """
 
-    def __init__(self, pipeline: Pipeline):
+    def __init__(
+        self,
+        pipeline: Pipeline,
+        normalise_query: bool = True,
+        cost_guard: QueryCostGuard = None,
+        query_cache: SemanticQueryCache = None,
+        deadline: float = None,
+        retrieval_share: float = 0.6,
+        max_workers: int = 8,
+    ):
         """
         :param pipeline: The pipeline to use. This should be defined using the RetrievalPipeline() class.
+        :param normalise_query: If True, queries are converted to a canonical form (case folded, with
+            punctuation and whitespace collapsed) before being passed to the retrievers, so that
+            equivalent queries are treated the same.
+        :param cost_guard: Optional QueryCostGuard, to reject, truncate or downgrade queries that would
+            be expensive to run.
+        :param query_cache: Optional SemanticQueryCache. Semantic and hybrid searches whose query embedding is
+            close enough to a recent query's, with the same filters and settings, return that query's results
+            without running the retrieval and reranking.
+        :param deadline: Optional latency budget in seconds for hybrid searches. The BM25 and kNN retrievals
+            run in parallel and have `retrieval_share` of the budget, and the reranker has the rest. A search
+            that misses a stage's deadline (or whose stage fails) goes on without it: without the reranker the
+            semantic results are in embedding order (and `threshold` isn't applied, as it is for reranker scores),
+            and without the kNN retrieval only the BM25 results are returned. Every result lists the stages skipped
+            ("bm25", "knn" or "rerank") in `meta["degraded"]`. If both retrievals are skipped,
+            SearchUnavailableError is raised. With a query cache, the query is embedded before the budget starts,
+            and degraded results aren't cached.
+        :param retrieval_share: Fraction of the deadline for the retrievals (including embedding the query).
+        :param max_workers: Number of threads running the stages of searches with a deadline. A stage can't be
+            stopped once it is running, so each stage runs on at most a third of them, and is skipped straight
+            away while they are all busy rather than queueing behind stuck calls. Give the OpenSearch client and
+            the reranker timeouts (see `document_store_factory` and `RetrievalPipeline(rerank_timeout=...)`) so
+            stuck calls free their threads.
         """
 
         self.pipeline = pipeline
+        self.cost_guard = cost_guard
+        self.query_cache = query_cache
+        self.deadline = deadline
+        self.retrieval_share = retrieval_share
+
+        if deadline is not None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=max_workers, thread_name_prefix="search-stage"
+            )
+            self._stage_slots = {
+                stage: threading.BoundedSemaphore(max(max_workers // 3, 1))
+                for stage in DEADLINE_STAGES
+            }
+
+        if normalise_query:
+            self.query_normaliser = QueryNormaliser()
+        else:
+            self.query_normaliser = None
+
+    def _prepare_query(self, search_query: str) -> str:
+        """
+        Get the form of the query passed to the pipeline and used as a cache key.
+        """
+
+        if self.query_normaliser is not None:
+            return self.query_normaliser.run(search_query)["query"]
+        return search_query
+
+    def _fast_reject(self, search_query: str) -> bool:
+        """
+        Reject queries the cost guard considers too long, or unusually spaced, before doing
+        anything else with them.
+        """
+
+        if self.cost_guard is None:
+            return False
+        if self.cost_guard.too_long(search_query):
+            return True
+        if self.cost_guard.unusual_spacing(search_query):
+            logger.warning("Query rejected: unusual spacing")
+            return True
+        return False
+
+    def _check_cost(
+        self,
+        search_query: str,
+        mode: str,
+        top_k: int = 0,
+        bm25_top_k: int = None,
+    ) -> CostDecision:
+        """
+        Ask the cost guard (if there is one) how to run the query.
+        """
+
+        if self.cost_guard is None:
+            return CostDecision(
+                search_query, mode, mode != "bm25", bm25_top_k, False, []
+            )
+
+        return self.cost_guard.check(search_query, mode, top_k, bm25_top_k)
+
+    def _run_bm25_retriever(
+        self, search_query: str, filters: dict, top_k: int
+    ) -> list:
+        """
+        Run only the BM25 retriever of the pipeline.
+        """
+
+        return self.pipeline.get_component("bm25_retriever").run(
+            query=search_query, filters=filters, top_k=top_k
+        )["documents"]
+
+    def _embed_query(self, search_query: str) -> list:
+        """
+        Run only the query embedder of the pipeline.
+        """
+
+        return self.pipeline.get_component("dense_text_embedder").run(
+            text=search_query
+        )["embedding"]
+
+    def _run_knn(
+        self,
+        search_query: str,
+        filters: dict,
+        top_k: int,
+        embedding: list = None,
+    ) -> list:
+        """
+        Run only the query embedder (unless the embedding has already been worked out) and
+        embedding retriever of the pipeline.
+        """
+
+        if embedding is None:
+            embedding = self._embed_query(search_query)
+
+        return self.pipeline.get_component("embedding_retriever").run(
+            query_embedding=embedding, filters=filters, top_k=top_k
+        )["documents"]
+
+    def _run_embedding_retriever(
+        self,
+        search_query: str,
+        filters: dict,
+        top_k: int,
+        threshold: float,
+        embedding: list = None,
+    ) -> list:
+        """
+        Run the embedding retrieval of the pipeline without the reranker, returning results in
+        embedding order.
+
+        :param embedding: The query embedding, if it has already been worked out.
+        """
+
+        documents = self._run_knn(search_query, filters, top_k, embedding)
+
+        return ThresholdScore().run(
+            documents=documents, score_threshold=threshold
+        )["documents"]
+
+    def _run_reranked_retrieval(
+        self,
+        search_query: str,
+        filters: dict,
+        top_k: int,
+        threshold: float,
+        embedding: list = None,
+    ) -> list:
+        """
+        Run the embedding retrieval and reranker of the pipeline, as the semantic branch of
+        the hybrid pipeline does.
+
+        :param embedding: The query embedding, if it has already been worked out.
+        """
+
+        documents = self._run_knn(search_query, filters, top_k, embedding)
+        documents = self.pipeline.get_component("ranker").run(
+            query=search_query, documents=documents, top_k=top_k
+        )["documents"]
+
+        return ThresholdScore().run(
+            documents=documents, score_threshold=threshold
+        )["documents"]
+
+    def _run_hybrid_retrieval(
+        self,
+        search_query: str,
+        filters: dict,
+        bm25_top_k: int,
+        semantic_top_k: int,
+        threshold: float,
+        fusion: dict,
+        embedding: list,
+    ) -> list:
+        """
+        Run the components of the hybrid pipeline one by one, starting from a query
+        embedding that has already been worked out.
+
+        :param fusion: Arguments for the document joiner.
+        """
+
+        return self.pipeline.get_component("document_joiner").run(
+            bm25_documents=self._run_bm25_retriever(
+                search_query, filters, bm25_top_k
+            ),
+            semantic_documents=self._run_reranked_retrieval(
+                search_query, filters, semantic_top_k, threshold, embedding
+            ),
+            **fusion,
+        )["documents"]
+
+    def _submit(self, stage: str, function, *args, **kwargs) -> Future:
+        """
+        Start a stage of a search with a deadline in the thread pool, unless every
+        thread the stage can use is busy.
+
+        :return: The stage's future, or None if it can't be started.
+        """
+
+        slots = self._stage_slots[stage]
+        if not slots.acquire(blocking=False):
+            return None
+
+        def run():
+            try:
+                return function(*args, **kwargs)
+            finally:
+                slots.release()
+
+        return self._executor.submit(run)
+
+    def _wait(
+        self, future: Future, deadline: float, stage: str, degraded: list
+    ):
+        """
+        Wait until the deadline (a time.monotonic() time) for a stage of a search.
+
+        :param future: The stage's future from `_submit`.
+        :param degraded: Stages skipped so far, which the stage is added to if it
+            wasn't started, misses the deadline or fails.
+        :return: The result of the stage, or None if it was skipped.
+        """
+
+        if future is None:
+            logger.warning(
+                "Search skipped the %s stage, which has no free workers", stage
+            )
+            degraded.append(stage)
+            return None
+
+        try:
+            return future.result(timeout=max(deadline - time.monotonic(), 0))
+        except TimeoutError:
+            future.cancel()
+            logger.warning(
+                "Search skipped the %s stage at its deadline", stage
+            )
+        except Exception:
+            logger.exception(
+                "Search skipped the %s stage, which failed", stage
+            )
+        degraded.append(stage)
+
+        return None
+
+    def _run_deadline_hybrid_retrieval(
+        self,
+        search_query: str,
+        filters: dict,
+        bm25_top_k: int,
+        semantic_top_k: int,
+        threshold: float,
+        fusion: dict,
+        embedding: list = None,
+    ) -> list:
+        """
+        Run the components of the hybrid pipeline within the search's deadline, skipping
+        the stages that would miss it. The BM25 and kNN retrievals run in parallel.
+
+        :param fusion: Arguments for the document joiner.
+        :param embedding: The query embedding, if it has already been worked out.
+        :raises SearchUnavailableError: If both retrievals are skipped.
+        """
+
+        start = time.monotonic()
+        retrieval_deadline = start + self.deadline * self.retrieval_share
+        deadline = start + self.deadline
+        degraded = []
+
+        bm25 = self._submit(
+            "bm25", self._run_bm25_retriever, search_query, filters, bm25_top_k
+        )
+        knn = self._submit(
+            "knn",
+            self._run_knn,
+            search_query,
+            filters,
+            semantic_top_k,
+            embedding,
+        )
+        bm25_documents = self._wait(bm25, retrieval_deadline, "bm25", degraded)
+        knn_documents = self._wait(knn, retrieval_deadline, "knn", degraded)
+        if bm25_documents is None and knn_documents is None:
+            raise SearchUnavailableError(degraded)
+
+        semantic_documents = []
+        if knn_documents:
+            ranker = self._submit(
+                "rerank",
+                self.pipeline.get_component("ranker").run,
+                query=search_query,
+                documents=knn_documents,
+                top_k=semantic_top_k,
+            )
+            ranked = self._wait(ranker, deadline, "rerank", degraded)
+            if ranked is None:
+                # The threshold is for reranker scores, so isn't applied to the kNN
+                # similarities
+                semantic_documents = knn_documents[:semantic_top_k]
+            else:
+                semantic_documents = ThresholdScore().run(
+                    documents=ranked["documents"], score_threshold=threshold
+                )["documents"]
+
+        documents = self.pipeline.get_component("document_joiner").run(
+            bm25_documents=bm25_documents or [],
+            semantic_documents=semantic_documents,
+            **fusion,
+        )["documents"]
+
+        return [
+            replace(doc, meta={**doc.meta, "degraded": degraded})
+            for doc in documents
+        ]
+
+    def _cached_search(self, search_query: str, settings: str, run) -> list:
+        """
+        Get the results of a search from the query cache, or run it with `run(embedding)`
+        and cache the results.
+
+        :param settings: Key of the search's filters and settings, from
+            `search_settings_key`.
+        """
+
+        generation = self.query_cache.generation
+        embedding = self._embed_query(search_query)
+
+        results = self.query_cache.lookup(embedding, settings)
+        if results is None:
+            results = run(embedding)
+            # Results missing a stage that missed its deadline aren't kept
+            if not any(doc.meta.get("degraded") for doc in results):
+                self.query_cache.store(
+                    embedding, settings, results, generation
+                )
+
+        return results
+
+    def _page_state(
+        self,
+        search_query: str,
+        mode: str,
+        filters: dict,
+        page_size: int,
+        continuation: str,
+        top_k: int = 0,
+    ) -> tuple:
+        """
+        Check the query of a paged search, and get the position of the search from the
+        continuation token (or the start, if there isn't one).
+
+        :return: The cost guard's decision and the search state, or (None, None) if the
+            query is rejected.
+        """
+
+        if not 0 < page_size <= MAX_PAGE_SIZE:
+            raise ValueError(
+                f"page_size must be between 1 and {MAX_PAGE_SIZE}, but got {page_size}"
+            )
+
+        if self._fast_reject(search_query):
+            return None, None
+
+        search_query = self._prepare_query(search_query)
+        if self._basic_query_verification(search_query):
+            return None, None
+
+        decision = self._check_cost(search_query, mode, top_k, page_size)
+        if decision.rejected:
+            return None, None
+
+        key = search_key(decision.mode, decision.query, filters)
+        if continuation is None:
+            state = {
+                "key": key,
+                "bm25_cursor": None,
+                "bm25_rank": 0,
+                "semantic_rank": 0,
+                "emitted": [],
+            }
+        else:
+            state = decode_token(continuation)
+            if state.get("key") != key:
+                raise ValueError(
+                    "The continuation token is for a different search"
+                )
+
+        return decision, state
+
+    def _semantic_window(self, window: list) -> tuple:
+        """
+        Rebuild the semantic results of a paged hybrid search from the [id, score] pairs
+        in its continuation token.
+
+        :return: The documents in order, and the ids of those deleted since the first
+            page. These keep their place (as documents without content), so the ranks
+            in the token still line up, but aren't returned.
+        """
+
+        if not window:
+            return [], set()
+
+        found = documents_by_id(
+            self.pipeline.get_component("embedding_retriever"),
+            [doc_id for doc_id, _ in window],
+        )
+        documents = [
+            (
+                replace(found[doc_id], score=score)
+                if doc_id in found
+                else Document(id=doc_id, score=score)
+            )
+            for doc_id, score in window
+        ]
+
+        return documents, {doc_id for doc_id, _ in window} - set(found)
 
     def _basic_query_verification(self, search_query: str):
         """
@@ -39,6 +511,8 @@ class Search:
         semantic_top_k: int = 10,
         top_k: int = None,
         threshold: float = 0.0,
+        join_mode: str = None,
+        weights: dict = None,
     ) -> list:
         """
         Run a hybrid search pipeline and return results. See `setup_hybrid_pipeline()`
@@ -56,41 +530,107 @@ class Search:
             }
             ```
         :param bm25_top_k: How many results to return from the BM25 retrieval (the
-            OpenSearchBM25Retriever class that this is based on has a default top_k of 10,
-            so set this to a value equal to the number of records in the document store to
-            retrieve all matches).
+            OpenSearchBM25Retriever class that this is based on has a default top_k of 10).
+            To go through all the matches, use `hybrid_search_page` rather than setting
+            this to the number of records in the document store.
         :param semantic_top_k: How many results to return from the dense embedding retrieval.
         :param top_k: How many results to return from the overall hybrid retrieval (if None
             then the upper limit for the total number of results will be bm25_top_k +
             semantic_top_k).
         :param threshold: Set a threshold match score (a float between 0 and 1) for the
             semantic search.
+        :param join_mode: How to fuse the BM25 and semantic results, if not the pipeline's
+            default: "reciprocal_rank_fusion", "convex_combination" or
+            "distribution_based_rank_fusion" (see FusionJoiner).
+        :param weights: Relative weights of the BM25 and semantic results in the fusion,
+            like {"bm25": 0.3, "semantic": 0.7}. Equal by default.
 
         :return: A list of ranked search results.
         """
 
+        if self._fast_reject(search_query):
+            return []
+
+        search_query = self._prepare_query(search_query)
         if self._basic_query_verification(search_query):
             return []
 
-        prediction = self.pipeline.run(
-            {
-                "dense_text_embedder": {"text": search_query},
-                "bm25_retriever": {
-                    "query": search_query,
-                    "filters": filters,
-                    "top_k": bm25_top_k,
-                },
-                "embedding_retriever": {
-                    "filters": filters,
-                    "top_k": semantic_top_k,
-                },
-                "ranker": {
-                    "query": search_query,
-                    "top_k": semantic_top_k,
-                },
-                "semantic_threshold": {"score_threshold": threshold},
-            }
+        decision = self._check_cost(
+            search_query, "hybrid", semantic_top_k, bm25_top_k
         )
+        if decision.rejected:
+            return []
+        search_query = decision.query
+        if decision.mode == "bm25":
+            return self._run_bm25_retriever(
+                search_query, filters, decision.bm25_top_k
+            )[:top_k]
+
+        # Only passed when set, so the pipeline's joiner needn't accept them otherwise.
+        # Passing top_k means only the results returned are copied with their new scores.
+        fusion = {"join_mode": join_mode, "weights": weights, "top_k": top_k}
+        fusion = {key: value for key, value in fusion.items() if value}
+
+        if self.deadline is None:
+            retrieve = self._run_hybrid_retrieval
+        else:
+            retrieve = self._run_deadline_hybrid_retrieval
+
+        if self.query_cache is not None:
+            settings = search_settings_key(
+                "hybrid",
+                filters,
+                bm25_top_k=decision.bm25_top_k,
+                semantic_top_k=semantic_top_k,
+                threshold=threshold,
+                **fusion,
+            )
+
+            return self._cached_search(
+                search_query,
+                settings,
+                lambda embedding: retrieve(
+                    search_query,
+                    filters,
+                    decision.bm25_top_k,
+                    semantic_top_k,
+                    threshold,
+                    fusion,
+                    embedding,
+                )[:top_k],
+            )
+
+        if self.deadline is not None:
+            return retrieve(
+                search_query,
+                filters,
+                decision.bm25_top_k,
+                semantic_top_k,
+                threshold,
+                fusion,
+            )[:top_k]
+
+        data = {
+            "dense_text_embedder": {"text": search_query},
+            "bm25_retriever": {
+                "query": search_query,
+                "filters": filters,
+                "top_k": decision.bm25_top_k,
+            },
+            "embedding_retriever": {
+                "filters": filters,
+                "top_k": semantic_top_k,
+            },
+            "ranker": {
+                "query": search_query,
+                "top_k": semantic_top_k,
+            },
+            "semantic_threshold": {"score_threshold": threshold},
+        }
+        if fusion:
+            data["document_joiner"] = fusion
+
+        prediction = self.pipeline.run(data)
 
         # Return an empty list if an unexpected object is returned by the pipeline
         if prediction is None:
@@ -134,9 +674,34 @@ class Search:
         :return: A list of ranked search results.
         """
 
+        if self._fast_reject(search_query):
+            return []
+
+        search_query = self._prepare_query(search_query)
         if self._basic_query_verification(search_query):
             return []
 
+        decision = self._check_cost(search_query, "semantic", top_k)
+        if decision.rejected:
+            return []
+        search_query = decision.query
+        if not decision.rerank:
+            return self._run_embedding_retriever(
+                search_query, filters, top_k, threshold
+            )
+
+        if self.query_cache is not None:
+            settings = search_settings_key(
+                "semantic", filters, top_k=top_k, threshold=threshold
+            )
+            return self._cached_search(
+                search_query,
+                settings,
+                lambda embedding: self._run_reranked_retrieval(
+                    search_query, filters, top_k, threshold, embedding
+                ),
+            )
+
         print("Running search...")
         prediction = self.pipeline.run(
             {
@@ -187,15 +752,24 @@ class Search:
         :return: A list of ranked search results.
         """
 
+        if self._fast_reject(search_query):
+            return []
+
+        search_query = self._prepare_query(search_query)
         if self._basic_query_verification(search_query):
             return []
 
+        decision = self._check_cost(search_query, "bm25", bm25_top_k=top_k)
+        if decision.rejected:
+            return []
+        search_query = decision.query
+
         prediction = self.pipeline.run(
             {
                 "bm25_retriever": {
                     "query": search_query,
                     "filters": filters,
-                    "top_k": top_k,
+                    "top_k": decision.bm25_top_k,
                 },
             }
         )
@@ -211,3 +785,130 @@ class Search:
             results = prediction["bm25_retriever"]["documents"]
 
         return results
+
+    def bm25_search_page(
+        self,
+        search_query: str,
+        filters: dict = None,
+        page_size: int = 10,
+        continuation: str = None,
+    ) -> SearchPage:
+        """
+        Get a page of BM25 search results. With an OpenSearch BM25 retriever, pages are
+        read with `search_after` in a point in time, so each page only costs as much as
+        the results on it.
+
+        :param search_query: The search query in the form of a text string.
+        :param filters: Metadata filters, as for `bm25_search`.
+        :param page_size: How many results to return, at most MAX_PAGE_SIZE.
+        :param continuation: The continuation token of the previous page, or None for
+            the first page. Tokens expire if not used within a few minutes.
+
+        :return: A SearchPage of results, with the continuation token for the next page
+            (None on the last page).
+        """
+
+        decision, state = self._page_state(
+            search_query, "bm25", filters, page_size, continuation
+        )
+        if decision is None:
+            return SearchPage([], None)
+
+        pager = bm25_pager(self.pipeline.get_component("bm25_retriever"))
+        cursor = state["bm25_cursor"] or pager.start()
+        results, exhausted = pager.fetch(
+            decision.query, filters, page_size, cursor
+        )
+        documents = [doc for doc, _ in results]
+
+        if exhausted:
+            pager.close(results[-1][1] if results else cursor)
+            return SearchPage(documents, None)
+
+        state["bm25_cursor"] = results[-1][1]
+        state["bm25_rank"] += len(results)
+
+        return SearchPage(documents, encode_token(state))
+
+    def hybrid_search_page(
+        self,
+        search_query: str,
+        filters: dict = None,
+        page_size: int = 10,
+        semantic_top_k: int = 10,
+        threshold: float = 0.0,
+        continuation: str = None,
+    ) -> SearchPage:
+        """
+        Get a page of hybrid search results. Each page fuses the next window of BM25
+        results, read as in `bm25_search_page`, with the next reranked semantic results
+        by reciprocal rank fusion (see `fuse_page`), so the BM25 retrieval never has to
+        return every match at once. The semantic results are retrieved and reranked once,
+        for the first page, and the next pages look them up by the ids in the token.
+
+        :param search_query: The search query in the form of a text string.
+        :param filters: Metadata filters, as for `hybrid_search`.
+        :param page_size: How many results to return, at most MAX_PAGE_SIZE.
+        :param semantic_top_k: How many results to get from the dense embedding
+            retrieval in total, spread over the pages.
+        :param threshold: Set a threshold match score (a float between 0 and 1) for the
+            semantic search.
+        :param continuation: The continuation token of the previous page, or None for
+            the first page. Tokens expire if not used within a few minutes.
+
+        :return: A SearchPage of results, with the continuation token for the next page
+            (None on the last page).
+        """
+
+        decision, state = self._page_state(
+            search_query,
+            "hybrid",
+            filters,
+            page_size,
+            continuation,
+            semantic_top_k,
+        )
+        if decision is None:
+            return SearchPage([], None)
+
+        # The semantic results are retrieved and reranked for the first page, and carried
+        # to the next pages in the token, so every page fuses the same list
+        if continuation is None:
+            semantic_documents = []
+            if decision.mode == "hybrid":
+                semantic_documents = self._run_reranked_retrieval(
+                    decision.query, filters, semantic_top_k, threshold
+                )
+            state["semantic"] = [
+                [doc.id, doc.score] for doc in semantic_documents
+            ]
+            missing = set()
+        else:
+            semantic_documents, missing = self._semantic_window(
+                state.get("semantic", [])
+            )
+
+        pager = bm25_pager(self.pipeline.get_component("bm25_retriever"))
+        cursor = state["bm25_cursor"] or pager.start()
+        state["bm25_cursor"] = cursor
+        results, exhausted = [], state.get("bm25_done", False)
+        if not exhausted:
+            results, exhausted = pager.fetch(
+                decision.query, filters, page_size, cursor
+            )
+
+        documents = fuse_page(
+            results, exhausted, semantic_documents, state, page_size
+        )
+        documents = [doc for doc in documents if doc.id not in missing]
+
+        remaining = [
+            doc
+            for doc in semantic_documents[state["semantic_rank"] :]
+            if doc.id not in state["emitted"]
+        ]
+        if state["bm25_done"] and not remaining:
+            pager.close(state["bm25_cursor"])
+            return SearchPage(documents, None)
+
+        return SearchPage(documents, encode_token(state))
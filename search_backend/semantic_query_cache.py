@@ -0,0 +1,254 @@
+"""
+Cache the results of searches by the embedding of their query, so paraphrases of a recent
+query ("GDD allowance expiry", "when does my GDD allowance expire") reuse its results
+rather than running the retrieval and reranking again.
+"""
+
+import json
+import threading
+import time
+from dataclasses import replace
+from typing import List, NamedTuple, Optional
+
+import numpy as np
+from haystack import Document
+
+
+class QueryCacheStats(NamedTuple):
+    """
+    Counts of how a SemanticQueryCache has been used.
+    """
+
+    # Lookups that returned cached results
+    hits: int
+    # Lookups that didn't, including those that only found expired results
+    misses: int
+    # Lookups that found results older than max_age
+    expired: int
+    # Times the cache was cleared because the index changed
+    invalidations: int
+    # Mean and maximum age in seconds of the results returned by hits
+    mean_hit_age: float
+    max_hit_age: float
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+def search_settings_key(mode: str, filters: Optional[dict], **settings) -> str:
+    """
+    Identify everything about a search except its query, so cached results are only
+    reused by searches with the same filters and settings.
+
+    >>> search_settings_key("semantic", None, top_k=10)
+    '["semantic", null, {"top_k": 10}]'
+    """
+
+    return json.dumps([mode, filters, settings], sort_keys=True, default=str)
+
+
+def _unit(embedding: List[float]) -> np.ndarray:
+    vector = np.asarray(embedding, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+
+    return vector / norm if norm > 0 else vector
+
+
+def _copy(documents: List[Document]) -> List[Document]:
+    """
+    Copies of documents and their metadata, so callers changing results they are
+    given (e.g. adding to `meta`) don't change the cached results.
+    """
+
+    return [replace(doc, meta=dict(doc.meta)) for doc in documents]
+
+
+class SemanticQueryCache:
+    """
+    Cache of search results, looked up by the embedding of the query. A lookup returns
+    the results of the most similar cached query with the same settings key, if its
+    cosine distance is at most `max_distance`.
+
+    The query embeddings are kept in a fixed-size array, so a lookup is one
+    matrix-vector product over the entries with the same settings. When the cache is
+    full the least recently used entry is replaced. Safe to use from several threads.
+
+    Call `invalidate()` when the index changes (IndexingPipeline does this if given the
+    cache), and set `max_age` to bound how stale results can be when the index is
+    changed by another process.
+    """
+
+    def __init__(
+        self,
+        max_distance: float = 0.05,
+        max_size: int = 1024,
+        max_age: Optional[float] = None,
+    ):
+        """
+        :param max_distance: Largest cosine distance (1 - cosine similarity) between two
+            queries for one to reuse the other's results.
+        :param max_size: Maximum number of queries to keep results for.
+        :param max_age: If set, results older than this many seconds aren't returned.
+        """
+
+        if max_size < 1:
+            raise ValueError(
+                f"max_size must be at least 1, but got {max_size}"
+            )
+
+        self.max_distance = max_distance
+        self.max_size = max_size
+        self.max_age = max_age
+
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._expired = 0
+        self._invalidations = 0
+        # Incremented by invalidate(), so results of searches that were running at the
+        # time aren't stored
+        self.generation = 0
+        self._hit_age_total = 0.0
+        self._max_hit_age = 0.0
+        self._clear()
+
+    def _clear(self):
+        # Allocated on the first store, when the embedding size is known
+        self._embeddings = None
+        self._settings = [None] * self.max_size
+        self._results = [None] * self.max_size
+        self._stored_at = np.zeros(self.max_size)
+        self._used = np.zeros(self.max_size, dtype=np.int64)
+        # Slots of the entries with each settings key
+        self._slots = {}
+        self._free = list(range(self.max_size - 1, -1, -1))
+        self._clock = 0
+
+    def __len__(self):
+        return self.max_size - len(self._free)
+
+    def _remove(self, slot: int):
+        slots = self._slots[self._settings[slot]]
+        slots.remove(slot)
+        if not slots:
+            del self._slots[self._settings[slot]]
+        self._settings[slot] = None
+        self._results[slot] = None
+
+    def lookup(
+        self, embedding: List[float], settings: str
+    ) -> Optional[List[Document]]:
+        """
+        Cached results of a query similar to this one, or None if there aren't any.
+        Results older than max_age are dropped first, so they can't hide newer results
+        of a slightly less similar query.
+
+        :param embedding: Embedding of the query.
+        :param settings: Key of the search's filters and settings, from
+            `search_settings_key`.
+        """
+
+        query = _unit(embedding)
+        now = time.monotonic()
+
+        with self._lock:
+            slots = self._slots.get(settings)
+            if slots and self._embeddings.shape[1] == len(query):
+                slots = np.fromiter(slots, dtype=np.int64, count=len(slots))
+                similarities = self._embeddings[slots] @ query
+                close = 1 - similarities <= self.max_distance
+
+                if self.max_age is not None:
+                    stale = now - self._stored_at[slots] > self.max_age
+                    for slot in slots[stale]:
+                        self._remove(int(slot))
+                        self._free.append(int(slot))
+                    if np.any(close & stale):
+                        self._expired += 1
+                    close &= ~stale
+
+                if np.any(close):
+                    best = int(
+                        np.argmax(np.where(close, similarities, -np.inf))
+                    )
+                    slot = int(slots[best])
+                    age = now - self._stored_at[slot]
+                    self._clock += 1
+                    self._used[slot] = self._clock
+                    self._hits += 1
+                    self._hit_age_total += age
+                    self._max_hit_age = max(self._max_hit_age, age)
+                    return _copy(self._results[slot])
+
+            self._misses += 1
+            return None
+
+    def store(
+        self,
+        embedding: List[float],
+        settings: str,
+        results: List[Document],
+        generation: Optional[int] = None,
+    ):
+        """
+        Cache the results of a query.
+
+        :param embedding: Embedding of the query.
+        :param settings: Key of the search's filters and settings, from
+            `search_settings_key`.
+        :param results: The results of the search.
+        :param generation: The cache's `generation` when the search started. If the
+            cache has been invalidated since, the results aren't stored.
+        """
+
+        query = _unit(embedding)
+
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            if self._embeddings is None or self._embeddings.shape[1] != len(
+                query
+            ):
+                self._clear()
+                self._embeddings = np.zeros(
+                    (self.max_size, len(query)), dtype=np.float32
+                )
+
+            if self._free:
+                slot = self._free.pop()
+            else:
+                slot = int(np.argmin(self._used))
+                self._remove(slot)
+
+            self._clock += 1
+            self._embeddings[slot] = query
+            self._settings[slot] = settings
+            self._results[slot] = _copy(results)
+            self._stored_at[slot] = time.monotonic()
+            self._used[slot] = self._clock
+            self._slots.setdefault(settings, set()).add(slot)
+
+    def invalidate(self):
+        """
+        Drop all the cached results, e.g. because documents have been indexed or deleted.
+        """
+
+        with self._lock:
+            self._clear()
+            self._invalidations += 1
+            self.generation += 1
+
+    def stats(self) -> QueryCacheStats:
+        with self._lock:
+            return QueryCacheStats(
+                hits=self._hits,
+                misses=self._misses,
+                expired=self._expired,
+                invalidations=self._invalidations,
+                mean_hit_age=(
+                    self._hit_age_total / self._hits if self._hits else 0.0
+                ),
+                max_hit_age=self._max_hit_age,
+            )
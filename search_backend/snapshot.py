@@ -0,0 +1,286 @@
+"""
+Export the chunks, metadata and embeddings of an index to a Parquet snapshot, and load a
+snapshot into a new index without parsing or embedding anything again.
+
+Needs pyarrow, from the `snapshot` extra.
+"""
+
+import json
+from itertools import islice
+from typing import Iterable, Iterator, List, Optional
+
+import numpy as np
+from haystack import Document
+from haystack.document_stores.types import DuplicatePolicy
+from haystack_integrations.document_stores.opensearch import (
+    OpenSearchDocumentStore,
+)
+from opensearchpy.helpers import bulk, scan
+
+# Version of the snapshot layout, stored in the file
+SNAPSHOT_FORMAT = "1"
+
+# Number of chunks read from or written to the document store at a time
+SNAPSHOT_BATCH_SIZE = 1000
+
+
+def _batched(items: Iterable, size: int) -> Iterator[list]:
+    items = iter(items)
+    while batch := list(islice(items, size)):
+        yield batch
+
+
+def iter_documents(
+    document_store, batch_size: int = SNAPSHOT_BATCH_SIZE
+) -> Iterator[List[Document]]:
+    """
+    Read every document in a document store, in batches. OpenSearch indexes are read with
+    a scroll, so only one batch is held at a time. Other document stores fall back to
+    `filter_documents()`.
+    """
+
+    if isinstance(document_store, OpenSearchDocumentStore):
+        hits = scan(
+            document_store.client,
+            index=document_store._index,
+            query={"query": {"match_all": {}}},
+            size=batch_size,
+        )
+        documents = (Document.from_dict(hit["_source"]) for hit in hits)
+    else:
+        documents = document_store.filter_documents()
+
+    yield from _batched(documents, batch_size)
+
+
+def _schema(dim: Optional[int], embedding_model: Optional[str]):
+    import pyarrow as pa
+
+    fields = [
+        pa.field("id", pa.string(), nullable=False),
+        pa.field("content", pa.large_string()),
+        # JSON, as the metadata fields can differ between chunks
+        pa.field("meta", pa.large_string()),
+    ]
+    if dim is not None:
+        fields.append(pa.field("embedding", pa.list_(pa.float32(), dim)))
+
+    metadata = {"format": SNAPSHOT_FORMAT}
+    if embedding_model is not None:
+        metadata["embedding_model"] = embedding_model
+
+    return pa.schema(fields, metadata=metadata)
+
+
+def _record_batch(documents: List[Document], schema):
+    import pyarrow as pa
+
+    columns = [
+        pa.array([doc.id for doc in documents], pa.string()),
+        pa.array([doc.content for doc in documents], pa.large_string()),
+        pa.array(
+            [json.dumps(doc.meta) for doc in documents], pa.large_string()
+        ),
+    ]
+
+    if "embedding" in schema.names:
+        dim = schema.field("embedding").type.list_size
+        if any(
+            doc.embedding is None or len(doc.embedding) != dim
+            for doc in documents
+        ):
+            raise ValueError(
+                f"Every chunk needs an embedding of size {dim} to be exported"
+            )
+        embeddings = np.asarray(
+            [doc.embedding for doc in documents], dtype=np.float32
+        )
+        columns.append(
+            pa.FixedSizeListArray.from_arrays(
+                pa.array(embeddings.ravel()), dim
+            )
+        )
+
+    return pa.RecordBatch.from_arrays(columns, schema=schema)
+
+
+def write_snapshot(
+    batches: Iterable[List[Document]],
+    path: str,
+    embedding_model: Optional[str] = None,
+) -> int:
+    """
+    Write batches of documents to a Parquet file, with a row group for each batch.
+    Embeddings are stored as a column of fixed-size lists of float32; if the first
+    document has no embedding, none are stored.
+
+    :param batches: Batches of documents, e.g. from `iter_documents()`.
+    :param path: Path of the Parquet file.
+    :param embedding_model: Name of the model the embeddings were made with, recorded
+        in the snapshot so it isn't loaded into an index for another model.
+    :return: The number of documents written.
+    """
+
+    import pyarrow.parquet as pq
+
+    written = 0
+    writer = None
+    try:
+        for documents in batches:
+            if not documents:
+                continue
+            if writer is None:
+                embedding = documents[0].embedding
+                schema = _schema(
+                    len(embedding) if embedding is not None else None,
+                    embedding_model,
+                )
+                writer = pq.ParquetWriter(path, schema)
+
+            writer.write_batch(_record_batch(documents, schema))
+            written += len(documents)
+
+        if writer is None:
+            writer = pq.ParquetWriter(path, _schema(None, embedding_model))
+    finally:
+        if writer is not None:
+            writer.close()
+
+    return written
+
+
+def read_snapshot(
+    path: str,
+    batch_size: int = SNAPSHOT_BATCH_SIZE,
+    embedding_model: Optional[str] = None,
+    embedding_dim: Optional[int] = None,
+) -> Iterator[List[Document]]:
+    """
+    Read the documents of a snapshot in batches. The snapshot is checked straight away,
+    and the batches are read as they are iterated over.
+
+    :param path: Path of the Parquet file.
+    :param batch_size: Number of documents in each batch.
+    :param embedding_model: If given, the model the snapshot's embeddings must have been
+        made with.
+    :param embedding_dim: If given, the size the snapshot's embeddings must have.
+    """
+
+    import pyarrow.parquet as pq
+
+    snapshot = pq.ParquetFile(path)
+    schema = snapshot.schema_arrow
+    metadata = {
+        key.decode(): value.decode()
+        for key, value in (schema.metadata or {}).items()
+    }
+    if metadata.get("format") != SNAPSHOT_FORMAT:
+        raise ValueError(f"{path} is not an index snapshot")
+
+    dim = None
+    if "embedding" in schema.names:
+        dim = schema.field("embedding").type.list_size
+        snapshot_model = metadata.get("embedding_model")
+        if embedding_model is not None and snapshot_model not in [
+            None,
+            embedding_model,
+        ]:
+            raise ValueError(
+                f"The snapshot has embeddings from {snapshot_model}, not {embedding_model}"
+            )
+        if embedding_dim is not None and dim != embedding_dim:
+            raise ValueError(
+                f"The snapshot has embeddings of size {dim}, not {embedding_dim}"
+            )
+
+    return _read_batches(snapshot, batch_size, dim)
+
+
+def _read_batches(snapshot, batch_size: int, dim: Optional[int]):
+    for batch in snapshot.iter_batches(batch_size=batch_size):
+        ids = batch.column("id").to_pylist()
+        contents = batch.column("content").to_pylist()
+        metas = batch.column("meta").to_pylist()
+        if dim is not None:
+            embeddings = (
+                batch.column("embedding")
+                .flatten()
+                .to_numpy()
+                .reshape(-1, dim)
+                .tolist()
+            )
+        else:
+            embeddings = [None] * len(ids)
+
+        yield [
+            Document(
+                id=doc_id,
+                content=content,
+                meta=json.loads(meta) if meta else {},
+                embedding=embedding,
+            )
+            for doc_id, content, meta, embedding in zip(
+                ids, contents, metas, embeddings
+            )
+        ]
+
+
+def load_documents(
+    document_store,
+    batches: Iterable[List[Document]],
+    policy: DuplicatePolicy = DuplicatePolicy.OVERWRITE,
+) -> int:
+    """
+    Write batches of documents to a document store. OpenSearch indexes are bulk loaded
+    with refreshes turned off, then refreshed once at the end; other document stores
+    use `write_documents()`.
+
+    :return: The number of documents written.
+    """
+
+    if not isinstance(document_store, OpenSearchDocumentStore):
+        return sum(
+            document_store.write_documents(documents, policy=policy)
+            for documents in batches
+        )
+
+    client = document_store.client
+    index = document_store._index
+    settings = client.indices.get_settings(index=index)
+    refresh_interval = settings[index]["settings"]["index"].get(
+        "refresh_interval"
+    )
+    action = "index" if policy == DuplicatePolicy.OVERWRITE else "create"
+
+    client.indices.put_settings(
+        index=index, body={"index": {"refresh_interval": "-1"}}
+    )
+    written = 0
+    try:
+        for documents in batches:
+            success, _ = bulk(
+                client,
+                (
+                    {
+                        "_op_type": action,
+                        "_id": doc.id,
+                        "_source": doc.to_dict(),
+                    }
+                    for doc in documents
+                ),
+                index=index,
+                max_chunk_bytes=document_store._max_chunk_bytes,
+                # With DuplicatePolicy.SKIP, documents already in the index are left
+                # as they are rather than raising an error
+                raise_on_error=policy != DuplicatePolicy.SKIP,
+            )
+            written += success
+    finally:
+        # Restore the index's own refresh interval (None resets it to the default)
+        client.indices.put_settings(
+            index=index,
+            body={"index": {"refresh_interval": refresh_interval}},
+        )
+        client.indices.refresh(index=index)
+
+    return written
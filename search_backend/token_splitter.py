@@ -0,0 +1,152 @@
+"""
+Split documents into chunks with a budget counted in the embedding model's tokens,
+rather than in words.
+"""
+
+from typing import List, Optional
+
+import numpy as np
+from haystack import Document, component
+from tokenizers import Tokenizer
+
+from search_backend.word_splitter import WordSplitter
+
+
+@component
+class TokenSplitter(WordSplitter):
+    """
+    A Haystack component to split documents into chunks of up to `split_length` tokens
+    of the embedding model (including the special tokens the model adds), with
+    `split_overlap` tokens shared between neighbouring chunks.
+
+    Chunks are packed as full as possible, so they aren't truncated by the model and
+    don't waste its context, but end at whitespace rather than in the middle of a word
+    where possible. Chunks are slices of the original text, with the same metadata as
+    `WordSplitter`.
+    """
+
+    def __init__(
+        self,
+        model: str,
+        split_length: int = 256,
+        split_overlap: int = 32,
+        split_threshold: int = 0,
+    ):
+        """
+        :param model: Name of the embedding model on Huggingface, whose tokenizer is
+            used to count tokens.
+        :param split_length: Maximum number of tokens in each chunk, including special
+            tokens, e.g. the model's maximum sequence length.
+        :param split_overlap: Number of tokens shared between neighbouring chunks.
+        :param split_threshold: Chunks at the end of a document with fewer tokens than
+            this are added to the previous chunk.
+        """
+
+        # The component decorator copies the class, so super() can't be used
+        WordSplitter.__init__(
+            self,
+            split_length=split_length,
+            split_overlap=split_overlap,
+            split_threshold=split_threshold,
+        )
+        self.model = model
+        self.tokenizer: Optional[Tokenizer] = None
+        self.budget = None
+
+    def warm_up(self):
+        """
+        Load the tokenizer.
+        """
+
+        if self.tokenizer is not None:
+            return
+
+        tokenizer = _load_tokenizer(self.model)
+        self.budget = self.split_length - tokenizer.num_special_tokens_to_add(
+            False
+        )
+        if self.budget <= self.split_overlap:
+            raise ValueError(
+                "split_length must leave room for more than split_overlap tokens "
+                "after the model's special tokens."
+            )
+        self.tokenizer = tokenizer
+
+    @component.output_types(documents=List[Document])
+    def run(self, documents: List[Document]):
+        """
+        Split documents into chunks (see `WordSplitter.run()`).
+        """
+
+        self.warm_up()
+
+        return WordSplitter.run(self, documents)
+
+    def count_tokens(self, texts: List[str]) -> List[int]:
+        """
+        Number of tokens the model sees for each text, including special tokens.
+        """
+
+        self.warm_up()
+        encodings = self.tokenizer.encode_batch(texts)
+
+        return [len(encoding.ids) for encoding in encodings]
+
+    def _chunk_offsets(self, text: str):
+        """
+        Generator over the chunks of a text, yielding (start, end, number of tokens)
+        tuples.
+        """
+
+        encoding = self.tokenizer.encode(text, add_special_tokens=False)
+        n_tokens = len(encoding.ids)
+        if n_tokens == 0:
+            yield 0, len(text), 0
+            return
+
+        offsets = np.asarray(encoding.offsets)
+        token_starts = offsets[:, 0]
+
+        # Tokens that start a new whitespace separated word are where chunks can be
+        # cut. For each token, find the closest cut point at or before it.
+        cuttable = np.ones(n_tokens, dtype=bool)
+        cuttable[1:] = token_starts[1:] > offsets[:-1, 1]
+        last_cut = np.maximum.accumulate(
+            np.where(cuttable, np.arange(n_tokens), 0)
+        )
+
+        first = 0
+        start = 0
+        while True:
+            last = first + self.budget
+            if last >= n_tokens:
+                yield start, len(text), n_tokens - first
+                return
+
+            # End at a word boundary, unless a single word fills the chunk
+            if last_cut[last] > first:
+                last = int(last_cut[last])
+            end = int(token_starts[last])
+            yield start, end, last - first
+
+            # Start the next chunk split_overlap tokens back, at a word boundary if
+            # that keeps the chunks moving forward
+            next_first = last - self.split_overlap
+            if next_first <= first:
+                next_first = last
+            elif last_cut[next_first] > first:
+                next_first = int(last_cut[next_first])
+            first = next_first
+            start = int(token_starts[first])
+
+
+def _load_tokenizer(model: str) -> Tokenizer:
+    """
+    Load the tokenizer of a Huggingface model, without truncation or padding.
+    """
+
+    tokenizer = Tokenizer.from_pretrained(model)
+    tokenizer.no_truncation()
+    tokenizer.no_padding()
+
+    return tokenizer
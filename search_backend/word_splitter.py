@@ -0,0 +1,227 @@
+"""
+Split documents into overlapping chunks of words, working out the chunk boundaries as
+character offsets so each chunk is a single slice of the original text.
+"""
+
+import logging
+import re
+from copy import deepcopy
+from functools import lru_cache
+from typing import List, Optional
+
+from haystack import Document, component
+
+logger = logging.getLogger(__name__)
+
+# A word followed by a space ending a sentence
+SENTENCE_ENDS = (". ", "? ", "! ")
+
+# Metadata values which don't need deep copying
+IMMUTABLE_TYPES = (str, int, float, bool, type(None))
+
+
+@lru_cache(maxsize=None)
+def _words_pattern(n_words: int) -> re.Pattern:
+    """
+    Pattern matching n_words words, each followed by a single space. Runs of spaces
+    count as empty words, as in str.split(" ").
+    """
+
+    return re.compile(r"(?:[^ ]* ){%d}" % n_words)
+
+
+def _advance(text: str, pos: int, n_words: int) -> Optional[int]:
+    """
+    Character offset of the word n_words after the word starting at pos, or None if
+    the text doesn't have that many more words.
+    """
+
+    match = _words_pattern(n_words).match(text, pos)
+
+    return match.end() if match else None
+
+
+@component
+class WordSplitter:
+    """
+    A Haystack component to split documents into chunks of `split_length` words, with
+    `split_overlap` words shared between neighbouring chunks.
+
+    Gives the same chunks and metadata as Haystack's
+    `DocumentSplitter(split_by="word")`, but instead of splitting the text into a list
+    of words and joining each window of words back together, it finds the character
+    offset of the start and end of each chunk in the text and takes one slice per
+    chunk.
+    """
+
+    def __init__(
+        self,
+        split_length: int = 200,
+        split_overlap: int = 0,
+        split_threshold: int = 0,
+        respect_sentence_boundary: bool = False,
+    ):
+        """
+        :param split_length: Maximum number of words in each chunk.
+        :param split_overlap: Number of words shared between neighbouring chunks.
+        :param split_threshold: Chunks at the end of a document with fewer words than
+            this are added to the previous chunk.
+        :param respect_sentence_boundary: End each chunk at the last sentence end
+            (".", "?" or "!" followed by a space) within its split_length words, if
+            there is one after the overlap. Overlaps are still counted in words.
+        """
+
+        if split_length <= 0:
+            raise ValueError("split_length must be greater than 0.")
+        if not 0 <= split_overlap < split_length:
+            raise ValueError(
+                "split_overlap must be at least 0 and less than split_length."
+            )
+
+        self.split_length = split_length
+        self.split_overlap = split_overlap
+        self.split_threshold = split_threshold
+        self.respect_sentence_boundary = respect_sentence_boundary
+
+    @component.output_types(documents=List[Document])
+    def run(self, documents: List[Document]):
+        """
+        Split documents into chunks. Each chunk gets the metadata of its document,
+        plus `source_id`, `page_number` (counting form feeds), `split_id` and
+        `split_idx_start` (the character offset of the chunk in the document). If
+        split_overlap > 0, `_split_overlap` records the ranges shared with the
+        neighbouring chunks.
+        """
+
+        if not isinstance(documents, list) or (
+            documents and not isinstance(documents[0], Document)
+        ):
+            raise TypeError(
+                f"{type(self).__name__} expects a List of Documents as input."
+            )
+
+        split_docs = []
+        for doc in documents:
+            if doc.content is None:
+                raise ValueError(
+                    f"{type(self).__name__} only works with text documents but content for document ID {doc.id} is None."
+                )
+            if doc.content == "":
+                logger.warning(
+                    "Document ID %s has an empty content. Skipping this document.",
+                    doc.id,
+                )
+                continue
+
+            split_docs += self._split_document(doc)
+
+        return {"documents": split_docs}
+
+    def _chunk_offsets(self, text: str):
+        """
+        Generator over the chunks of a text, yielding (start, end, number of words)
+        tuples. Chunks start every split_length - split_overlap words.
+        """
+
+        step = self.split_length - self.split_overlap
+        start = 0
+        while True:
+            end = _advance(text, start, self.split_length)
+            if end is None:
+                # Last chunk, running to the end of the text
+                yield start, len(text), text.count(" ", start) + 1
+                return
+
+            next_start = None
+            if self.respect_sentence_boundary:
+                sentence_end = max(
+                    text.rfind(sentence_end, start, end)
+                    for sentence_end in SENTENCE_ENDS
+                )
+                n_words = text.count(" ", start, sentence_end + 2)
+                # Only end at a sentence if the chunk gets past the overlap
+                if sentence_end > start and n_words > self.split_overlap:
+                    end = sentence_end + 2
+                    next_start = _advance(
+                        text, start, n_words - self.split_overlap
+                    )
+                    yield start, end, n_words
+
+            if next_start is None:
+                yield start, end, self.split_length
+                next_start = _advance(text, start, step)
+
+            start = next_start
+
+    def _split_document(self, doc: Document) -> List[Document]:
+        text = doc.content
+
+        meta = deepcopy(doc.meta)
+        meta["source_id"] = doc.id
+
+        # A shallow copy is enough to give each chunk its own metadata if none of the
+        # values can be changed in place
+        copy_meta = deepcopy
+        if all(isinstance(value, IMMUTABLE_TYPES) for value in meta.values()):
+            copy_meta = dict
+
+        splits = []
+        page_number = 1
+        page_start = 0
+        for start, end, n_words in self._chunk_offsets(text):
+            page_number += text.count("\f", page_start, start)
+            page_start = start
+
+            if n_words < self.split_threshold and splits:
+                # Add a short final chunk to the previous one
+                splits[-1][0] += text[start:end]
+            elif end > start:
+                splits.append([text[start:end], page_number, start])
+
+        split_docs = []
+        for split_id, (content, page_number, start) in enumerate(splits):
+            split_meta = copy_meta(meta)
+            split_meta["page_number"] = page_number
+            split_meta["split_id"] = split_id
+            split_meta["split_idx_start"] = start
+            split_doc = Document(content=content, meta=split_meta)
+
+            if self.split_overlap > 0:
+                split_doc.meta["_split_overlap"] = []
+                if split_docs:
+                    _add_split_overlap(
+                        split_docs[-1],
+                        splits[split_id - 1][2],
+                        split_doc,
+                        start,
+                    )
+
+            split_docs.append(split_doc)
+
+        return split_docs
+
+
+def _add_split_overlap(
+    previous_doc: Document,
+    previous_start: int,
+    current_doc: Document,
+    current_start: int,
+):
+    """
+    Record the range of text shared by neighbouring chunks in the `_split_overlap`
+    metadata of both chunks.
+    """
+
+    overlap = (current_start - previous_start, len(previous_doc.content))
+    if overlap[0] >= overlap[1]:
+        return
+
+    if current_doc.content.startswith(
+        previous_doc.content[overlap[0] : overlap[1]]
+    ):
+        current_doc.meta["_split_overlap"].append(
+            {"doc_id": previous_doc.id, "range": overlap}
+        )
+        previous_doc.meta["_split_overlap"].append(
+            {"doc_id": current_doc.id, "range": (0, overlap[1] - overlap[0])}
+        )
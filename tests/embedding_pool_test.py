@@ -0,0 +1,112 @@
+import os
+import unittest
+
+import numpy as np
+from haystack import Document
+from haystack.document_stores.in_memory import InMemoryDocumentStore
+
+from search_backend.embedding_pool import (
+    EmbeddingPool,
+    ParallelDocumentEmbedder,
+)
+from search_backend.indexing_pipeline import IndexingPipeline
+
+
+class FakeModel:
+    """
+    Embeds a text as its length, number of words and the id of the worker process.
+    """
+
+    def embed(self, texts, batch_size=None):
+        for text in texts:
+            yield np.array([len(text), len(text.split()), os.getpid()])
+
+
+def load_fake_model(model, threads):
+    return FakeModel()
+
+
+class TestEmbeddingPool(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        # Starting worker processes is slow, so the tests share a pool
+        cls.pool = EmbeddingPool(
+            "fake", workers=2, batch_size=3, load_model=load_fake_model
+        )
+        cls.pool.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.pool.close()
+
+    def setUp(self):
+        self.texts = [f"text {'word ' * ii}" for ii in range(50)]
+
+    def test_embed(self):
+        embeddings = self.pool.embed(self.texts)
+
+        self.assertEqual(self.pool.dim, 3)
+        self.assertEqual(embeddings.dtype, np.float32)
+        # Rows are in the same order as the texts, whichever worker embedded them
+        np.testing.assert_array_equal(
+            embeddings[:, :2],
+            [[len(text), len(text.split())] for text in self.texts],
+        )
+        self.assertNotIn(os.getpid(), embeddings[:, 2])
+
+        # The same workers are used for later calls
+        reversed_embeddings = self.pool.embed(self.texts[::-1])
+        np.testing.assert_array_equal(
+            reversed_embeddings[:, :2], embeddings[::-1, :2]
+        )
+        self.assertLessEqual(
+            len(set(embeddings[:, 2]) | set(reversed_embeddings[:, 2])), 2
+        )
+
+    def test_embed_empty(self):
+        self.assertEqual(self.pool.embed([]).shape, (0, 3))
+
+    def test_document_embedder(self):
+        embedder = ParallelDocumentEmbedder(
+            "fake", prefix="passage: ", meta_fields_to_embed=["title"]
+        )
+        embedder.pool = self.pool
+        docs = [
+            Document(content="one two three", meta={"title": "Numbers"}),
+            Document(content="four"),
+            Document(content="five six", meta={"title": None}),
+        ]
+        embedder.warm_up()
+        results = embedder.run(docs)["documents"]
+
+        texts = [
+            "passage: Numbers\none two three",
+            "passage: four",
+            "passage: five six",
+        ]
+        self.assertEqual(
+            [doc.content for doc in results], [doc.content for doc in docs]
+        )
+        self.assertEqual(
+            [doc.embedding[:2] for doc in results],
+            [[len(text), len(text.split())] for text in texts],
+        )
+        self.assertIsNone(docs[0].embedding)
+
+        with self.assertRaises(TypeError):
+            embedder.run(["text"])
+
+    def test_indexing_pipeline(self):
+        indexer = IndexingPipeline(
+            InMemoryDocumentStore(),
+            "fake",
+            semantic=True,
+            embedding_workers=2,
+            threads_per_worker=4,
+        )
+        embedder = indexer.indexing.get_component("dense_doc_embedder")
+
+        self.assertIsInstance(embedder, ParallelDocumentEmbedder)
+        self.assertEqual(embedder.pool.workers, 2)
+        self.assertEqual(embedder.pool.threads_per_worker, 4)
@@ -0,0 +1,138 @@
+import unittest
+
+from haystack import Document
+from mockito import unstub, when
+from tokenizers import Tokenizer, models, pre_tokenizers, processors
+
+from search_backend import token_splitter
+from search_backend.evaluation import (
+    chunking_report,
+    hnsw_report,
+    quantisation_report,
+    recall_at_k,
+    recommend_hnsw_params,
+)
+
+
+class TestEvaluation(unittest.TestCase):
+
+    def tearDown(self):
+        unstub()
+
+    def test_recall_at_k(self):
+        self.assertEqual(recall_at_k(["a", "b"], ["a", "b"], k=2), 1.0)
+        self.assertEqual(recall_at_k(["a", "b", "c"], ["c", "a"], k=2), 0.5)
+        self.assertEqual(recall_at_k([], ["a"], k=1), 0.0)
+        self.assertEqual(recall_at_k(["a"], [], k=1), 1.0)
+
+    def test_quantisation_report(self):
+        """
+        Test that each mode is reported, with the expected compression.
+        """
+
+        docs = [
+            Document(id=str(ii), content="x", embedding=[ii, 1.0, -ii] * 8)
+            for ii in range(-5, 5)
+        ]
+        queries = [[1.0, 0.5, -1.0] * 8, [-1.0, 0.5, 1.0] * 8]
+
+        report = quantisation_report(docs, queries, k=3)
+
+        self.assertEqual(
+            [row["quantisation"] for row in report],
+            ["float32", "int8", "binary"],
+        )
+        self.assertEqual(
+            [row["compression"] for row in report], [1.0, 4.0, 32.0]
+        )
+        self.assertEqual(report[0]["recall@3"], 1.0)
+        self.assertTrue(all(0 <= row["recall@3"] <= 1 for row in report))
+
+    def test_hnsw_report(self):
+        """
+        Test that each combination of parameters is reported, and the sweep finds
+        settings with full recall on a small corpus.
+        """
+
+        docs = [
+            Document(id=str(ii), content="x", embedding=[ii, 1.0, -ii] * 8)
+            for ii in range(-20, 20)
+        ]
+        queries = [[1.0, 0.5, -1.0] * 8, [-1.0, 0.5, 1.0] * 8]
+
+        report = hnsw_report(
+            docs,
+            queries,
+            k=3,
+            m_values=[4, 8],
+            ef_construction_values=[16],
+            ef_search_values=[4, 64],
+        )
+
+        self.assertEqual(
+            [(row["m"], row["ef_search"]) for row in report],
+            [(4, 4), (4, 64), (8, 4), (8, 64)],
+        )
+        self.assertEqual(report[1]["recall@3"], 1.0)
+        self.assertTrue(all(row["visited"] > 0 for row in report))
+
+        best = recommend_hnsw_params(report, 1.0, k=3)
+        self.assertEqual(best["recall@3"], 1.0)
+
+    def test_recommend_hnsw_params(self):
+        columns = [
+            "m",
+            "ef_construction",
+            "ef_search",
+            "recall@10",
+            "latency_ms",
+            "visited",
+        ]
+        rows = [
+            (8, 64, 16, 0.8, 1.0, 100),
+            (8, 64, 64, 0.96, 3.0, 300),
+            (16, 64, 32, 0.97, 2.0, 250),
+            (32, 64, 16, 0.97, 1.5, 250),
+        ]
+        report = [dict(zip(columns, row)) for row in rows]
+
+        best = recommend_hnsw_params(report, 0.95)
+        self.assertEqual((best["m"], best["ef_search"]), (16, 32))
+        best = recommend_hnsw_params(report, 0.95, cost="latency_ms")
+        self.assertEqual((best["m"], best["ef_search"]), (32, 16))
+        self.assertIsNone(recommend_hnsw_params(report, 0.99))
+
+    def test_chunking_report(self):
+        """
+        Test word and token splitting are compared, without embedding.
+        """
+
+        # One token per word, plus [CLS] and [SEP]
+        tokenizer = Tokenizer(
+            models.WordLevel({"[CLS]": 0, "[SEP]": 1, "word": 2}, "word")
+        )
+        tokenizer.pre_tokenizer = pre_tokenizers.WhitespaceSplit()
+        tokenizer.post_processor = processors.TemplateProcessing(
+            single="[CLS] $A [SEP]",
+            special_tokens=[("[CLS]", 0), ("[SEP]", 1)],
+        )
+        when(token_splitter)._load_tokenizer("model").thenReturn(tokenizer)
+
+        docs = [Document(content=" ".join(["word"] * 100))]
+
+        word, token = chunking_report(
+            docs,
+            "model",
+            word_split_length=20,
+            word_split_overlap=0,
+            token_split_length=52,
+            token_split_overlap=0,
+            embed=False,
+        )
+
+        self.assertEqual(word["chunks"], 5)
+        self.assertEqual(word["mean_tokens"], 22)
+        self.assertEqual(token["chunks"], 2)
+        self.assertEqual(token["truncated"], 0)
+        self.assertEqual(token["chunk_reduction"], 0.6)
+        self.assertNotIn("embedding_s", token)
@@ -0,0 +1,239 @@
+import time
+import unittest
+
+from haystack import Document, Pipeline
+from mockito import mock, unstub, verify, when
+
+from search_backend.federated_search import FederatedSearch
+from search_backend.fusion_joiner import FusionJoiner
+from search_backend.search import SearchUnavailableError
+
+
+class FakeRetriever:
+    """
+    Returns fixed documents after a delay, recording the queries it was run with.
+    """
+
+    def __init__(self, documents, delay=0.0, error=None):
+        self.documents = documents
+        self.delay = delay
+        self.error = error
+        self.calls = []
+
+    def run(self, **kwargs):
+        self.calls.append(kwargs)
+        time.sleep(self.delay)
+        if self.error is not None:
+            raise self.error
+        return {"documents": self.documents}
+
+
+def index_pipeline(name, scores, delay=0.0, error=None):
+    """
+    A mock pipeline whose retrievers and ranker return documents with the given scores.
+    """
+
+    documents = [
+        Document(id=f"{name}{ii}", content=f"{name} {ii}", score=score)
+        for ii, score in enumerate(scores)
+    ]
+
+    pipeline = mock(Pipeline)
+    components = {
+        "dense_text_embedder": mock(),
+        "bm25_retriever": FakeRetriever(documents, delay, error),
+        "embedding_retriever": FakeRetriever(documents, delay, error),
+        "ranker": FakeRetriever(documents),
+        "document_joiner": FusionJoiner(),
+    }
+    when(components["dense_text_embedder"]).run(text="tax").thenReturn(
+        {"embedding": [0.1, 0.2]}
+    )
+    for component_name, component in components.items():
+        when(pipeline).get_component(component_name).thenReturn(component)
+
+    return pipeline
+
+
+class TestFederatedSearch(unittest.TestCase):
+
+    def tearDown(self):
+        unstub()
+
+    def test_merges_normalised_scores(self):
+        search = FederatedSearch(
+            {
+                "finance": index_pipeline("finance", [20.0, 10.0]),
+                "hr": index_pipeline("hr", [0.9, 0.6, 0.3]),
+            }
+        )
+
+        results = search.bm25_search("Tax", top_k=4)
+
+        self.assertEqual(
+            [doc.id for doc in results], ["finance0", "hr0", "hr1", "finance1"]
+        )
+        for doc, score in zip(results, [1.0, 1.0, 0.5, 0.0]):
+            self.assertAlmostEqual(doc.score, score)
+        self.assertEqual(results[0].meta["index"], "finance")
+        self.assertEqual(results[1].meta["index"], "hr")
+
+    def test_single_result_not_scaled(self):
+        """
+        Test an index's only result keeps its score, rather than being scaled to 1 and
+        ranked with the best results of other indexes.
+        """
+
+        search = FederatedSearch(
+            {
+                "finance": index_pipeline("finance", [0.9, 0.5, 0.1]),
+                "hr": index_pipeline("hr", [0.2]),
+                "legal": index_pipeline("legal", [1.7, 1.7]),
+            }
+        )
+
+        results = search.bm25_search("Tax", top_k=5)
+
+        self.assertEqual(
+            [doc.id for doc in results],
+            ["finance0", "legal0", "legal1", "finance1", "hr0"],
+        )
+        self.assertAlmostEqual(results[-1].score, 0.2)
+
+    def test_embeds_query_once(self):
+        pipelines = {
+            "finance": index_pipeline("finance", [0.8]),
+            "hr": index_pipeline("hr", [0.7]),
+        }
+        search = FederatedSearch(pipelines)
+
+        results = search.hybrid_search("tax", top_k=5)
+
+        self.assertEqual({doc.id for doc in results}, {"finance0", "hr0"})
+        embedders = [
+            pipeline.get_component("dense_text_embedder")
+            for pipeline in pipelines.values()
+        ]
+        verify(embedders[0], times=1).run(...)
+        verify(embedders[1], times=0).run(...)
+        for pipeline in pipelines.values():
+            retriever = pipeline.get_component("embedding_retriever")
+            self.assertEqual(retriever.calls[0]["query_embedding"], [0.1, 0.2])
+
+    def test_runs_in_parallel(self):
+        search = FederatedSearch(
+            {
+                name: index_pipeline(name, [0.5], delay=0.2)
+                for name in ["finance", "hr", "legal"]
+            }
+        )
+
+        start = time.monotonic()
+        results = search.semantic_search("tax")
+
+        self.assertEqual(len(results), 3)
+        self.assertLess(time.monotonic() - start, 0.5)
+
+    def test_slow_index_left_out(self):
+        search = FederatedSearch(
+            {
+                "finance": index_pipeline("finance", [0.5]),
+                "archive": index_pipeline("archive", [0.9], delay=0.5),
+            },
+            timeout=2.0,
+            timeouts={"archive": 0.1},
+        )
+
+        start = time.monotonic()
+        with self.assertLogs(
+            "search_backend.federated_search", level="WARNING"
+        ):
+            results = search.semantic_search("tax")
+
+        self.assertLess(time.monotonic() - start, 0.4)
+        self.assertEqual([doc.id for doc in results], ["finance0"])
+
+    def test_all_indexes_slow(self):
+        """
+        Test that a search no index answers in time raises, rather than looking like
+        one with no matches.
+        """
+
+        search = FederatedSearch(
+            {
+                name: index_pipeline(name, [0.5], delay=0.3)
+                for name in ["finance", "hr"]
+            },
+            timeout=0.05,
+        )
+
+        with self.assertLogs(
+            "search_backend.federated_search", level="WARNING"
+        ):
+            with self.assertRaises(SearchUnavailableError) as context:
+                search.bm25_search("tax")
+        self.assertEqual(context.exception.degraded, ["finance", "hr"])
+
+    def test_busy_index_skipped(self):
+        """
+        Test that an index whose threads are all stuck is skipped straight away, while
+        the other indexes are still searched.
+        """
+
+        search = FederatedSearch(
+            {
+                "finance": index_pipeline("finance", [0.5]),
+                "archive": index_pipeline("archive", [0.9], delay=0.5),
+            },
+            timeout=0.05,
+            max_workers=2,
+        )
+        with self.assertLogs("search_backend.federated_search"):
+            search.bm25_search("tax")
+        archive = search.searches["archive"].pipeline.get_component(
+            "bm25_retriever"
+        )
+
+        with self.assertLogs(
+            "search_backend.federated_search", level="WARNING"
+        ) as logs:
+            results = search.bm25_search("tax")
+
+        self.assertEqual([doc.id for doc in results], ["finance0"])
+        self.assertEqual(len(archive.calls), 1)
+        self.assertIn("no free workers", logs.output[0])
+
+    def test_failed_index_left_out(self):
+        search = FederatedSearch(
+            {
+                "finance": index_pipeline("finance", [0.5]),
+                "hr": index_pipeline("hr", [0.5], error=ConnectionError()),
+            }
+        )
+
+        with self.assertLogs("search_backend.federated_search"):
+            results = search.bm25_search("tax")
+        self.assertEqual([doc.id for doc in results], ["finance0"])
+
+        search = FederatedSearch(
+            {"hr": index_pipeline("hr", [0.5], error=ConnectionError())}
+        )
+        with self.assertLogs("search_backend.federated_search"):
+            with self.assertRaises(ConnectionError):
+                search.bm25_search("tax")
+
+    def test_invalid_query(self):
+        search = FederatedSearch({"finance": index_pipeline("finance", [0.5])})
+
+        self.assertEqual(search.hybrid_search("?"), [])
+
+    def test_invalid_normalisation(self):
+        with self.assertRaises(ValueError):
+            FederatedSearch(
+                {"finance": index_pipeline("finance", [0.5])},
+                normalisation="max",
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,213 @@
+import unittest
+
+from haystack_integrations.document_stores.opensearch import (
+    OpenSearchDocumentStore,
+)
+from mockito import mock
+
+from search_backend.filtered_knn import FilteredEmbeddingRetriever
+from search_backend.retrieval_pipeline import RetrievalPipeline
+
+
+class FakeOpenSearchClient:
+    """
+    Counts documents by the value of their "area" field, and answers every search with
+    `hits_per_search` hits (or fewer if the search asks for fewer neighbours).
+    """
+
+    def __init__(self, areas, hits_per_search=None):
+        self.areas = areas
+        self.hits_per_search = hits_per_search
+        self.indices = mock()
+        self.counts = []
+        self.bodies = []
+
+    def count(self, index, body=None):
+        self.counts.append(body)
+        if body is None:
+            return {"count": sum(self.areas.values())}
+        area = body["query"]["bool"]["filter"]["bool"]["must"]["term"]["area"]
+        return {"count": self.areas.get(area, 0)}
+
+    def search(self, index, body):
+        self.bodies.append(body)
+        size = body["size"]
+        if self.hits_per_search is not None:
+            size = min(size, self.hits_per_search(body))
+        hits = [
+            {"_id": str(ii), "_score": 1.5, "_source": {"content": str(ii)}}
+            for ii in range(size)
+        ]
+        return {"hits": {"hits": hits}}
+
+
+def k_of(body: dict) -> int:
+    return body["query"]["bool"]["must"][0]["knn"]["embedding"]["k"]
+
+
+class TestFilteredEmbeddingRetriever(unittest.TestCase):
+
+    def setUp(self):
+        self.document_store = OpenSearchDocumentStore(
+            hosts="http://localhost:9200", index="document"
+        )
+        self.client = FakeOpenSearchClient(
+            {"tax": 50, "hr": 50_000, "finance": 949_950}
+        )
+        self.document_store._client = self.client
+        self.retriever = FilteredEmbeddingRetriever(self.document_store)
+
+    def filters(self, area):
+        return {"field": "area", "operator": "==", "value": area}
+
+    def test_unfiltered(self):
+        result = self.retriever.run(query_embedding=[0.1, 0.2])
+
+        self.assertEqual(result["strategy"], "unfiltered")
+        self.assertEqual(len(result["documents"]), 10)
+        self.assertEqual(self.client.counts, [])
+
+    def test_exact_for_small_subsets(self):
+        with self.assertLogs("search_backend.filtered_knn", level="INFO"):
+            result = self.retriever.run(
+                query_embedding=[0.1, 0.2], filters=self.filters("tax")
+            )
+
+        self.assertEqual(result["strategy"], "exact")
+        body = self.client.bodies[0]
+        self.assertEqual(
+            body["query"]["script_score"]["script"]["params"]["query_value"],
+            [0.1, 0.2],
+        )
+        # Mapped from 1 + cosine similarity to nmslib's 1 / (2 - cosine similarity)
+        self.assertAlmostEqual(result["documents"][0].score, 1 / 1.5)
+
+    def test_exact_scores_on_engine_scale(self):
+        document_store = OpenSearchDocumentStore(
+            hosts="http://localhost:9200",
+            index="document",
+            method={
+                "name": "hnsw",
+                "engine": "lucene",
+                "space_type": "cosinesimil",
+            },
+        )
+        document_store._client = self.client
+        retriever = FilteredEmbeddingRetriever(document_store)
+
+        result = retriever.run(
+            query_embedding=[0.1, 0.2], filters=self.filters("tax")
+        )
+
+        self.assertEqual(retriever.engine, "lucene")
+        # (1 + cosine similarity) / 2
+        self.assertEqual(result["documents"][0].score, 0.75)
+
+        retriever = FilteredEmbeddingRetriever(
+            self.document_store, space_type="l2"
+        )
+        result = retriever.run(
+            query_embedding=[0.1, 0.2], filters=self.filters("tax")
+        )
+        self.assertEqual(result["documents"][0].score, 1.5)
+
+    def test_no_matches(self):
+        result = self.retriever.run(
+            query_embedding=[0.1, 0.2], filters=self.filters("legal")
+        )
+
+        self.assertEqual(result, {"documents": [], "strategy": "exact"})
+        self.assertEqual(self.client.bodies, [])
+
+    def test_efficient_for_selective_filters(self):
+        result = self.retriever.run(
+            query_embedding=[0.1, 0.2], filters=self.filters("hr"), top_k=5
+        )
+
+        self.assertEqual(result["strategy"], "efficient")
+        knn = self.client.bodies[0]["query"]["bool"]["must"][0]["knn"]
+        self.assertIn("filter", knn["embedding"])
+        self.assertEqual(knn["embedding"]["k"], 5)
+
+    def test_post_filter_for_broad_filters(self):
+        result = self.retriever.run(
+            query_embedding=[0.1, 0.2], filters=self.filters("finance")
+        )
+
+        self.assertEqual(result["strategy"], "post_filter")
+        body = self.client.bodies[0]
+        self.assertIn("filter", body["query"]["bool"])
+        # 10 results, oversampled by 1.2, for filters matching 95% of documents
+        self.assertEqual(k_of(body), 13)
+
+    def test_post_filter_expands_k(self):
+        # Only one in a hundred neighbours passes the filters
+        self.client.hits_per_search = lambda body: k_of(body) // 100
+        retriever = FilteredEmbeddingRetriever(
+            self.document_store, efficient_filtering=False, max_k=2000
+        )
+
+        result = retriever.run(
+            query_embedding=[0.1, 0.2], filters=self.filters("hr"), top_k=10
+        )
+
+        self.assertEqual(result["strategy"], "post_filter")
+        self.assertEqual(
+            [k_of(body) for body in self.client.bodies], [240, 480, 960, 1920]
+        )
+        self.assertEqual(len(result["documents"]), 10)
+
+        # Stops at max_k
+        self.client.bodies = []
+        self.client.hits_per_search = lambda body: 0
+        result = retriever.run(
+            query_embedding=[0.1, 0.2], filters=self.filters("hr"), top_k=10
+        )
+        self.assertEqual(k_of(self.client.bodies[-1]), 2000)
+        self.assertEqual(result["documents"], [])
+
+    def test_ef_search(self):
+        retriever = FilteredEmbeddingRetriever(
+            self.document_store, ef_search=100
+        )
+
+        retriever.run(query_embedding=[0.1, 0.2])
+        retriever.run(
+            query_embedding=[0.1, 0.2],
+            filters=self.filters("hr"),
+            ef_search=200,
+        )
+
+        self.assertEqual(
+            [
+                body["query"]["bool"]["must"][0]["knn"]["embedding"][
+                    "method_parameters"
+                ]
+                for body in self.client.bodies
+            ],
+            [{"ef_search": 100}, {"ef_search": 200}],
+        )
+
+    def test_counts_cached(self):
+        for _ in range(3):
+            self.retriever.run(
+                query_embedding=[0.1, 0.2], filters=self.filters("hr")
+            )
+
+        self.assertEqual(len(self.client.counts), 2)
+
+    def test_retrieval_pipeline(self):
+        pipeline = RetrievalPipeline(
+            self.document_store, adaptive_filtering=True
+        )
+
+        self.assertIsInstance(
+            pipeline.embedding_retriever, FilteredEmbeddingRetriever
+        )
+
+        pipeline = RetrievalPipeline(self.document_store, ef_search=128)
+        self.assertEqual(pipeline.embedding_retriever.ef_search, 128)
+
+
+if __name__ == "__main__":
+    unittest.main()
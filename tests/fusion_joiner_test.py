@@ -0,0 +1,185 @@
+import unittest
+
+import numpy as np
+from haystack import Document, Pipeline
+from haystack.components.joiners import DocumentJoiner
+from haystack_integrations.document_stores.opensearch import (
+    OpenSearchDocumentStore,
+)
+from mockito import mock, unstub, verify, when
+
+from search_backend.fusion_joiner import FusionJoiner
+from search_backend.retrieval_pipeline import RetrievalPipeline
+from search_backend.search import Search
+
+
+class TestFusionJoiner(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.bm25_docs = [
+            Document(id=str(ii), content=f"bm25 {ii}", score=float(score))
+            for ii, score in enumerate(
+                sorted(rng.random(50) * 20, reverse=True)
+            )
+        ]
+        self.semantic_docs = [
+            Document(id=str(ii), content=f"semantic {ii}", score=float(score))
+            for ii, score in zip(
+                rng.permutation(80)[:20], sorted(rng.random(20), reverse=True)
+            )
+        ]
+
+    def tearDown(self):
+        unstub()
+
+    def scores(self, documents):
+        return {doc.id: doc.score for doc in documents}
+
+    def test_rrf_matches_document_joiner(self):
+        expected = DocumentJoiner(join_mode="reciprocal_rank_fusion").run(
+            [self.bm25_docs, self.semantic_docs]
+        )["documents"]
+        results = FusionJoiner().run(self.bm25_docs, self.semantic_docs)[
+            "documents"
+        ]
+
+        self.assertEqual(len(results), len(expected))
+        expected_scores = self.scores(expected)
+        for doc in results:
+            self.assertAlmostEqual(doc.score, expected_scores[doc.id])
+        self.assertEqual(
+            [doc.score for doc in results],
+            sorted((doc.score for doc in results), reverse=True),
+        )
+        # Documents in both branches are the semantic copies
+        both = {doc.id for doc in self.bm25_docs} & {
+            doc.id for doc in self.semantic_docs
+        }
+        self.assertTrue(both)
+        for doc in results:
+            if doc.id in both:
+                self.assertTrue(doc.content.startswith("semantic"))
+
+    def test_rrf_k_and_weights(self):
+        joiner = FusionJoiner(rrf_k=1)
+        results = joiner.run(
+            [Document(id="a"), Document(id="b")],
+            [Document(id="c")],
+            weights={"bm25": 3, "semantic": 1},
+        )["documents"]
+
+        self.assertEqual(
+            self.scores(results), {"a": 0.75, "b": 0.375, "c": 0.25}
+        )
+
+        # Weights only for one branch ignore the other
+        results = joiner.run(
+            self.bm25_docs, self.semantic_docs, weights={"semantic": 1}
+        )["documents"]
+        self.assertEqual(
+            [doc.id for doc in results[:20]],
+            [doc.id for doc in self.semantic_docs],
+        )
+
+    def test_convex_combination(self):
+        bm25 = [
+            Document(id="a", score=10.0),
+            Document(id="b", score=6.0),
+            Document(id="c", score=2.0),
+        ]
+        semantic = [Document(id="c", score=0.9), Document(id="d", score=0.5)]
+
+        results = FusionJoiner(join_mode="convex_combination").run(
+            bm25, semantic, weights={"bm25": 0.4, "semantic": 0.6}
+        )["documents"]
+        self.assertEqual([doc.id for doc in results], ["c", "a", "b", "d"])
+        scores = self.scores(results)
+        self.assertAlmostEqual(scores["a"], 0.4)
+        self.assertAlmostEqual(scores["b"], 0.2)
+        self.assertAlmostEqual(scores["c"], 0.6)
+        self.assertAlmostEqual(scores["d"], 0.0)
+
+        results = FusionJoiner(
+            join_mode="convex_combination", normalisation="z_score"
+        ).run(bm25, semantic)["documents"]
+        scores = self.scores(results)
+        z = np.sqrt(1.5)
+        self.assertAlmostEqual(scores["a"], 0.5 * z)
+        self.assertAlmostEqual(scores["b"], 0.0)
+        self.assertAlmostEqual(scores["c"], 0.5 * (1 - z))
+        self.assertAlmostEqual(scores["d"], -0.5)
+
+    def test_distribution_based_rank_fusion(self):
+        results = FusionJoiner().run(
+            [Document(id="a", score=3.0), Document(id="b", score=1.0)],
+            # All the same, so uninformative
+            [Document(id="b", score=0.5), Document(id="c", score=0.5)],
+            join_mode="distribution_based_rank_fusion",
+            top_k=2,
+        )["documents"]
+
+        # Mean -/+ 3 standard deviations of the BM25 scores is -1 to 5
+        self.assertEqual([doc.id for doc in results], ["a", "b"])
+        self.assertAlmostEqual(results[0].score, 0.5 * 4 / 6)
+        self.assertAlmostEqual(results[1].score, 0.5 * 2 / 6)
+
+    def test_empty_and_invalid(self):
+        joiner = FusionJoiner()
+        self.assertEqual(joiner.run([], []), {"documents": []})
+        self.assertEqual(
+            [
+                doc.id
+                for doc in joiner.run(None, self.semantic_docs)["documents"]
+            ],
+            [doc.id for doc in self.semantic_docs],
+        )
+
+        with self.assertRaises(ValueError):
+            FusionJoiner(join_mode="concatenate")
+        with self.assertRaises(ValueError):
+            FusionJoiner(normalisation="rank")
+        with self.assertRaises(ValueError):
+            joiner.run(self.bm25_docs, weights={"sparse": 1})
+        with self.assertRaises(ValueError):
+            joiner.run(self.bm25_docs, weights={"bm25": 0})
+
+    def test_hybrid_search_fusion_options(self):
+        mock_pipeline = mock(Pipeline)
+        when(mock_pipeline).add_component(...)
+        when(mock_pipeline).connect(...)
+        pipeline = RetrievalPipeline(
+            mock(OpenSearchDocumentStore),
+            "sentence-transformers/all-MiniLM-L6-v2",
+            "cross-encoder/ms-marco-MiniLM-L-2-v2",
+            retrieval=mock_pipeline,
+        ).setup_hybrid_pipeline()
+        when(mock_pipeline).run(...).thenReturn(
+            {"document_joiner": {"documents": []}}
+        )
+
+        Search(pipeline).hybrid_search(
+            "lighthouse",
+            join_mode="convex_combination",
+            weights={"bm25": 0.2, "semantic": 0.8},
+            top_k=5,
+        )
+
+        verify(mock_pipeline).run(
+            {
+                "dense_text_embedder": {"text": "lighthouse"},
+                "bm25_retriever": {
+                    "query": "lighthouse",
+                    "filters": None,
+                    "top_k": 10,
+                },
+                "embedding_retriever": {"filters": None, "top_k": 10},
+                "ranker": {"query": "lighthouse", "top_k": 10},
+                "semantic_threshold": {"score_threshold": 0.0},
+                "document_joiner": {
+                    "join_mode": "convex_combination",
+                    "weights": {"bm25": 0.2, "semantic": 0.8},
+                    "top_k": 5,
+                },
+            }
+        )
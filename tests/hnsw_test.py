@@ -0,0 +1,126 @@
+import unittest
+
+import numpy as np
+from haystack import Document
+
+from search_backend.evaluation import recall_at_k
+from search_backend.hnsw import (
+    LocalHNSWIndex,
+    hnsw_index_options,
+    knn_clause,
+)
+from search_backend.local_embedding_retriever import LocalEmbeddingIndex
+
+
+class TestHNSWOptions(unittest.TestCase):
+
+    def test_hnsw_index_options(self):
+        method, settings = hnsw_index_options(
+            "lucene", m=32, ef_construction=256, ef_search=100
+        )
+        self.assertEqual(
+            method,
+            {
+                "name": "hnsw",
+                "engine": "lucene",
+                "space_type": "cosinesimil",
+                "parameters": {"m": 32, "ef_construction": 256},
+            },
+        )
+        self.assertEqual(settings, {"index.knn": True})
+
+        method, settings = hnsw_index_options("faiss", ef_search=100)
+        self.assertEqual(method["parameters"], {"ef_search": 100})
+
+        method, settings = hnsw_index_options("nmslib", ef_search=100)
+        self.assertEqual(method["parameters"], {})
+        self.assertEqual(settings["index.knn.algo_param.ef_search"], 100)
+
+        with self.assertRaises(ValueError):
+            hnsw_index_options("annoy")
+
+    def test_knn_clause(self):
+        self.assertEqual(
+            knn_clause([0.1], 5),
+            {"knn": {"embedding": {"vector": [0.1], "k": 5}}},
+        )
+        self.assertEqual(
+            knn_clause([0.1], 5, {"term": {"area": "hr"}}, ef_search=64),
+            {
+                "knn": {
+                    "embedding": {
+                        "vector": [0.1],
+                        "k": 5,
+                        "filter": {"term": {"area": "hr"}},
+                        "method_parameters": {"ef_search": 64},
+                    }
+                }
+            },
+        )
+
+
+class TestLocalHNSWIndex(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        rng = np.random.default_rng(0)
+        cls.docs = [
+            Document(id=str(ii), content="x", embedding=embedding.tolist())
+            for ii, embedding in enumerate(rng.normal(size=(500, 16)))
+        ]
+        cls.docs.append(Document(id="none", content="no embedding"))
+        cls.queries = rng.normal(size=(20, 16)).tolist()
+        cls.exact = LocalEmbeddingIndex.from_documents(cls.docs)
+
+    def recall(self, index, ef_search):
+        recalls = [
+            recall_at_k(
+                [doc.id for doc in index.search(query, 10, ef_search)],
+                [doc.id for doc in self.exact.search(query, 10)],
+                10,
+            )
+            for query in self.queries
+        ]
+        return np.mean(recalls)
+
+    def test_search(self):
+        index = LocalHNSWIndex.from_documents(
+            self.docs, m=16, ef_construction=100
+        )
+
+        self.assertEqual(len(index), 500)
+        results = index.search(self.queries[0], top_k=5, ef_search=200)
+        expected = self.exact.search(self.queries[0], top_k=5)
+        self.assertEqual(
+            [doc.id for doc in results], [doc.id for doc in expected]
+        )
+        np.testing.assert_allclose(
+            [doc.score for doc in results],
+            [doc.score for doc in expected],
+            rtol=1e-5,
+        )
+        self.assertIsNone(results[0].embedding)
+
+    def test_recall_grows_with_ef_search(self):
+        index = LocalHNSWIndex.from_documents(
+            self.docs, m=4, ef_construction=16
+        )
+
+        index.visited = 0
+        low = self.recall(index, ef_search=10)
+        low_visited = index.visited
+        index.visited = 0
+        high = self.recall(index, ef_search=200)
+
+        self.assertLess(low, high)
+        self.assertGreater(high, 0.9)
+        self.assertLess(low_visited, index.visited)
+
+    def test_empty(self):
+        index = LocalHNSWIndex.from_documents([])
+
+        self.assertEqual(index.search([1.0, 0.0], top_k=5), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
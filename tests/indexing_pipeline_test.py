@@ -1,18 +1,22 @@
 import unittest
 
 from haystack import Pipeline, Document
-from haystack.components.preprocessors import DocumentSplitter
 from haystack.components.writers import DocumentWriter
+from haystack.document_stores.in_memory import InMemoryDocumentStore
 from haystack_integrations.components.embedders.fastembed import (
     FastembedDocumentEmbedder,
 )
 from haystack_integrations.document_stores.opensearch import (
     OpenSearchDocumentStore,
 )
-from mockito import mock, when, verify, any
+from mockito import mock, when, verify, any, unstub
 from mockito.matchers import captor
 
+from search_backend import indexing_pipeline
 from search_backend.indexing_pipeline import IndexingPipeline
+from search_backend.near_duplicate_filter import NearDuplicateFilter
+from search_backend.token_splitter import TokenSplitter
+from search_backend.word_splitter import WordSplitter
 
 
 class TestIndexingPipeline(unittest.TestCase):
@@ -23,6 +27,9 @@ class TestIndexingPipeline(unittest.TestCase):
         when(self.mock_pipeline).add_component(any(), any())
         when(self.mock_pipeline).connect(any(), any())
 
+    def tearDown(self):
+        unstub()
+
     def test_init_with_semantic_search(self):
         IndexingPipeline(
             self.mock_document_store,
@@ -32,7 +39,7 @@ class TestIndexingPipeline(unittest.TestCase):
         )
 
         verify(self.mock_pipeline).add_component(
-            "document_splitter", any(DocumentSplitter)
+            "document_splitter", any(WordSplitter)
         )
         verify(self.mock_pipeline).add_component(
             "document_writer", any(DocumentWriter)
@@ -55,7 +62,7 @@ class TestIndexingPipeline(unittest.TestCase):
         )
 
         verify(self.mock_pipeline).add_component(
-            "document_splitter", any(DocumentSplitter)
+            "document_splitter", any(WordSplitter)
         )
         verify(self.mock_pipeline).add_component(
             "document_writer", any(DocumentWriter)
@@ -64,6 +71,114 @@ class TestIndexingPipeline(unittest.TestCase):
             "document_splitter", "document_writer"
         )
 
+    def test_init_with_token_splitting(self):
+        IndexingPipeline(
+            self.mock_document_store,
+            "dense_model",
+            semantic=True,
+            indexing=self.mock_pipeline,
+            split_by="token",
+            split_length=256,
+            split_overlap=32,
+        )
+
+        verify(self.mock_pipeline).add_component(
+            "document_splitter", any(TokenSplitter)
+        )
+
+        with self.assertRaises(ValueError):
+            IndexingPipeline(
+                self.mock_document_store,
+                "dense_model",
+                indexing=self.mock_pipeline,
+                split_by="sentence",
+            )
+        with self.assertRaises(ValueError):
+            IndexingPipeline(
+                self.mock_document_store,
+                indexing=self.mock_pipeline,
+                split_by="token",
+            )
+
+    def test_init_with_dedup(self):
+        IndexingPipeline(
+            self.mock_document_store,
+            "dense_model",
+            semantic=True,
+            indexing=self.mock_pipeline,
+            dedup_threshold=0.9,
+        )
+
+        verify(self.mock_pipeline).add_component(
+            "near_duplicate_filter", any(NearDuplicateFilter)
+        )
+        verify(self.mock_pipeline).connect(
+            "document_splitter", "near_duplicate_filter"
+        )
+        verify(self.mock_pipeline).connect(
+            "near_duplicate_filter.documents", "dense_doc_embedder"
+        )
+
+    def test_index_docs_with_dedup(self):
+        """
+        Test near-duplicate chunks aren't written to the document store.
+        """
+
+        document_store = InMemoryDocumentStore()
+        pipeline = IndexingPipeline(
+            document_store,
+            split_length=5,
+            split_overlap=0,
+            dedup_threshold=0.9,
+        )
+        text = "the tower was very tall. "
+        docs = [
+            Document(content=text * 2, meta={"title": "a"}),
+            Document(content=text, meta={"title": "b"}),
+        ]
+
+        result = pipeline.index_docs(docs)
+
+        # Only the repeated chunk of the first document is dropped
+        self.assertEqual(document_store.count_documents(), 2)
+        self.assertEqual(len(result["near_duplicate_filter"]["duplicates"]), 1)
+
+        # Deleting the first document leaves the second document's copy of the text
+        pipeline.delete_docs(["a"], "title")
+        remaining = document_store.filter_documents()
+        self.assertEqual([doc.meta["title"] for doc in remaining], ["b"])
+        self.assertEqual(remaining[0].content, text)
+
+    def test_index_docs_with_cross_source_dedup(self):
+        """
+        Test chunks duplicating another document's are dropped when deduplicating across
+        documents.
+        """
+
+        document_store = InMemoryDocumentStore()
+        pipeline = IndexingPipeline(
+            document_store,
+            split_length=5,
+            split_overlap=0,
+            dedup_threshold=0.9,
+            merge_duplicates=True,
+            cross_source_dedup=True,
+        )
+        text = "the tower was very tall. "
+        docs = [
+            Document(content=text * 2, meta={"title": "a"}),
+            Document(content=text, meta={"title": "b"}),
+        ]
+
+        result = pipeline.index_docs(docs)
+
+        self.assertEqual(document_store.count_documents(), 1)
+        self.assertEqual(len(result["near_duplicate_filter"]["duplicates"]), 2)
+        kept = document_store.filter_documents()[0]
+        self.assertEqual(
+            kept.meta["duplicate_source_ids"], [docs[0].id, docs[1].id]
+        )
+
     def test_index_docs_method(self):
         pipeline = IndexingPipeline(
             self.mock_document_store,
@@ -86,7 +201,106 @@ class TestIndexingPipeline(unittest.TestCase):
         )
 
     def test_delete_docs_method(self):
+        """
+        Test documents are deleted on the server, in batches of ids.
+        """
+
+        mock_client = mock()
+        self.mock_document_store.client = mock_client
+        self.mock_document_store._index = "document"
+        pipeline = IndexingPipeline(self.mock_document_store, "dense_model")
+
+        def query(ids):
+            terms = {"bool": {"must": {"terms": {"custom_id": ids}}}}
+            return {"query": {"bool": {"filter": terms}}}
+
+        when(mock_client).delete_by_query(
+            index="document",
+            body=query(["1", "2"]),
+            slices="auto",
+            conflicts="proceed",
+            refresh=True,
+            wait_for_completion=False,
+        ).thenReturn({"task": "node:1"})
+        when(mock_client).delete_by_query(
+            index="document",
+            body=query(["3"]),
+            slices="auto",
+            conflicts="proceed",
+            refresh=True,
+            wait_for_completion=False,
+        ).thenReturn({"task": "node:2"})
+        mock_client.tasks = mock()
+        when(mock_client.tasks).get(task_id="node:1").thenReturn(
+            {"completed": True, "response": {"deleted": 5, "failures": []}}
+        )
+        when(mock_client.tasks).get(task_id="node:2").thenReturn(
+            {"completed": True, "response": {"deleted": 2, "failures": []}}
+        )
+
+        deleted = pipeline.delete_docs(
+            ["1", "2", "3"], "custom_id", batch_size=2
+        )
+
+        self.assertEqual(deleted, 7)
+        verify(self.mock_document_store, times=0).filter_documents(...)
+
+    def test_delete_docs_throttled(self):
+        mock_client = mock()
+        self.mock_document_store.client = mock_client
+        self.mock_document_store._index = "document"
+        pipeline = IndexingPipeline(self.mock_document_store, "dense_model")
+
+        when(mock_client).delete_by_query(...).thenReturn({"task": "node:1"})
+        mock_client.tasks = mock()
+        when(mock_client.tasks).get(task_id="node:1").thenReturn(
+            {"completed": False}
+        ).thenReturn({"completed": True, "response": {"deleted": 1}})
+        when(indexing_pipeline.time).sleep(...)
+
+        deleted = pipeline.delete_docs(
+            ["1"], "custom_id", requests_per_second=100
+        )
+
+        self.assertEqual(deleted, 1)
+        verify(mock_client).delete_by_query(
+            index="document",
+            body=any(dict),
+            slices="auto",
+            conflicts="proceed",
+            refresh=True,
+            wait_for_completion=False,
+            requests_per_second=100,
+        )
+        verify(indexing_pipeline.time, times=1).sleep(
+            indexing_pipeline.DELETE_POLL_INTERVAL
+        )
+
+    def test_delete_docs_task_failed(self):
+        mock_client = mock()
+        self.mock_document_store.client = mock_client
+        self.mock_document_store._index = "document"
         pipeline = IndexingPipeline(self.mock_document_store, "dense_model")
+
+        when(mock_client).delete_by_query(...).thenReturn({"task": "node:1"})
+        mock_client.tasks = mock()
+        when(mock_client.tasks).get(task_id="node:1").thenReturn(
+            {
+                "completed": True,
+                "response": {"deleted": 0, "failures": [{"status": 429}]},
+            }
+        )
+
+        with self.assertRaises(RuntimeError):
+            pipeline.delete_docs(["1"], "custom_id")
+
+    def test_delete_docs_other_document_store(self):
+        """
+        Test document stores other than OpenSearch filter then delete documents.
+        """
+
+        mock_document_store = mock(InMemoryDocumentStore)
+        pipeline = IndexingPipeline(mock_document_store, "dense_model")
         doc_ids = ["1", "2"]
         id_metafield = "custom_id"
 
@@ -98,7 +312,7 @@ class TestIndexingPipeline(unittest.TestCase):
 
         mock_results = [mock_doc1, mock_doc2]
 
-        when(self.mock_document_store).filter_documents(
+        when(mock_document_store).filter_documents(
             filters={
                 "field": f"meta.{id_metafield}",
                 "operator": "in",
@@ -107,10 +321,11 @@ class TestIndexingPipeline(unittest.TestCase):
         ).thenReturn(mock_results)
 
         capture = captor()
-        when(self.mock_document_store).delete_documents(capture)
+        when(mock_document_store).delete_documents(capture)
 
-        pipeline.delete_docs(doc_ids, id_metafield)
+        deleted = pipeline.delete_docs(doc_ids, id_metafield)
 
         # because the values returned by the document store are a set, the sort
         # order is not guaranteed, so we sort before doing the assertion
         self.assertEqual(sorted(doc_ids), sorted(capture.value))
+        self.assertEqual(deleted, 2)
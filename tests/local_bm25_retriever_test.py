@@ -0,0 +1,152 @@
+import tempfile
+import unittest
+
+import numpy as np
+from haystack import Document
+
+from search_backend.local_bm25_retriever import (
+    LocalBM25Index,
+    LocalBM25Retriever,
+    auto_fuzziness,
+    tokenise,
+)
+
+
+class TestLocalBM25Retriever(unittest.TestCase):
+
+    def setUp(self):
+        self.docs = [
+            Document(
+                id="a",
+                content="The lighthouse stood on the island.",
+                meta={"type": "article"},
+            ),
+            Document(
+                id="b",
+                content="A hanging garden full of plants and flowers.",
+                meta={"type": "article"},
+            ),
+            Document(
+                id="c",
+                content="The garden by the lighthouse, the garden by the sea.",
+                meta={"type": "report"},
+            ),
+            Document(id="d", content="A statue of a god in a temple."),
+        ]
+        self.index = LocalBM25Index.from_documents(self.docs)
+
+    def exhaustive_scores(self, query, fuzziness=0):
+        """
+        Score every document without any pruning, to compare against.
+        """
+
+        scores = np.zeros(len(self.index), dtype=np.float32)
+        for term_id, weight in self.index.query_terms(
+            query, fuzziness
+        ).items():
+            start = self.index.offsets[term_id]
+            end = self.index.offsets[term_id + 1]
+            scores[self.index.postings[start:end]] += (
+                weight * self.index.impacts[start:end]
+            )
+
+        return scores
+
+    def test_tokenise(self):
+        self.assertEqual(
+            tokenise("The Lighthouse's light, 2024!"),
+            ["the", "lighthouse", "s", "light", "2024"],
+        )
+
+    def test_auto_fuzziness(self):
+        self.assertEqual(auto_fuzziness("to"), 0)
+        self.assertEqual(auto_fuzziness("plant"), 1)
+        self.assertEqual(auto_fuzziness("lighthouse"), 2)
+
+    def test_search_ranking(self):
+        """
+        Test that only matching documents are returned, in order of BM25 score.
+        """
+
+        results = self.index.search("garden", fuzziness=0)
+
+        self.assertEqual([doc.id for doc in results], ["c", "b"])
+        self.assertGreater(results[0].score, results[1].score)
+
+    def test_search_matches_exhaustive_scoring(self):
+        """
+        Test that MaxScore pruning doesn't change the top k results.
+        """
+
+        query = "the lighthouse garden by the sea"
+        scores = self.exhaustive_scores(query)
+
+        results = self.index.search(query, top_k=2, fuzziness=0)
+        expected = np.argsort(-scores, kind="stable")[:2]
+
+        self.assertEqual(
+            [doc.id for doc in results],
+            [self.docs[idx].id for idx in expected],
+        )
+        np.testing.assert_allclose(
+            [doc.score for doc in results], scores[expected], rtol=1e-6
+        )
+
+    def test_fuzzy_search(self):
+        """
+        Test that misspelt terms match with fuzziness, scored below an exact match.
+        """
+
+        self.assertEqual(self.index.search("lihgthouse", fuzziness=0), [])
+
+        results = self.index.search("lihgthouse", fuzziness="AUTO")
+        self.assertEqual({doc.id for doc in results}, {"a", "c"})
+
+        exact = self.index.search("lighthouse", fuzziness="AUTO")
+        self.assertGreater(exact[0].score, results[0].score)
+
+        # Short terms don't get any fuzziness with AUTO
+        self.assertEqual(self.index.search("se", fuzziness="AUTO"), [])
+
+    def test_search_with_filters(self):
+        filters = {"field": "meta.type", "operator": "==", "value": "article"}
+
+        results = self.index.search("garden", filters=filters)
+
+        self.assertEqual([doc.id for doc in results], ["b"])
+
+    def test_scale_score(self):
+        results = self.index.search("garden", scale_score=True)
+
+        self.assertTrue(all(0.5 < doc.score < 1 for doc in results))
+
+    def test_save_and_load(self):
+        """
+        Test that an index reloaded from disk as a memory map gives the same results.
+        """
+
+        with tempfile.TemporaryDirectory() as path:
+            self.index.save(path)
+            loaded = LocalBM25Index.load(path)
+
+            self.assertIsInstance(loaded.postings, np.memmap)
+
+            query = "garden lighthouse"
+            self.assertEqual(
+                [(doc.id, doc.score) for doc in loaded.search(query)],
+                [(doc.id, doc.score) for doc in self.index.search(query)],
+            )
+
+    def test_retriever_component(self):
+        retriever = LocalBM25Retriever(self.index, top_k=1)
+
+        results = retriever.run(query="garden")
+        self.assertEqual([doc.id for doc in results["documents"]], ["c"])
+
+        results = retriever.run(query="garden", top_k=5)
+        self.assertEqual(len(results["documents"]), 2)
+
+    def test_empty_index(self):
+        index = LocalBM25Index.from_documents([])
+
+        self.assertEqual(index.search("garden"), [])
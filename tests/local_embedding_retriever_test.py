@@ -0,0 +1,189 @@
+import tempfile
+import unittest
+
+import numpy as np
+from haystack import Document
+from haystack_integrations.document_stores.opensearch import (
+    OpenSearchDocumentStore,
+)
+from mockito import mock, when
+
+from search_backend.local_embedding_retriever import (
+    LocalEmbeddingIndex,
+    LocalEmbeddingRetriever,
+)
+
+
+class TestLocalEmbeddingRetriever(unittest.TestCase):
+
+    def setUp(self):
+        self.docs = [
+            Document(
+                id="a",
+                content="lighthouse",
+                meta={"type": "article"},
+                embedding=[1.0, 0.0, 0.0],
+            ),
+            Document(
+                id="b",
+                content="garden",
+                meta={"type": "article"},
+                embedding=[0.0, 2.0, 0.0],
+            ),
+            Document(
+                id="c",
+                content="greenhouse",
+                meta={"type": "report"},
+                embedding=[0.6, 0.8, 0.0],
+            ),
+            Document(id="d", content="no embedding"),
+        ]
+        self.index = LocalEmbeddingIndex.from_documents(self.docs)
+
+    def test_from_documents(self):
+        """
+        Test that documents without embeddings are skipped and rows are normalised.
+        """
+
+        self.assertEqual(len(self.index), 3)
+        self.assertEqual(self.index.embeddings.dtype, np.float32)
+        np.testing.assert_allclose(
+            np.linalg.norm(self.index.embeddings, axis=1), 1, rtol=1e-6
+        )
+
+    def test_search_order_and_top_k(self):
+        """
+        Test that results are sorted by similarity and limited to top_k.
+        """
+
+        results = self.index.search([0.0, 1.0, 0.0], top_k=2)
+
+        self.assertEqual([doc.id for doc in results], ["b", "c"])
+        self.assertAlmostEqual(results[0].score, 1.0, places=6)
+        self.assertAlmostEqual(results[1].score, 0.8, places=6)
+        self.assertIsNone(results[0].embedding)
+
+    def test_search_with_filters(self):
+        """
+        Test that metadata filters restrict the candidates before the top_k cut.
+        """
+
+        filters = {"field": "meta.type", "operator": "==", "value": "report"}
+        results = self.index.search([0.0, 1.0, 0.0], top_k=1, filters=filters)
+
+        self.assertEqual([doc.id for doc in results], ["c"])
+
+        filters = {"field": "meta.type", "operator": "==", "value": "missing"}
+        results = self.index.search([0.0, 1.0, 0.0], filters=filters)
+
+        self.assertEqual(results, [])
+
+    def test_scale_score(self):
+        """
+        Test that cosine scores are scaled to the range 0 to 1.
+        """
+
+        results = self.index.search([-1.0, 0.0, 0.0], scale_score=True)
+
+        self.assertAlmostEqual(results[-1].score, 0.0, places=6)
+        self.assertTrue(all(0 <= doc.score <= 1 for doc in results))
+
+    def test_save_and_load(self):
+        """
+        Test that an index reloaded from disk as a memory map gives the same results.
+        """
+
+        with tempfile.TemporaryDirectory() as path:
+            self.index.save(path)
+            loaded = LocalEmbeddingIndex.load(path)
+
+            self.assertIsInstance(loaded.embeddings, np.memmap)
+
+            expected = self.index.search([0.5, 0.5, 0.0])
+            results = loaded.search([0.5, 0.5, 0.0])
+
+            self.assertEqual(
+                [(doc.id, doc.meta) for doc in results],
+                [(doc.id, doc.meta) for doc in expected],
+            )
+
+    def test_from_document_store(self):
+        """
+        Test building the index from documents fetched from the document store.
+        """
+
+        mock_document_store = mock(OpenSearchDocumentStore)
+        when(mock_document_store).filter_documents(filters=None).thenReturn(
+            self.docs
+        )
+
+        index = LocalEmbeddingIndex.from_document_store(mock_document_store)
+
+        self.assertEqual(len(index), 3)
+
+    def test_retriever_component(self):
+        """
+        Test the Haystack component wrapping the index.
+        """
+
+        retriever = LocalEmbeddingRetriever(self.index, top_k=1)
+
+        results = retriever.run(query_embedding=[1.0, 0.0, 0.0])
+
+        self.assertEqual([doc.id for doc in results["documents"]], ["a"])
+
+        results = retriever.run(query_embedding=[1.0, 0.0, 0.0], top_k=3)
+
+        self.assertEqual(len(results["documents"]), 3)
+
+    def test_quantised_search(self):
+        """
+        Test that quantised indexes rescore candidates with full precision embeddings.
+        """
+
+        expected = self.index.search([0.5, 0.5, 0.1])
+
+        for quantisation, dtype in [("int8", np.int8), ("binary", np.uint8)]:
+            index = LocalEmbeddingIndex.from_documents(
+                self.docs, quantisation=quantisation
+            )
+            self.assertEqual(index.codes.dtype, dtype)
+            self.assertLess(index.search_nbytes, self.index.search_nbytes)
+
+            results = index.search([0.5, 0.5, 0.1])
+
+            self.assertEqual(
+                [(doc.id, doc.score) for doc in results],
+                [(doc.id, doc.score) for doc in expected],
+            )
+
+    def test_save_and_load_quantised(self):
+        """
+        Test that the codes are saved, and the full precision embeddings memory-mapped.
+        """
+
+        index = LocalEmbeddingIndex.from_documents(
+            self.docs, quantisation="binary", rescore_multiplier=2
+        )
+
+        with tempfile.TemporaryDirectory() as path:
+            index.save(path)
+            loaded = LocalEmbeddingIndex.load(path, mmap=False)
+
+            self.assertEqual(loaded.quantisation, "binary")
+            self.assertEqual(loaded.rescore_multiplier, 2)
+            self.assertIsInstance(loaded.embeddings, np.memmap)
+            self.assertNotIsInstance(loaded.codes, np.memmap)
+            np.testing.assert_array_equal(loaded.codes, index.codes)
+
+    def test_invalid_similarity(self):
+        """
+        Test that an error is raised for an unsupported similarity function.
+        """
+
+        with self.assertRaises(ValueError):
+            LocalEmbeddingIndex.from_documents(self.docs, similarity="l2")
+
+    def test_invalid_quantisation(self):
+        with self.assertRaises(ValueError):
+            LocalEmbeddingIndex.from_documents(self.docs, quantisation="int4")
@@ -0,0 +1,227 @@
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+from haystack import Document
+from haystack.components.rankers import TransformersSimilarityRanker
+from haystack_integrations.components.embedders.fastembed import (
+    FastembedTextEmbedder,
+)
+from haystack_integrations.document_stores.opensearch import (
+    OpenSearchDocumentStore,
+)
+from mockito import mock, unstub, when
+
+from search_backend.micro_batcher import (
+    BatchedRanker,
+    BatchedTextEmbedder,
+    MicroBatcher,
+)
+from search_backend.retrieval_pipeline import RetrievalPipeline
+
+
+class TestMicroBatcher(unittest.TestCase):
+
+    def setUp(self):
+        self.batches = []
+
+    def process_batch(self, items):
+        self.batches.append(items)
+        # Give other callers time to queue up
+        time.sleep(0.02)
+        if "error" in items:
+            raise ValueError("bad item")
+        return [item * 2 for item in items]
+
+    def test_single_caller_doesnt_wait(self):
+        batcher = MicroBatcher(self.process_batch, max_wait=10)
+
+        start = time.monotonic()
+        results = [batcher.submit(ii) for ii in range(3)]
+
+        self.assertEqual(results, [0, 2, 4])
+        self.assertEqual(self.batches, [[0], [1], [2]])
+        self.assertLess(time.monotonic() - start, 1)
+
+    def test_concurrent_callers(self):
+        batcher = MicroBatcher(self.process_batch, max_batch=4, max_wait=1)
+
+        with ThreadPoolExecutor(10) as executor:
+            results = list(executor.map(batcher.submit, range(10)))
+
+        # Each caller gets its own result
+        self.assertEqual(results, [ii * 2 for ii in range(10)])
+        self.assertEqual(
+            sorted(item for batch in self.batches for item in batch),
+            list(range(10)),
+        )
+        self.assertTrue(all(len(batch) <= 4 for batch in self.batches))
+        self.assertLess(len(self.batches), 10)
+
+    def test_max_wait(self):
+        batcher = MicroBatcher(self.process_batch, max_batch=4, max_wait=0)
+
+        with ThreadPoolExecutor(4) as executor:
+            results = list(executor.map(batcher.submit, range(4)))
+
+        self.assertEqual(results, [0, 2, 4, 6])
+        self.assertTrue(all(len(batch) <= 4 for batch in self.batches))
+
+    def test_errors(self):
+        batcher = MicroBatcher(self.process_batch, max_wait=1)
+        # Hold up the batcher so the next items are batched together
+        blocker = threading.Thread(target=batcher.submit, args=("a",))
+        blocker.start()
+        time.sleep(0.005)
+
+        with ThreadPoolExecutor(2) as executor:
+            futures = [
+                executor.submit(batcher.submit, item)
+                for item in ["error", "b"]
+            ]
+            blocker.join()
+            for future in futures:
+                with self.assertRaises(ValueError):
+                    future.result()
+
+        # The batcher keeps going after an error
+        self.assertEqual(batcher.submit("c"), "cc")
+
+    def test_max_batch(self):
+        with self.assertRaises(ValueError):
+            MicroBatcher(self.process_batch, max_batch=0)
+
+    def test_timeout(self):
+        batcher = MicroBatcher(self.process_batch)
+
+        with self.assertRaises(TimeoutError):
+            batcher.submit(1, timeout=0.001)
+        self.assertEqual(batcher.submit(2, timeout=1), 4)
+
+
+class TestBatchedComponents(unittest.TestCase):
+
+    def tearDown(self):
+        unstub()
+
+    def test_batched_text_embedder(self):
+        embedder = BatchedTextEmbedder("model", prefix="query: ")
+        backend = mock()
+        embedder.embedder.embedding_backend = backend
+        when(backend).embed(
+            ["query: one", "query: two"], progress_bar=False, batch_size=2
+        ).thenReturn([[1.0], [2.0]])
+
+        self.assertEqual(embedder._embed(["one", "two"]), [[1.0], [2.0]])
+
+        when(backend).embed(
+            ["query: one"], progress_bar=False, batch_size=1
+        ).thenReturn([[1.0]])
+        self.assertEqual(embedder.run(text="one"), {"embedding": [1.0]})
+
+        with self.assertRaises(TypeError):
+            embedder.run(text=["one"])
+
+    def test_batched_ranker(self):
+        ranker = BatchedRanker(
+            "model", top_k=2, meta_fields_to_embed=["title"]
+        )
+        when(ranker.ranker).warm_up()
+        docs = [
+            Document(id="1", content="one", meta={"title": "A"}, score=0.1),
+            Document(id="2", content="two", score=0.2),
+            Document(id="3", content="three", score=0.3),
+            Document(id="1", content="one", meta={"title": "A"}, score=0.5),
+        ]
+        when(ranker)._score(
+            [
+                ["a", "A\none"],
+                ["a", "two"],
+                ["a", "three"],
+                ["b", "two"],
+            ]
+        ).thenReturn([-1.0, 2.0, 0.0, 1000.0])
+
+        results = ranker._rank(
+            [
+                {
+                    "query": "a",
+                    "documents": docs[:3],
+                    "top_k": 2,
+                    "scale_score": False,
+                    "calibration_factor": 1.0,
+                    "score_threshold": None,
+                },
+                {
+                    "query": "b",
+                    "documents": docs[1:2],
+                    "top_k": 2,
+                    "scale_score": True,
+                    "calibration_factor": 1.0,
+                    "score_threshold": None,
+                },
+            ]
+        )
+
+        self.assertEqual([doc.id for doc in results[0]], ["2", "3"])
+        self.assertEqual([doc.score for doc in results[0]], [2.0, 0.0])
+        self.assertEqual([doc.score for doc in results[1]], [1.0])
+
+        # Duplicates are removed, keeping the highest scoring copy
+        when(ranker)._score([["a", "A\none"], ["a", "two"]]).thenReturn(
+            [-800.0, 0.0]
+        )
+        results = ranker.run(query="a", documents=[docs[3], docs[1], docs[0]])
+        self.assertEqual([doc.id for doc in results["documents"]], ["2", "1"])
+        self.assertEqual(results["documents"][0].score, 0.5)
+        self.assertEqual(results["documents"][1].meta, {"title": "A"})
+
+        self.assertEqual(
+            ranker.run(query="a", documents=[]), {"documents": []}
+        )
+
+    def test_retrieval_pipeline(self):
+        retrieval = RetrievalPipeline(
+            mock(OpenSearchDocumentStore),
+            "sentence-transformers/all-MiniLM-L6-v2",
+            "cross-encoder/ms-marco-MiniLM-L-2-v2",
+            micro_batching=True,
+            max_batch=16,
+            max_wait=0.01,
+        )
+        pipeline = retrieval.setup_semantic_pipeline()
+
+        embedder = pipeline.get_component("dense_text_embedder")
+        ranker = pipeline.get_component("ranker")
+        self.assertIsInstance(embedder, BatchedTextEmbedder)
+        self.assertIsInstance(ranker, BatchedRanker)
+        self.assertEqual(ranker.batcher.max_batch, 16)
+        self.assertEqual(embedder.batcher.max_wait, 0.01)
+
+        ranker = (
+            RetrievalPipeline(
+                mock(OpenSearchDocumentStore),
+                "sentence-transformers/all-MiniLM-L6-v2",
+                "cross-encoder/ms-marco-MiniLM-L-2-v2",
+                rerank_timeout=0.5,
+            )
+            .setup_semantic_pipeline()
+            .get_component("ranker")
+        )
+        self.assertIsInstance(ranker, BatchedRanker)
+        self.assertEqual(ranker.timeout, 0.5)
+        self.assertEqual(ranker.batcher.max_batch, 1)
+
+        pipeline = RetrievalPipeline(
+            mock(OpenSearchDocumentStore),
+            "sentence-transformers/all-MiniLM-L6-v2",
+            "cross-encoder/ms-marco-MiniLM-L-2-v2",
+        ).setup_semantic_pipeline()
+        self.assertIsInstance(
+            pipeline.get_component("dense_text_embedder"),
+            FastembedTextEmbedder,
+        )
+        self.assertIsInstance(
+            pipeline.get_component("ranker"), TransformersSimilarityRanker
+        )
@@ -0,0 +1,101 @@
+import unittest
+
+from haystack import Document
+
+from search_backend.near_duplicate_filter import NearDuplicateFilter, shingles
+
+
+class TestNearDuplicateFilter(unittest.TestCase):
+
+    def setUp(self):
+        text = (
+            "The lighthouse of Alexandria was a tall tower built by the "
+            "Ptolemaic Kingdom during the reign of Ptolemy II Philadelphus"
+        )
+        self.docs = [
+            Document(content=text, meta={"source_id": "a"}),
+            Document(
+                content="The Hanging Gardens of Babylon were one of the wonders",
+                meta={"source_id": "a"},
+            ),
+            # Same apart from case, whitespace and one word
+            Document(
+                content=text.upper().replace("TALL", "HIGH") + "  ",
+                meta={"source_id": "b"},
+            ),
+            Document(content=text, meta={"source_id": "c"}),
+        ]
+
+    def test_remove_near_duplicates(self):
+        results = NearDuplicateFilter(threshold=0.7, cross_source=True).run(
+            self.docs
+        )
+
+        self.assertEqual(results["documents"], self.docs[:2])
+        self.assertEqual(results["duplicates"], self.docs[2:])
+        self.assertEqual(
+            [doc.meta["canonical_id"] for doc in results["duplicates"]],
+            [self.docs[0].id, self.docs[0].id],
+        )
+        self.assertNotIn("duplicate_ids", self.docs[0].meta)
+
+    def test_threshold(self):
+        """
+        Test chunks less similar than the threshold are kept.
+        """
+
+        results = NearDuplicateFilter(threshold=0.95, cross_source=True).run(
+            self.docs
+        )
+
+        self.assertEqual(results["documents"], self.docs[:3])
+        self.assertEqual(results["duplicates"], self.docs[3:])
+
+    def test_merge(self):
+        """
+        Test the canonical chunk records its duplicates when merging.
+        """
+
+        ids = [doc.id for doc in self.docs]
+        NearDuplicateFilter(threshold=0.7, merge=True, cross_source=True).run(
+            self.docs
+        )
+
+        self.assertEqual(self.docs[0].meta["duplicate_ids"], ids[2:])
+        self.assertEqual(self.docs[0].meta["duplicate_source_ids"], ["b", "c"])
+        # Ids aren't changed by the new metadata
+        self.assertEqual(self.docs[0].id, ids[0])
+
+    def test_same_source_only(self):
+        """
+        Test only chunks of the same source document are compared by default.
+        """
+
+        docs = self.docs + [
+            Document(content=self.docs[0].content, meta={"source_id": "a"})
+        ]
+
+        results = NearDuplicateFilter(threshold=0.7).run(docs)
+
+        self.assertEqual(results["documents"], docs[:4])
+        self.assertEqual(results["duplicates"], docs[4:])
+        self.assertEqual(
+            results["duplicates"][0].meta["canonical_id"], docs[0].id
+        )
+
+    def test_empty_and_short_chunks(self):
+        docs = [
+            Document(content=""),
+            Document(content="   "),
+            Document(content="Contents"),
+            Document(content="contents"),
+        ]
+
+        results = NearDuplicateFilter().run(docs)
+
+        self.assertEqual(results["documents"], docs[:3])
+        self.assertEqual(len(shingles("Contents")), 1)
+
+    def test_invalid_threshold(self):
+        with self.assertRaises(ValueError):
+            NearDuplicateFilter(threshold=0)
@@ -0,0 +1,248 @@
+import unittest
+from dataclasses import replace
+
+from haystack import Document, Pipeline
+from haystack_integrations.components.retrievers.opensearch import (
+    OpenSearchBM25Retriever,
+)
+from haystack_integrations.document_stores.opensearch import (
+    OpenSearchDocumentStore,
+)
+from mockito import mock, unstub, verify, when
+
+from search_backend.local_bm25_retriever import (
+    LocalBM25Index,
+    LocalBM25Retriever,
+)
+from search_backend.local_embedding_retriever import (
+    LocalEmbeddingIndex,
+    LocalEmbeddingRetriever,
+)
+from search_backend.pagination import (
+    MAX_PAGE_SIZE,
+    decode_token,
+    encode_token,
+    rrf_score,
+)
+from search_backend.retrieval_pipeline import RetrievalPipeline
+from search_backend.search import Search
+
+
+class FakeOpenSearchClient:
+    """
+    Answers point in time searches over a fixed list of hits, sorted by score and id.
+    """
+
+    def __init__(self, hits):
+        self.hits = sorted(hits, key=lambda hit: (-hit["_score"], hit["_id"]))
+        self.bodies = []
+        self.open_pits = set()
+
+    def create_pit(self, index, keep_alive):
+        self.open_pits.add("pit")
+        return {"pit_id": "pit"}
+
+    def delete_pit(self, body):
+        self.open_pits -= set(body["pit_id"])
+
+    def search(self, body):
+        self.bodies.append(body)
+        hits = [
+            {**hit, "sort": [hit["_score"], hit["_id"]]} for hit in self.hits
+        ]
+        if "search_after" in body:
+            after = body["search_after"]
+            hits = [
+                hit
+                for hit in hits
+                if (-hit["_score"], hit["_id"]) > (-after[0], after[1])
+            ]
+
+        return {"pit_id": "pit", "hits": {"hits": hits[: body["size"]]}}
+
+
+class TestPagination(unittest.TestCase):
+
+    def setUp(self):
+        self.docs = [
+            Document(id=f"{ii:02d}", content=f"garden {'flower ' * ii}")
+            for ii in range(12)
+        ]
+        self.retriever = LocalBM25Retriever(
+            LocalBM25Index.from_documents(self.docs)
+        )
+        self.search = Search(
+            RetrievalPipeline(
+                mock(OpenSearchDocumentStore), bm25_retriever=self.retriever
+            ).setup_bm25_pipeline()
+        )
+
+    def tearDown(self):
+        unstub()
+
+    def all_pages(self, get_page, **kwargs):
+        pages = []
+        continuation = None
+        while True:
+            page = get_page(
+                "garden flower", continuation=continuation, **kwargs
+            )
+            pages.append(page.documents)
+            continuation = page.continuation
+            if continuation is None:
+                return pages
+
+    def test_token(self):
+        state = {
+            "key": "abc",
+            "bm25_cursor": {"offset": 3},
+            "bm25_rank": 3,
+            "semantic_rank": 1,
+            "emitted": ["x"],
+            "semantic": [["x", 0.5], ["y", 0.25]],
+        }
+        self.assertEqual(decode_token(encode_token(state)), state)
+
+        for token in [
+            "not a token!",
+            encode_token([1, 2]),
+            encode_token({"key": "abc", "bm25_cursor": {"offset": 3}}),
+            encode_token({**state, "bm25_rank": "3"}),
+            encode_token({**state, "bm25_cursor": {"offset": -1}}),
+            encode_token({**state, "semantic": [["x"]]}),
+        ]:
+            with self.assertRaises(ValueError):
+                decode_token(token)
+
+    def test_bm25_search_page(self):
+        pages = self.all_pages(self.search.bm25_search_page, page_size=5)
+
+        self.assertEqual([len(page) for page in pages], [5, 5, 2])
+        expected = self.retriever.run("garden flower", top_k=100)["documents"]
+        self.assertEqual(
+            [doc.id for page in pages for doc in page],
+            [doc.id for doc in expected],
+        )
+
+    def test_continuation_checks(self):
+        page = self.search.bm25_search_page("garden flower", page_size=5)
+
+        with self.assertRaises(ValueError):
+            self.search.bm25_search_page(
+                "garden", page_size=5, continuation=page.continuation
+            )
+        with self.assertRaises(ValueError):
+            self.search.bm25_search_page(
+                "garden flower", page_size=MAX_PAGE_SIZE + 1
+            )
+        self.assertEqual(self.search.bm25_search_page("a").documents, [])
+
+    def test_opensearch_pages(self):
+        document_store = mock(OpenSearchDocumentStore)
+        document_store._index = "index"
+        document_store._return_embedding = False
+        document_store.client = FakeOpenSearchClient(
+            [
+                {
+                    "_id": doc.id,
+                    "_score": float(len(doc.content) // 10),
+                    "_source": doc.to_dict(flatten=False),
+                }
+                for doc in self.docs
+            ]
+        )
+        when(document_store)._deserialize_document(...).thenAnswer(
+            lambda hit: Document(
+                id=hit["_id"],
+                content=hit["_source"]["content"],
+                score=hit["_score"],
+            )
+        )
+        search = Search(
+            RetrievalPipeline(document_store).setup_bm25_pipeline()
+        )
+
+        pages = self.all_pages(search.bm25_search_page, page_size=4)
+
+        ids = [doc.id for page in pages for doc in page]
+        self.assertEqual(
+            ids, [hit["_id"] for hit in document_store.client.hits]
+        )
+        self.assertEqual(len(pages), 4)
+        # Each page only asks for its own results
+        bodies = document_store.client.bodies
+        self.assertEqual([body["size"] for body in bodies], [4] * 4)
+        self.assertNotIn("search_after", bodies[0])
+        last_hit = document_store.client.hits[3]
+        self.assertEqual(
+            bodies[1]["search_after"], [last_hit["_score"], last_hit["_id"]]
+        )
+        self.assertEqual(bodies[0]["pit"]["id"], "pit")
+        self.assertEqual(document_store.client.open_pits, set())
+        # BM25 scores are scaled as by the retriever
+        self.assertTrue(
+            all(0 < doc.score < 1 for page in pages for doc in page)
+        )
+
+    def hybrid_search(self, documents):
+        pipeline = Pipeline()
+        pipeline.add_component(
+            "bm25_retriever",
+            LocalBM25Retriever(LocalBM25Index.from_documents(self.docs)),
+        )
+        pipeline.add_component(
+            "embedding_retriever",
+            LocalEmbeddingRetriever(
+                LocalEmbeddingIndex.from_documents(
+                    [
+                        replace(doc, embedding=[1.0, float(ii)])
+                        for ii, doc in enumerate(documents)
+                    ]
+                )
+            ),
+        )
+
+        return Search(pipeline)
+
+    def test_hybrid_search_page(self):
+        bm25 = self.retriever.run("garden flower", top_k=100)["documents"]
+        semantic = [self.docs[0], bm25[0], Document(id="x", content="x")]
+        search = self.hybrid_search(self.docs + semantic[-1:])
+        when(search)._run_reranked_retrieval(...).thenReturn(semantic)
+
+        pages = self.all_pages(search.hybrid_search_page, page_size=4)
+
+        ids = [doc.id for page in pages for doc in page]
+        self.assertTrue(all(len(page) <= 4 for page in pages))
+        # Every result is returned once
+        self.assertEqual(
+            sorted(ids), sorted(doc.id for doc in self.docs) + ["x"]
+        )
+        # The top BM25 result is also the second semantic result, so is fused first
+        self.assertEqual(pages[0][0].id, bm25[0].id)
+        self.assertEqual(pages[0][0].score, rrf_score([0, 1]))
+        # Results are taken from both lists in order of rank, ties going to BM25
+        self.assertEqual(
+            [doc.id for doc in pages[0][1:]], ["00", bm25[1].id, bm25[2].id]
+        )
+        self.assertEqual(pages[1][0].id, "x")
+        self.assertEqual(pages[1][0].content, "x")
+        # The semantic results are only retrieved and reranked for the first page
+        verify(search, times=1)._run_reranked_retrieval(...)
+
+    def test_hybrid_search_page_deleted(self):
+        """
+        Test that semantic results deleted after the first page are left out.
+        """
+
+        bm25 = self.retriever.run("garden flower", top_k=100)["documents"]
+        semantic = [self.docs[0], bm25[0], Document(id="x", content="x")]
+        search = self.hybrid_search(self.docs)
+        when(search)._run_reranked_retrieval(...).thenReturn(semantic)
+
+        pages = self.all_pages(search.hybrid_search_page, page_size=4)
+
+        self.assertEqual(
+            sorted(doc.id for page in pages for doc in page),
+            sorted(doc.id for doc in self.docs),
+        )
@@ -0,0 +1,87 @@
+import os
+import tempfile
+import unittest
+from io import BytesIO
+
+from scripts.parsed_text_cache import ParsedTextCache, content_hash
+
+
+class TestParsedTextCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.cache = ParsedTextCache(self.tmpdir.name)
+        self.pages = [
+            {"meta": {"title": "a.pdf", "path": "docs/a.pdf", "page": 2}},
+            {"content": "Café £5 – “quoted”"},
+        ]
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_put_and_get(self):
+        key = self.cache.key('"etag"', reader_version=1)
+        self.assertIsNone(self.cache.get(key))
+
+        self.cache.put(key, self.pages)
+
+        self.assertEqual(self.cache.get(key), self.pages)
+        # Entries persist between instances
+        cache = ParsedTextCache(self.tmpdir.name)
+        self.assertEqual(cache.get(key), self.pages)
+        self.assertEqual(cache.total_bytes, self.cache.total_bytes)
+
+    def test_key(self):
+        """
+        Test keys depend on the contents and the reader settings.
+        """
+
+        key = self.cache.key("abc", reader_version=1, pdf_backend="layout")
+
+        self.assertEqual(
+            key, self.cache.key("abc", pdf_backend="layout", reader_version=1)
+        )
+        self.assertNotEqual(
+            key, self.cache.key("abc", reader_version=2, pdf_backend="layout")
+        )
+        self.assertNotEqual(
+            key, self.cache.key("abd", reader_version=1, pdf_backend="layout")
+        )
+
+    def test_corrupt_entry(self):
+        key = self.cache.key("abc")
+        self.cache.put(key, self.pages)
+        with open(self.cache._entry_path(key), "wb") as f:
+            f.write(b"not gzip")
+
+        self.assertIsNone(self.cache.get(key))
+
+    def test_eviction(self):
+        """
+        Test the least recently used entries are removed when over the size limit.
+        """
+
+        keys = [self.cache.key(str(ii)) for ii in range(3)]
+        for ii, key in enumerate(keys):
+            self.cache.put(key, self.pages)
+            os.utime(self.cache._entry_path(key), (ii, ii))
+        entry_size = self.cache.total_bytes // 3
+
+        # Use the oldest entry, so the second is now the least recently used
+        self.cache.get(keys[0])
+        self.cache.max_bytes = 3 * entry_size - 1
+        self.cache.put(keys[2], self.pages)
+
+        self.assertIsNotNone(self.cache.get(keys[0]))
+        self.assertIsNone(self.cache.get(keys[1]))
+        self.assertIsNotNone(self.cache.get(keys[2]))
+        self.assertEqual(self.cache.total_bytes, 2 * entry_size)
+
+    def test_content_hash(self):
+        f = BytesIO(b"x" * 100)
+        f.read(10)
+
+        self.assertEqual(
+            content_hash(f, chunk_size=7), content_hash(BytesIO(b"x" * 100))
+        )
+        self.assertEqual(f.tell(), 0)
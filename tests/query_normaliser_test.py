@@ -0,0 +1,57 @@
+import json
+import unittest
+
+from search_backend.query_normaliser import (
+    QueryNormaliser,
+    normalise_query,
+    query_cache_key,
+)
+
+
+class TestQueryNormaliser(unittest.TestCase):
+
+    def test_normalise_query(self):
+        """
+        Test that case, whitespace and punctuation are made canonical.
+        """
+
+        cases = {
+            "When does my GDD allowance EXPIRE?": "when does my gdd allowance expire",
+            "  gdd\tallowance\n\nexpiry  ": "gdd allowance expiry",
+            "GDD’s allowance — expiry!!": "gdd's allowance expiry",
+            "R&D spend... (2023/24)": "r and d spend 2023 24",
+            "section 3.5, e-mail -- policy": "section 3.5 e-mail policy",
+            'the "quoted" café': "the quoted café",
+            "???": "",
+        }
+
+        for query, expected in cases.items():
+            self.assertEqual(normalise_query(query), expected)
+
+    def test_equivalent_queries_share_cache_key(self):
+        filters = {"field": "meta.type", "operator": "==", "value": "article"}
+
+        key1 = query_cache_key(
+            normalise_query("GDD allowance expiry?"), filters, top_k=10
+        )
+        key2 = query_cache_key(
+            normalise_query("gdd  allowance expiry"), dict(filters), top_k=10
+        )
+        key3 = query_cache_key(
+            normalise_query("gdd allowance expiry"), filters, top_k=5
+        )
+
+        self.assertEqual(key1, key2)
+        self.assertNotEqual(key1, key3)
+        self.assertEqual(json.loads(key1)[0], "gdd allowance expiry")
+
+    def test_component(self):
+        normaliser = QueryNormaliser(cache_size=2)
+
+        self.assertEqual(
+            normaliser.run(query="Lighthouse?"), {"query": "lighthouse"}
+        )
+        self.assertEqual(
+            normaliser.run(query="Lighthouse?"), {"query": "lighthouse"}
+        )
+        self.assertEqual(normaliser.normalise.cache_info().hits, 1)
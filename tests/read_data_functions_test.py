@@ -0,0 +1,378 @@
+import re
+import tempfile
+import unittest
+from collections import Counter
+from io import BytesIO
+from unittest.mock import patch
+
+import pytest
+
+pytest.importorskip("pdfminer")
+pytest.importorskip("docx")
+pytest.importorskip("pptx")
+
+from pdfminer.converter import TextConverter  # noqa: E402
+from pdfminer.layout import LAParams  # noqa: E402
+from pdfminer.pdfinterp import (  # noqa: E402
+    PDFPageInterpreter,
+    PDFResourceManager,
+)
+from pdfminer.pdfpage import PDFPage  # noqa: E402
+
+from mockito import mock, unstub, verify, when  # noqa: E402
+from pptx import Presentation  # noqa: E402
+
+from scripts import read_data_functions  # noqa: E402
+from scripts.read_data_functions import (  # noqa: E402
+    _read_pdf_gen,
+    _read_ppt_gen,
+    read_docs,
+    starts_with,
+)
+from scripts.parsed_text_cache import ParsedTextCache  # noqa: E402
+from scripts.s3client import S3Client  # noqa: E402
+
+
+def make_pdf(pages):
+    """
+    Build a minimal PDF with one page per list of text lines, using a standard font.
+    A page can also be given as the text operators of its content stream.
+    """
+
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    page_ids = []
+    for lines in pages:
+        stream = b"BT /F1 12 Tf 14 TL 72 720 Td "
+        if isinstance(lines, bytes):
+            stream += lines + b" "
+        for line in lines if isinstance(lines, list) else []:
+            stream += b"(" + line.encode("latin-1") + b") Tj T* "
+        stream += b"ET"
+        objects.append(
+            b"<< /Length %d >>\nstream\n" % len(stream)
+            + stream
+            + b"\nendstream"
+        )
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>"
+            % len(objects)
+        )
+        page_ids.append(len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+        b" ".join(b"%d 0 R" % ii for ii in page_ids),
+        len(page_ids),
+    )
+
+    pdf = b"%PDF-1.4\n"
+    offsets = []
+    for ii, obj in enumerate(objects):
+        offsets.append(len(pdf))
+        pdf += b"%d 0 obj\n" % (ii + 1) + obj + b"\nendobj\n"
+    xref = len(pdf)
+    pdf += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        pdf += b"%010d 00000 n \n" % offset
+    pdf += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (
+        len(objects) + 1,
+        xref,
+    )
+
+    return pdf
+
+
+def glyphs(line):
+    """
+    Text operators drawing a line one character at a time, as some PDF writers do.
+    """
+
+    return b" ".join(b"(%s) Tj" % char.encode("latin-1") for char in line)
+
+
+def reference_read_pdf(f):
+    """
+    The original PDF reader, which sets up new pdfminer objects for every page. Returns
+    (page number, cleaned text) for each page.
+    """
+
+    pages = []
+    for page_number, page in enumerate(PDFPage.get_pages(f)):
+        rsrcmgr = PDFResourceManager()
+        retstr = BytesIO()
+        device = TextConverter(
+            rsrcmgr, retstr, codec="utf-8", laparams=LAParams()
+        )
+        PDFPageInterpreter(rsrcmgr, device).process_page(page)
+        body = retstr.getvalue().decode("utf-8").replace("\x0c", "")
+        pages.append((page_number + 1, re.sub(r"\s+", " ", body.strip())))
+
+    return pages
+
+
+class TestReadPDF(unittest.TestCase):
+
+    def setUp(self):
+        body = [
+            "The lighthouse of Alexandria was a tall tower built by the",
+            "Ptolemaic Kingdom during the reign of Ptolemy II.",
+        ]
+        self.pdf = make_pdf(
+            [
+                ["Annual report"],
+                ["Contents", "1. Introduction"],
+                body,
+                [],
+                body[::-1],
+            ]
+        )
+
+    def tearDown(self):
+        unstub()
+
+    def read(self, title="title", **kwargs):
+        return list(
+            _read_pdf_gen(
+                BytesIO(self.pdf), title, "docs/report.pdf", **kwargs
+            )
+        )
+
+    def test_layout_backend_parity(self):
+        """
+        Test the layout backend gives the same output as the original reader, skipping
+        the title, contents and empty pages.
+        """
+
+        expected = reference_read_pdf(BytesIO(self.pdf))
+        pages = self.read()
+
+        self.assertEqual([page["meta"]["page"] for page in pages], [3, 5])
+        self.assertEqual(
+            [(page["meta"]["page"], page["content"]) for page in pages],
+            [expected[2], expected[4]],
+        )
+        self.assertEqual(
+            pages[0]["meta"],
+            {"title": "title", "path": "docs/report.pdf", "page": 3},
+        )
+
+    def test_fast_backend(self):
+        """
+        Test the fast backend extracts the same text from simple single-column pages.
+        """
+
+        self.assertEqual(self.read(backend="fast"), self.read())
+
+    def test_page_numbers(self):
+        """
+        Test only the requested pages are read.
+        """
+
+        pages = self.read(page_numbers={4})
+
+        self.assertEqual([page["meta"]["page"] for page in pages], [5])
+
+    def test_skip_stats(self):
+        """
+        Test the number of pages skipped by each filter is counted.
+        """
+
+        stats = Counter()
+        self.read(stats=stats)
+
+        self.assertEqual(
+            stats,
+            {"pages": 5, "kept": 2, "title": 1, "contents": 1, "empty": 1},
+        )
+
+    def test_one_glyph_per_operator(self):
+        """
+        Test the default filters skip the same pages as the original reader when words
+        are drawn one character at a time, which splits them in the quick text.
+        """
+
+        self.pdf = make_pdf(
+            [
+                glyphs("Annual report"),
+                glyphs("Contents") + b" T* (1. Introduction) Tj",
+                ["The lighthouse of Alexandria"],
+            ]
+        )
+        expected = reference_read_pdf(BytesIO(self.pdf))
+
+        pages = self.read()
+
+        self.assertEqual(expected[1][1], "Contents 1. Introduction")
+        self.assertEqual(
+            [(page["meta"]["page"], page["content"]) for page in pages],
+            [expected[2]],
+        )
+
+        # The quick filters see "A n n u a l   r e p o r t" and "C o n t e n t s"
+        pages = self.read(
+            page_filters=read_data_functions.QUICK_PDF_PAGE_FILTERS
+        )
+        self.assertEqual([page["meta"]["page"] for page in pages], [1, 2, 3])
+
+    def test_skipped_pages_not_fully_extracted(self):
+        """
+        Test that with the quick filters, the layout backend only runs on pages that are
+        kept, or that a filter needs the full text of.
+        """
+
+        extracted = []
+
+        class CountingExtractor(read_data_functions._LayoutExtractor):
+            def __call__(self, page):
+                extracted.append(page)
+                return super().__call__(page)
+
+        backends = {"layout": CountingExtractor}
+        with patch.dict(read_data_functions.PDF_BACKENDS, backends):
+            pages = self.read(
+                page_filters=read_data_functions.QUICK_PDF_PAGE_FILTERS
+            )
+
+        # Two kept pages plus the empty page, which is only found from the full text
+        self.assertEqual(len(pages), 2)
+        self.assertEqual(len(extracted), 3)
+
+    def test_custom_page_filters(self):
+        """
+        Test extra filters can be added, and are applied in order.
+        """
+
+        filters = read_data_functions.PDF_PAGE_FILTERS + [
+            ("lighthouse", starts_with("the lighthouse")),
+        ]
+        stats = Counter()
+        pages = self.read(page_filters=filters, stats=stats)
+
+        self.assertEqual([page["meta"]["page"] for page in pages], [5])
+        self.assertEqual(stats["lighthouse"], 1)
+
+    def test_read_docs(self):
+        """
+        Test documents are streamed from S3, and unreadable documents are skipped.
+        """
+
+        s3client = mock(S3Client)
+        when(s3client).get_etag(...).thenReturn((None, "ERROR"))
+        when(s3client).download_fileobj(
+            "docs/report.pdf", prepend_prefix=False
+        ).thenReturn((BytesIO(self.pdf), None))
+        when(s3client).download_fileobj(
+            "docs/missing.pdf", prepend_prefix=False
+        ).thenReturn((None, "ERROR: missing"))
+
+        skip_stats = {}
+        pages = read_docs(
+            s3client,
+            ["docs/missing.pdf", "docs/report.pdf"],
+            skip_stats=skip_stats,
+        )
+
+        self.assertEqual(pages, self.read(title="report.pdf"))
+        self.assertEqual(list(skip_stats), ["docs/report.pdf"])
+        self.assertEqual(skip_stats["docs/report.pdf"]["kept"], 2)
+
+    def test_read_docs_cache(self):
+        """
+        Test cached documents aren't downloaded or parsed again, and get the title and
+        path of the file they were read from.
+        """
+
+        s3client = mock(S3Client)
+        when(s3client).get_etag(...).thenReturn(('"etag"', None))
+        when(s3client).download_fileobj(...).thenAnswer(
+            lambda *args, **kwargs: (BytesIO(self.pdf), None)
+        )
+
+        with tempfile.TemporaryDirectory() as path:
+            cache = ParsedTextCache(path)
+            pages = read_docs(s3client, ["docs/report.pdf"], cache=cache)
+            cached = read_docs(s3client, ["docs/copy.pdf"], cache=cache)
+            verify(s3client, times=1).download_fileobj(...)
+
+            self.assertEqual(len(cached), 2)
+            self.assertEqual(cached[0]["meta"]["path"], "docs/copy.pdf")
+            self.assertEqual(cached[0]["meta"]["title"], "copy.pdf")
+            self.assertEqual(
+                [page["content"] for page in cached],
+                [page["content"] for page in pages],
+            )
+
+            # Changing the reader settings means parsing again
+            read_docs(
+                s3client, ["docs/report.pdf"], cache=cache, pdf_backend="fast"
+            )
+            verify(s3client, times=2).download_fileobj(...)
+
+    def test_read_docs_cache_without_etag(self):
+        """
+        Test documents are cached by content hash if the ETag can't be fetched.
+        """
+
+        s3client = mock(S3Client)
+        when(s3client).get_etag(...).thenReturn((None, "ERROR"))
+        when(s3client).download_fileobj(...).thenAnswer(
+            lambda *args, **kwargs: (BytesIO(self.pdf), None)
+        )
+
+        with tempfile.TemporaryDirectory() as path:
+            cache = ParsedTextCache(path)
+            pages = read_docs(s3client, ["docs/report.pdf"], cache=cache)
+
+            when(read_data_functions)._read_doc(...).thenRaise(
+                AssertionError("parsed again")
+            )
+            self.assertEqual(
+                read_docs(s3client, ["docs/report.pdf"], cache=cache), pages
+            )
+
+
+class TestReadPowerpoint(unittest.TestCase):
+
+    def setUp(self):
+        ppt = Presentation()
+        layout = ppt.slide_layouts[1]
+        for title, body in [
+            ("Quarterly review", "Presented by the analysis team"),
+            ("Contents", "Introduction"),
+            ("Findings", "Ten words or more of text on this slide to keep"),
+            ("Thanks", ""),
+        ]:
+            slide = ppt.slides.add_slide(layout)
+            slide.shapes.title.text = title
+            slide.placeholders[1].text = body
+
+        self.pptx = BytesIO()
+        ppt.save(self.pptx)
+
+    def test_read_ppt(self):
+        """
+        Test the title, contents and short slides are skipped, and counted.
+        """
+
+        self.pptx.seek(0)
+        stats = Counter()
+        slides = list(_read_ppt_gen(self.pptx, "title", "path", stats=stats))
+
+        self.assertEqual([slide["meta"]["page"] for slide in slides], [3])
+        self.assertEqual(
+            slides[0]["content"],
+            "Findings\nTen words or more of text on this slide to keep",
+        )
+        self.assertEqual(
+            stats,
+            {
+                "pages": 4,
+                "kept": 1,
+                "first_slide": 1,
+                "contents": 1,
+                "title": 1,
+            },
+        )
@@ -0,0 +1,130 @@
+import unittest
+
+from haystack import Document
+from haystack_integrations.document_stores.opensearch import (
+    OpenSearchDocumentStore,
+)
+from mockito import mock, unstub, when
+
+from search_backend.micro_batcher import BatchedRanker
+from search_backend.rerank_cache import (
+    RerankScoreCache,
+    SharedRerankScoreCache,
+    rerank_key,
+)
+from search_backend.retrieval_pipeline import RetrievalPipeline
+
+
+class TestRerankScoreCache(unittest.TestCase):
+
+    def setUp(self):
+        self.keys = [
+            rerank_key("model", "query", str(ii), f"text {ii}")
+            for ii in range(10)
+        ]
+
+    def test_rerank_key(self):
+        key = rerank_key("model", "query", "1", "text")
+
+        self.assertEqual(len(key), 16)
+        self.assertEqual(key, rerank_key("model", "query", "1", "text"))
+        for other in [
+            ("other model", "query", "1", "text"),
+            ("model", "other query", "1", "text"),
+            ("model", "query", "2", "text"),
+            ("model", "query", "1", "new text"),
+            # Parts can't run into each other
+            ("model", "query1", "", "text"),
+        ]:
+            self.assertNotEqual(key, rerank_key(*other))
+
+    def test_lru_cache(self):
+        cache = RerankScoreCache(max_size=3)
+        cache.put_many(self.keys[:3], [0.0, 1.0, 2.0])
+        # Use the first key, so the second is the least recently used
+        self.assertEqual(cache.get_many(self.keys[:1]), [0.0])
+        cache.put_many(self.keys[3:4], [3.0])
+
+        self.assertEqual(len(cache), 3)
+        self.assertEqual(cache.get_many(self.keys[:4]), [0.0, None, 2.0, 3.0])
+
+    def test_shared_cache(self):
+        # A single set of entries, so eviction can be checked
+        cache = SharedRerankScoreCache(max_size=8)
+        self.addCleanup(cache.unlink)
+        self.addCleanup(cache.close)
+
+        cache.put_many(self.keys[:8], [float(ii) for ii in range(8)])
+        self.assertEqual(cache.get_many(self.keys[:1]), [0.0])
+        cache.put_many(self.keys[8:9], [8.0])
+
+        # Another process would attach to the cache by name
+        attached = SharedRerankScoreCache(cache.name, create=False)
+        self.addCleanup(attached.close)
+        self.assertEqual(len(attached), 8)
+        self.assertEqual(
+            attached.get_many(self.keys[:3] + self.keys[8:]),
+            [0.0, None, 2.0, 8.0, None],
+        )
+
+        attached.put_many(self.keys[2:3], [-2.5])
+        self.assertEqual(cache.get_many(self.keys[2:3]), [-2.5])
+        self.assertEqual(cache.get_many([]), [])
+
+
+class TestCachedRanker(unittest.TestCase):
+
+    def setUp(self):
+        self.ranker = BatchedRanker(
+            "model", max_batch=1, score_cache=RerankScoreCache()
+        )
+        when(self.ranker.ranker).warm_up()
+        self.scored = []
+        self.ranker._score = self.score
+        self.docs = [
+            Document(id=str(ii), content="text" + "s" * ii) for ii in range(5)
+        ]
+
+    def tearDown(self):
+        unstub()
+
+    def score(self, pairs):
+        self.scored.append(pairs)
+        return [float(len(text)) for _, text in pairs]
+
+    def test_only_new_pairs_scored(self):
+        results = self.ranker.run(query="query", documents=self.docs)
+        self.assertEqual(len(self.scored[0]), 5)
+
+        # Scores come from the cache
+        self.assertEqual(
+            self.ranker.run(query="query", documents=self.docs[::-1]),
+            results,
+        )
+        self.assertEqual(len(self.scored), 1)
+
+        # A new query, and a changed chunk, are scored
+        self.ranker.run(query="other query", documents=self.docs[:1])
+        changed = Document(id="1", content="changed text 1")
+        results = self.ranker.run(
+            query="query", documents=[changed] + self.docs[2:]
+        )
+        self.assertEqual(
+            self.scored[1:],
+            [[["other query", "text"]], [["query", "changed text 1"]]],
+        )
+        self.assertEqual(results["documents"][0].content, "changed text 1")
+
+    def test_retrieval_pipeline(self):
+        cache = RerankScoreCache()
+        pipeline = RetrievalPipeline(
+            mock(OpenSearchDocumentStore),
+            "sentence-transformers/all-MiniLM-L6-v2",
+            "cross-encoder/ms-marco-MiniLM-L-2-v2",
+            rerank_cache=cache,
+        ).setup_semantic_pipeline()
+
+        ranker = pipeline.get_component("ranker")
+        self.assertIsInstance(ranker, BatchedRanker)
+        self.assertIs(ranker.score_cache, cache)
+        self.assertEqual(ranker.batcher.max_batch, 1)
@@ -0,0 +1,338 @@
+import json
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from haystack import Document
+from haystack_integrations.components.retrievers.opensearch import (
+    OpenSearchBM25Retriever,
+)
+from haystack_integrations.document_stores.opensearch import (
+    OpenSearchDocumentStore,
+)
+from opensearchpy import OpenSearch
+from opensearchpy.exceptions import NotFoundError, TransportError
+
+from search_backend.local_bm25_retriever import (
+    LocalBM25Index,
+    LocalBM25Retriever,
+)
+from search_backend.resilient_transport import (
+    CircuitBreaker,
+    CircuitOpenError,
+    FallbackRetriever,
+    ResilientTransport,
+)
+
+
+class FakeNode:
+    """
+    An HTTP server standing in for an OpenSearch node, answering every search with one
+    hit after `delay` seconds (or with `status`, if it isn't 200).
+    """
+
+    def __init__(self, name, delay=0.0, status=200):
+        self.name = name
+        self.delay = delay
+        self.status = status
+        self.requests = []
+
+        node = self
+
+        class Handler(BaseHTTPRequestHandler):
+
+            def respond(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                self.rfile.read(length)
+                node.requests.append((self.command, self.path))
+                time.sleep(node.delay)
+
+                body = json.dumps(
+                    {
+                        "hits": {
+                            "hits": [
+                                {
+                                    "_id": node.name,
+                                    "_score": 1.0,
+                                    "_source": {"content": node.name},
+                                }
+                            ]
+                        },
+                        "items": [],
+                        "errors": False,
+                    }
+                ).encode()
+                self.send_response(node.status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                if self.command != "HEAD":
+                    self.wfile.write(body)
+
+            do_GET = do_POST = do_PUT = do_HEAD = respond
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(
+            target=self.server.serve_forever, args=(0.05,), daemon=True
+        ).start()
+
+    def searches(self):
+        return [path for method, path in self.requests if method != "HEAD"]
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class TestResilientTransport(unittest.TestCase):
+
+    def setUp(self):
+        self.slow = FakeNode("slow", delay=0.5)
+        self.fast = FakeNode("fast")
+
+    def tearDown(self):
+        self.slow.close()
+        self.fast.close()
+
+    def client(self, nodes, **kwargs):
+        return OpenSearch(
+            hosts=[node.url for node in nodes],
+            transport_class=ResilientTransport,
+            randomize_hosts=False,
+            max_retries=0,
+            **kwargs,
+        )
+
+    def test_hedges_slow_search(self):
+        client = self.client([self.slow, self.fast], initial_hedge_delay=0.05)
+
+        start = time.monotonic()
+        response = client.search(index="document", body={"query": {}})
+
+        self.assertLess(time.monotonic() - start, 0.3)
+        self.assertEqual(response["hits"]["hits"][0]["_id"], "fast")
+        self.assertEqual(len(self.slow.searches()), 1)
+        self.assertEqual(len(self.fast.searches()), 1)
+
+    def test_no_hedge_when_quick(self):
+        self.slow.delay = 0.0
+        client = self.client([self.slow, self.fast], initial_hedge_delay=0.2)
+
+        client.search(index="document", body={"query": {}})
+        client.search(index="document", body={"query": {}})
+
+        self.assertEqual(len(self.slow.searches()), 1)
+        self.assertEqual(len(self.fast.searches()), 1)
+
+    def test_writes_not_hedged(self):
+        client = self.client([self.slow, self.fast], initial_hedge_delay=0.05)
+
+        start = time.monotonic()
+        client.index(index="document", body={"content": "x"}, id="1")
+
+        self.assertGreater(time.monotonic() - start, 0.4)
+        self.assertEqual(len(self.fast.requests), 0)
+
+    def test_hedge_budget(self):
+        client = self.client(
+            [self.slow, self.fast],
+            initial_hedge_delay=0.05,
+            hedge_window=20,
+            hedge_budget=0.05,
+        )
+
+        # One in twenty requests can be hedged
+        client.search(index="document", body={"query": {}})
+        start = time.monotonic()
+        client.search(index="document", body={"query": {}})
+
+        self.assertGreater(time.monotonic() - start, 0.4)
+        self.assertEqual(len(self.slow.searches()), 2)
+        self.assertEqual(len(self.fast.searches()), 1)
+
+    def test_no_hedge_after_failures(self):
+        client = self.client([self.slow, self.fast], initial_hedge_delay=0.05)
+        client.transport.breaker.record_failure()
+
+        start = time.monotonic()
+        client.search(index="document", body={"query": {}})
+
+        self.assertGreater(time.monotonic() - start, 0.4)
+        self.assertEqual(len(self.fast.searches()), 0)
+        self.assertEqual(client.transport.breaker.failures, 0)
+
+    def test_hedge_with_retry_on_timeout(self):
+        """
+        Test the first attempt of a hedged request isn't retried when it reaches the
+        hedging delay, so slow nodes aren't marked dead.
+        """
+
+        other_slow = FakeNode("other_slow", delay=0.5)
+        self.addCleanup(other_slow.close)
+        client = OpenSearch(
+            hosts=[node.url for node in [self.slow, other_slow, self.fast]],
+            transport_class=ResilientTransport,
+            randomize_hosts=False,
+            max_retries=3,
+            retry_on_timeout=True,
+            initial_hedge_delay=0.05,
+        )
+
+        client.search(index="document", body={"query": {}})
+
+        # The first attempt and the hedge
+        nodes = [self.slow, other_slow, self.fast]
+        self.assertEqual(sum(len(node.searches()) for node in nodes), 2)
+        pool = client.transport.connection_pool
+        self.assertEqual(len(pool.connections), 3)
+        self.assertEqual(pool.dead_count, {})
+
+    def test_single_host_not_hedged(self):
+        client = self.client([self.slow], initial_hedge_delay=0.05)
+
+        client.search(index="document", body={"query": {}})
+
+        self.assertEqual(len(self.slow.searches()), 1)
+
+    def test_hedge_delay_from_latencies(self):
+        self.slow.delay = 0.0
+        client = self.client(
+            [self.slow],
+            min_hedge_samples=5,
+            initial_hedge_delay=1.0,
+            min_hedge_delay=0.0,
+        )
+        transport = client.transport
+
+        self.assertEqual(transport.hedge_delay, 1.0)
+        for _ in range(5):
+            client.search(index="document", body={"query": {}})
+        self.assertLess(transport.hedge_delay, 0.1)
+
+    def test_circuit_breaker(self):
+        failing = FakeNode("failing", status=503)
+        self.addCleanup(failing.close)
+        client = self.client([failing], failure_threshold=2, reset_timeout=0.2)
+
+        with self.assertLogs("search_backend.resilient_transport"):
+            for _ in range(2):
+                with self.assertRaises(TransportError):
+                    client.search(index="document", body={"query": {}})
+        with self.assertRaises(CircuitOpenError):
+            client.search(index="document", body={"query": {}})
+        self.assertEqual(len(failing.requests), 2)
+
+        # After the reset timeout, a trial request closes the breaker
+        time.sleep(0.25)
+        failing.status = 200
+        client.search(index="document", body={"query": {}})
+        self.assertEqual(client.transport.breaker.state, "closed")
+
+    def test_not_found_is_healthy(self):
+        missing = FakeNode("missing", status=404)
+        self.addCleanup(missing.close)
+        client = self.client([missing], failure_threshold=1)
+
+        with self.assertRaises(NotFoundError):
+            client.search(index="document", body={"query": {}})
+        self.assertEqual(client.transport.breaker.state, "closed")
+
+    def test_document_store(self):
+        """
+        Test retrieval through a document store using the transport.
+        """
+
+        document_store = OpenSearchDocumentStore(
+            hosts=[self.slow.url, self.fast.url],
+            index="document",
+            transport_class=ResilientTransport,
+            randomize_hosts=False,
+            initial_hedge_delay=0.05,
+        )
+        retriever = OpenSearchBM25Retriever(document_store=document_store)
+        # Checking the index exists goes to the slow node
+        document_store.client
+
+        start = time.monotonic()
+        documents = retriever.run(query="tax")["documents"]
+
+        self.assertLess(time.monotonic() - start, 0.3)
+        self.assertEqual([doc.content for doc in documents], ["fast"])
+
+
+class TestCircuitBreaker(unittest.TestCase):
+
+    def test_states(self):
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.1)
+
+        breaker.record_failure()
+        breaker.record_success()
+        breaker.record_failure()
+        self.assertTrue(breaker.allow())
+        with self.assertLogs("search_backend.resilient_transport"):
+            breaker.record_failure()
+        self.assertEqual(breaker.state, "open")
+        self.assertFalse(breaker.allow())
+
+        time.sleep(0.15)
+        self.assertTrue(breaker.allow())
+        self.assertEqual(breaker.state, "half_open")
+        # Only one trial request
+        self.assertFalse(breaker.allow())
+
+        with self.assertLogs("search_backend.resilient_transport"):
+            breaker.record_failure()
+        self.assertEqual(breaker.state, "open")
+
+
+class TestFallbackRetriever(unittest.TestCase):
+
+    def setUp(self):
+        self.document_store = OpenSearchDocumentStore(
+            hosts="http://127.0.0.1:1", index="document"
+        )
+        self.document_store._client = OpenSearch(
+            hosts="http://127.0.0.1:1",
+            transport_class=ResilientTransport,
+            max_retries=0,
+            failure_threshold=1,
+        )
+        self.local = LocalBM25Retriever(
+            LocalBM25Index.from_documents(
+                [Document(id="local", content="tax allowance")]
+            )
+        )
+
+    def test_fallback(self):
+        retriever = FallbackRetriever(
+            OpenSearchBM25Retriever(document_store=self.document_store),
+            self.local,
+        )
+
+        for _ in range(2):
+            with self.assertLogs("search_backend.resilient_transport"):
+                documents = retriever.run(
+                    query="tax", all_terms_must_match=True
+                )["documents"]
+            self.assertEqual([doc.id for doc in documents], ["local"])
+        self.assertEqual(
+            self.document_store._client.transport.breaker.state, "open"
+        )
+
+    def test_no_fallback(self):
+        retriever = FallbackRetriever(
+            OpenSearchBM25Retriever(document_store=self.document_store)
+        )
+
+        with self.assertRaises(TransportError):
+            retriever.run(query="tax")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,7 +1,6 @@
 import unittest
 
 from haystack import Pipeline
-from haystack.components.joiners import DocumentJoiner
 from haystack.components.rankers import TransformersSimilarityRanker
 from haystack_integrations.components.embedders.fastembed import (
     FastembedTextEmbedder,
@@ -15,6 +14,16 @@ from haystack_integrations.document_stores.opensearch import (
 )
 from mockito import mock, when, verify, any
 
+from search_backend.fusion_joiner import FusionJoiner
+from search_backend.local_bm25_retriever import (
+    LocalBM25Index,
+    LocalBM25Retriever,
+)
+from search_backend.local_embedding_retriever import (
+    LocalEmbeddingIndex,
+    LocalEmbeddingRetriever,
+)
+from search_backend.resilient_transport import FallbackRetriever
 from search_backend.retrieval_pipeline import RetrievalPipeline
 from search_backend.threshold_score import ThresholdScore
 
@@ -64,17 +73,21 @@ class TestRetrievalPipeline(unittest.TestCase):
             "semantic_threshold", any(ThresholdScore)
         )
         verify(mock_pipeline).add_component(
-            "document_joiner", any(DocumentJoiner)
+            "document_joiner", any(FusionJoiner)
         )
 
         verify(mock_pipeline).connect(
             "dense_text_embedder.embedding",
             "embedding_retriever.query_embedding",
         )
-        verify(mock_pipeline).connect("bm25_retriever", "document_joiner")
+        verify(mock_pipeline).connect(
+            "bm25_retriever", "document_joiner.bm25_documents"
+        )
         verify(mock_pipeline).connect("embedding_retriever", "ranker")
         verify(mock_pipeline).connect("ranker", "semantic_threshold.documents")
-        verify(mock_pipeline).connect("semantic_threshold", "document_joiner")
+        verify(mock_pipeline).connect(
+            "semantic_threshold", "document_joiner.semantic_documents"
+        )
 
     def test_setup_semantic_pipeline(self):
         """
@@ -107,6 +120,31 @@ class TestRetrievalPipeline(unittest.TestCase):
         verify(mock_pipeline).connect("embedding_retriever", "ranker")
         verify(mock_pipeline).connect("ranker", "threshold.documents")
 
+    def test_setup_semantic_pipeline_local_retriever(self):
+        """
+        Verify a custom embedding retriever is used in place of the OpenSearch one
+        """
+
+        mock_pipeline = self.create_mock_pipeline()
+        local_retriever = LocalEmbeddingRetriever(
+            LocalEmbeddingIndex.from_documents([])
+        )
+
+        RetrievalPipeline(
+            self.mock_document_store,
+            self.dense_embedding_model,
+            self.rerank_model,
+            retrieval=mock_pipeline,
+            embedding_retriever=local_retriever,
+        ).setup_semantic_pipeline()
+
+        verify(mock_pipeline).add_component(
+            "embedding_retriever", local_retriever
+        )
+        verify(mock_pipeline, times=0).add_component(
+            "embedding_retriever", any(OpenSearchEmbeddingRetriever)
+        )
+
     def test_setup_bm25_pipeline(self):
         """
         Verify components of BM25 retrieval pipeline get set up
@@ -122,6 +160,67 @@ class TestRetrievalPipeline(unittest.TestCase):
             "bm25_retriever", any(OpenSearchBM25Retriever)
         )
 
+    def test_setup_hybrid_pipeline_local_retrievers(self):
+        """
+        Verify custom BM25 and embedding retrievers are used in place of the OpenSearch ones
+        """
+
+        mock_pipeline = self.create_mock_pipeline()
+        bm25_retriever = LocalBM25Retriever(LocalBM25Index.from_documents([]))
+        embedding_retriever = LocalEmbeddingRetriever(
+            LocalEmbeddingIndex.from_documents([])
+        )
+
+        RetrievalPipeline(
+            self.mock_document_store,
+            self.dense_embedding_model,
+            self.rerank_model,
+            retrieval=mock_pipeline,
+            embedding_retriever=embedding_retriever,
+            bm25_retriever=bm25_retriever,
+        ).setup_hybrid_pipeline()
+
+        verify(mock_pipeline).add_component("bm25_retriever", bm25_retriever)
+        verify(mock_pipeline).add_component(
+            "embedding_retriever", embedding_retriever
+        )
+        verify(mock_pipeline).connect(
+            "bm25_retriever", "document_joiner.bm25_documents"
+        )
+
+    def test_setup_hybrid_pipeline_fallback_retrievers(self):
+        """
+        Verify fallback retrievers wrap the OpenSearch ones, with the same inputs
+        """
+
+        bm25_fallback = LocalBM25Retriever(LocalBM25Index.from_documents([]))
+        embedding_fallback = LocalEmbeddingRetriever(
+            LocalEmbeddingIndex.from_documents([])
+        )
+
+        pipeline = RetrievalPipeline(
+            self.mock_document_store,
+            self.dense_embedding_model,
+            self.rerank_model,
+            fallback_bm25_retriever=bm25_fallback,
+            fallback_embedding_retriever=embedding_fallback,
+        )
+        retrieval = pipeline.setup_hybrid_pipeline()
+
+        self.assertIsInstance(pipeline.bm25_retriever, FallbackRetriever)
+        self.assertIsInstance(
+            pipeline.bm25_retriever.retriever, OpenSearchBM25Retriever
+        )
+        self.assertIs(
+            pipeline.embedding_retriever.fallback, embedding_fallback
+        )
+        self.assertIn(
+            "query_embedding",
+            retrieval.inputs(include_components_with_connected_inputs=True)[
+                "embedding_retriever"
+            ],
+        )
+
     def test_setup_no_input_pipeline(self):
         """
         Test that the Pipeline object gets set up if not provided as an arg.
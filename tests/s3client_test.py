@@ -0,0 +1,73 @@
+import unittest
+from io import BytesIO
+
+from botocore.exceptions import ClientError
+from mockito import any, mock, verify, when
+
+from scripts.s3client import S3Client
+
+
+class TestS3Client(unittest.TestCase):
+
+    def setUp(self):
+        self.client = mock()
+        self.s3client = S3Client("bucket", "/docs/", self.client)
+
+    def test_download_fileobj(self):
+        """
+        Test the object is streamed into a seekable file, positioned at the start.
+        """
+
+        def download(bucket, key, f, Config):
+            f.write(b"%PDF-1.4")
+
+        when(self.client).download_fileobj(
+            "bucket", "docs/report.pdf", any(), Config=any()
+        ).thenAnswer(download)
+
+        f, error = self.s3client.download_fileobj("report.pdf")
+
+        self.assertIsNone(error)
+        self.assertTrue(f.seekable())
+        self.assertEqual(f.read(), b"%PDF-1.4")
+        self.assertFalse(f._rolled)
+
+    def test_download_fileobj_spools_large_files(self):
+        """
+        Test objects larger than the spool size are written to disk.
+        """
+
+        def download(bucket, key, f, Config):
+            f.write(b"x" * 100)
+
+        when(self.client).download_fileobj(...).thenAnswer(download)
+
+        f, error = self.s3client.download_fileobj(
+            "docs/report.pdf", prepend_prefix=False, spool_max_size=10
+        )
+
+        self.assertTrue(f._rolled)
+        self.assertEqual(len(f.read()), 100)
+
+    def test_download_fileobj_error(self):
+        error = ClientError({"Error": {"Code": "NoSuchKey"}}, "GetObject")
+        when(self.client).download_fileobj(...).thenRaise(error)
+
+        f, message = self.s3client.download_fileobj("missing.pdf")
+
+        self.assertIsNone(f)
+        self.assertTrue(message.startswith("ERROR"))
+
+    def test_upload(self):
+        """
+        Test uploads are streamed with the basename of the file as the key.
+        """
+
+        when(self.client).upload_fileobj(...).thenReturn(None)
+
+        error = self.s3client.upload(b"content", "some/path/report.pdf")
+
+        self.assertIsNone(error)
+        verify(self.client).upload_fileobj(
+            any(BytesIO), "bucket", "docs/report.pdf", Config=any()
+        )
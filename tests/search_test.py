@@ -1,11 +1,14 @@
+import time
 import unittest
 from haystack import Pipeline, Document
 from haystack_integrations.document_stores.opensearch import (
     OpenSearchDocumentStore,
 )
 from mockito import mock, when, verify, any
+from search_backend.fusion_joiner import FusionJoiner
+from search_backend.query_cost_guard import QueryCostGuard
 from search_backend.retrieval_pipeline import RetrievalPipeline
-from search_backend.search import Search
+from search_backend.search import Search, SearchUnavailableError
 
 
 class TestSearch(unittest.TestCase):
@@ -365,3 +368,316 @@ class TestSearch(unittest.TestCase):
             "test result 1",
             f"Expected content 'test result 1', got {results[0].content}",
         )
+
+    def test_query_normalisation(self):
+        """
+        Test that the canonical form of the query is passed to the pipeline.
+        """
+
+        mock_pipeline = self.create_mock_pipeline()
+        bm25_pipeline = RetrievalPipeline(
+            self.mock_document_store, retrieval=mock_pipeline
+        ).setup_bm25_pipeline()
+
+        mock_prediction = {
+            "bm25_retriever": {"documents": [Document(content="result")]}
+        }
+        when(mock_pipeline).run(
+            {
+                "bm25_retriever": {
+                    "query": "when does my gdd allowance expire",
+                    "filters": None,
+                    "top_k": 10,
+                }
+            }
+        ).thenReturn(mock_prediction)
+
+        for query in [
+            "When does my GDD allowance expire?",
+            "  when does my gdd   allowance expire ??? ",
+        ]:
+            results = Search(bm25_pipeline).bm25_search(query)
+            self.assertEqual(
+                len(results), 1, f"Expected 1 result but got {len(results)}"
+            )
+
+        # Queries with no content once normalised are rejected
+        results = Search(bm25_pipeline).bm25_search("?!")
+        self.assertEqual(
+            len(results), 0, f"Expected 0 results but got {len(results)}"
+        )
+
+        # Normalisation can be switched off
+        when(mock_pipeline).run(...).thenReturn(None)
+        results = Search(bm25_pipeline, normalise_query=False).bm25_search(
+            "When does my GDD allowance expire?"
+        )
+        self.assertEqual(
+            len(results), 0, f"Expected 0 results but got {len(results)}"
+        )
+
+    def test_cost_guard_reject(self):
+        """
+        Test that queries rejected by the cost guard don't run the pipeline.
+        """
+
+        mock_pipeline = self.create_mock_pipeline()
+        hybrid_pipeline = RetrievalPipeline(
+            self.mock_document_store,
+            self.dense_embedding_model,
+            self.rerank_model,
+            retrieval=mock_pipeline,
+        ).setup_hybrid_pipeline()
+        search_init = Search(
+            hybrid_pipeline, cost_guard=QueryCostGuard(max_chars=50)
+        )
+
+        results = search_init.hybrid_search("lighthouse " * 10)
+
+        self.assertEqual(
+            len(results), 0, f"Expected 0 results but got {len(results)}"
+        )
+        verify(mock_pipeline, times=0).run(...)
+
+    def test_cost_guard_unusual_spacing(self):
+        """
+        Test that unusual spacing is checked before the query is normalised.
+        """
+
+        mock_pipeline = self.create_mock_pipeline()
+        bm25_pipeline = RetrievalPipeline(
+            self.mock_document_store, retrieval=mock_pipeline
+        ).setup_bm25_pipeline()
+        when(mock_pipeline).run(...).thenReturn(
+            {"bm25_retriever": {"documents": [Document(content="result")]}}
+        )
+        search_init = Search(bm25_pipeline, cost_guard=QueryCostGuard())
+
+        # Normalised to "a b c d testing results"
+        results = search_init.bm25_search("A/B/C/D testing results")
+        self.assertEqual(len(results), 1)
+
+        with self.assertLogs("search_backend.search", level="WARNING"):
+            results = search_init.bm25_search("I-g-n-o-r-e the rules")
+        self.assertEqual(len(results), 0)
+        verify(mock_pipeline, times=1).run(...)
+
+    def test_cost_guard_downgrade_hybrid(self):
+        """
+        Test that a hybrid search over the rerank budget runs only the BM25 retriever.
+        """
+
+        mock_pipeline = self.create_mock_pipeline()
+        hybrid_pipeline = RetrievalPipeline(
+            self.mock_document_store,
+            self.dense_embedding_model,
+            self.rerank_model,
+            retrieval=mock_pipeline,
+        ).setup_hybrid_pipeline()
+
+        mock_bm25_retriever = mock()
+        when(mock_pipeline).get_component("bm25_retriever").thenReturn(
+            mock_bm25_retriever
+        )
+        when(mock_bm25_retriever).run(
+            query="lighthouse", filters=None, top_k=10
+        ).thenReturn(
+            {"documents": [Document(content="result", score=0.5)] * 3}
+        )
+
+        search_init = Search(
+            hybrid_pipeline, cost_guard=QueryCostGuard(max_rerank_cost=100)
+        )
+        results = search_init.hybrid_search("Lighthouse", top_k=2)
+
+        self.assertEqual(
+            len(results), 2, f"Expected 2 results but got {len(results)}"
+        )
+        verify(mock_pipeline, times=0).run(...)
+
+    def test_cost_guard_downgrade_semantic(self):
+        """
+        Test that a semantic search over the rerank budget skips the reranker.
+        """
+
+        mock_pipeline = self.create_mock_pipeline()
+        semantic_pipeline = RetrievalPipeline(
+            self.mock_document_store,
+            self.dense_embedding_model,
+            self.rerank_model,
+            retrieval=mock_pipeline,
+        ).setup_semantic_pipeline()
+
+        mock_embedder = mock()
+        mock_retriever = mock()
+        when(mock_pipeline).get_component("dense_text_embedder").thenReturn(
+            mock_embedder
+        )
+        when(mock_pipeline).get_component("embedding_retriever").thenReturn(
+            mock_retriever
+        )
+        when(mock_embedder).run(text="lighthouse").thenReturn(
+            {"embedding": [0.1, 0.2]}
+        )
+        when(mock_retriever).run(
+            query_embedding=[0.1, 0.2], filters=None, top_k=10
+        ).thenReturn(
+            {
+                "documents": [
+                    Document(content="high", score=0.8),
+                    Document(content="low", score=0.2),
+                ]
+            }
+        )
+
+        search_init = Search(
+            semantic_pipeline, cost_guard=QueryCostGuard(max_rerank_cost=100)
+        )
+        results = search_init.semantic_search("lighthouse", threshold=0.5)
+
+        self.assertEqual(
+            [doc.content for doc in results],
+            ["high"],
+            f"Expected only the high scoring result but got {results}",
+        )
+        verify(mock_pipeline, times=0).run(...)
+
+
+class SlowComponent:
+    """
+    Returns fixed outputs after a delay.
+    """
+
+    def __init__(self, output, delay=0.0, error=None):
+        self.output = output
+        self.delay = delay
+        self.error = error
+        self.calls = 0
+
+    def run(self, **kwargs):
+        self.calls += 1
+        time.sleep(self.delay)
+        if self.error is not None:
+            raise self.error
+        return self.output
+
+
+class TestSearchDeadline(unittest.TestCase):
+
+    def create_search(
+        self,
+        bm25_delay=0.0,
+        knn_delay=0.0,
+        rerank_delay=0.0,
+        knn_error=None,
+        max_workers=8,
+    ):
+        knn_documents = [
+            Document(id="knn0", content="knn 0", score=0.9),
+            Document(id="knn1", content="knn 1", score=0.8),
+        ]
+        components = {
+            "dense_text_embedder": SlowComponent({"embedding": [0.1, 0.2]}),
+            "bm25_retriever": SlowComponent(
+                {
+                    "documents": [
+                        Document(id="bm25", content="bm25", score=0.5)
+                    ]
+                },
+                bm25_delay,
+            ),
+            "embedding_retriever": SlowComponent(
+                {"documents": knn_documents}, knn_delay, knn_error
+            ),
+            "ranker": SlowComponent(
+                {"documents": knn_documents[::-1]}, rerank_delay
+            ),
+            "document_joiner": FusionJoiner(),
+        }
+        pipeline = mock(Pipeline)
+        for name, component in components.items():
+            when(pipeline).get_component(name).thenReturn(component)
+        self.components = components
+
+        return Search(
+            pipeline,
+            deadline=0.2,
+            retrieval_share=0.5,
+            max_workers=max_workers,
+        )
+
+    def semantic_ids(self, results):
+        return [doc.id for doc in results if doc.id != "bm25"]
+
+    def test_in_time(self):
+        results = self.create_search().hybrid_search("tax")
+
+        self.assertEqual(len(results), 3)
+        self.assertEqual(self.semantic_ids(results), ["knn1", "knn0"])
+        self.assertEqual(results[0].meta["degraded"], [])
+
+    def test_slow_reranker(self):
+        search = self.create_search(rerank_delay=0.5)
+
+        start = time.monotonic()
+        with self.assertLogs("search_backend.search", level="WARNING"):
+            results = search.hybrid_search("tax")
+
+        self.assertLess(time.monotonic() - start, 0.4)
+        # Semantic results in embedding order
+        self.assertEqual(len(results), 3)
+        self.assertEqual(self.semantic_ids(results), ["knn0", "knn1"])
+        self.assertTrue(
+            all(doc.meta["degraded"] == ["rerank"] for doc in results)
+        )
+
+        # The threshold is for reranker scores, so doesn't apply to the kNN scores
+        with self.assertLogs("search_backend.search", level="WARNING"):
+            results = search.hybrid_search("tax", threshold=0.95)
+        self.assertEqual(self.semantic_ids(results), ["knn0", "knn1"])
+
+    def test_slow_knn(self):
+        search = self.create_search(knn_delay=0.5)
+
+        start = time.monotonic()
+        with self.assertLogs("search_backend.search", level="WARNING"):
+            results = search.hybrid_search("tax")
+
+        self.assertLess(time.monotonic() - start, 0.2)
+        self.assertEqual([doc.id for doc in results], ["bm25"])
+        self.assertEqual(results[0].meta["degraded"], ["knn"])
+
+    def test_failed_knn(self):
+        search = self.create_search(knn_error=ConnectionError())
+
+        with self.assertLogs("search_backend.search"):
+            results = search.hybrid_search("tax")
+
+        self.assertEqual([doc.id for doc in results], ["bm25"])
+        self.assertEqual(results[0].meta["degraded"], ["knn"])
+
+    def test_all_retrievals_slow(self):
+        search = self.create_search(bm25_delay=0.5, knn_delay=0.5)
+
+        with self.assertLogs("search_backend.search", level="WARNING"):
+            with self.assertRaises(SearchUnavailableError) as context:
+                search.hybrid_search("tax")
+        self.assertEqual(context.exception.degraded, ["bm25", "knn"])
+
+    def test_busy_stage_skipped(self):
+        """
+        Test that a stage whose workers are all stuck is skipped without waiting.
+        """
+
+        # One worker per stage
+        search = self.create_search(knn_delay=0.5, max_workers=3)
+        with self.assertLogs("search_backend.search", level="WARNING"):
+            search.hybrid_search("tax")
+
+            start = time.monotonic()
+            results = search.hybrid_search("tax")
+
+        self.assertLess(time.monotonic() - start, 0.05)
+        self.assertEqual([doc.id for doc in results], ["bm25"])
+        self.assertEqual(results[0].meta["degraded"], ["knn"])
+        self.assertEqual(self.components["embedding_retriever"].calls, 1)
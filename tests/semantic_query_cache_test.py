@@ -0,0 +1,226 @@
+import time
+import unittest
+
+from haystack import Document, Pipeline
+from mockito import any, mock, unstub, verify, when
+
+from search_backend.fusion_joiner import FusionJoiner
+from search_backend.indexing_pipeline import IndexingPipeline
+from search_backend.semantic_query_cache import (
+    SemanticQueryCache,
+    search_settings_key,
+)
+from search_backend.search import Search
+
+
+class TestSemanticQueryCache(unittest.TestCase):
+
+    def setUp(self):
+        self.settings = search_settings_key("semantic", None, top_k=10)
+        self.results = [Document(content="result", score=0.9)]
+
+    def test_similar_query_hits(self):
+        cache = SemanticQueryCache(max_distance=0.05)
+        cache.store([1.0, 0.0], self.settings, self.results)
+
+        # Cosine distance of about 0.005, and scaling doesn't matter
+        self.assertEqual(cache.lookup([2.0, 0.2], self.settings), self.results)
+        # Cosine distance of about 0.3
+        self.assertIsNone(cache.lookup([1.0, 1.0], self.settings))
+
+        stats = cache.stats()
+        self.assertEqual((stats.hits, stats.misses), (1, 1))
+        self.assertEqual(stats.hit_rate, 0.5)
+
+    def test_settings_must_match(self):
+        cache = SemanticQueryCache()
+        cache.store([1.0, 0.0], self.settings, self.results)
+
+        for settings in [
+            search_settings_key("semantic", None, top_k=5),
+            search_settings_key("hybrid", None, top_k=10),
+            search_settings_key(
+                "semantic",
+                {"field": "meta.type", "operator": "==", "value": "article"},
+                top_k=10,
+            ),
+        ]:
+            self.assertIsNone(cache.lookup([1.0, 0.0], settings))
+
+    def test_closest_query_wins(self):
+        cache = SemanticQueryCache(max_distance=0.5)
+        first, second = [Document(content="first")], [
+            Document(content="second")
+        ]
+        cache.store([1.0, 0.0], self.settings, first)
+        cache.store([0.8, 0.6], self.settings, second)
+
+        self.assertEqual(cache.lookup([0.9, 0.5], self.settings), second)
+
+    def test_least_recently_used_replaced(self):
+        cache = SemanticQueryCache(max_size=2)
+        x, y, z = [[Document(content=text)] for text in "xyz"]
+        cache.store([1.0, 0.0, 0.0], self.settings, x)
+        cache.store([0.0, 1.0, 0.0], self.settings, y)
+        cache.lookup([1.0, 0.0, 0.0], self.settings)
+        cache.store([0.0, 0.0, 1.0], self.settings, z)
+
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.lookup([1.0, 0.0, 0.0], self.settings), x)
+        self.assertIsNone(cache.lookup([0.0, 1.0, 0.0], self.settings))
+        self.assertEqual(cache.lookup([0.0, 0.0, 1.0], self.settings), z)
+
+    def test_expired(self):
+        cache = SemanticQueryCache(max_age=0.01)
+        cache.store([1.0, 0.0], self.settings, self.results)
+        self.assertEqual(cache.lookup([1.0, 0.0], self.settings), self.results)
+        time.sleep(0.02)
+
+        self.assertIsNone(cache.lookup([1.0, 0.0], self.settings))
+        stats = cache.stats()
+        self.assertEqual((stats.hits, stats.misses, stats.expired), (1, 1, 1))
+        self.assertGreater(stats.max_hit_age, 0)
+        self.assertEqual(len(cache), 0)
+
+    def test_expired_closer_query_skipped(self):
+        """
+        Test that expired results of the closest query don't hide fresh results of
+        another query within max_distance.
+        """
+
+        cache = SemanticQueryCache(max_distance=0.05, max_age=0.05)
+        stale = [Document(content="stale")]
+        cache.store([1.0, 0.0], self.settings, stale)
+        time.sleep(0.06)
+        cache.store([1.0, 0.2], self.settings, self.results)
+
+        self.assertEqual(cache.lookup([1.0, 0.0], self.settings), self.results)
+        stats = cache.stats()
+        self.assertEqual((stats.hits, stats.expired), (1, 1))
+        self.assertEqual(len(cache), 1)
+
+    def test_results_copied(self):
+        cache = SemanticQueryCache()
+        cache.store([1.0, 0.0], self.settings, self.results)
+        self.results[0].meta["stored"] = True
+
+        hit = cache.lookup([1.0, 0.0], self.settings)
+        hit[0].meta["changed"] = True
+
+        self.assertEqual(cache.lookup([1.0, 0.0], self.settings)[0].meta, {})
+
+    def test_invalidate(self):
+        cache = SemanticQueryCache()
+        generation = cache.generation
+        cache.store([1.0, 0.0], self.settings, self.results)
+        cache.invalidate()
+
+        self.assertIsNone(cache.lookup([1.0, 0.0], self.settings))
+        # Results of a search that started before the cache was invalidated
+        cache.store([1.0, 0.0], self.settings, self.results, generation)
+        self.assertIsNone(cache.lookup([1.0, 0.0], self.settings))
+        self.assertEqual(cache.stats().invalidations, 1)
+
+
+class TestCachedSearch(unittest.TestCase):
+
+    def setUp(self):
+        self.pipeline = mock(Pipeline)
+        self.embedder = mock()
+        self.embedding_retriever = mock()
+        self.ranker = mock()
+        self.bm25_retriever = mock()
+        components = {
+            "dense_text_embedder": self.embedder,
+            "embedding_retriever": self.embedding_retriever,
+            "ranker": self.ranker,
+            "bm25_retriever": self.bm25_retriever,
+            "document_joiner": FusionJoiner(),
+        }
+        for name, component in components.items():
+            when(self.pipeline).get_component(name).thenReturn(component)
+
+        self.embeddings = {
+            "gdd allowance expiry": [1.0, 0.1],
+            "when does my gdd allowance expire": [1.0, 0.12],
+            "lighthouse": [0.0, 1.0],
+        }
+        for text, embedding in self.embeddings.items():
+            when(self.embedder).run(text=text).thenReturn(
+                {"embedding": embedding}
+            )
+
+        self.semantic_documents = [
+            Document(id="a", content="GDD allowances expire", score=0.9),
+            Document(id="b", content="Other", score=0.4),
+        ]
+        when(self.embedding_retriever).run(
+            query_embedding=any(), filters=any(), top_k=any()
+        ).thenReturn({"documents": self.semantic_documents})
+        when(self.ranker).run(
+            query=any(), documents=any(), top_k=any()
+        ).thenReturn({"documents": self.semantic_documents})
+        when(self.bm25_retriever).run(
+            query=any(), filters=any(), top_k=any()
+        ).thenReturn(
+            {"documents": [Document(id="c", content="GDD", score=0.7)]}
+        )
+
+        self.cache = SemanticQueryCache(max_distance=0.01)
+        self.search = Search(self.pipeline, query_cache=self.cache)
+
+    def tearDown(self):
+        unstub()
+
+    def test_semantic_search(self):
+        first = self.search.semantic_search("GDD allowance expiry")
+        second = self.search.semantic_search(
+            "When does my GDD allowance expire?"
+        )
+        self.search.semantic_search("lighthouse")
+
+        self.assertEqual(first, second)
+        verify(self.ranker, times=2).run(...)
+        verify(self.pipeline, times=0).run(...)
+        self.assertEqual(self.cache.stats().hits, 1)
+
+    def test_filters_not_shared(self):
+        self.search.semantic_search("GDD allowance expiry")
+        self.search.semantic_search(
+            "GDD allowance expiry",
+            filters={"field": "meta.type", "operator": "==", "value": "x"},
+        )
+
+        verify(self.ranker, times=2).run(...)
+
+    def test_hybrid_search(self):
+        first = self.search.hybrid_search("GDD allowance expiry", top_k=2)
+        second = self.search.hybrid_search(
+            "When does my GDD allowance expire?", top_k=2
+        )
+
+        self.assertEqual([doc.id for doc in first], ["a", "c"])
+        self.assertEqual(first, second)
+        verify(self.bm25_retriever, times=1).run(...)
+        verify(self.ranker, times=1).run(...)
+        verify(self.pipeline, times=0).run(...)
+
+    def test_invalidated_on_indexing(self):
+        indexing = mock(Pipeline)
+        when(indexing).add_component(any(str), any())
+        when(indexing).connect(any(str), any(str))
+        when(indexing).run(...).thenReturn({})
+        indexer = IndexingPipeline(
+            mock(), indexing=indexing, query_cache=self.cache
+        )
+
+        self.search.semantic_search("GDD allowance expiry")
+        indexer.index_docs([Document(content="New")])
+        self.search.semantic_search("GDD allowance expiry")
+
+        verify(self.ranker, times=2).run(...)
+        self.assertEqual(self.cache.stats().invalidations, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
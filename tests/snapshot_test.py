@@ -0,0 +1,172 @@
+import os
+import tempfile
+import unittest
+
+import pytest
+
+pytest.importorskip("pyarrow")
+
+import pyarrow as pa  # noqa: E402
+import pyarrow.parquet as pq  # noqa: E402
+from haystack import Document  # noqa: E402
+from haystack.document_stores.in_memory import (  # noqa: E402
+    InMemoryDocumentStore,
+)
+from haystack_integrations.document_stores.opensearch import (  # noqa: E402
+    OpenSearchDocumentStore,
+)
+from mockito import any, mock, unstub, verify, when  # noqa: E402
+
+from search_backend import snapshot  # noqa: E402
+from search_backend.indexing_pipeline import IndexingPipeline  # noqa: E402
+
+
+class TestSnapshot(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.path = os.path.join(self.directory.name, "index.parquet")
+
+        self.docs = [
+            Document(
+                id=str(ii),
+                content=f"chunk {ii}",
+                meta={"source": f"doc{ii // 2}.pdf", "page": ii},
+                embedding=[ii / 4, 0.5, -1.0],
+            )
+            for ii in range(5)
+        ]
+        self.document_store = InMemoryDocumentStore()
+        self.document_store.write_documents(self.docs)
+
+    def tearDown(self):
+        unstub()
+
+    def test_round_trip(self):
+        exported = IndexingPipeline(
+            self.document_store, "dense_model"
+        ).export_snapshot(self.path, batch_size=2)
+
+        self.assertEqual(exported, 5)
+        snapshot_file = pq.ParquetFile(self.path)
+        self.assertEqual(snapshot_file.num_row_groups, 3)
+        self.assertEqual(
+            snapshot_file.schema_arrow.field("embedding").type,
+            pa.list_(pa.float32(), 3),
+        )
+
+        new_store = InMemoryDocumentStore()
+        imported = IndexingPipeline(new_store, "dense_model").import_snapshot(
+            self.path, batch_size=2
+        )
+
+        self.assertEqual(imported, 5)
+        self.assertEqual(
+            sorted(new_store.filter_documents(), key=lambda doc: doc.id),
+            self.docs,
+        )
+
+    def test_without_embeddings(self):
+        document_store = InMemoryDocumentStore()
+        document_store.write_documents(
+            [Document(id="1", content="chunk", meta={"page": 1})]
+        )
+        IndexingPipeline(document_store).export_snapshot(self.path)
+
+        self.assertNotIn("embedding", pq.read_schema(self.path).names)
+        new_store = InMemoryDocumentStore()
+        IndexingPipeline(new_store).import_snapshot(self.path)
+        self.assertEqual(
+            new_store.filter_documents(), document_store.filter_documents()
+        )
+
+    def test_missing_embedding(self):
+        self.document_store.write_documents([Document(id="x", content="x")])
+
+        with self.assertRaises(ValueError):
+            IndexingPipeline(self.document_store).export_snapshot(
+                self.path, batch_size=2
+            )
+
+    def test_wrong_model(self):
+        IndexingPipeline(self.document_store, "dense_model").export_snapshot(
+            self.path
+        )
+
+        pipeline = IndexingPipeline(InMemoryDocumentStore(), "other_model")
+        with self.assertRaises(ValueError):
+            pipeline.import_snapshot(self.path)
+
+    def test_opensearch_bulk_load(self):
+        IndexingPipeline(self.document_store, "dense_model").export_snapshot(
+            self.path
+        )
+
+        document_store = mock(OpenSearchDocumentStore)
+        document_store.client = mock()
+        document_store.client.indices = mock()
+        document_store._index = "document"
+        document_store._embedding_dim = 3
+        document_store._max_chunk_bytes = 100_000
+
+        indices = document_store.client.indices
+        when(indices).get_settings(index="document").thenReturn(
+            {"document": {"settings": {"index": {"refresh_interval": "1s"}}}}
+        )
+        when(indices).put_settings(...)
+        when(indices).refresh(...)
+
+        loaded = []
+
+        def bulk(client, actions, **kwargs):
+            actions = list(actions)
+            loaded.extend(actions)
+            return len(actions), []
+
+        when(snapshot).bulk(...).thenAnswer(bulk)
+
+        imported = IndexingPipeline(
+            document_store, "dense_model"
+        ).import_snapshot(self.path)
+
+        self.assertEqual(imported, 5)
+        self.assertEqual([action["_id"] for action in loaded], list("01234"))
+        self.assertEqual(
+            Document.from_dict(loaded[1]["_source"]), self.docs[1]
+        )
+        verify(indices).put_settings(
+            index="document", body={"index": {"refresh_interval": "-1"}}
+        )
+        verify(indices).put_settings(
+            index="document", body={"index": {"refresh_interval": "1s"}}
+        )
+        verify(indices).refresh(index="document")
+
+        # An index for embeddings of a different size
+        document_store._embedding_dim = 768
+        with self.assertRaises(ValueError):
+            IndexingPipeline(document_store, "dense_model").import_snapshot(
+                self.path
+            )
+
+    def test_opensearch_export(self):
+        document_store = mock(OpenSearchDocumentStore)
+        document_store.client = mock()
+        document_store._index = "document"
+        hits = [{"_id": doc.id, "_source": doc.to_dict()} for doc in self.docs]
+        when(snapshot).scan(
+            document_store.client, index="document", query=any(), size=2
+        ).thenReturn(iter(hits))
+
+        IndexingPipeline(document_store, "dense_model").export_snapshot(
+            self.path, batch_size=2
+        )
+
+        table = pq.read_table(self.path)
+        self.assertEqual(table.column("id").to_pylist(), list("01234"))
+        self.assertEqual(pq.ParquetFile(self.path).num_row_groups, 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,144 @@
+import unittest
+
+from haystack import Document
+from mockito import unstub, when
+from tokenizers import (
+    Tokenizer,
+    models,
+    normalizers,
+    pre_tokenizers,
+    processors,
+)
+
+from search_backend import token_splitter
+from search_backend.token_splitter import TokenSplitter
+
+
+def make_tokenizer():
+    """
+    Small WordPiece tokenizer, which adds [CLS] and [SEP] tokens like BERT models.
+    """
+
+    vocab = ["[UNK]", "[CLS]", "[SEP]", "the", "light", "##house", "tower"]
+    vocab += ["is", "tall", ".", "a", "un", "##believ", "##able"]
+    tokenizer = Tokenizer(
+        models.WordPiece({token: ii for ii, token in enumerate(vocab)})
+    )
+    tokenizer.normalizer = normalizers.BertNormalizer(lowercase=True)
+    tokenizer.pre_tokenizer = pre_tokenizers.BertPreTokenizer()
+    tokenizer.post_processor = processors.TemplateProcessing(
+        single="[CLS] $A [SEP]", special_tokens=[("[CLS]", 1), ("[SEP]", 2)]
+    )
+
+    return tokenizer
+
+
+class TestTokenSplitter(unittest.TestCase):
+
+    def setUp(self):
+        when(token_splitter)._load_tokenizer("model").thenReturn(
+            make_tokenizer()
+        )
+
+    def tearDown(self):
+        unstub()
+
+    def split(self, text, **kwargs):
+        splitter = TokenSplitter("model", **kwargs)
+        results = splitter.run([Document(content=text, meta={"page": 2})])
+
+        return results["documents"]
+
+    def test_split_at_word_boundaries(self):
+        """
+        Test chunks are packed up to the token budget (excluding special tokens),
+        without splitting words into different chunks.
+        """
+
+        # Tokens: the light ##house is tall . the tower is tall .
+        text = "The lighthouse is tall. The tower is tall."
+        docs = self.split(text, split_length=7, split_overlap=0)
+
+        self.assertEqual(
+            [doc.content for doc in docs],
+            ["The lighthouse is ", "tall. The tower is ", "tall."],
+        )
+        self.assertEqual(
+            [doc.meta["split_idx_start"] for doc in docs], [0, 18, 37]
+        )
+        self.assertEqual(docs[1].meta["page"], 2)
+        self.assertEqual("".join(doc.content for doc in docs), text)
+
+    def test_overlap(self):
+        docs = self.split(
+            "the tower is tall the tower is tall",
+            split_length=6,
+            split_overlap=1,
+        )
+
+        self.assertEqual(
+            [doc.content for doc in docs],
+            ["the tower is tall ", "tall the tower is ", "is tall"],
+        )
+        self.assertEqual(docs[1].meta["_split_overlap"][0]["range"], (13, 18))
+
+    def test_long_word(self):
+        """
+        Test a word longer than the budget is split between chunks.
+        """
+
+        docs = self.split("unbelievable", split_length=4, split_overlap=0)
+
+        self.assertEqual([doc.content for doc in docs], ["unbeliev", "able"])
+
+    def test_chunks_fit_budget(self):
+        splitter = TokenSplitter("model", split_length=8, split_overlap=2)
+        text = " ".join(["the lighthouse is unbelievable ."] * 20)
+
+        docs = splitter.run([Document(content=text)])["documents"]
+        counts = splitter.count_tokens([doc.content for doc in docs])
+
+        self.assertTrue(all(count <= 8 for count in counts))
+        self.assertEqual(max(counts), 8)
+
+    def test_overlap_after_short_chunk(self):
+        """
+        Test a chunk ended at a word boundary fewer than split_overlap tokens from its
+        start is followed by the rest of the text, rather than skipping to the end.
+        """
+
+        text = "a unbelievable the tower is tall the tower is tall the tower is tall"
+        docs = self.split(text, split_length=5, split_overlap=2)
+
+        self.assertEqual(docs[0].content, "a ")
+        self.assertEqual(docs[1].content, "unbelievable ")
+        self.assertTrue(docs[-1].content.endswith("is tall"))
+        self.assertGreater(len(docs), 5)
+
+    def test_every_token_in_a_chunk(self):
+        """
+        Test the chunks cover the whole text, whatever the length and overlap.
+        """
+
+        words = ["a", "unbelievable", "the", "lighthouse", "tower", "is"]
+        text = " ".join(words[ii * 7 % 6] for ii in range(60))
+        for split_length in range(5, 12):
+            for split_overlap in range(split_length - 2):
+                docs = self.split(
+                    text,
+                    split_length=split_length,
+                    split_overlap=split_overlap,
+                )
+
+                covered = set()
+                for doc in docs:
+                    start = doc.meta["split_idx_start"]
+                    covered.update(range(start, start + len(doc.content)))
+                    self.assertEqual(
+                        text[start : start + len(doc.content)], doc.content
+                    )
+                self.assertEqual(covered, set(range(len(text))))
+
+    def test_invalid_budget(self):
+        with self.assertRaises(ValueError):
+            self.split("the tower", split_length=4, split_overlap=2)
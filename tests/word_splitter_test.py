@@ -0,0 +1,100 @@
+import random
+import unittest
+
+from haystack import Document
+from haystack.components.preprocessors import DocumentSplitter
+
+from search_backend.word_splitter import WordSplitter
+
+
+class TestWordSplitter(unittest.TestCase):
+
+    def test_parity_with_document_splitter(self):
+        """
+        Test the chunks and metadata are the same as Haystack's word splitter, for
+        texts with runs of spaces, page breaks and leading or trailing spaces.
+        """
+
+        random.seed(0)
+        words = ["a", "bb", "ccc.", "dd\f", "", "e\n", "f!", "ggg?"]
+
+        for _ in range(300):
+            text = " ".join(
+                random.choice(words) for _ in range(random.randint(1, 40))
+            )
+            text = random.choice(["", " "]) + text + random.choice(["", " "])
+            docs = [Document(content=text, meta={"title": "t", "tags": [1]})]
+
+            split_length = random.randint(1, 10)
+            params = {
+                "split_length": split_length,
+                "split_overlap": random.randint(0, split_length - 1),
+                "split_threshold": random.randint(0, split_length - 1),
+            }
+
+            expected = DocumentSplitter(split_by="word", **params).run(docs)
+            results = WordSplitter(**params).run(docs)
+
+            self.assertEqual(results, expected, msg=f"{text!r} {params}")
+
+    def test_split(self):
+        docs = [
+            Document(content="one two three four five", meta={"title": "t"})
+        ]
+
+        results = WordSplitter(split_length=3, split_overlap=1).run(docs)
+
+        self.assertEqual(
+            [doc.content for doc in results["documents"]],
+            ["one two three ", "three four five"],
+        )
+        self.assertEqual(
+            [doc.meta["split_idx_start"] for doc in results["documents"]],
+            [0, 8],
+        )
+        self.assertEqual(results["documents"][1].meta["title"], "t")
+
+    def test_metadata_copied(self):
+        """
+        Test chunks don't share mutable metadata.
+        """
+
+        docs = [Document(content="one two three", meta={"tags": ["a"]})]
+
+        results = WordSplitter(split_length=1).run(docs)["documents"]
+        results[0].meta["tags"].append("b")
+
+        self.assertEqual(results[1].meta["tags"], ["a"])
+        self.assertEqual(docs[0].meta["tags"], ["a"])
+
+    def test_respect_sentence_boundary(self):
+        docs = [
+            Document(content="One two. Three four five. Six seven eight nine")
+        ]
+
+        results = WordSplitter(
+            split_length=4, split_overlap=1, respect_sentence_boundary=True
+        ).run(docs)
+
+        self.assertEqual(
+            [doc.content for doc in results["documents"]],
+            [
+                "One two. ",
+                "two. Three four five. ",
+                "five. Six seven eight ",
+                "eight nine",
+            ],
+        )
+
+    def test_empty_documents_skipped(self):
+        results = WordSplitter().run([Document(content="")])
+
+        self.assertEqual(results["documents"], [])
+
+    def test_invalid_input(self):
+        with self.assertRaises(TypeError):
+            WordSplitter().run(["text"])
+        with self.assertRaises(ValueError):
+            WordSplitter().run([Document()])
+        with self.assertRaises(ValueError):
+            WordSplitter(split_length=2, split_overlap=2)